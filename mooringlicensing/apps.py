@@ -8,3 +8,4 @@ class MooringlicensingConfig(AppConfig):
         import mooringlicensing.components.payments_ml.signals
         import mooringlicensing.components.approvals.signals
         import mooringlicensing.components.proposals.signals
+        import mooringlicensing.components.main.signals
@@ -0,0 +1,215 @@
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+#bumped in the shared cache on every delete/clear, so that every process drops its local entries
+GENERATION_CACHE_KEY = 'tiered_cache_generation'
+
+_MISSING = object()
+
+
+class LocalLRU(object):
+    """
+    Bounded, thread safe, least recently used store of pickled values with an expiry time each
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, pickled = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout):
+        # Values are pickled like LocMemCache does, so a caller changing a value it got back does not change the cached one
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, pickled)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache(BaseCache):
+    """
+    A per process LRU in front of a shared cache (LOCATION is the alias of the shared cache in settings.CACHES).
+
+    Reads are answered from the local tier for up to LOCAL_TIMEOUT seconds, so that the hot keys cost neither a file open
+    nor a network round trip.  Writes go through to the shared cache.  A delete or clear in any process is published through
+    a generation key, checked at most every GENERATION_CHECK_INTERVAL seconds; a set overwriting an existing key reaches the
+    other processes once their local copy expires.  Keys starting with one of LOCAL_EXCLUDE (e.g. the version keys other
+    processes are notified through) are always read from the shared cache.
+
+    While the shared cache cannot be reached, get/set/delete fall back to the local tier alone instead of failing the request.
+
+    Key namespacing (KEY_PREFIX) and versioning (VERSION, incr_version) are those of the shared cache.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.generation_check_interval = options.get('GENERATION_CHECK_INTERVAL', 1)
+        self.local_exclude = tuple(options.get('LOCAL_EXCLUDE', ()))
+        self._local = LocalLRU(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._generation = None
+        self._generation_checked_at = 0
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_key(self, key, version):
+        if key.startswith(self.local_exclude):
+            return None
+        return self.shared.make_and_validate_key(key, version=version)
+
+    def _local_timeout(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if now - self._generation_checked_at < self.generation_check_interval:
+            return
+        self._generation_checked_at = now
+        try:
+            generation = self.shared.get(GENERATION_CACHE_KEY)
+        except Exception as e:
+            logger.error(f'Failed to read the cache generation.  Error: [{e}]')
+            self._local.clear()
+            return
+        if generation != self._generation:
+            self._local.clear()
+            self._generation = generation
+
+    def _publish_generation(self):
+        self._generation = uuid.uuid4().hex
+        self._call_shared('set', GENERATION_CACHE_KEY, self._generation, None)
+
+    def _call_shared(self, method, *args, default=None, **kwargs):
+        try:
+            return getattr(self.shared, method)(*args, **kwargs)
+        except Exception as e:
+            logger.error(f'Shared cache: [{self._shared_alias}] {method} failed.  Error: [{e}]')
+            return default
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        if local_key is None:
+            return self._call_shared('get', key, default, version=version, default=default)
+        self._check_generation()
+        value = self._local.get(local_key)
+        if value is not _MISSING:
+            return value
+        value = self._call_shared('get', key, _MISSING, version=version, default=_MISSING)
+        if value is _MISSING:
+            return default
+        self._local.set(local_key, value, self.local_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._call_shared('set', key, value, timeout, version=version)
+        local_key = self._local_key(key, version)
+        if local_key is None:
+            return
+        local_timeout = self._local_timeout(timeout)
+        if local_timeout > 0:
+            self._local.set(local_key, value, local_timeout)
+        else:
+            self._local.delete(local_key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            local_key = self._local_key(key, version)
+            if local_key is not None and self._local_timeout(timeout) > 0:
+                self._local.set(local_key, value, self._local_timeout(timeout))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self._call_shared('delete', key, version=version, default=False)
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self._local.delete(local_key)
+            self._publish_generation()
+        return deleted
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self._local.delete(local_key)
+        return value
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed_keys = self.shared.set_many(data, timeout, version=version)
+        local_timeout = self._local_timeout(timeout)
+        for key, value in data.items():
+            local_key = self._local_key(key, version)
+            if local_key is None or key in failed_keys:
+                continue
+            if local_timeout > 0:
+                self._local.set(local_key, value, local_timeout)
+            else:
+                self._local.delete(local_key)
+        return failed_keys
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=version)
+        for key in keys:
+            local_key = self._local_key(key, version)
+            if local_key is not None:
+                self._local.delete(local_key)
+        self._publish_generation()
+
+    def clear(self):
+        self.shared.clear()
+        self._local.clear()
+        self._publish_generation()
+
+    def clear_local(self):
+        """
+        Drop the local entries of this process only
+        """
+        self._local.clear()
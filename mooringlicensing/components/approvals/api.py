@@ -24,7 +24,9 @@ from mooringlicensing.components.proposals.email import send_create_mooring_lice
 from mooringlicensing.components.main.decorators import basic_exception_handler
 from mooringlicensing.components.payments_ml.api import logger
 
-from mooringlicensing.components.main.models import ApplicationType
+from mooringlicensing.components.main.models import ApplicationType, SearchDocument
+from mooringlicensing.components.main import search
+from mooringlicensing.components.main.api import InvoicePropertyCachePageMixin
 from mooringlicensing.components.payments_ml.models import FeePeriod, FeeSeason, FeeConstructor
 from mooringlicensing.components.payments_ml.serializers import (
     DcvPermitSerializer, 
@@ -148,17 +150,7 @@ class GetSticker(views.APIView):
             items_per_page = 10
 
             if search_term:
-                system_user_ids = list(SystemUser.objects.annotate(full_name=Concat('legal_first_name',Value(" "),'legal_last_name',output_field=CharField()))
-                .filter(
-                    Q(legal_first_name__icontains=search_term) | Q(legal_last_name__icontains=search_term) | Q(email__icontains=search_term) | Q(full_name__icontains=search_term)
-                ).values_list("ledger_id", flat=True))
-
-                proposal_applicant_proposals = list(ProposalApplicant.objects.annotate(full_name=Concat('first_name',Value(" "),'last_name',output_field=CharField()))
-                .filter(
-                    Q(first_name__icontains=search_term) | Q(last_name__icontains=search_term) | Q(email__icontains=search_term) | Q(full_name__icontains=search_term)
-                ).values_list("proposal_id", flat=True))
-
-                data = Sticker.objects.filter(Q(approval__current_proposal__id__in=proposal_applicant_proposals)|Q(approval__submitter__in=system_user_ids)|Q(vessel_ownership__vessel__rego_no__icontains=search_term)|Q(number__icontains=search_term)).exclude(number="")
+                data = Sticker.objects.filter(id__in=search.search(SearchDocument.OBJECT_TYPE_STICKER, search_term)).exclude(number="")
 
                 paginator = Paginator(data, items_per_page)
                 try:
@@ -289,14 +281,8 @@ class ApprovalFilterBackend(DatatablesFilterBackend):
 
         filter_approval_type2 = request.data.get('filter_approval_type2')
         if filter_approval_type2 and not filter_approval_type2.lower() == 'all':
-            if filter_approval_type2 == 'ml':
-                filter_query &= ~Q(mooringlicence=None)
-            elif filter_approval_type2 == 'aup':
-                filter_query &= ~Q(authoriseduserpermit=None)
-            elif filter_approval_type2 == 'aap':
-                filter_query &= ~Q(annualadmissionpermit=None)
-            elif filter_approval_type2 == 'wla':
-                filter_query &= ~Q(waitinglistallocation=None)
+            if filter_approval_type2 in [MooringLicence.code, AuthorisedUserPermit.code, AnnualAdmissionPermit.code, WaitingListAllocation.code]:
+                filter_query &= Q(child_type=filter_approval_type2)
 
         queryset = queryset.filter(filter_query)
         
@@ -307,24 +293,8 @@ class ApprovalFilterBackend(DatatablesFilterBackend):
             # Custom search
             search_text= request.data.get('search[value]')  # This has a search term.
             if search_text:
-                # User can search by a fullname, too
-                system_user_ids = list(SystemUser.objects.annotate(full_name=Concat('legal_first_name',Value(" "),'legal_last_name',output_field=CharField()))
-                .filter(
-                    Q(legal_first_name__icontains=search_text) | Q(legal_last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-                ).values_list("ledger_id", flat=True))
-
-                proposal_applicant_proposals = list(ProposalApplicant.objects.annotate(full_name=Concat('first_name',Value(" "),'last_name',output_field=CharField()))
-                .filter(
-                    Q(first_name__icontains=search_text) | Q(last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-                ).values_list("proposal_id", flat=True))
-
-                #Search by vessel registration
-                queryset = queryset.filter(
-                    Q(current_proposal__id__in=proposal_applicant_proposals)|
-                    Q(current_proposal__submitter__in=system_user_ids)|
-                    Q(id__in=VesselOwnershipOnApproval.objects.filter(vessel_ownership__vessel__rego_no__icontains=search_text).values_list('approval__id', flat=True))|
-                    Q(current_proposal__vessel_details__vessel__rego_no__icontains=search_text)
-                )
+                # Holder name/email, vessel rego and lodgement number are all held in the search index
+                queryset = queryset.filter(id__in=search.search(SearchDocument.OBJECT_TYPE_APPROVAL, search_text))
 
                 queryset = queryset.distinct() | super_queryset 
         except Exception as e:
@@ -414,13 +384,9 @@ class ApprovalPaginatedViewSet(viewsets.ReadOnlyModelViewSet):
         if filter_approval_type and not filter_approval_type.lower() == 'all':
             filter_approval_type_list = filter_approval_type.split(',')
             if 'wla' in filter_approval_type_list:
-                filter_query &= ~Q(waitinglistallocation=None)
+                filter_query &= Q(child_type=WaitingListAllocation.code)
             else:
-                filter_query &= Q(
-                    ~Q(authoriseduserpermit=None) |
-                    ~Q(mooringlicence=None) |
-                    ~Q(annualadmissionpermit=None)
-                )
+                filter_query &= Q(child_type__in=[AuthorisedUserPermit.code, MooringLicence.code, AnnualAdmissionPermit.code])
         queryset = queryset.exclude(current_proposal__processing_status=Proposal.PROCESSING_STATUS_DECLINED).filter(filter_query)
         total_count = queryset.count()
         #set total count attr here
@@ -601,7 +567,7 @@ class ApprovalViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
             #But we must not allow this to continue if there are no missing stickers
 
             #Annual Admissions can only have one sticker
-            if type(approval.child_obj) == AnnualAdmissionPermit:
+            if approval.child_type == AnnualAdmissionPermit.code:
                 if Sticker.objects.filter(approval=approval).filter(fee_season=season).exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST,Sticker.STICKER_STATUS_RETURNED]).exists():
                     raise serializers.ValidationError("This approval already has an active sticker record.")
                 #if the approval is current but has no sticker that is current or printing (or awaiting export) then replace then latest sticker (set replace sticker) if it exists
@@ -614,7 +580,7 @@ class ApprovalViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
                 #if none, replace blindly (handled after payment)
     
             #MLA - one sticker per vessel
-            elif type(approval.child_obj) == MooringLicence:
+            elif approval.child_type == MooringLicence.code:
                 #identify missing stickers (any VOOA VO that is not on a valid sticker with this approval assigned)
                 vessel_ownership_on_approvals = approval.child_obj.get_current_vessel_ownership_on_approvals().values_list("vessel_ownership_id",flat=True)
 
@@ -642,7 +608,7 @@ class ApprovalViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
                 #if none, replace blindly (handled after payment)
                 
             #AUP - one sticker for every four moorings, each mooring must have a sticker
-            elif type(approval.child_obj) == AuthorisedUserPermit:
+            elif approval.child_type == AuthorisedUserPermit.code:
                 #identify missing stickers (any MOA with a null sticker OR a sticker that is cancelled or lost)
                 active_moa_with_invalid_sticker_or_no_sticker = MooringOnApproval.objects.filter(
                     approval=approval,active=True
@@ -1722,7 +1688,7 @@ class DcvPermitFilterBackend(DatatablesFilterBackend):
         return queryset
 
 
-class DcvPermitPaginatedViewSet(viewsets.ReadOnlyModelViewSet):
+class DcvPermitPaginatedViewSet(InvoicePropertyCachePageMixin, viewsets.ReadOnlyModelViewSet):
     filter_backends = (DcvPermitFilterBackend,)
     pagination_class = DatatablesPageNumberPagination
     queryset = DcvPermit.objects.none()
@@ -1814,14 +1780,8 @@ class StickerFilterBackend(DatatablesFilterBackend):
         # Filter by approval types (wla, aap, aup, ml)
         filter_approval_type = request.GET.get('filter_approval_type')
         if filter_approval_type and not filter_approval_type.lower() == 'all':
-            if filter_approval_type == 'wla':
-                queryset = queryset.filter(approval__in=Approval.objects.filter(waitinglistallocation__in=WaitingListAllocation.objects.all()))
-            elif filter_approval_type == 'aap':
-                queryset = queryset.filter(approval__in=Approval.objects.filter(annualadmissionpermit__in=AnnualAdmissionPermit.objects.all()))
-            elif filter_approval_type == 'aup':
-                queryset = queryset.filter(approval__in=Approval.objects.filter(authoriseduserpermit__in=AuthorisedUserPermit.objects.all()))
-            elif filter_approval_type == 'ml':
-                queryset = queryset.filter(approval__in=Approval.objects.filter(mooringlicence__in=MooringLicence.objects.all()))
+            if filter_approval_type in [WaitingListAllocation.code, AnnualAdmissionPermit.code, AuthorisedUserPermit.code, MooringLicence.code]:
+                queryset = queryset.filter(approval__child_type=filter_approval_type)
 
         # Filter Year (FeeSeason)
         filter_year = request.GET.get('filter_year')
@@ -1987,7 +1947,7 @@ class StickerViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
         return Response({'sticker': serializer.data})
 
 
-class StickerPaginatedViewSet(viewsets.ReadOnlyModelViewSet):
+class StickerPaginatedViewSet(InvoicePropertyCachePageMixin, viewsets.ReadOnlyModelViewSet):
     filter_backends = (StickerFilterBackend,)
     pagination_class = DatatablesPageNumberPagination
     queryset = Sticker.objects.none()
@@ -2013,7 +1973,7 @@ class NonExportedStickerPaginatedViewSet(viewsets.ReadOnlyModelViewSet):
             qs = Sticker.objects.exclude(status__in=Sticker.EXPOSED_STATUS).order_by('-date_updated', '-date_created')
         return qs
 
-class DcvAdmissionPaginatedViewSet(viewsets.ReadOnlyModelViewSet):
+class DcvAdmissionPaginatedViewSet(InvoicePropertyCachePageMixin, viewsets.ReadOnlyModelViewSet):
     filter_backends = (DcvAdmissionFilterBackend,)
     pagination_class = DatatablesPageNumberPagination
     queryset = DcvAdmission.objects.none()
@@ -0,0 +1,136 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.db import connections
+from django.utils import timezone
+
+from mooringlicensing import settings
+
+logger = logging.getLogger('cron_tasks')
+
+
+def _init_worker():
+    #workers are spawned (not forked) so they never share the parent's database connections
+    django.setup()
+
+
+def _regenerate_batch(run_name, approval_ids):
+    """
+    Regenerate the documents of the approvals and record the outcome of each in its checkpoint.
+    Runs in a worker process.  Returns (completed, failed) counts.
+    """
+    from mooringlicensing.components.approvals.models import Approval, ApprovalDocumentRegeneration
+    from mooringlicensing.doctopdf import create_approval_doc_bytes_batch, create_authorised_user_summary_doc_bytes_batch
+
+    completed = 0
+    failed = 0
+    try:
+        approvals = list(Approval.objects.filter(id__in=approval_ids))
+        licence_docs = create_approval_doc_bytes_batch(approvals)
+        mooring_licences = [approval.child_obj for approval in approvals if approval.child_obj and approval.child_obj.code == 'ml']
+        au_summary_docs = dict(zip(
+            [mooring_licence.id for mooring_licence in mooring_licences],
+            create_authorised_user_summary_doc_bytes_batch(mooring_licences)
+        ))
+
+        for approval, licence_doc in zip(approvals, licence_docs):
+            try:
+                if isinstance(licence_doc, Exception):
+                    raise licence_doc
+                approval.generate_doc(contents_as_bytes=licence_doc)
+                approval.refresh_from_db()
+                if approval.id in au_summary_docs:
+                    au_summary_doc = au_summary_docs[approval.id]
+                    if isinstance(au_summary_doc, Exception):
+                        raise au_summary_doc
+                    approval.child_obj.generate_au_summary_doc(contents_as_bytes=au_summary_doc)
+                    approval.refresh_from_db()
+
+                approval.write_approval_history("Documents Regenerated")
+                approval.log_user_action("Document Regenerated")
+
+                ApprovalDocumentRegeneration.objects.filter(run_name=run_name, approval=approval).update(
+                    status=ApprovalDocumentRegeneration.STATUS_COMPLETED, error='', completed_at=timezone.now()
+                )
+                completed += 1
+            except Exception as e:
+                logger.error(f'Failed to regenerate the documents of the approval: [{approval}].  Error: [{e}]')
+                ApprovalDocumentRegeneration.objects.filter(run_name=run_name, approval=approval).update(
+                    status=ApprovalDocumentRegeneration.STATUS_FAILED, error=str(e), completed_at=timezone.now()
+                )
+                failed += 1
+    finally:
+        connections.close_all()
+    return completed, failed
+
+
+class DocumentRegenerationProgress(object):
+
+    def __init__(self, total, report):
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.report = report
+
+    def update(self, completed, failed):
+        self.completed += completed
+        self.failed += failed
+        processed = self.completed + self.failed
+        elapsed = time.monotonic() - self.started
+        rate = processed / elapsed if elapsed else 0
+        eta = (self.total - processed) / rate if rate else 0
+        self.report('{}/{} approvals processed ({} failed), {:.2f} approvals/s, ETA {}s'.format(
+            processed, self.total, self.failed, rate, int(eta)
+        ))
+
+
+def regenerate_approval_documents(run_name, approvals, workers=None, batch_size=None, retry_failed=False, report=logger.info):
+    """
+    Regenerate the licence/permit (and authorised user summary) documents of approvals across a pool of worker processes.
+
+    Each approval gets a checkpoint under run_name.  Re-running with the same run_name only processes the approvals
+    that have not been completed yet (and those that failed, when retry_failed).
+    Returns the final DocumentRegenerationProgress.
+    """
+    from mooringlicensing.components.approvals.models import ApprovalDocumentRegeneration
+
+    workers = workers or settings.DOCUMENT_REGENERATION_WORKERS
+    batch_size = batch_size or settings.LIBREOFFICE_BATCH_SIZE
+
+    ApprovalDocumentRegeneration.objects.bulk_create(
+        [ApprovalDocumentRegeneration(run_name=run_name, approval_id=approval_id) for approval_id in approvals.values_list('id', flat=True)],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    statuses = [ApprovalDocumentRegeneration.STATUS_PENDING,]
+    if retry_failed:
+        statuses.append(ApprovalDocumentRegeneration.STATUS_FAILED)
+    approval_ids = list(ApprovalDocumentRegeneration.objects.filter(
+        run_name=run_name, status__in=statuses
+    ).order_by('approval_id').values_list('approval_id', flat=True))
+
+    progress = DocumentRegenerationProgress(len(approval_ids), report)
+    report('Regenerating the documents of {} approvals for the run: [{}] with {} workers'.format(len(approval_ids), run_name, workers))
+    if not approval_ids:
+        return progress
+
+    batches = [approval_ids[i:i + batch_size] for i in range(0, len(approval_ids), batch_size)]
+
+    #the connections are not needed while the workers run
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker) as executor:
+        futures = [executor.submit(_regenerate_batch, run_name, batch) for batch in batches]
+        for future in as_completed(futures):
+            try:
+                completed, failed = future.result()
+            except Exception as e:
+                #the whole batch failed (e.g. the worker died), its checkpoints stay pending for the next run
+                logger.exception(f'Document regeneration batch failed.  Error: [{e}]')
+                completed, failed = 0, 0
+            progress.update(completed, failed)
+
+    return progress
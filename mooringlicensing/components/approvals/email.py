@@ -8,11 +8,9 @@ from django.utils.encoding import smart_str
 from django.urls import reverse
 from django.conf import settings
 from mooringlicensing import settings
-from mooringlicensing.components.emails.emails import TemplateEmailBase, _extract_email_headers
-from mooringlicensing.components.main.models import FileExtensionWhitelist
+from mooringlicensing.components.emails.emails import TemplateEmailBase, _extract_email_headers, log_email_attachments
 from ledger_api_client.ledger_models import EmailUserRO as EmailUser, EmailUserRO
 from mooringlicensing.components.emails.utils import get_user_as_email_user, get_public_url, make_http_https
-from django.core.files.base import ContentFile
 import os
 
 from mooringlicensing.components.users.utils import _log_user_email
@@ -97,10 +95,7 @@ def send_auth_user_mooring_removed_notification(approval, mooring_licence, stick
     msg = email.send(proposal.applicant_obj.email, cc=all_ccs, context=context)
     if msg:
         sender = settings.DEFAULT_FROM_EMAIL
-        try:
-            sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-        except:
-            sender_user = None
+        sender_user = get_user_as_email_user(sender)
 
         _log_approval_email(msg, approval, sender=sender_user)
         _log_user_email(msg, approval.applicant_obj, proposal.applicant_obj, sender=sender_user)
@@ -128,10 +123,7 @@ def send_approval_expire_email_notification(approval):
     msg = email.send(proposal.applicant_obj.email, cc=all_ccs, context=context)
     if msg:
         sender = settings.DEFAULT_FROM_EMAIL
-        try:
-            sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-        except:
-            sender_user = None
+        sender_user = get_user_as_email_user(sender)
 
         _log_approval_email(msg, approval, sender=sender_user)
         _log_user_email(msg, approval.applicant_obj, proposal.applicant_obj, sender=sender_user)
@@ -158,10 +150,7 @@ def send_approval_cancelled_due_to_no_vessels_nominated_mail(approval, request=N
     }
 
     sender = settings.DEFAULT_FROM_EMAIL
-    try:
-        sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-    except:
-        sender_user = None
+    sender_user = get_user_as_email_user(sender)
 
     to_address = approval.applicant_obj.email
     all_ccs = []
@@ -195,10 +184,7 @@ def send_vessel_nomination_reminder_mail(approval, request=None):
     }
 
     sender = settings.DEFAULT_FROM_EMAIL
-    try:
-        sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-    except:
-        sender_user = None
+    sender_user = get_user_as_email_user(sender)
 
     to_address = approval.applicant_obj.email
     all_ccs = []
@@ -255,18 +241,7 @@ def _log_approval_email(email_message, approval, sender=None, attachments=[]):
 
     email_entry = ApprovalLogEntry.objects.create(**kwargs)
 
-    for attachment in attachments:
-        check = attachment[0].split(".")
-        filename = attachment[0]
-        try:
-            if len(check) < 2 or not FileExtensionWhitelist.objects.filter(name=check[len(check)-1].lower()).exists():
-                filename = attachment[0] + ".pdf"
-        except Exception as e:
-            logger.error(e)
-            filename = attachment[0] + ".pdf"
-        email_entry_document = email_entry.documents.create(name=filename)
-        email_entry_document._file.save(filename, ContentFile(attachment[1]), save=False)
-        email_entry_document.save()
+    log_email_attachments(email_entry, email_message, attachments)
 
     return email_entry
 
@@ -458,10 +433,7 @@ def send_approval_cancel_email_notification(approval):
         'details': approval.cancellation_details,
     }
     sender = settings.DEFAULT_FROM_EMAIL
-    try:
-        sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-    except:
-        sender_user = None
+    sender_user = get_user_as_email_user(sender)
     all_ccs = []
     msg = email.send(proposal.applicant_obj.email, cc=all_ccs, context=context)
     if msg:
@@ -498,10 +470,7 @@ def send_approval_suspend_email_notification(approval, request=None):
         'to_date': to_date
     }
     sender = settings.DEFAULT_FROM_EMAIL
-    try:
-        sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-    except:
-        sender_user = None
+    sender_user = get_user_as_email_user(sender)
     all_ccs = []
     msg = email.send(proposal.applicant_obj.email, cc=all_ccs, context=context)
     if msg:
@@ -543,10 +512,7 @@ def send_approval_surrender_email_notification(approval, request=None, already_s
         'stickers_to_be_returned': stickers_to_be_returned,
     }
     sender = settings.DEFAULT_FROM_EMAIL
-    try:
-        sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-    except:
-        sender_user = None
+    sender_user = get_user_as_email_user(sender)
     all_ccs = []
     bccs = proposal.assessor_recipients
 
@@ -11,7 +11,7 @@ import pytz
 from django.db import models,transaction
 from django.dispatch import receiver
 from django.db.models.signals import pre_delete
-from django.db.models import Count
+from django.db.models import Count, Exists, F, Min, OuterRef, Subquery
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.db.models import JSONField
 from django.utils import timezone
@@ -19,7 +19,7 @@ from django.conf import settings
 from django.db.models import Q
 from django_countries.fields import CountryField
 
-from mooringlicensing.ledger_api_utils import retrieve_email_userro
+from mooringlicensing.ledger_api_utils import retrieve_email_userro, get_invoice_property_cache_entries
 from mooringlicensing.settings import PROPOSAL_TYPE_SWAP_MOORINGS, TIME_ZONE, GROUP_DCV_PERMIT_ADMIN, PRIVATE_MEDIA_STORAGE_LOCATION, PRIVATE_MEDIA_BASE_URL, STICKER_EXPORT_RUN_TIME_MESSAGE
 from ledger_api_client.ledger_models import Invoice, EmailUserRO
 from mooringlicensing.components.approvals.pdf import (
@@ -27,7 +27,7 @@ from mooringlicensing.components.approvals.pdf import (
     create_approval_doc, create_renewal_doc
 )
 from mooringlicensing.components.emails.utils import get_public_url
-from mooringlicensing.components.payments_ml.models import StickerActionFee, FeeConstructor, FeeSeason
+from mooringlicensing.components.payments_ml.models import StickerActionFee, FeeConstructor, FeeSeason, ApplicationFee, FeeItemApplicationFee
 from mooringlicensing.components.proposals.models import (
     Proposal, ProposalUserAction, Mooring, 
     StickerPrintingBatch, StickerPrintingResponse,
@@ -35,7 +35,12 @@ from mooringlicensing.components.proposals.models import (
 )
 from mooringlicensing.components.main.models import (
     CommunicationsLogEntry, UserAction, Document,
-    GlobalSettings, RevisionedMixin, ApplicationType, SanitiseMixin
+    GlobalSettings, RevisionedMixin, ApplicationType, SanitiseMixin, ChildObjQuerySet
+)
+from mooringlicensing.components.main.sequences import (
+    next_value, reserve_values,
+    SEQUENCE_APPROVAL_LODGEMENT_NUMBER, SEQUENCE_DCV_ADMISSION_LODGEMENT_NUMBER,
+    SEQUENCE_DCV_PERMIT_LODGEMENT_NUMBER, SEQUENCE_STICKER_NUMBER,
 )
 from mooringlicensing.components.approvals.email import (
     send_approval_expire_email_notification,
@@ -296,7 +301,22 @@ class Approval(RevisionedMixin):
         APPROVAL_STATUS_CURRENT,
         APPROVAL_STATUS_SUSPENDED,
     ]
+    CHILD_TYPE_CHOICES = (
+        ('wla', 'Waiting List Allocation'),
+        ('aap', 'Annual Admission Permit'),
+        ('aup', 'Authorised User Permit'),
+        ('ml', 'Mooring Site Licence'),
+    )
+    # child_type: reverse one-to-one of the subclass
+    CHILD_RELATIONS = {
+        'wla': 'waitinglistallocation',
+        'aap': 'annualadmissionpermit',
+        'aup': 'authoriseduserpermit',
+        'ml': 'mooringlicence',
+    }
     lodgement_number = models.CharField(max_length=9, blank=True, unique=True)
+    # code of the subclass, set on save
+    child_type = models.CharField(max_length=3, choices=CHILD_TYPE_CHOICES, blank=True, default='', db_index=True)
     status = models.CharField(max_length=40, choices=STATUS_CHOICES, default=STATUS_CHOICES[0][0])
     internal_status = models.CharField(max_length=40, choices=INTERNAL_STATUS_CHOICES, blank=True, null=True)
     licence_document = models.ForeignKey(ApprovalDocument, blank=True, null=True, related_name='licence_document', on_delete=models.SET_NULL)
@@ -319,6 +339,10 @@ class Approval(RevisionedMixin):
     set_to_cancel = models.BooleanField(default=False)
     set_to_suspend = models.BooleanField(default=False)
     set_to_surrender = models.BooleanField(default=False)
+    # Dates of suspension_details/surrender_details, kept in sync by save() so the scheduled transitions can be selected in SQL
+    suspension_from_date = models.DateField(blank=True, null=True)
+    suspension_to_date = models.DateField(blank=True, null=True)
+    surrender_date = models.DateField(blank=True, null=True)
 
     renewal_count = models.PositiveSmallIntegerField('Number of times an Approval has been renewed', default=0)
     migrated = models.BooleanField(default=False)
@@ -336,10 +360,25 @@ class Approval(RevisionedMixin):
     regenerate_documents = models.BooleanField(default=False)
     regenerate_document_email_notification = JSONField(blank=True,null=True) #{"func":"","params":[]}
 
+    # latest_applied_season as of the last change to the proposals/application fees of this approval, for the list pages
+    latest_applied_season_cache = models.ForeignKey(FeeSeason, null=True, blank=True, related_name='+', on_delete=models.SET_NULL)
+    # A new approval has no proposal applied yet, so its cache is up to date from the start (NULL: never computed)
+    latest_applied_season_cache_updated_at = models.DateTimeField(blank=True, null=True, default=timezone.now)
+
+    objects = ChildObjQuerySet.as_manager()
+
     class Meta:
         app_label = 'mooringlicensing'
         unique_together = ('lodgement_number', 'issue_date')
         ordering = ['-id',]
+        indexes = [
+            # Candidates of the scheduled status transitions (see components/approvals/status_transitions.py)
+            models.Index(fields=['status', 'expiry_date'], name='approval_status_expiry_idx'),
+            models.Index(fields=['suspension_from_date'], condition=Q(set_to_suspend=True), name='approval_to_suspend_idx'),
+            models.Index(fields=['suspension_to_date'], condition=Q(status='suspended'), name='approval_suspended_to_idx'),
+            models.Index(fields=['cancellation_date'], condition=Q(set_to_cancel=True), name='approval_to_cancel_idx'),
+            models.Index(fields=['surrender_date'], condition=Q(set_to_surrender=True), name='approval_to_surrender_idx'),
+        ]
 
     @property
     def grace_period_end_date(self):
@@ -682,23 +721,43 @@ class Approval(RevisionedMixin):
 
     @property
     def next_id(self):
-        ids = map(int, [re.sub('^[A-Za-z]*', '', i) for i in Approval.objects.all().values_list('lodgement_number', flat=True) if i])
-        ids = list(ids)
-        return max(ids) + 1 if ids else 1
+        return next_value(SEQUENCE_APPROVAL_LODGEMENT_NUMBER)
+
+    @staticmethod
+    def _parse_details_date(details, key):
+        if details and details.get(key):
+            try:
+                return datetime.datetime.strptime(details[key], '%d/%m/%Y').date()
+            except (TypeError, ValueError):
+                logger.warning(f'Invalid {key}: [{details[key]}]')
+        return None
+
+    def set_scheduled_dates(self):
+        self.suspension_from_date = Approval._parse_details_date(self.suspension_details, 'from_date')
+        self.suspension_to_date = Approval._parse_details_date(self.suspension_details, 'to_date')
+        self.surrender_date = Approval._parse_details_date(self.surrender_details, 'surrender_date')
 
     def save(self, *args, **kwargs):
         kwargs.pop('version_user', None)
         kwargs.pop('version_comment', None)
         #kwargs['no_revision'] = True
+        self.set_scheduled_dates()
+        if kwargs.get('update_fields') is not None:
+            update_fields = set(kwargs['update_fields'])
+            if 'suspension_details' in update_fields:
+                update_fields |= {'suspension_from_date', 'suspension_to_date'}
+            if 'surrender_details' in update_fields:
+                update_fields.add('surrender_date')
+            kwargs['update_fields'] = update_fields
         super(Approval, self).save(*args, **kwargs)
         self.child_obj.refresh_from_db()
 
-        if type(self.child_obj) == MooringLicence and self.status in [
+        if self.child_type == MooringLicence.code and self.status in [
             Approval.APPROVAL_STATUS_EXPIRED,
             Approval.APPROVAL_STATUS_CANCELLED,
             Approval.APPROVAL_STATUS_SURRENDERED,
         ]:
-            if type(self.child_obj) == MooringLicence and self.status in [
+            if self.child_type == MooringLicence.code and self.status in [
                 Approval.APPROVAL_STATUS_CANCELLED,
                 Approval.APPROVAL_STATUS_SURRENDERED,
             ]:
@@ -807,15 +866,15 @@ class Approval(RevisionedMixin):
             ## test whether any renewal or amendment applications have been created
             customer_status_choices = []
             ria_generated_proposal_qs = None
-            if type(self.child_obj) == WaitingListAllocation:
+            if self.child_type == WaitingListAllocation.code:
                 customer_status_choices = [Proposal.CUSTOMER_STATUS_WITH_ASSESSOR, Proposal.CUSTOMER_STATUS_DRAFT]
                 ria_generated_proposal_qs = self.child_obj.ria_generated_proposal.filter(customer_status__in=customer_status_choices)
             else:
-                if type(self.child_obj) == AnnualAdmissionPermit:
+                if self.child_type == AnnualAdmissionPermit.code:
                     customer_status_choices = [Proposal.CUSTOMER_STATUS_WITH_ASSESSOR, Proposal.CUSTOMER_STATUS_DRAFT, Proposal.CUSTOMER_STATUS_PRINTING_STICKER]
-                elif type(self.child_obj) == AuthorisedUserPermit:
+                elif self.child_type == AuthorisedUserPermit.code:
                     customer_status_choices = [Proposal.CUSTOMER_STATUS_WITH_ASSESSOR, Proposal.CUSTOMER_STATUS_DRAFT, Proposal.CUSTOMER_STATUS_AWAITING_ENDORSEMENT, Proposal.CUSTOMER_STATUS_AWAITING_PAYMENT,]
-                elif type(self.child_obj) == MooringLicence:
+                elif self.child_type == MooringLicence.code:
                     customer_status_choices = [Proposal.CUSTOMER_STATUS_WITH_ASSESSOR, Proposal.CUSTOMER_STATUS_DRAFT, Proposal.CUSTOMER_STATUS_AWAITING_ENDORSEMENT, Proposal.CUSTOMER_STATUS_AWAITING_PAYMENT, Proposal.CUSTOMER_STATUS_AWAITING_DOCUMENTS]
             existing_proposal_qs=self.proposal_set.filter(customer_status__in=customer_status_choices,
                     proposal_type__in=ProposalType.objects.filter(code__in=[PROPOSAL_TYPE_AMENDMENT, PROPOSAL_TYPE_RENEWAL, PROPOSAL_TYPE_SWAP_MOORINGS,]))
@@ -838,11 +897,11 @@ class Approval(RevisionedMixin):
         except Exception as e:
             raise e
 
-    def generate_doc(self, preview=False):
+    def generate_doc(self, preview=False, contents_as_bytes=None):
         if preview:
             return create_approval_doc_bytes(self)
 
-        self.licence_document = create_approval_doc(self)  # Update the attribute to the latest doc
+        self.licence_document = create_approval_doc(self, contents_as_bytes)  # Update the attribute to the latest doc
 
         self.save(version_comment='Created Approval PDF: {}'.format(self.licence_document.name))
         self.current_proposal.save(version_comment='Created Approval PDF: {}'.format(self.licence_document.name))
@@ -869,7 +928,7 @@ class Approval(RevisionedMixin):
                     #this should not be allowed to happen, ensure all AUPs on both moorings are exported prior to approval
                     print(e)
 
-    def generate_au_summary_doc(self):
+    def generate_au_summary_doc(self, contents_as_bytes=None):
         target_date=datetime.datetime.now(pytz.timezone(TIME_ZONE)).date()
         if hasattr(self, 'mooring'):
             query = Q()
@@ -881,7 +940,8 @@ class Approval(RevisionedMixin):
 
             #if moa_set.count() > 0:
             # Authorised User exists
-            contents_as_bytes = create_authorised_user_summary_doc_bytes(self)
+            if contents_as_bytes is None:
+                contents_as_bytes = create_authorised_user_summary_doc_bytes(self)
 
             filename = 'authorised-user-summary-{}.pdf'.format(self.lodgement_number)
             document = AuthorisedUserSummaryDocument.objects.create(approval=self, name=filename)
@@ -931,8 +991,8 @@ class Approval(RevisionedMixin):
                         logger.info(f'Status: [{sticker.status}] has been set to the sticker: [{sticker}]')
 
                     #NOTE: post-cancel and post-expiry functionality identitical for these license types
-                    if (type(self.child_obj) == MooringLicence or 
-                        type(self.child_obj) == AuthorisedUserPermit):
+                    if (self.child_type == MooringLicence.code or 
+                        self.child_type == AuthorisedUserPermit.code):
                         self.child_obj.processes_after_cancel()
             except:
                 raise
@@ -968,9 +1028,9 @@ class Approval(RevisionedMixin):
                     self.save()
                     logger.info(f'True has been set to the "set_to_cancel" attribute of the approval: [{self}]')
 
-                if (type(self.child_obj) == WaitingListAllocation or 
-                    type(self.child_obj) == MooringLicence or 
-                    type(self.child_obj) == AuthorisedUserPermit):
+                if (self.child_type == WaitingListAllocation.code or 
+                    self.child_type == MooringLicence.code or 
+                    self.child_type == AuthorisedUserPermit.code):
                     self.child_obj.processes_after_cancel()
                 # Log proposal action
                 self.log_user_action(ApprovalUserAction.ACTION_CANCEL_APPROVAL.format(self.id),request)
@@ -1006,7 +1066,7 @@ class Approval(RevisionedMixin):
                 else:
                     self.set_to_suspend = True
                 self.save()
-                if type(self.child_obj) == MooringLicence:
+                if self.child_type == MooringLicence.code:
                     self.child_obj.update_auth_user_permits()
                 # Log approval action
                 self.log_user_action(ApprovalUserAction.ACTION_SUSPEND_APPROVAL.format(self.id),request)
@@ -1108,12 +1168,12 @@ class Approval(RevisionedMixin):
                 previous_status = self.status
                 self.status = Approval.APPROVAL_STATUS_CURRENT
                 self.save()
-                if type(self.child_obj) == WaitingListAllocation and previous_status in [Approval.APPROVAL_STATUS_CANCELLED, Approval.APPROVAL_STATUS_SURRENDERED]:
+                if self.child_type == WaitingListAllocation.code and previous_status in [Approval.APPROVAL_STATUS_CANCELLED, Approval.APPROVAL_STATUS_SURRENDERED]:
                     wla = self.child_obj
                     wla.internal_status = Approval.INTERNAL_STATUS_WAITING
                     wla.save()
 
-                if type(self.child_obj) == AuthorisedUserPermit:
+                if self.child_type == AuthorisedUserPermit.code:
                     #update mooring license pdf
                     for moa in MooringOnApproval.objects.filter(approval=self):
                         if moa.mooring and moa.mooring.mooring_licence:
@@ -1166,10 +1226,10 @@ class Approval(RevisionedMixin):
                 #    send_approval_surrender_email_notification(self, already_surrendered=False, stickers_to_be_returned=stickers_to_be_returned)
                 
                 self.save()
-                if type(self.child_obj) == WaitingListAllocation:
+                if self.child_type == WaitingListAllocation.code:
                     self.child_obj.processes_after_surrender()
-                if (type(self.child_obj) == MooringLicence or 
-                    type(self.child_obj) == AuthorisedUserPermit):
+                if (self.child_type == MooringLicence.code or 
+                    self.child_type == AuthorisedUserPermit.code):
                     self.child_obj.processes_after_cancel()
                 # Log approval action
                 self.log_user_action(ApprovalUserAction.ACTION_SURRENDER_APPROVAL.format(self.id),request)
@@ -1243,18 +1303,19 @@ class Approval(RevisionedMixin):
                 moa.previous_sticker = None
                 moa.save()
 
+    def get_child_type(self):
+        if not self.child_type:
+            for child_type, relation in self.CHILD_RELATIONS.items():
+                if hasattr(self, relation):
+                    return child_type
+        return self.child_type
+
     @property
     def child_obj(self):
-        if hasattr(self, 'waitinglistallocation'):
-            return self.waitinglistallocation
-        elif hasattr(self, 'annualadmissionpermit'):
-            return self.annualadmissionpermit
-        elif hasattr(self, 'authoriseduserpermit'):
-            return self.authoriseduserpermit
-        elif hasattr(self, 'mooringlicence'):
-            return self.mooringlicence
-        else:
-            raise ObjectDoesNotExist("Approval must have an associated child object - WLA, AAP, AUP or ML")
+        child_type = self.get_child_type()
+        if child_type and hasattr(self, self.CHILD_RELATIONS[child_type]):
+            return getattr(self, self.CHILD_RELATIONS[child_type])
+        raise ObjectDoesNotExist("Approval must have an associated child object - WLA, AAP, AUP or ML")
 
     @classmethod
     def approval_types_dict(cls, include_codes=[]):
@@ -1308,28 +1369,59 @@ class Approval(RevisionedMixin):
                 feeless_proposals.append(proposal)
         return feeless_proposals
     
+    @staticmethod
+    def get_applied_seasons(approval):
+        # The seasons applied for the approval (an Approval, or an OuterRef when used in a subquery), latest first:
+        # the seasons of the fee items paid for and the seasons of the proposals approved without fees.
+        applied_processing_statuses = [Proposal.PROCESSING_STATUS_APPROVED, Proposal.PROCESSING_STATUS_PRINTING_STICKER]
+        application_fees = ApplicationFee.objects.filter(proposal=OuterRef('pk'), cancelled=False)
+        feeless_proposals = Proposal.objects.filter(
+            approval=approval,
+            processing_status__in=applied_processing_statuses,
+        ).filter(
+            ~Exists(application_fees) | Exists(application_fees.filter(fee_items__isnull=True))
+        )
+        applied_fee_items = FeeItemApplicationFee.objects.filter(
+            application_fee__proposal__approval=approval,
+            application_fee__proposal__processing_status__in=applied_processing_statuses,
+            application_fee__cancelled=False,
+        )
+        return FeeSeason.objects.filter(
+            Q(id__in=applied_fee_items.values('fee_item__fee_period__fee_season_id')) |
+            Q(id__in=feeless_proposals.values('fee_season_id'))
+        ).annotate(
+            first_period_start_date=Min('fee_periods__start_date')
+        ).order_by(F('first_period_start_date').desc(nulls_last=True), 'id')
+
     @property
     def latest_applied_season(self):
-        latest_applied_season = None
+        # The season applied latest.  Same result as get_applied_fee_items() + get_feeless_proposals(), in one query.
+        return Approval.get_applied_seasons(self).first()
 
-        if self.get_applied_fee_items():
-            for fee_item in self.get_applied_fee_items():
-                if latest_applied_season:
-                    if latest_applied_season.end_date < fee_item.fee_period.fee_season.end_date:
-                        latest_applied_season = fee_item.fee_period.fee_season
-                else:
-                    latest_applied_season = fee_item.fee_period.fee_season
-
-        if self.get_feeless_proposals():
-            for proposal in self.get_feeless_proposals():
-                if proposal.fee_season:
-                    if latest_applied_season:
-                        if latest_applied_season.end_date < proposal.fee_season.end_date:
-                            latest_applied_season = proposal.fee_season
-                    else:
-                        latest_applied_season = proposal.fee_season
+    @staticmethod
+    def get_latest_applied_season_ids(approval_ids):
+        # {approval id: id of its latest_applied_season} for all the approvals in one query, without updating their caches
+        latest_applied_season = Approval.get_applied_seasons(OuterRef(OuterRef('pk'))).values('id')[:1]
+        return dict(Approval.objects.filter(id__in=approval_ids).annotate(
+            latest_applied_season_id=Subquery(latest_applied_season),
+        ).values_list('id', 'latest_applied_season_id'))
+
+    def get_latest_applied_season_cache(self):
+        if not self.latest_applied_season_cache_updated_at:
+            self.update_latest_applied_season_cache()
+        return self.latest_applied_season_cache
+
+    def update_latest_applied_season_cache(self, save=True):
+        self.latest_applied_season_cache = self.latest_applied_season
+        self.latest_applied_season_cache_updated_at = timezone.now()
 
-        return latest_applied_season
+        if save:
+            # Neither a revision nor the post_save of the approval is wanted for this
+            Approval.objects.filter(id=self.id).update(
+                latest_applied_season_cache=self.latest_applied_season_cache,
+                latest_applied_season_cache_updated_at=self.latest_applied_season_cache_updated_at,
+            )
+        return self.latest_applied_season_cache
 
     def _update_status_of_sticker_to_be_removed(self, stickers_to_be_removed, stickers_to_be_replaced_for_renewal=[]):
         for sticker in stickers_to_be_removed:
@@ -2252,7 +2344,7 @@ class MooringLicence(Approval):
     def get_grace_period_end_date(self):
         end_date = None
         today = datetime.datetime.now(pytz.timezone(TIME_ZONE)).date()
-        min_mooring_vessel_size_str = GlobalSettings.objects.get(key=GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH).value
+        min_mooring_vessel_size_str = GlobalSettings.get_value(GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH)
         min_mooring_vessel_size = float(min_mooring_vessel_size_str)
 
         for vooa in self.vesselownershiponapproval_set.all():
@@ -2304,7 +2396,7 @@ class MooringLicence(Approval):
 
         for moa in moa_set:
             authorised_person = {}
-            if type(moa.approval.child_obj) == AuthorisedUserPermit:
+            if moa.approval.child_type == AuthorisedUserPermit.code:
                 aup = moa.approval.child_obj
                 authorised_by = aup.get_authorised_by()
                 authorised_by = authorised_by.upper().replace('_', ' ')
@@ -2344,7 +2436,7 @@ class MooringLicence(Approval):
             additional_vessels = []
 
             max_vessel_length = 0
-            minimum_mooring_vessel_length = float(GlobalSettings.objects.get(key=GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH).value)
+            minimum_mooring_vessel_length = float(GlobalSettings.get_value(GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH))
             current_vessels = self.get_current_vessels_for_licence_doc()
             for vessel in current_vessels:
                 v = {}
@@ -2415,7 +2507,7 @@ class MooringLicence(Approval):
                 active=True
             )
             for moa in moa_set:
-                if type(moa.approval.child_obj) == AuthorisedUserPermit:
+                if moa.approval.child_type == AuthorisedUserPermit.code:
                     moa.approval.child_obj.update_moorings(self)
 
     def _create_new_sticker_by_proposal(self, proposal):
@@ -3189,6 +3281,7 @@ class DcvAdmission(RevisionedMixin):
     status = models.CharField(max_length=40, choices=STATUS_CHOICES, null=True, blank=True)
 
     invoice_property_cache = JSONField(null=True, blank=True, default=dict)
+    invoice_property_cache_updated_at = models.DateTimeField(blank=True, null=True)
     
     @property
     def admin_group(self):
@@ -3220,21 +3313,22 @@ class DcvAdmission(RevisionedMixin):
         return Invoice.objects.filter(reference__in=invoice_references)
 
     def get_invoice_property_cache(self):
-        if len(self.invoice_property_cache) == 0:
+        # Not fetched again for the objects filled in memory for a list page
+        if len(self.invoice_property_cache) == 0 and not getattr(self, 'invoice_property_cache_loaded', False):
             self.update_invoice_property_cache()
         return self.invoice_property_cache
     
+    def get_invoices_for_property_cache(self):
+        return self.invoices_display()
+
     def update_invoice_property_cache(self, save=True):
-        for inv in self.invoices_display():
-            inv_props = ledger_api_client.utils.get_invoice_properties(inv.id)
-
-            self.invoice_property_cache[inv.id] = {
-                'payment_status': inv_props['data']['invoice']['payment_status'],
-                'reference': inv_props['data']['invoice']['reference'],
-                'amount': inv_props['data']['invoice']['amount'],
-                'settlement_date': inv_props['data']['invoice']['settlement_date'],
-            }
-            
+        # All the invoices are fetched from ledger as one batch
+        entries, failed_invoice_ids = get_invoice_property_cache_entries(self.get_invoices_for_property_cache())
+        self.invoice_property_cache.update(entries)
+        if not failed_invoice_ids:
+            # Otherwise left as it was, for the invoices which could not be fetched to be refreshed again
+            self.invoice_property_cache_updated_at = timezone.now()
+
         if save:
            self.save()
         return self.invoice_property_cache
@@ -3259,15 +3353,11 @@ class DcvAdmission(RevisionedMixin):
 
     @classmethod
     def get_next_id(cls):
-        ids = map(int, [i.split(cls.LODGEMENT_NUMBER_PREFIX)[1] for i in cls.objects.all().values_list('lodgement_number', flat=True) if i])
-        ids = list(ids)
-        return max(ids) + 1 if len(ids) else 1
+        return next_value(SEQUENCE_DCV_ADMISSION_LODGEMENT_NUMBER)
 
     def save(self, **kwargs):
         if self.lodgement_number in ['', None]:
             self.lodgement_number = self.LODGEMENT_NUMBER_PREFIX + '{0:06d}'.format(self.get_next_id())
-        if self.pk:
-            self.update_invoice_property_cache(save=False)
         super(DcvAdmission, self).save(**kwargs)
 
     def generate_dcv_admission_doc(self):
@@ -3496,6 +3586,7 @@ class DcvPermit(RevisionedMixin):
     postal_address_country = CountryField(default='AU', blank=True, null=True)
     
     invoice_property_cache = JSONField(null=True, blank=True, default=dict)
+    invoice_property_cache_updated_at = models.DateTimeField(blank=True, null=True)
 
     @property
     def submitter_obj(self):
@@ -3605,21 +3696,22 @@ class DcvPermit(RevisionedMixin):
         return Invoice.objects.filter(reference__in=invoice_references)
 
     def get_invoice_property_cache(self):
-        if len(self.invoice_property_cache) == 0:
+        # Not fetched again for the objects filled in memory for a list page
+        if len(self.invoice_property_cache) == 0 and not getattr(self, 'invoice_property_cache_loaded', False):
             self.update_invoice_property_cache()
         return self.invoice_property_cache
     
+    def get_invoices_for_property_cache(self):
+        return self.invoices_display()
+
     def update_invoice_property_cache(self, save=True):
-        for inv in self.invoices_display():
-            inv_props = ledger_api_client.utils.get_invoice_properties(inv.id)
-
-            self.invoice_property_cache[inv.id] = {
-                'payment_status': inv_props['data']['invoice']['payment_status'],
-                'reference': inv_props['data']['invoice']['reference'],
-                'amount': inv_props['data']['invoice']['amount'],
-                'settlement_date': inv_props['data']['invoice']['settlement_date'],
-            }
-            
+        # All the invoices are fetched from ledger as one batch
+        entries, failed_invoice_ids = get_invoice_property_cache_entries(self.get_invoices_for_property_cache())
+        self.invoice_property_cache.update(entries)
+        if not failed_invoice_ids:
+            # Otherwise left as it was, for the invoices which could not be fetched to be refreshed again
+            self.invoice_property_cache_updated_at = timezone.now()
+
         if save:
            self.save()
         return self.invoice_property_cache
@@ -3647,9 +3739,7 @@ class DcvPermit(RevisionedMixin):
 
     @classmethod
     def get_next_id(cls):
-        ids = map(int, [i.split(cls.LODGEMENT_NUMBER_PREFIX)[1] for i in cls.objects.all().values_list('lodgement_number', flat=True) if i])
-        ids = list(ids)
-        return max(ids) + 1 if len(ids) else 1
+        return next_value(SEQUENCE_DCV_PERMIT_LODGEMENT_NUMBER)
 
     def save(self, **kwargs):
         logger.info(f"Saving DcvPermit: {self}...")
@@ -3657,13 +3747,11 @@ class DcvPermit(RevisionedMixin):
             # Only when the fee has been paid, a lodgement number is assigned
             logger.info(f'DcvPermit: [{self}] has no lodgement number.')
             self.lodgement_number = self.LODGEMENT_NUMBER_PREFIX + '{0:06d}'.format(self.get_next_id())
-        if self.pk:
-            self.update_invoice_property_cache(save=False)
         super(DcvPermit, self).save(**kwargs)
         logger.info(f"DcvPermit: [{self}] has been updated with the lodgement_number: [{self.lodgement_number}].")
 
-    def generate_dcv_permit_doc(self):
-        permit_document = create_dcv_permit_document(self)
+    def generate_dcv_permit_doc(self, contents_as_bytes=None):
+        permit_document = create_dcv_permit_document(self, contents_as_bytes)
 
     def get_fee_amount_adjusted(self, fee_item, vessel_length):
         # Adjust fee amount if needed
@@ -3833,6 +3921,7 @@ class Sticker(RevisionedMixin):
     postal_address_postcode = models.CharField(max_length=10, null=True, blank=True)
 
     invoice_property_cache = JSONField(null=True, blank=True, default=dict)
+    invoice_property_cache_updated_at = models.DateTimeField(blank=True, null=True)
     batch_property_cache = JSONField(null=True, blank=True, default=dict)
 
     class Meta:
@@ -3841,21 +3930,22 @@ class Sticker(RevisionedMixin):
 
 
     def get_invoice_property_cache(self):
-        if len(self.invoice_property_cache) == 0:
+        # Not fetched again for the objects filled in memory for a list page
+        if len(self.invoice_property_cache) == 0 and not getattr(self, 'invoice_property_cache_loaded', False):
             self.update_invoice_property_cache()
         return self.invoice_property_cache
     
+    def get_invoices_for_property_cache(self):
+        return self.get_invoices()
+
     def update_invoice_property_cache(self, save=True):
-        for inv in self.get_invoices():
-            inv_props = get_invoice_properties(inv.id)
-
-            self.invoice_property_cache[inv.id] = {
-                'payment_status': inv_props['data']['invoice']['payment_status'],
-                'reference': inv_props['data']['invoice']['reference'],
-                'amount': inv_props['data']['invoice']['amount'],
-                'settlement_date': inv_props['data']['invoice']['settlement_date'],
-            }
-            
+        # All the invoices are fetched from ledger as one batch
+        entries, failed_invoice_ids = get_invoice_property_cache_entries(self.get_invoices_for_property_cache())
+        self.invoice_property_cache.update(entries)
+        if not failed_invoice_ids:
+            # Otherwise left as it was, for the invoices which could not be fetched to be refreshed again
+            self.invoice_property_cache_updated_at = timezone.now()
+
         if save:
            self.save()
         return self.invoice_property_cache
@@ -3942,7 +4032,7 @@ class Sticker(RevisionedMixin):
                 )
                 logger.info(f'New Sticker: [{new_sticker}] has been created for the approval with a new postal address: [{self.approval}].')
                 #update the MOA if AUP 
-                if type(self.approval.child_obj) == AuthorisedUserPermit:
+                if self.approval.child_type == AuthorisedUserPermit.code:
                     MooringOnApproval.objects.filter(sticker=self,approval=self.approval).update(sticker=new_sticker)
             else:
                 # Create replacement sticker
@@ -3961,32 +4051,34 @@ class Sticker(RevisionedMixin):
                 )
                 logger.info(f'New Sticker: [{new_sticker}] has been created for the approval: [{self.approval}].')
                 #update the MOA if AUP 
-                if type(self.approval.child_obj) == AuthorisedUserPermit:
+                if self.approval.child_type == AuthorisedUserPermit.code:
                     MooringOnApproval.objects.filter(sticker=self,approval=self.approval).update(sticker=new_sticker)
 
             return new_sticker
 
-    def get_sticker_colour(self):
+    def get_sticker_colour(self, vessel_length=None):
         colour = ''
-        if type(self.approval.child_obj) not in [AnnualAdmissionPermit,]:
-            colour = self.get_vessel_size_colour()
+        if self.approval.child_type not in [AnnualAdmissionPermit.code,]:
+            colour = self.get_vessel_size_colour(vessel_length)
         return colour
 
-    def get_white_info(self):
+    def get_white_info(self, vessel_length=None):
         white_info = ''
-        colour = self.get_sticker_colour().lower()
+        colour = self.get_sticker_colour(vessel_length).lower()
         if colour == 'white':
-            if self.vessel_applicable_length > 26:
-                white_info = self.vessel_applicable_length
-            elif self.vessel_applicable_length > 24:
+            if not vessel_length:
+                vessel_length = self.vessel_applicable_length
+            if vessel_length > 26:
+                white_info = vessel_length
+            elif vessel_length > 24:
                 white_info = 26
-            elif self.vessel_applicable_length > 22:
+            elif vessel_length > 22:
                 white_info = 24
-            elif self.vessel_applicable_length > 20:
+            elif vessel_length > 20:
                 white_info = 22
-            elif self.vessel_applicable_length > 18:
+            elif vessel_length > 18:
                 white_info = 20
-            elif self.vessel_applicable_length > 16:
+            elif vessel_length > 16:
                 white_info = 18
         return white_info
 
@@ -4010,15 +4102,16 @@ class Sticker(RevisionedMixin):
 
     @property
     def next_number(self):
-        try:
-            ids = [int(i) for i in Sticker.objects.all().values_list('number', flat=True) if i]
-            return max(ids) + 1 if ids else 1
-        except Exception as e:
-            print(e)
+        return next_value(SEQUENCE_STICKER_NUMBER)
+
+    @staticmethod
+    def reserve_numbers(count):
+        """
+        Allocate count new sticker numbers at once, formatted as stored in Sticker.number
+        """
+        return ['{0:07d}'.format(number) for number in reserve_values(SEQUENCE_STICKER_NUMBER, count)]
 
     def save(self, *args, **kwargs):
-        if self.pk:
-            self.update_invoice_property_cache(save=False)
         super(Sticker, self).save(*args, **kwargs)
         if self.status not in [Sticker.STICKER_STATUS_NOT_READY_YET, Sticker.STICKER_STATUS_READY,]:
             # We don't want to assign a number yet to not_ready_yet sticker.
@@ -4075,6 +4168,34 @@ class StickerActionDetail(SanitiseMixin):
         app_label = 'mooringlicensing'
         ordering = ['-date_created']
 
+class ApprovalDocumentRegeneration(models.Model):
+    """
+    Checkpoint of a bulk document regeneration run (see components/approvals/document_regeneration.py).
+    One record per approval per run, so an interrupted run can be resumed without regenerating the completed approvals.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    run_name = models.CharField(max_length=100)
+    approval = models.ForeignKey(Approval, related_name='document_regenerations', on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        unique_together = ('run_name', 'approval',)
+
+    def __str__(self):
+        return '{}: {} ({})'.format(self.run_name, self.approval_id, self.status)
+
 @receiver(pre_delete, sender=Approval)
 def delete_documents(sender, instance, *args, **kwargs):
     if hasattr(instance, 'approval_documents'):
@@ -1,16 +1,23 @@
 import datetime
+import logging
+from django.conf import settings
 from django.core.files.base import ContentFile
 
 from mooringlicensing.doctopdf import (
     create_dcv_permit_pdf_bytes, 
     create_dcv_admission_pdf_bytes,
     create_approval_doc_bytes,
+    create_approval_doc_bytes_batch,
+    create_dcv_permit_pdf_bytes_batch,
 )
 
+logger = logging.getLogger(__name__)
 
-def create_dcv_permit_document(dcv_permit):
+
+def create_dcv_permit_document(dcv_permit, contents_as_bytes=None):
     # create bytes
-    contents_as_bytes = create_dcv_permit_pdf_bytes(dcv_permit)
+    if contents_as_bytes is None:
+        contents_as_bytes = create_dcv_permit_pdf_bytes(dcv_permit)
 
     filename = 'dcv_permit-{}.pdf'.format(dcv_permit.lodgement_number)
     from mooringlicensing.components.approvals.models import DcvPermitDocument
@@ -38,9 +45,10 @@ def create_dcv_admission_document(dcv_admission_arrival):
     return document
 
 
-def create_approval_doc(approval):
+def create_approval_doc(approval, contents_as_bytes=None):
     # create bytes
-    contents_as_bytes = create_approval_doc_bytes(approval)
+    if contents_as_bytes is None:
+        contents_as_bytes = create_approval_doc_bytes(approval)
 
     now = datetime.datetime.now()
 
@@ -67,3 +75,55 @@ def create_renewal_doc(approval, proposal):
     document.save()
     return document
 
+
+
+def generate_approval_docs(approvals):
+    """
+    Generate the licence/permit documents of the approvals, converting them to pdf in batches.
+    Returns a list of (approval, exception) for the approvals that failed.
+    """
+    approvals = list(approvals)
+    errors = []
+    for i in range(0, len(approvals), settings.LIBREOFFICE_BATCH_SIZE):
+        batch = approvals[i:i + settings.LIBREOFFICE_BATCH_SIZE]
+        try:
+            batch_contents = create_approval_doc_bytes_batch(batch)
+        except Exception as e:
+            # The rest of the batches are still generated
+            logger.exception(f'Failed to generate the documents of: [{batch}].  Error: [{e}]')
+            errors += [(approval, e) for approval in batch]
+            continue
+        for approval, contents_as_bytes in zip(batch, batch_contents):
+            try:
+                if isinstance(contents_as_bytes, Exception):
+                    raise contents_as_bytes
+                approval.generate_doc(contents_as_bytes=contents_as_bytes)
+            except Exception as e:
+                errors.append((approval, e))
+    return errors
+
+
+def generate_dcv_permit_docs(dcv_permits):
+    """
+    Generate the documents of the dcv permits, converting them to pdf in batches.
+    Returns a list of (dcv_permit, exception) for the dcv permits that failed.
+    """
+    dcv_permits = list(dcv_permits)
+    errors = []
+    for i in range(0, len(dcv_permits), settings.LIBREOFFICE_BATCH_SIZE):
+        batch = dcv_permits[i:i + settings.LIBREOFFICE_BATCH_SIZE]
+        try:
+            batch_contents = create_dcv_permit_pdf_bytes_batch(batch)
+        except Exception as e:
+            # The rest of the batches are still generated
+            logger.exception(f'Failed to generate the documents of: [{batch}].  Error: [{e}]')
+            errors += [(dcv_permit, e) for dcv_permit in batch]
+            continue
+        for dcv_permit, contents_as_bytes in zip(batch, batch_contents):
+            try:
+                if isinstance(contents_as_bytes, Exception):
+                    raise contents_as_bytes
+                dcv_permit.generate_dcv_permit_doc(contents_as_bytes=contents_as_bytes)
+            except Exception as e:
+                errors.append((dcv_permit, e))
+    return errors
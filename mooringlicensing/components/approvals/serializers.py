@@ -42,6 +42,7 @@ from rest_framework import serializers
 from django.core.exceptions import ObjectDoesNotExist
 
 from mooringlicensing.ledger_api_utils import retrieve_system_user
+from mooringlicensing.components.approvals.utils import ApprovalListPageLoader
 
 logger = logging.getLogger(__name__)
 
@@ -315,7 +316,7 @@ class ApprovalSerializer(serializers.ModelSerializer):
         return None
 
     def get_mooring_licence_mooring(self, obj):
-        if type(obj.child_obj) == MooringLicence and hasattr(obj.child_obj,"mooring"):
+        if obj.child_type == MooringLicence.code and hasattr(obj.child_obj,"mooring"):
             return obj.child_obj.mooring.name 
         else:
             return None
@@ -350,7 +351,7 @@ class ApprovalSerializer(serializers.ModelSerializer):
     def get_mooring_licence_vessels(self, obj):
         links = ''
         request = self.context.get('request')
-        if type(obj.child_obj) == MooringLicence:
+        if obj.child_type == MooringLicence.code:
             for vessel_details in obj.child_obj.vessel_details_list:
                 if request and request.GET.get('is_internal') and request.GET.get('is_internal') == 'true':
                     links += '<a href="/internal/vessel/{}">{}</a><br/>'.format(
@@ -363,7 +364,7 @@ class ApprovalSerializer(serializers.ModelSerializer):
 
     def get_mooring_licence_authorised_users(self, obj):
         authorised_users = []
-        if type(obj.child_obj) == MooringLicence and hasattr(obj.child_obj,"mooring"):
+        if obj.child_type == MooringLicence.code and hasattr(obj.child_obj,"mooring"):
             moa_set = MooringOnApproval.objects.filter(
                     mooring=obj.child_obj.mooring,
                     active=True
@@ -388,7 +389,7 @@ class ApprovalSerializer(serializers.ModelSerializer):
     def get_mooring_licence_vessels_detail(self, obj):
         vessels = []
         vessel_details = []
-        if type(obj.child_obj) == MooringLicence:
+        if obj.child_type == MooringLicence.code:
             for vessel_ownership in obj.child_obj.vessel_ownership_list:
                 vessel = vessel_ownership.vessel
                 vessels.append(vessel)
@@ -412,7 +413,7 @@ class ApprovalSerializer(serializers.ModelSerializer):
 
     def get_authorised_user_moorings_detail(self, obj):
         moorings = []
-        if type(obj.child_obj) == AuthorisedUserPermit:
+        if obj.child_type == AuthorisedUserPermit.code:
             for moa in obj.mooringonapproval_set.filter(end_date__isnull=True, active=True):
                 if moa.mooring.mooring_licence is not None:
                     licence_holder_data = ProposalApplicantSerializer(moa.mooring.mooring_licence.current_proposal.proposal_applicant).data
@@ -430,7 +431,7 @@ class ApprovalSerializer(serializers.ModelSerializer):
     def get_authorised_user_moorings(self, obj):
         links = ''
         request = self.context.get('request')
-        if type(obj.child_obj) == AuthorisedUserPermit:
+        if obj.child_type == AuthorisedUserPermit.code:
             for moa in obj.mooringonapproval_set.filter(mooring__mooring_licence__status='current', active=True):
                 if request and request.GET.get('is_internal') and request.GET.get('is_internal') == 'true':
                     links += '<a href="/internal/moorings/{}">{}</a><br/>'.format(
@@ -443,7 +444,7 @@ class ApprovalSerializer(serializers.ModelSerializer):
 
     def get_ria_generated_proposals(self, obj):
         links = '<br/>'
-        if type(obj.child_obj) == WaitingListAllocation:
+        if obj.child_type == WaitingListAllocation.code:
             for mla in obj.child_obj.ria_generated_proposal.all():
                 links += '<a href="/internal/proposal/{}">{} : {}</a><br/>'.format(
                         mla.id,
@@ -455,7 +456,7 @@ class ApprovalSerializer(serializers.ModelSerializer):
     def get_offer_link(self, obj):
         link = ''
         if (
-            type(obj.child_obj) == WaitingListAllocation and 
+            obj.child_type == WaitingListAllocation.code and 
             obj.status == Approval.APPROVAL_STATUS_CURRENT and
             obj.current_proposal.preferred_bay and
             obj.internal_status == Approval.INTERNAL_STATUS_WAITING
@@ -726,7 +727,7 @@ class ListApprovalSerializer(serializers.ModelSerializer):
 
     def get_mooring_offered(self, obj):
         mooring = {}
-        if type(obj.child_obj) == WaitingListAllocation:
+        if obj.child_type == WaitingListAllocation.code:
             proposal = obj.child_obj.ria_generated_proposal.first()
             if proposal and proposal.allocated_mooring:
                 mooring = {
@@ -735,51 +736,53 @@ class ListApprovalSerializer(serializers.ModelSerializer):
                 }
         return mooring
 
+    def get_page_loader(self, obj):
+        # Related data for the whole page is loaded once, in a fixed number of queries
+        loader = self.context.get('approval_page_loader')
+        if loader is None or not loader.has_approval(obj):
+            approvals = [obj]
+            if isinstance(self.parent, serializers.ListSerializer) and self.parent.instance is not None:
+                approvals = self.parent.instance
+            loader = ApprovalListPageLoader(approvals)
+            if not loader.has_approval(obj):
+                loader = ApprovalListPageLoader([obj])
+            self.context['approval_page_loader'] = loader
+        return loader
+
     def get_has_sticker(self,obj):
-        return Sticker.objects.filter(approval=obj).exclude(status__in=[Sticker.STICKER_STATUS_EXPIRED,Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_RETURNED,Sticker.STICKER_STATUS_TO_BE_RETURNED,Sticker.STICKER_STATUS_LOST]).exists()
+        return self.get_page_loader(obj).has_sticker(obj)
 
     #we only consider a sticker missing if the only stickers that exist for the season are lost or cancelled
     def get_is_missing_sticker(self,obj):
-        season = obj.latest_applied_season
-        if type(obj.child_obj) == AuthorisedUserPermit:
+        loader = self.get_page_loader(obj)
+        season = loader.latest_applied_season(obj)
+        if obj.child_type == AuthorisedUserPermit.code:
             #check moas
             #if there is a moa with a null sticker or the moa has a sticker that is cancelled, lost, or returned - that moa has not got a valid sticker
-            return MooringOnApproval.objects.filter(
-                    approval=obj,active=True
-                ).filter(
-                    Q(sticker__isnull=True)|
-                    (
-                     Q(sticker__status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED])
-                     &Q(sticker__fee_season=season)
-                    )
-                ).exists()
-        elif type(obj.child_obj) == MooringLicence:
+            return len(loader.moas_without_valid_sticker(obj, season)) > 0
+        elif obj.child_type == MooringLicence.code:
             #check vos
-            vo_ids = list(VesselOwnershipOnApproval.objects.filter(approval=obj, end_date__isnull=True, vessel_ownership__end_date__isnull=True).values_list("vessel_ownership__id",flat=True))
-            vos = VesselOwnership.objects.filter(id__in=vo_ids)
-            for vo in vos:
+            season_stickers = loader.stickers_in_season(obj, season)
+            for vo in loader.current_vessel_ownerships(obj):
                 #NOTE: we exclude returned from the check because a vessel can be re-added to a permit, but we never replace a returned sticker
-                if not Sticker.objects.filter(approval=obj,vessel_ownership=vo).filter(fee_season=season).exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED]).exists():
+                if not [sticker for sticker in season_stickers if sticker.vessel_ownership_id == vo.id and sticker.status not in loader.STICKER_STATUSES_INVALID]:
                     return True
-        elif type(obj.child_obj) == WaitingListAllocation:
+        elif obj.child_type == WaitingListAllocation.code:
             return False
-        return not Sticker.objects.filter(approval=obj).filter(fee_season=season).exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED]).exists()
+        return not [sticker for sticker in loader.stickers_in_season(obj, season) if sticker.status not in loader.STICKER_STATUSES_INVALID]
 
 
     def get_missing_sticker_message(self,obj):
         #specified WHICH valid sticker(s) is/are missing (and what invalid stikcers will be replaced)
         #OR what vessel/mooring is missing a sticker (and will have a sticker made for)
-        season = obj.latest_applied_season
-        if type(obj.child_obj) == AuthorisedUserPermit:
-            moas = MooringOnApproval.objects.filter(
-                    approval=obj,active=True
-                ).filter(
-                    Q(sticker__isnull=True)|(Q(sticker__status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED])&Q(sticker__fee_season=season))
-                ).order_by("-id")
+        loader = self.get_page_loader(obj)
+        season = loader.latest_applied_season(obj)
+        if obj.child_type == AuthorisedUserPermit.code:
+            moas = sorted(loader.moas_without_valid_sticker(obj, season), key=lambda moa: moa.id, reverse=True)
 
             message = ""
             stickers = []
-            if moas.exists():
+            if moas:
                 message = "The following moorings do not have a valid sticker record assigned: "
                 for moa in moas:
                     #We do not want to replace a returned sticker, we treat it as if there is no sticker
@@ -798,27 +801,28 @@ class ListApprovalSerializer(serializers.ModelSerializer):
             else:
                 return ""
 
-        elif type(obj.child_obj) == MooringLicence:
-            vo_ids = list(VesselOwnershipOnApproval.objects.filter(approval=obj, end_date__isnull=True, vessel_ownership__end_date__isnull=True).values_list("vessel_ownership__id",flat=True))
-            vos = VesselOwnership.objects.filter(id__in=vo_ids)
-            vo_stickers = Sticker.objects.filter(vessel_ownership_id__in=vo_ids,approval=obj).filter(fee_season=season).order_by('-id')
+        elif obj.child_type == MooringLicence.code:
+            vos = loader.current_vessel_ownerships(obj)
+            vo_ids = [vo.id for vo in vos]
+            vo_stickers = sorted([sticker for sticker in loader.stickers_in_season(obj, season) if sticker.vessel_ownership_id in vo_ids], key=lambda sticker: sticker.id, reverse=True)
             
             bad_vos = []
             bad_stickers = []
 
             for vo in vos:
-                sticker_check = vo_stickers.filter(vessel_ownership=vo,approval=obj)
+                sticker_check = [sticker for sticker in vo_stickers if sticker.vessel_ownership_id == vo.id]
+                cancelled_or_lost = [sticker for sticker in sticker_check if sticker.status in [Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]]
 
-                if sticker_check.exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED]).exists():
+                if [sticker for sticker in sticker_check if sticker.status not in loader.STICKER_STATUSES_INVALID]:
                     #vo is fine
                     continue
-                elif not sticker_check.exclude(status=Sticker.STICKER_STATUS_RETURNED).exists():
+                elif not [sticker for sticker in sticker_check if sticker.status != Sticker.STICKER_STATUS_RETURNED]:
                     #vo has no stickers at all
                     bad_vos.append(vo)
-                elif sticker_check.filter(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).exists():
+                elif cancelled_or_lost:
                     #vo has bad stickers
                     bad_vos.append(vo)
-                    bad_stickers.append(sticker_check.filter(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).first().number)
+                    bad_stickers.append(cancelled_or_lost[0].number)
 
             if bad_vos:
                 message = "The following vessels do not have a valid sticker record assigned: "
@@ -835,17 +839,17 @@ class ListApprovalSerializer(serializers.ModelSerializer):
             else:
                 return ""
 
-        elif type(obj.child_obj) == AnnualAdmissionPermit:
-            stickers = Sticker.objects.filter(approval=obj).filter(fee_season=season).exclude(status=Sticker.STICKER_STATUS_RETURNED).order_by('-id')
+        elif obj.child_type == AnnualAdmissionPermit.code:
+            stickers = sorted([sticker for sticker in loader.stickers_in_season(obj, season) if sticker.status != Sticker.STICKER_STATUS_RETURNED], key=lambda sticker: sticker.id, reverse=True)
             bad_vo = None
             bad_sticker = None
-            if not stickers.exists():
+            if not stickers:
                 #AA has no stickers at all
                 bad_vo = obj.current_proposal.vessel_ownership if obj.current_proposal else None
-            elif not stickers.exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).exists():
+            elif not [sticker for sticker in stickers if sticker.status not in [Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]]:
                 #AA has no valid stickers
                 bad_vo = obj.current_proposal.vessel_ownership if obj.current_proposal else None
-                bad_sticker = stickers.filter(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).first()
+                bad_sticker = [sticker for sticker in stickers if sticker.status in [Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]][0]
             
             if bad_vo and bad_vo.vessel:
                 message = f"{bad_vo.vessel.rego_no} has no valid sticker record assigned."
@@ -859,9 +863,10 @@ class ListApprovalSerializer(serializers.ModelSerializer):
     def get_moorings(self, obj):
         links = []
         request = self.context.get('request')
+        loader = self.get_page_loader(obj)
         if obj.child_obj:
-            if type(obj.child_obj) == AuthorisedUserPermit:
-                moas = MooringOnApproval.get_current_moas_by_approval(obj)
+            if obj.child_type == AuthorisedUserPermit.code:
+                moas = loader.current_moas(obj)
                 for moa in moas:
                     if moa.mooring and moa.mooring.mooring_bay:
                         links.append({
@@ -869,7 +874,7 @@ class ListApprovalSerializer(serializers.ModelSerializer):
                             'bay_name': moa.mooring.mooring_bay.name,
                             'mooring_name': moa.mooring.name,
                         })
-            elif type(obj.child_obj) == MooringLicence and hasattr(obj.child_obj,'mooring') and obj.child_obj.mooring.mooring_bay: 
+            elif obj.child_type == MooringLicence.code and hasattr(obj.child_obj,'mooring') and obj.child_obj.mooring.mooring_bay: 
                 links.append({
                     'id': obj.child_obj.mooring.id,
                     'bay_name': obj.child_obj.mooring.mooring_bay.name,
@@ -919,30 +924,26 @@ class ListApprovalSerializer(serializers.ModelSerializer):
             return False
 
     def get_stickers_historical(self, obj):
-        stickers = obj.stickers.all()
+        stickers = self.get_page_loader(obj).stickers(obj)
         serializers = StickerSerializerSimple(stickers, many=True)
         list_return = serializers.data
         return list_return
 
     def get_stickers(self, obj):
-        stickers = obj.stickers.order_by('id').filter(status__in=[
+        loader = self.get_page_loader(obj)
+        stickers = sorted([sticker for sticker in loader.stickers(obj) if sticker.status in [
             Sticker.STICKER_STATUS_CURRENT,
             Sticker.STICKER_STATUS_AWAITING_PRINTING]
-        )
+        ], key=lambda sticker: sticker.id)
 
-        if not stickers.exists() and type(obj.child_obj) != AuthorisedUserPermit:
-            stickers = obj.stickers.order_by('-id')[0:]
-        elif not stickers.exists() and type(obj.child_obj) == AuthorisedUserPermit:
-            moas = MooringOnApproval.objects.filter(approval=obj).order_by('mooring','-id').distinct('mooring')
-            sticker_ids = []
-            for moa in moas:
-                if moa.sticker:
-                    sticker_ids.append(moa.sticker.id)
-            stickers = Sticker.objects.filter(id__in=sticker_ids)
+        if not stickers and obj.child_type != AuthorisedUserPermit.code:
+            stickers = sorted(loader.stickers(obj), key=lambda sticker: sticker.id, reverse=True)
+        elif not stickers and obj.child_type == AuthorisedUserPermit.code:
+            stickers = loader.latest_moa_stickers(obj)
         
-        if stickers.exists() and type(obj.child_obj) == AnnualAdmissionPermit:
+        if stickers and obj.child_type == AnnualAdmissionPermit.code:
             #Annual Admissions can only have one sticker at a time, if multiple returned present only the last
-            stickers = stickers.order_by('-id')[:1]
+            stickers = sorted(stickers, key=lambda sticker: sticker.id, reverse=True)[:1]
 
         serializers = StickerSerializerSimple(stickers, many=True)
         list_return = serializers.data
@@ -957,7 +958,7 @@ class ListApprovalSerializer(serializers.ModelSerializer):
         return obj.can_external_action
 
     def get_can_reissue(self,obj):
-        return obj.can_reissue
+        return self.get_page_loader(obj).can_reissue(obj)
 
     def get_can_reinstate(self,obj):
         return obj.can_reinstate
@@ -969,15 +970,16 @@ class ListApprovalSerializer(serializers.ModelSerializer):
         return obj.can_extend
 
     def get_amend_or_renew(self,obj):
-        return obj.amend_or_renew
+        return self.get_page_loader(obj).amend_or_renew(obj)
 
     def get_mooring_swappable(self,obj):
-        return obj.mooring_swappable
+        # if it is amendable/renewable, it is also swappable.
+        return bool(self.get_page_loader(obj).amend_or_renew(obj))
 
     def get_mooring_licence_vessels(self, obj):
         links = ''
         request = self.context.get('request')
-        if type(obj.child_obj) == MooringLicence:
+        if obj.child_type == MooringLicence.code:
             for vessel_details in obj.child_obj.vessel_details_list:
                 if request and request.GET.get('is_internal') and request.GET.get('is_internal') == 'true':
                     links += '<a href="/internal/vessel/{}">{}</a><br/>'.format(
@@ -990,7 +992,7 @@ class ListApprovalSerializer(serializers.ModelSerializer):
 
     def get_ria_generated_proposals(self, obj):
         links = '<br/>'
-        if type(obj.child_obj) == WaitingListAllocation:
+        if obj.child_type == WaitingListAllocation.code:
             for mla in obj.child_obj.ria_generated_proposal.all():
                 links += '<a href="/internal/proposal/{}">{} : {}</a><br/>'.format(
                         mla.id,
@@ -1002,7 +1004,7 @@ class ListApprovalSerializer(serializers.ModelSerializer):
     def get_offer_link(self, obj):
         link = ''
         if (
-            type(obj.child_obj) == WaitingListAllocation and 
+            obj.child_type == WaitingListAllocation.code and 
             obj.status == Approval.APPROVAL_STATUS_CURRENT and
             obj.current_proposal.preferred_bay and
             obj.internal_status == Approval.INTERNAL_STATUS_WAITING
@@ -1042,7 +1044,7 @@ class ListApprovalSerializer(serializers.ModelSerializer):
     def get_vessel_regos(self, obj):
         today = datetime.now(pytz.timezone(TIME_ZONE)).date()
         regos = []
-        if type(obj.child_obj) == MooringLicence:
+        if obj.child_type == MooringLicence.code:
             for vessel_details in obj.child_obj.vessel_details_list:
                 regos.append(vessel_details.vessel.rego_no)
         else:
@@ -1218,7 +1220,7 @@ class LookupApprovalSerializer(serializers.ModelSerializer):
 
     def get_vessel_data(self, obj):
         vessel_data = []
-        if type(obj.child_obj) != MooringLicence:
+        if obj.child_type != MooringLicence.code:
             if obj.current_proposal and obj.current_proposal.vessel_details and obj.current_proposal.vessel_details.vessel:
                 vessel_data.append({
                     "id": obj.current_proposal.vessel_details.vessel.id,
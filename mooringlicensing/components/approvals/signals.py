@@ -1,9 +1,15 @@
 import logging
-from django.db.models.signals import post_save
+import threading
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.db.models import Q
-from mooringlicensing.components.approvals.models import Sticker, ApprovalHistory
-from mooringlicensing.components.proposals.models import Proposal
+from mooringlicensing.components.approvals.models import Approval, Sticker, ApprovalHistory
+from mooringlicensing.components.approvals.sticker_printing import approve_printed_proposals
+from mooringlicensing.components.payments_ml.models import ApplicationFee, FeeItemApplicationFee
+from mooringlicensing.components.proposals.models import (
+    Proposal, WaitingListApplication, AnnualAdmissionApplication, AuthorisedUserApplication, MooringLicenceApplication,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,20 +23,8 @@ class StickerListener(object):
         sticker_saved = instance
         if sticker_saved.status == Sticker.STICKER_STATUS_CURRENT or sticker_saved.status == Sticker.STICKER_STATUS_CANCELLED:
             if sticker_saved.proposal_initiated and sticker_saved.proposal_initiated.processing_status == Proposal.PROCESSING_STATUS_PRINTING_STICKER:
-                # Retrieve the stickers being printed for this proposal
-                stickers_being_printed = Sticker.objects.filter(
-                    proposal_initiated=sticker_saved.proposal_initiated,
-                    status__in=[
-                        Sticker.STICKER_STATUS_READY,
-                        Sticker.STICKER_STATUS_NOT_READY_YET,
-                        Sticker.STICKER_STATUS_AWAITING_PRINTING,
-                    ])
-                if not stickers_being_printed:
-                    # When a sticker gets 'current' status and there are no stickers with being-printed statuses, update related proposal.status
-                    sticker_saved.proposal_initiated.processing_status = Proposal.PROCESSING_STATUS_APPROVED
-                    sticker_saved.proposal_initiated.save()
-                    logger.info(f'Status: [{Proposal.PROCESSING_STATUS_APPROVED}] has been set to the proposal: [{sticker_saved.proposal_initiated}]')
-                else:
+                # When a sticker gets 'current' status and there are no stickers with being-printed statuses, update related proposal.status
+                if not approve_printed_proposals([sticker_saved.proposal_initiated_id]):
                     logger.info(f'Proposal: [{sticker_saved.proposal_initiated}] still has sticker(s) being printed.')
         elif sticker_saved.status in [Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED,]:
 
@@ -117,3 +111,54 @@ class StickerListener(object):
             # Somehow there is no approval history object
             logger.warning('Active ApprovalHistory object for the sticker: {} not found'.format(sticker_saved))
 
+
+_pending_latest_applied_seasons = threading.local()
+
+
+def update_latest_applied_season_caches_on_commit(approval_id):
+    """
+    Recompute the latest_applied_season_cache of the approval once the transaction has been committed.
+    Every approval changed in a transaction is recomputed once, by the first callback to run.
+    """
+    approval_ids = getattr(_pending_latest_applied_seasons, 'approval_ids', None)
+    if approval_ids is None:
+        approval_ids = _pending_latest_applied_seasons.approval_ids = set()
+    approval_ids.add(approval_id)
+
+    def _update():
+        # Ids left over from a rolled back transaction are recomputed too, which does no harm
+        ids = set(approval_ids)
+        approval_ids.clear()
+        for approval in Approval.objects.filter(id__in=ids):
+            try:
+                approval.update_latest_applied_season_cache()
+            except Exception as e:
+                logger.exception(f'Failed to update the latest applied season of the approval: [{approval}].  Error: [{e}]')
+    transaction.on_commit(_update)
+
+
+class LatestAppliedSeasonListener(object):
+
+    @staticmethod
+    def _proposal_post_save(sender, instance, **kwargs):
+        if instance.approval_id:
+            update_latest_applied_season_caches_on_commit(instance.approval_id)
+
+    @staticmethod
+    @receiver(post_save, sender=ApplicationFee)
+    def _application_fee_post_save(sender, instance, **kwargs):
+        if instance.proposal_id and instance.proposal.approval_id:
+            update_latest_applied_season_caches_on_commit(instance.proposal.approval_id)
+
+    @staticmethod
+    @receiver(post_save, sender=FeeItemApplicationFee)
+    @receiver(post_delete, sender=FeeItemApplicationFee)
+    def _fee_item_application_fee_post_save(sender, instance, **kwargs):
+        application_fee = ApplicationFee.objects.filter(id=instance.application_fee_id).select_related('proposal').first()
+        if application_fee and application_fee.proposal and application_fee.proposal.approval_id:
+            update_latest_applied_season_caches_on_commit(application_fee.proposal.approval_id)
+
+
+#post_save is sent with the concrete class, so each subclass has to be connected
+for proposal_class in (Proposal, WaitingListApplication, AnnualAdmissionApplication, AuthorisedUserApplication, MooringLicenceApplication,):
+    post_save.connect(LatestAppliedSeasonListener._proposal_post_save, sender=proposal_class, dispatch_uid=f'latest_applied_season_{proposal_class.__name__}_save')
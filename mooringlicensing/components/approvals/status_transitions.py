@@ -0,0 +1,192 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+
+from mooringlicensing import settings
+from mooringlicensing.components.approvals.email import (
+    send_approval_cancel_email_notification,
+    send_approval_suspend_email_notification,
+    send_approval_surrender_email_notification,
+)
+from mooringlicensing.components.approvals.models import (
+    Approval,
+    ApprovalUserAction,
+    AuthorisedUserPermit,
+    MooringLicence,
+    Sticker,
+    WaitingListAllocation,
+)
+from mooringlicensing.components.main.models import JobQueue
+from mooringlicensing.components.proposals.models import ProposalUserAction
+
+logger = logging.getLogger('cron_tasks')
+
+#the management command processing the queued side effects of a batch of transitions
+SIDE_EFFECTS_JOB_CMD = 'process_approval_status_transitions'
+#the side effects which fail are queued again, up to this number of attempts in all
+SIDE_EFFECTS_MAX_ATTEMPTS = 3
+
+TRANSITION_EXPIRE = 'expire'
+TRANSITION_SUSPEND = 'suspend'
+TRANSITION_CANCEL = 'cancel'
+TRANSITION_SURRENDER = 'surrender'
+TRANSITION_REINSTATE = 'reinstate'
+
+#the order the transitions are applied in; an approval both due to be cancelled and surrendered is cancelled
+TRANSITIONS = (
+    TRANSITION_EXPIRE,
+    TRANSITION_SUSPEND,
+    TRANSITION_CANCEL,
+    TRANSITION_SURRENDER,
+    TRANSITION_REINSTATE,
+)
+
+
+def get_candidates(transition, today):
+    """
+    Return a queryset of the approvals due to undergo the transition on today.
+    Each predicate is covered by one of the indexes of Approval.Meta.
+    """
+    if transition == TRANSITION_EXPIRE:
+        queries = Q(status=Approval.APPROVAL_STATUS_CURRENT, expiry_date__lt=today)
+    elif transition == TRANSITION_SUSPEND:
+        queries = Q(status=Approval.APPROVAL_STATUS_CURRENT, set_to_suspend=True, suspension_from_date__lte=today)
+    elif transition == TRANSITION_CANCEL:
+        queries = Q(
+            status__in=[Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED],
+            set_to_cancel=True,
+            cancellation_date__lte=today,
+        )
+    elif transition == TRANSITION_SURRENDER:
+        queries = Q(
+            status__in=[Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED],
+            set_to_surrender=True,
+            surrender_date__lte=today,
+        )
+    elif transition == TRANSITION_REINSTATE:
+        queries = Q(status=Approval.APPROVAL_STATUS_SUSPENDED, suspension_to_date__lte=today, expiry_date__gt=today)
+    else:
+        raise ValueError('Unknown approval status transition: [{}]'.format(transition))
+    return Approval.objects.filter(queries)
+
+
+def _log_actions(approval, approval_action, proposal_action):
+    ApprovalUserAction.log_action(approval, approval_action.format(approval.id), None)
+    proposal = approval.current_proposal
+    if proposal:
+        ProposalUserAction.log_action(proposal, proposal_action.format(proposal.lodgement_number), None)
+
+
+def _apply(transition, approval):
+    """
+    Apply the transition to the (locked) approval.
+    Returns the side effects to be queued for it, or None when there are none.
+    """
+    side_effects = {'approval_id': approval.id, 'transition': transition}
+
+    if transition == TRANSITION_EXPIRE:
+        #expire_approval sends its own notifications
+        approval.expire_approval()
+        return None
+
+    if transition == TRANSITION_SUSPEND:
+        approval.status = Approval.APPROVAL_STATUS_SUSPENDED
+        approval.set_to_suspend = False
+        approval.save()
+        _log_actions(approval, ApprovalUserAction.ACTION_SUSPEND_APPROVAL, ProposalUserAction.ACTION_SUSPEND_APPROVAL)
+        return side_effects
+
+    if transition == TRANSITION_CANCEL:
+        approval.status = Approval.APPROVAL_STATUS_CANCELLED
+        approval.set_to_cancel = False
+        approval.save()
+        if approval.child_type == WaitingListAllocation.code:
+            approval.child_obj.processes_after_cancel()
+        _log_actions(approval, ApprovalUserAction.ACTION_CANCEL_APPROVAL, ProposalUserAction.ACTION_CANCEL_APPROVAL)
+        return side_effects
+
+    if transition == TRANSITION_SURRENDER:
+        stickers_to_be_returned = approval._process_stickers()
+        approval.status = Approval.APPROVAL_STATUS_SURRENDERED
+        approval.set_to_surrender = False
+        approval.save()
+        if approval.child_type == WaitingListAllocation.code:
+            approval.child_obj.processes_after_surrender()
+        _log_actions(approval, ApprovalUserAction.ACTION_SURRENDER_APPROVAL, ProposalUserAction.ACTION_SURRENDER_APPROVAL)
+        side_effects['stickers_to_be_returned'] = [sticker.id for sticker in stickers_to_be_returned]
+        return side_effects
+
+    if transition == TRANSITION_REINSTATE:
+        approval.status = Approval.APPROVAL_STATUS_CURRENT
+        approval.save()
+        _log_actions(approval, ApprovalUserAction.ACTION_REINSTATE_APPROVAL, ProposalUserAction.ACTION_REINSTATE_APPROVAL)
+        return None
+
+    raise ValueError('Unknown approval status transition: [{}]'.format(transition))
+
+
+def _apply_batch(transition, approval_ids, today, errors, updates):
+    side_effects = []
+    with transaction.atomic():
+        #the predicate is applied again to the locked rows in case an approval has changed since it was selected
+        approvals = get_candidates(transition, today).filter(id__in=approval_ids).select_for_update(of=('self',)).order_by('id')
+        for approval in approvals:
+            try:
+                with transaction.atomic():
+                    side_effect = _apply(transition, approval)
+                if side_effect:
+                    side_effects.append(side_effect)
+                logger.info('Updated Approval {} status to {}'.format(approval.id, approval.status))
+                updates.append({approval.status: approval.lodgement_number})
+            except Exception as e:
+                err_msg = 'Error applying the transition: [{}] to the Approval {}'.format(transition, approval.lodgement_number)
+                logger.exception('{}\n{}'.format(err_msg, str(e)))
+                errors.append(err_msg)
+
+        if side_effects:
+            #queued within the transaction so the side effects exist if, and only if, the transitions do
+            queue_side_effects(side_effects)
+
+
+def queue_side_effects(side_effects, attempt=1):
+    return JobQueue.objects.create(
+        job_cmd=SIDE_EFFECTS_JOB_CMD,
+        parameters_json={'transitions': side_effects, 'attempt': attempt},
+    )
+
+
+def apply_transitions(today, batch_size=None):
+    """
+    Apply every approval status transition due on today, batch_size approvals per transaction.
+    Returns (errors, updates) for the cron email.
+    """
+    batch_size = batch_size or settings.APPROVAL_STATUS_TRANSITION_BATCH_SIZE
+    errors = []
+    updates = []
+    for transition in TRANSITIONS:
+        approval_ids = list(get_candidates(transition, today).order_by('id').values_list('id', flat=True))
+        if approval_ids:
+            logger.info('{} approvals to {}'.format(len(approval_ids), transition))
+        for i in range(0, len(approval_ids), batch_size):
+            _apply_batch(transition, approval_ids[i:i + batch_size], today, errors, updates)
+    return errors, updates
+
+
+def process_side_effects(transition, approval, stickers_to_be_returned=()):
+    """
+    Send the notification and run the child specific processes of a transition already applied to the approval
+    """
+    if transition == TRANSITION_SUSPEND:
+        send_approval_suspend_email_notification(approval)
+    elif transition == TRANSITION_CANCEL:
+        if approval.child_type in (AuthorisedUserPermit.code, MooringLicence.code):
+            approval.child_obj.processes_after_cancel()
+        send_approval_cancel_email_notification(approval)
+    elif transition == TRANSITION_SURRENDER:
+        if approval.child_type in (AuthorisedUserPermit.code, MooringLicence.code):
+            approval.child_obj.processes_after_cancel()
+        stickers_to_be_returned = list(Sticker.objects.filter(id__in=stickers_to_be_returned))
+        send_approval_surrender_email_notification(approval, stickers_to_be_returned=stickers_to_be_returned)
+    else:
+        raise ValueError('No side effects for the approval status transition: [{}]'.format(transition))
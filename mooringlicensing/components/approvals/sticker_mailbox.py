@@ -0,0 +1,328 @@
+import base64
+import binascii
+import email
+import logging
+import quopri
+import re
+from collections import namedtuple
+from email.header import decode_header, make_header
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from mooringlicensing.components.proposals.models import (
+    StickerPrintingResponse, StickerPrintingResponseEmail, StickerPrintingResponseMailbox,
+)
+
+logger = logging.getLogger(__name__)
+
+#only the attachments with these extensions are downloaded
+ATTACHMENT_EXTENSIONS = ('.csv', '.xlsx')
+HEADER_FIELDS = 'MESSAGE-ID SUBJECT FROM DATE'
+
+#a leaf of the MIME tree of a message; number is the IMAP part specifier, e.g. '2' or '1.2'
+MessagePart = namedtuple('MessagePart', ['number', 'content_type', 'filename', 'encoding', 'charset'])
+
+_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}\r\n|([^\s()"{]+))', re.DOTALL)
+
+
+def _decode_header_value(value):
+    if value is None:
+        return None
+    return str(make_header(decode_header(value)))
+
+
+def _parse_tokens(data, pos=0):
+    """
+    Parse an IMAP parenthesised list into nested python lists of str/None.  Returns (items, end position)
+    """
+    items = []
+    while pos < len(data):
+        match = _TOKEN_RE.match(data, pos)
+        if match is None:
+            break
+        pos = match.end()
+        open_paren, close_paren, quoted, literal_length, atom = match.groups()
+        if open_paren:
+            sub_items, pos = _parse_tokens(data, pos)
+            items.append(sub_items)
+        elif close_paren:
+            return items, pos
+        elif quoted is not None:
+            items.append(re.sub(rb'\\(.)', rb'\1', quoted).decode('utf-8', errors='replace'))
+        elif literal_length is not None:
+            length = int(literal_length)
+            items.append(data[pos:pos + length].decode('utf-8', errors='replace'))
+            pos += length
+        else:
+            items.append(None if atom.upper() == b'NIL' else atom.decode('ascii', errors='replace'))
+    return items, pos
+
+
+def parse_fetch_response(data):
+    """
+    Return {item name: value} of the first message in the data returned by imaplib's uid('FETCH', ...)
+    """
+    raw = b''
+    for item in data:
+        if isinstance(item, tuple):
+            # imaplib splits the literals out of the line, put them back
+            raw += item[0] + b'\r\n' + item[1]
+        elif item:
+            raw += item
+    items, _ = _parse_tokens(raw)
+    # items: [sequence number, [NAME, value, NAME, value, ...]]
+    values = next((item for item in items if isinstance(item, list)), [])
+    return {str(values[i]).upper(): values[i + 1] for i in range(0, len(values) - 1, 2)}
+
+
+def _params(values):
+    if not isinstance(values, list):
+        return {}
+    return {str(values[i]).lower(): values[i + 1] for i in range(0, len(values) - 1, 2)}
+
+
+def parse_bodystructure(structure, number=''):
+    """
+    Return the leaves of a parsed BODYSTRUCTURE as MessageParts, in the order of the message
+    """
+    if isinstance(structure[0], list):
+        # multipart: the children are followed by the subtype
+        parts = []
+        for index, child in enumerate(structure, start=1):
+            if not isinstance(child, list):
+                break
+            parts += parse_bodystructure(child, f'{number}.{index}' if number else str(index))
+        return parts
+
+    params = _params(structure[2])
+    filename = params.get('name')
+    # The disposition is in the extension data, after the fields which depend on the content type
+    for value in structure[7:]:
+        if isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and (value[1] is None or isinstance(value[1], list)):
+            disposition_params = _params(value[1])
+            filename = disposition_params.get('filename') or filename
+            break
+    return [MessagePart(
+        number or '1',
+        f'{structure[0]}/{structure[1]}'.lower(),
+        _decode_header_value(filename),
+        (structure[5] or '7bit').lower(),
+        params.get('charset'),
+    )]
+
+
+def decode_part(payload, encoding):
+    if encoding == 'base64':
+        try:
+            return base64.b64decode(payload)
+        except binascii.Error:
+            return base64.b64decode(payload + b'==')
+    if encoding == 'quoted-printable':
+        return quopri.decodestring(payload)
+    return payload
+
+
+def is_response_file(part):
+    return bool(part.filename) and part.filename.lower().endswith(ATTACHMENT_EXTENSIONS)
+
+
+class ImapMailboxClient(object):
+    """
+    Reads a mailbox through an imaplib client (logged in already) by UID, downloading only the parts asked for
+    """
+
+    def __init__(self, imapclient, mailbox='INBOX'):
+        self.imapclient = imapclient
+        self.mailbox = mailbox
+
+    def _uid(self, command, *args):
+        typ, data = self.imapclient.uid(command, *args)
+        if typ != 'OK':
+            raise Exception(f'IMAP UID {command} {" ".join([str(arg) for arg in args if arg])} failed: {data}')
+        return data
+
+    def select(self):
+        """
+        Select the mailbox and return its UIDVALIDITY
+        """
+        typ, data = self.imapclient.select(self.mailbox)
+        if typ != 'OK':
+            raise Exception(f'IMAP SELECT {self.mailbox} failed: {data}')
+        typ, data = self.imapclient.response('UIDVALIDITY')
+        return int(data[0])
+
+    def uids_after(self, last_uid):
+        data = self._uid('SEARCH', None, f'UID {last_uid + 1}:*')
+        # 'n:*' always matches the last message, even when its UID is lower than n
+        return sorted(uid for uid in [int(uid) for uid in data[0].split()] if uid > last_uid)
+
+    def fetch_headers(self, uid):
+        data = self._uid('FETCH', str(uid), f'(BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])')
+        return email.message_from_bytes(next(item[1] for item in data if isinstance(item, tuple)))
+
+    def fetch_structure(self, uid):
+        return parse_bodystructure(parse_fetch_response(self._uid('FETCH', str(uid), '(BODYSTRUCTURE)'))['BODYSTRUCTURE'])
+
+    def fetch_part(self, uid, part):
+        data = self._uid('FETCH', str(uid), f'(BODY.PEEK[{part.number}])')
+        return decode_part(next(item[1] for item in data if isinstance(item, tuple)), part.encoding)
+
+    def archive(self, uid):
+        self._uid('COPY', str(uid), 'Archive')
+        self._uid('STORE', str(uid), '+FLAGS', '(\\Deleted)')
+
+    def close(self):
+        self.imapclient.close()
+        self.imapclient.logout()
+
+
+class LocalMailboxClient(object):
+    """
+    Stand-in for ImapMailboxClient holding the messages in memory, for tests and local development
+    """
+
+    def __init__(self, messages=(), uid_validity=1, mailbox='INBOX'):
+        self.mailbox = mailbox
+        self.uid_validity = uid_validity
+        self.messages = {}
+        self.archived = []
+        self.fetched_parts = []
+        self._next_uid = 1
+        for message in messages:
+            self.add_message(message)
+
+    def add_message(self, message):
+        if isinstance(message, bytes):
+            message = email.message_from_bytes(message)
+        uid = self._next_uid
+        self._next_uid += 1
+        self.messages[uid] = message
+        return uid
+
+    def _leaves(self, message, number=''):
+        if message.is_multipart():
+            leaves = []
+            for index, child in enumerate(message.get_payload(), start=1):
+                leaves += self._leaves(child, f'{number}.{index}' if number else str(index))
+            return leaves
+        return [(MessagePart(
+            number or '1',
+            message.get_content_type(),
+            message.get_filename(),
+            str(message.get('Content-Transfer-Encoding', '7bit')).lower(),
+            message.get_content_charset(),
+        ), message)]
+
+    def select(self):
+        return self.uid_validity
+
+    def uids_after(self, last_uid):
+        return sorted(uid for uid in self.messages if uid > last_uid)
+
+    def fetch_headers(self, uid):
+        return self.messages[uid]
+
+    def fetch_structure(self, uid):
+        return [part for part, _ in self._leaves(self.messages[uid])]
+
+    def fetch_part(self, uid, part):
+        self.fetched_parts.append((uid, part.number))
+        return dict([(leaf.number, message) for leaf, message in self._leaves(self.messages[uid])])[part.number].get_payload(decode=True)
+
+    def archive(self, uid):
+        self.archived.append(uid)
+        self.messages.pop(uid)
+
+    def close(self):
+        pass
+
+
+def get_checkpoint(host, username, mailbox):
+    checkpoint, _ = StickerPrintingResponseMailbox.objects.get_or_create(host=host, username=username, mailbox=mailbox)
+    return checkpoint
+
+
+def import_message(client, uid):
+    """
+    Save the message and its response files.  Returns the StickerPrintingResponseEmail created,
+    or None when the message has been imported already.
+    """
+    headers = client.fetch_headers(uid)
+    email_message_id = _decode_header_value(headers['Message-ID'])
+    if email_message_id and StickerPrintingResponseEmail.objects.filter(email_message_id=email_message_id).exists():
+        logger.info(f'Email: [{email_message_id}] has been imported already.')
+        return None
+
+    parts = client.fetch_structure(uid)
+    # The body is the first leaf of the message, when it is text
+    email_body = ''
+    if parts and parts[0].content_type.startswith('text/') and not is_response_file(parts[0]):
+        email_body = client.fetch_part(uid, parts[0]).decode(parts[0].charset or 'utf-8', errors='replace')
+
+    with transaction.atomic():
+        sticker_printing_response_email = StickerPrintingResponseEmail.objects.create(
+            email_subject=_decode_header_value(headers['Subject']),
+            email_from=headers['From'],
+            email_body=email_body,
+            email_date=headers['Date'],
+            email_message_id=email_message_id,
+        )
+        logger.info(f'StickerPrintingResponseEmail object: {sticker_printing_response_email} has been created')
+
+        for part in parts:
+            if not is_response_file(part):
+                continue
+            sticker_printing_response = StickerPrintingResponse(
+                sticker_printing_response_email=sticker_printing_response_email,
+                name=part.filename,
+            )
+            sticker_printing_response._file.save(part.filename, ContentFile(client.fetch_part(uid, part)), save=False)
+            sticker_printing_response.save()
+            logger.info(f'StickerPrintingResponse object: {sticker_printing_response} has been created')
+    return sticker_printing_response_email
+
+
+def import_new_messages(client, checkpoint, max_messages=None):
+    """
+    Import the messages which arrived after the checkpoint and move the checkpoint forward.
+
+    When the UIDVALIDITY of the mailbox has changed the UIDs of the checkpoint mean nothing any more, the whole mailbox
+    is read again; the messages imported already are then skipped by their Message-ID.
+    A message which fails to import is logged and left in the mailbox, and the checkpoint does not move past it, so that
+    it is tried again by the next run.  The messages after it which are imported are archived (and expunged when the
+    mailbox is closed), so the next run does not see them again.
+
+    Returns (StickerPrintingResponseEmails created, error messages)
+    """
+    uid_validity = client.select()
+    if checkpoint.uid_validity != uid_validity:
+        if checkpoint.uid_validity is not None:
+            logger.warning(f'UIDVALIDITY of the mailbox: [{checkpoint}] changed to {uid_validity}, the mailbox is read again.')
+        checkpoint.uid_validity = uid_validity
+        checkpoint.last_uid = 0
+        checkpoint.save()
+
+    uids = client.uids_after(checkpoint.last_uid)
+    if max_messages:
+        uids = uids[:max_messages]
+    logger.info(f'{len(uids)} new message(s) found in the mailbox: [{checkpoint}].')
+
+    imported = []
+    errors = []
+    for uid in uids:
+        try:
+            sticker_printing_response_email = import_message(client, uid)
+            if sticker_printing_response_email:
+                imported.append(sticker_printing_response_email)
+            client.archive(uid)
+        except Exception as e:
+            err_msg = f'Error importing the message: UID {uid}'
+            logger.exception(f'{err_msg}\n{e}')
+            errors.append(err_msg)
+            continue
+        if not errors:
+            # Only up to the first message which failed
+            checkpoint.last_uid = uid
+            checkpoint.save()
+    return imported, errors
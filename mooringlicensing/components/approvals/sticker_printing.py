@@ -0,0 +1,433 @@
+import csv
+import datetime
+import logging
+from collections import defaultdict
+
+import openpyxl
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from mooringlicensing.components.approvals.models import (
+    Approval, Sticker, ApprovalHistory, AuthorisedUserPermit, MooringLicence, MooringOnApproval,
+)
+from mooringlicensing.components.main import search
+from mooringlicensing.components.proposals.models import Proposal, Mooring, VesselDetails
+
+logger = logging.getLogger(__name__)
+
+#statuses of the stickers still being printed for a proposal
+STATUSES_BEING_PRINTED = [
+    Sticker.STICKER_STATUS_READY,
+    Sticker.STICKER_STATUS_NOT_READY_YET,
+    Sticker.STICKER_STATUS_AWAITING_PRINTING,
+]
+#the post_save of stickers ending in these statuses updates other stickers/proposals, they are saved one by one
+STATUSES_SAVED_ONE_BY_ONE = [
+    Sticker.STICKER_STATUS_TO_BE_RETURNED,
+    Sticker.STICKER_STATUS_RETURNED,
+    Sticker.STICKER_STATUS_LOST,
+]
+
+
+def make_sure_datetime(dt_obj):
+    if dt_obj:
+        if isinstance(dt_obj, datetime.datetime):
+            return dt_obj
+        else:
+            return datetime.datetime.strptime(dt_obj, '%d/%m/%Y')
+    else:
+        return None
+
+
+def make_sure_sticker_number(sticker_number):
+    if isinstance(sticker_number, int):
+        return '{0:07d}'.format(sticker_number)
+    else:
+        return sticker_number
+
+
+def _is_empty(value):
+    return value is None or not str(value).strip()
+
+
+def _find_columns(row):
+    """
+    Return {column name: 0-based index} when the row is the header row, otherwise None
+    """
+    columns = {}
+    for index, value in enumerate(row):
+        if _is_empty(value) or not isinstance(value, str):
+            continue
+        value = value.strip().lower()
+        if 'sticker' in value and 'number' in value:
+            columns['sticker_number'] = index
+        elif ('printing' in value or 'printed' in value) and 'date' in value:
+            columns['printing_date'] = index
+        elif ('mailing' in value or 'mailed' in value) and 'date' in value:
+            columns['mailing_date'] = index
+        elif 'status' in value:
+            columns['status'] = index
+    return columns if 'sticker_number' in columns else None
+
+
+def _iter_raw_rows(response):
+    filename = response._file.name.lower()
+    if filename.endswith('.csv'):
+        with open(response._file.path, newline='') as csvfile:
+            for row in csv.reader(csvfile):
+                if not any(not _is_empty(value) for value in row):
+                    continue
+                yield row
+    elif filename.endswith('.xlsx'):
+        wb = openpyxl.load_workbook(response._file.path, read_only=True, data_only=True)
+        try:
+            if not wb.worksheets:
+                logger.warning('No worksheet found in the file: {}'.format(response._file.name))
+                return
+            header_found = False
+            for row in wb.worksheets[0].iter_rows(values_only=True):
+                if all(_is_empty(value) for value in row):
+                    if header_found:
+                        # Found empty row, finish processing rows
+                        break
+                    continue
+                header_found = header_found or _find_columns(row) is not None
+                yield row
+        finally:
+            wb.close()
+
+
+def iter_response_rows(response):
+    """
+    Read the printing response file row by row, without loading the whole file into memory.
+    Yields (sticker number, printing date, mailing date, status, error) for each row after the header row;
+    error is the exception raised when the row could not be read.
+    """
+    columns = None
+    for row in _iter_raw_rows(response):
+        if columns is None:
+            columns = _find_columns(row)
+            continue
+
+        def _value(name):
+            index = columns.get(name)
+            return row[index] if index is not None and index < len(row) else None
+
+        sticker_number = _value('sticker_number')
+        if _is_empty(sticker_number):
+            continue
+        try:
+            if isinstance(sticker_number, str):
+                sticker_number = int(sticker_number)
+            status = _value('status')
+            yield (
+                make_sure_sticker_number(sticker_number),
+                make_sure_datetime(_value('printing_date')),
+                make_sure_datetime(_value('mailing_date')),
+                status.strip().lower() if isinstance(status, str) else status,
+                None,
+            )
+        except Exception as e:
+            yield sticker_number, None, None, None, e
+
+
+def approve_printed_proposals(proposal_ids):
+    """
+    Approve the proposals waiting for their stickers to be printed which have no sticker being printed any more.
+    Returns the proposals approved.
+    """
+    proposals = Proposal.objects.filter(
+        id__in=proposal_ids,
+        processing_status=Proposal.PROCESSING_STATUS_PRINTING_STICKER,
+    ).exclude(
+        id__in=Sticker.objects.filter(proposal_initiated_id__in=proposal_ids, status__in=STATUSES_BEING_PRINTED).values('proposal_initiated_id')
+    )
+    approved = []
+    for proposal in proposals:
+        proposal.processing_status = Proposal.PROCESSING_STATUS_APPROVED
+        proposal.save()
+        logger.info(f'Status: [{Proposal.PROCESSING_STATUS_APPROVED}] has been set to the proposal: [{proposal}]')
+        approved.append(proposal)
+    return approved
+
+
+def add_to_approval_histories(stickers):
+    """
+    Add the current stickers to the active approval history of their approval, as the Sticker post_save does
+    """
+    stickers = [sticker for sticker in stickers if sticker.approval_id and sticker.status in [Sticker.STICKER_STATUS_CURRENT, Sticker.STICKER_STATUS_AWAITING_PRINTING,]]
+    if not stickers:
+        return
+
+    histories = {}
+    for approval_history in ApprovalHistory.objects.filter(
+        approval_id__in={sticker.approval_id for sticker in stickers}, end_date__isnull=True
+    ).order_by('approval_id', '-start_date'):
+        histories.setdefault(approval_history.approval_id, approval_history)
+
+    through = ApprovalHistory.stickers.through
+    existing = set(through.objects.filter(approvalhistory_id__in=[history.id for history in histories.values()]).values_list('approvalhistory_id', 'sticker_id'))
+    new_links = []
+    for sticker in stickers:
+        approval_history = histories.get(sticker.approval_id)
+        if approval_history is None:
+            logger.warning('Active ApprovalHistory object for the sticker: {} not found'.format(sticker))
+            continue
+        if (approval_history.id, sticker.id) not in existing:
+            new_links.append(through(approvalhistory_id=approval_history.id, sticker_id=sticker.id))
+            existing.add((approval_history.id, sticker.id))
+    through.objects.bulk_create(new_links)
+
+
+def _apply_row(sticker, response, printing_date, mailing_date, status):
+    """
+    Apply a row of the response to the sticker.  Returns False when the row does not change the sticker.
+    """
+    if status == 'cancelled':
+        sticker.sticker_printing_response = response
+        if sticker.status in (Sticker.STICKER_STATUS_AWAITING_PRINTING, Sticker.STICKER_STATUS_READY, Sticker.STICKER_STATUS_EXPIRED, Sticker.STICKER_STATUS_LOST):
+            sticker.status = Sticker.STICKER_STATUS_CANCELLED
+        return True
+    if printing_date and mailing_date:
+        sticker.printing_date = printing_date
+        sticker.mailing_date = mailing_date
+        sticker.sticker_printing_response = response
+        if sticker.status in (Sticker.STICKER_STATUS_AWAITING_PRINTING, Sticker.STICKER_STATUS_READY):
+            # sticker should not be in READY status though.
+            sticker.status = Sticker.STICKER_STATUS_CURRENT
+        return True
+    return False
+
+
+def import_sticker_printing_response(response):
+    """
+    Apply the printing and mailing dates of a printing response file to the stickers.
+
+    All the sticker numbers of the file are resolved with one query and the stickers are written with one bulk_update.
+    The post_save work is then done once per affected proposal/approval instead of once per sticker;
+    only the (rare) stickers ending in a status whose post_save updates other stickers are saved one by one.
+
+    Returns (stickers updated, error messages)
+    """
+    rows = []
+    errors = []
+    for sticker_number, printing_date, mailing_date, status, error in iter_response_rows(response):
+        if error is not None:
+            err_msg = 'Error updating the sticker {}'.format(sticker_number)
+            logger.error('{}\n{}'.format(err_msg, str(error)))
+            errors.append(err_msg)
+            continue
+        rows.append((sticker_number, printing_date, mailing_date, status))
+
+    with transaction.atomic():
+        stickers = {
+            sticker.number: sticker for sticker in
+            Sticker.objects.select_for_update(of=('self',)).filter(number__in={row[0] for row in rows})
+        }
+        updated = {}
+        for sticker_number, printing_date, mailing_date, status in rows:
+            sticker = stickers.get(sticker_number)
+            if sticker is None:
+                err_msg = 'Error sticker {} not found to update'.format(sticker_number)
+                logger.error(err_msg)
+                errors.append(err_msg)
+                continue
+            if _apply_row(sticker, response, printing_date, mailing_date, status):
+                updated[sticker.id] = sticker
+
+        bulk_stickers = [sticker for sticker in updated.values() if sticker.status not in STATUSES_SAVED_ONE_BY_ONE]
+        now = timezone.now()
+        for sticker in bulk_stickers:
+            # auto_now is not applied by bulk_update
+            sticker.date_updated = now
+        Sticker.objects.bulk_update(bulk_stickers, ['printing_date', 'mailing_date', 'sticker_printing_response', 'status', 'date_updated'], batch_size=1000)
+        for sticker in updated.values():
+            if sticker.status in STATUSES_SAVED_ONE_BY_ONE:
+                sticker.save()
+
+        approve_printed_proposals({
+            sticker.proposal_initiated_id for sticker in bulk_stickers
+            if sticker.proposal_initiated_id and sticker.status in [Sticker.STICKER_STATUS_CURRENT, Sticker.STICKER_STATUS_CANCELLED,]
+        })
+        add_to_approval_histories(bulk_stickers)
+
+        sticker_ids = [sticker.id for sticker in bulk_stickers]
+        transaction.on_commit(lambda: search.index_stickers(sticker_ids))
+
+    logger.info(f'{len(updated)} sticker(s) updated from the printing response: [{response}].')
+    return list(updated.values()), errors
+
+
+STICKER_EXPORT_HEADERS = [
+    'Date',
+    'First Name',
+    'Last Name',
+    'Address Line 1',
+    'Address Line 2',
+    'Suburb',
+    'State',
+    'Postcode',
+    'Sticker Type',
+    'Sticker Number',
+    'Vessel Registration Number',
+    'Moorings',
+    'Length Colour',
+    'White info',
+    'Vessel Length',
+    'Season',
+]
+
+
+class StickerBatchBuilder(object):
+    """
+    Bulk load what the rows of a sticker printing batch are made of (approvals and their subclass, current proposals,
+    applicants, vessels and their latest details, moorings and fee seasons) in a fixed number of queries
+    """
+
+    def __init__(self, stickers):
+        self.stickers = list(stickers.select_related(
+            'approval__current_proposal__proposal_applicant',
+            'approval__current_proposal__vessel_ownership',
+            'vessel_ownership__vessel',
+            'fee_season',
+            *['approval__' + relation for relation in Approval.CHILD_RELATIONS.values()]
+        ))
+        self.moorings_by_sticker = defaultdict(list)
+        self.ml_moorings = {}
+        self.vessel_lengths = {}
+        if self.stickers:
+            self._load_moorings()
+            self._load_vessel_lengths()
+
+    def _load_moorings(self):
+        aup_sticker_ids = [sticker.id for sticker in self.stickers if sticker.approval and sticker.approval.child_type == AuthorisedUserPermit.code]
+        for moa in MooringOnApproval.objects.filter(sticker_id__in=aup_sticker_ids, end_date__isnull=True).select_related('mooring'):
+            self.moorings_by_sticker[moa.sticker_id].append(moa.mooring)
+
+        ml_ids = [sticker.approval_id for sticker in self.stickers if sticker.approval and sticker.approval.child_type == MooringLicence.code]
+        self.ml_moorings = {mooring.mooring_licence_id: mooring for mooring in Mooring.objects.filter(mooring_licence_id__in=ml_ids)}
+
+    def _load_vessel_lengths(self):
+        vessel_ids = {sticker.vessel_ownership.vessel_id for sticker in self.stickers if sticker.vessel_ownership and sticker.vessel_ownership.vessel_id}
+        # The latest vessel details of a vessel are the ones with the largest id (see VesselDetailsManager)
+        latest_ids = VesselDetails.objects.filter(vessel_id__in=vessel_ids).values('vessel').annotate(latest_id=Max('id')).values_list('latest_id', flat=True)
+        self.vessel_lengths = {
+            vessel_details.vessel_id: vessel_details.vessel_applicable_length
+            for vessel_details in VesselDetails.objects.filter(id__in=latest_ids)
+        }
+
+    def get_moorings(self, sticker):
+        # Same as Sticker.get_moorings
+        if not sticker.approval:
+            return []
+        if sticker.approval.child_type == AuthorisedUserPermit.code:
+            return self.moorings_by_sticker[sticker.id]
+        if sticker.approval.child_type == MooringLicence.code:
+            if sticker.approval_id in self.ml_moorings:
+                return [self.ml_moorings[sticker.approval_id]]
+            logger.error(
+                'Failed to retrieve the mooring for the sticker {} because the associated MooringLicence {} does not have a mooring'.format(
+                    sticker.number, sticker.approval.lodgement_number))
+        return []
+
+    def get_vessel_applicable_length(self, sticker):
+        # Same as Sticker.vessel_applicable_length
+        if sticker.vessel_ownership and sticker.vessel_ownership.vessel_id in self.vessel_lengths:
+            return self.vessel_lengths[sticker.vessel_ownership.vessel_id]
+        raise ValueError('Vessel size not found for the sticker: {}'.format(sticker))
+
+    def has_postal_address(self, sticker):
+        return sticker.postal_address_line1 and sticker.postal_address_locality and sticker.postal_address_state and sticker.postal_address_postcode
+
+    def get_row(self, sticker, today):
+        vessel_length = self.get_vessel_applicable_length(sticker)
+        return [
+            today.strftime('%d/%m/%Y'),
+            sticker.first_name,
+            sticker.last_name,
+            sticker.postal_address_line1,
+            sticker.postal_address_line2,
+            sticker.postal_address_locality.upper(),
+            sticker.postal_address_state.upper(),
+            sticker.postal_address_postcode,
+            sticker.approval.description,
+            sticker.number,
+            sticker.vessel_registration_number.upper(),
+            ', '.join([mooring.name for mooring in self.get_moorings(sticker)]),
+            sticker.get_sticker_colour(vessel_length),
+            sticker.get_white_info(vessel_length),
+            vessel_length,
+            sticker.fee_season.name if sticker.fee_season and sticker.fee_season.name else ''
+        ]
+
+    def new_approval_history(self, sticker):
+        approval = sticker.approval
+        return ApprovalHistory(
+            vessel_ownership=approval.current_proposal.vessel_ownership,
+            approval=approval,
+            proposal=approval.current_proposal,
+            start_date=approval.issue_date,
+            approval_letter_id=approval.licence_document_id,
+        )
+
+
+def get_batch_properties(row):
+    # The season is not cached
+    return {STICKER_EXPORT_HEADERS[i].lower().replace(" ", "_"): row[i] for i in range(0, len(row) - 1)}
+
+
+def write_sticker_batch(stickers, csv_file, today):
+    """
+    Number the stickers, write their rows into csv_file (a text stream) as they are built and record them in new approval histories.
+
+    Must be called in a transaction: the stickers and the approval histories are written with one bulk_update/bulk_create each.
+    A sticker whose row cannot be built is reported and left out of the file; like the others it keeps the number allocated.
+
+    Returns (stickers exported, error messages)
+    """
+    builder = StickerBatchBuilder(stickers)
+    stickers = builder.stickers
+    for sticker, number in zip(stickers, Sticker.reserve_numbers(len(stickers))):
+        # Sticker is being printed.  We assign a new number here.
+        sticker.number = number
+
+    writer = csv.writer(csv_file)
+    writer.writerow(STICKER_EXPORT_HEADERS)
+
+    exported = []
+    errors = []
+    approval_histories = []
+    for sticker in stickers:
+        try:
+            if not builder.has_postal_address(sticker):
+                logger.warning(f'Postal address not found for the Sticker: [{sticker}].')
+                continue
+            row = builder.get_row(sticker, today)
+            approval_history = builder.new_approval_history(sticker)
+        except Exception as e:
+            err_msg = 'Error adding sticker: {} details to spreadsheet.'.format(sticker.number)
+            logger.error('{}\n{}'.format(err_msg, str(e)))
+            errors.append(err_msg)
+            continue
+        sticker.batch_property_cache = get_batch_properties(row)
+        writer.writerow(row)
+        approval_histories.append((approval_history, sticker))
+        exported.append(sticker)
+        logger.info('Sticker: {} details added to the spreadsheet'.format(sticker.number))
+
+    now = timezone.now()
+    for sticker in stickers:
+        # auto_now is not applied by bulk_update
+        sticker.date_updated = now
+    Sticker.objects.bulk_update(stickers, ['number', 'batch_property_cache', 'date_updated'], batch_size=1000)
+
+    ApprovalHistory.objects.bulk_create([approval_history for approval_history, _ in approval_histories], batch_size=1000)
+    ApprovalHistory.stickers.through.objects.bulk_create([
+        ApprovalHistory.stickers.through(approvalhistory_id=approval_history.id, sticker_id=sticker.id)
+        for approval_history, sticker in approval_histories
+    ], batch_size=1000)
+
+    sticker_ids = [sticker.id for sticker in stickers]
+    transaction.on_commit(lambda: search.index_stickers(sticker_ids))
+    return exported, errors
@@ -1,11 +1,25 @@
+from collections import defaultdict
+
+from django.db.models import Q
+
 from mooringlicensing.components.proposals.models import (
+    Proposal,
     WaitingListApplication,
-    MooringLicenceApplication
+    MooringLicenceApplication,
+    Mooring,
 )
 from mooringlicensing.components.approvals.models import (
+    Approval,
     WaitingListAllocation, 
-    MooringLicence
+    AnnualAdmissionPermit,
+    AuthorisedUserPermit,
+    MooringLicence,
+    MooringOnApproval,
+    VesselOwnershipOnApproval,
+    Sticker,
 )
+from mooringlicensing.components.payments_ml.models import FeeSeason
+from mooringlicensing.settings import PROPOSAL_TYPE_AMENDMENT, PROPOSAL_TYPE_RENEWAL, PROPOSAL_TYPE_SWAP_MOORINGS
 
 def get_wla_allowed(user_id):
     wla_allowed = True
@@ -18,4 +32,220 @@ def get_wla_allowed(user_id):
     if rule1 or rule2 or rule3 or rule4:
         wla_allowed = False
 
-    return wla_allowed
\ No newline at end of file
+    return wla_allowed
+
+
+def order_stickers_by_default_ordering(stickers):
+    """
+    Sort stickers in python the same way as Sticker.Meta.ordering (-date_updated, -date_created, -number), nulls first as in postgres
+    """
+    stickers = list(stickers)
+    for attr in reversed(['date_updated', 'date_created', 'number']):
+        nulls = [s for s in stickers if getattr(s, attr) is None]
+        non_nulls = sorted([s for s in stickers if getattr(s, attr) is not None], key=lambda s: getattr(s, attr), reverse=True)
+        stickers = nulls + non_nulls
+    return stickers
+
+
+class ApprovalListPageLoader:
+    """
+    Bulk load the stickers, mooring on approvals, current vessel ownership on approvals, subclass (child_obj)
+    and pending applications of a page of approvals in a fixed number of queries, for ListApprovalSerializer
+    """
+    STICKER_STATUSES_NOT_HELD = [
+        Sticker.STICKER_STATUS_EXPIRED,
+        Sticker.STICKER_STATUS_CANCELLED,
+        Sticker.STICKER_STATUS_RETURNED,
+        Sticker.STICKER_STATUS_TO_BE_RETURNED,
+        Sticker.STICKER_STATUS_LOST,
+    ]
+    STICKER_STATUSES_INVALID = [
+        Sticker.STICKER_STATUS_CANCELLED,
+        Sticker.STICKER_STATUS_LOST,
+        Sticker.STICKER_STATUS_RETURNED,
+    ]
+    PROCESSING_STATUSES_FINAL = [
+        Proposal.PROCESSING_STATUS_APPROVED,
+        Proposal.PROCESSING_STATUS_DECLINED,
+        Proposal.PROCESSING_STATUS_DISCARDED,
+        Proposal.PROCESSING_STATUS_EXPIRED,
+    ]
+
+    def __init__(self, approvals):
+        self.approvals = list(approvals)
+        self.approval_ids = set([approval.id for approval in self.approvals])
+        self.stickers_by_approval = defaultdict(list)  # in the Sticker.Meta.ordering
+        self.moas_by_approval = defaultdict(list)  # in id order
+        self.current_vooas_by_approval = defaultdict(list)  # in id order
+        self._latest_applied_seasons = {}
+        self.reissue_blocking_proposal_ids = set()  # current proposals (None for no current proposal) with an active succeeding application
+        self.pending_customer_statuses_by_approval = defaultdict(set)  # of the amendment, renewal and swap applications
+        self.wla_ids_with_ria_proposal = set()
+
+        if self.approval_ids:
+            self._load_child_objs()
+            self._load_stickers()
+            self._load_moas()
+            self._load_current_vooas()
+            self._load_ml_moorings()
+            self._load_latest_applied_seasons()
+            self._load_reissue_blocking_proposals()
+            self._load_pending_applications()
+
+    def has_approval(self, approval):
+        return approval.id in self.approval_ids
+
+    def _load_child_objs(self):
+        # One query joining all the subclass tables, then prime the reverse one-to-one caches so that child_obj does not query again
+        loaded = Approval.objects.filter(id__in=self.approval_ids).select_child_objs().in_bulk()
+        for approval in self.approvals:
+            loaded_approval = loaded.get(approval.id)
+            for relation in Approval.CHILD_RELATIONS.values():
+                field = Approval._meta.get_field(relation)
+                child = field.get_cached_value(loaded_approval, default=None) if loaded_approval else None
+                field.set_cached_value(approval, child)
+
+    def _load_stickers(self):
+        stickers = Sticker.objects.filter(approval_id__in=self.approval_ids).select_related(
+            'vessel_ownership__vessel',
+        ).prefetch_related('sticker_action_details__sticker_action_fee')
+        for sticker in stickers:
+            self.stickers_by_approval[sticker.approval_id].append(sticker)
+
+    def _load_moas(self):
+        moas = MooringOnApproval.objects.filter(approval_id__in=self.approval_ids).select_related(
+            'mooring__mooring_bay',
+            'mooring__mooring_licence',
+            'sticker',
+        ).order_by('id')
+        for moa in moas:
+            self.moas_by_approval[moa.approval_id].append(moa)
+
+    def _load_current_vooas(self):
+        vooas = VesselOwnershipOnApproval.objects.filter(
+            approval_id__in=self.approval_ids,
+            end_date__isnull=True,
+            vessel_ownership__end_date__isnull=True,
+        ).select_related('vessel_ownership__vessel').order_by('vessel_ownership_id')
+        for vooa in vooas:
+            self.current_vooas_by_approval[vooa.approval_id].append(vooa)
+
+    def _load_ml_moorings(self):
+        mooring_licences = [approval.child_obj for approval in self.approvals if approval.child_type == MooringLicence.code]
+        if not mooring_licences:
+            return
+        moorings = {mooring.mooring_licence_id: mooring for mooring in Mooring.objects.filter(
+            mooring_licence_id__in=[ml.id for ml in mooring_licences]
+        ).select_related('mooring_bay')}
+        field = MooringLicence._meta.get_field('mooring')
+        for ml in mooring_licences:
+            field.set_cached_value(ml, moorings.get(ml.id))
+
+    def _load_latest_applied_seasons(self):
+        # From the cache columns of the approvals.  For the approvals which have never had them computed, the seasons are
+        # computed in one query without saving them: the update_latest_applied_seasons job fills the caches in.
+        season_ids_by_approval = {approval.id: approval.latest_applied_season_cache_id for approval in self.approvals}
+        missing_ids = [approval.id for approval in self.approvals if not approval.latest_applied_season_cache_updated_at]
+        if missing_ids:
+            season_ids_by_approval.update(Approval.get_latest_applied_season_ids(missing_ids))
+        seasons = FeeSeason.objects.in_bulk(set([season_id for season_id in season_ids_by_approval.values() if season_id]))
+        for approval in self.approvals:
+            self._latest_applied_seasons[approval.id] = seasons.get(season_ids_by_approval[approval.id])
+
+    def _load_reissue_blocking_proposals(self):
+        current_proposal_ids = set([approval.current_proposal_id for approval in self.approvals if approval.current_proposal_id])
+        q = Q(previous_application_id__in=current_proposal_ids)
+        if any(approval.current_proposal_id is None for approval in self.approvals):
+            # Approval.can_reissue filters on previous_application=None for these
+            q |= Q(previous_application__isnull=True)
+        self.reissue_blocking_proposal_ids = set(Proposal.objects.filter(q).exclude(
+            processing_status__in=self.PROCESSING_STATUSES_FINAL
+        ).values_list('previous_application_id', flat=True).distinct())
+
+    def _load_pending_applications(self):
+        proposals = Proposal.objects.filter(
+            approval_id__in=self.approval_ids,
+            proposal_type__code__in=[PROPOSAL_TYPE_AMENDMENT, PROPOSAL_TYPE_RENEWAL, PROPOSAL_TYPE_SWAP_MOORINGS,],
+        ).values_list('approval_id', 'customer_status').distinct()
+        for approval_id, customer_status in proposals:
+            self.pending_customer_statuses_by_approval[approval_id].add(customer_status)
+
+        wla_ids = [approval.id for approval in self.approvals if approval.child_type == WaitingListAllocation.code]
+        if wla_ids:
+            self.wla_ids_with_ria_proposal = set(Proposal.objects.filter(
+                waiting_list_allocation_id__in=wla_ids,
+                customer_status__in=[Proposal.CUSTOMER_STATUS_WITH_ASSESSOR, Proposal.CUSTOMER_STATUS_DRAFT],
+            ).values_list('waiting_list_allocation_id', flat=True).distinct())
+
+    def can_reissue(self, approval):
+        # Same rules as Approval.can_reissue
+        if approval.current_proposal_id in self.reissue_blocking_proposal_ids:
+            return False
+        return approval.status in [Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED]
+
+    def amend_or_renew(self, approval):
+        # Same rules as Approval.amend_or_renew
+        if approval.status not in [Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED, Approval.APPROVAL_STATUS_FULFILLED,]:
+            return None
+        customer_status_choices = []
+        if approval.child_type == WaitingListAllocation.code:
+            customer_status_choices = [Proposal.CUSTOMER_STATUS_WITH_ASSESSOR, Proposal.CUSTOMER_STATUS_DRAFT]
+        elif approval.child_type == AnnualAdmissionPermit.code:
+            customer_status_choices = [Proposal.CUSTOMER_STATUS_WITH_ASSESSOR, Proposal.CUSTOMER_STATUS_DRAFT, Proposal.CUSTOMER_STATUS_PRINTING_STICKER]
+        elif approval.child_type == AuthorisedUserPermit.code:
+            customer_status_choices = [Proposal.CUSTOMER_STATUS_WITH_ASSESSOR, Proposal.CUSTOMER_STATUS_DRAFT, Proposal.CUSTOMER_STATUS_AWAITING_ENDORSEMENT, Proposal.CUSTOMER_STATUS_AWAITING_PAYMENT,]
+        elif approval.child_type == MooringLicence.code:
+            customer_status_choices = [Proposal.CUSTOMER_STATUS_WITH_ASSESSOR, Proposal.CUSTOMER_STATUS_DRAFT, Proposal.CUSTOMER_STATUS_AWAITING_ENDORSEMENT, Proposal.CUSTOMER_STATUS_AWAITING_PAYMENT, Proposal.CUSTOMER_STATUS_AWAITING_DOCUMENTS]
+
+        if self.pending_customer_statuses_by_approval[approval.id].intersection(customer_status_choices) or approval.id in self.wla_ids_with_ria_proposal:
+            # cannot amend or renew
+            return None
+        elif approval.renewal_document_id and approval.renewal_sent:
+            return 'renew'
+        return 'amend'
+
+    def latest_applied_season(self, approval):
+        if approval.id not in self._latest_applied_seasons:
+            self._latest_applied_seasons[approval.id] = approval.get_latest_applied_season_cache()
+        return self._latest_applied_seasons[approval.id]
+
+    def stickers(self, approval):
+        return self.stickers_by_approval[approval.id]
+
+    def stickers_in_season(self, approval, season):
+        season_id = season.id if season else None
+        return [sticker for sticker in self.stickers(approval) if sticker.fee_season_id == season_id]
+
+    def has_sticker(self, approval):
+        return any(sticker.status not in self.STICKER_STATUSES_NOT_HELD for sticker in self.stickers(approval))
+
+    def moas(self, approval):
+        return self.moas_by_approval[approval.id]
+
+    def moas_without_valid_sticker(self, approval, season):
+        # Active moas with no sticker, or with a cancelled/lost/returned sticker for the season
+        season_id = season.id if season else None
+        return [moa for moa in self.moas(approval) if moa.active and (
+            moa.sticker is None or
+            (moa.sticker.status in self.STICKER_STATUSES_INVALID and moa.sticker.fee_season_id == season_id)
+        )]
+
+    def current_moas(self, approval):
+        # Same rules as MooringOnApproval.get_current_moas_by_approval
+        return [moa for moa in self.moas(approval) if (
+            moa.end_date is None and
+            moa.mooring.mooring_licence and moa.mooring.mooring_licence.status in MooringLicence.STATUSES_AS_CURRENT and
+            ((moa.sticker and moa.sticker.status in Sticker.STATUSES_AS_CURRENT) or approval.migrated) and
+            moa.active
+        )]
+
+    def latest_moa_stickers(self, approval):
+        # Sticker of the latest moa per mooring
+        latest_moas = {}
+        for moa in self.moas(approval):
+            latest_moas[moa.mooring_id] = moa
+        stickers = {moa.sticker.id: moa.sticker for moa in latest_moas.values() if moa.sticker}
+        return order_stickers_by_default_ordering(stickers.values())
+
+    def current_vessel_ownerships(self, approval):
+        return [vooa.vessel_ownership for vooa in self.current_vooas_by_approval[approval.id]]
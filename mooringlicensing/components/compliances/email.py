@@ -8,7 +8,7 @@ from django.conf import settings
 from mooringlicensing.components.emails.emails import TemplateEmailBase
 from ledger_api_client.ledger_models import EmailUserRO as EmailUser
 
-from mooringlicensing.components.emails.utils import get_public_url, make_http_https
+from mooringlicensing.components.emails.utils import get_public_url, make_http_https, get_user_as_email_user
 from mooringlicensing.components.users.utils import _log_user_email
 
 logger = logging.getLogger(__name__)
@@ -118,10 +118,7 @@ def send_reminder_email_notification(compliance, is_test=False):
         return
     if msg:
         sender = settings.DEFAULT_FROM_EMAIL
-        try:
-            sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-        except:
-            sender_user = None
+        sender_user = get_user_as_email_user(sender)
 
         _log_compliance_email(msg, compliance, sender=sender_user)
         _log_user_email(msg, compliance.proposal.applicant_obj, compliance.holder_obj, sender=sender_user)
@@ -145,10 +142,7 @@ def send_internal_reminder_email_notification(compliance, is_test=False):
         return
     if msg:
         sender = settings.DEFAULT_FROM_EMAIL
-        try:
-            sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-        except:
-            sender_user = None
+        sender_user = get_user_as_email_user(sender)
 
         _log_compliance_email(msg, compliance, sender=sender_user)
         _log_user_email(msg, compliance.proposal.applicant_obj, compliance.holder_id, sender=sender_user)
@@ -175,10 +169,7 @@ def send_due_email_notification(compliance, is_test=False):
         return
     if msg:
         sender = settings.DEFAULT_FROM_EMAIL
-        try:
-            sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-        except:
-            sender_user = None
+        sender_user = get_user_as_email_user(sender)
 
         _log_compliance_email(msg, compliance, sender=sender_user)
         _log_user_email(msg, compliance.proposal.applicant_obj, compliance.holder_id, sender=sender_user)
@@ -203,10 +194,7 @@ def send_internal_due_email_notification(compliance, is_test=False):
         return
     if msg:
         sender = settings.DEFAULT_FROM_EMAIL
-        try:
-            sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-        except:
-            sender_user = None
+        sender_user = get_user_as_email_user(sender)
         _log_compliance_email(msg, compliance, sender=sender_user)
         _log_user_email(msg, compliance.proposal.applicant_obj, compliance.holder_id, sender=sender_user)
 
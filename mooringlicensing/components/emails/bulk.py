@@ -0,0 +1,52 @@
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+
+from mooringlicensing.components.emails.emails import collect_render_stats
+from mooringlicensing.components.emails.utils import get_user_as_email_user
+from mooringlicensing.ledger_api_utils import email_user_scope, preload_email_users
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def bulk_notifications():
+    """
+    Context of a command sending a notification to many recipients in one pass:
+      - the EmailUserROs retrieved are remembered for the run, preload_applicants fetches them up front in bulk,
+      - the compiled templates are reused (see get_compiled_template),
+      - the render time per template is collected into the RenderStats yielded.
+
+        with bulk_notifications() as render_stats:
+            preload_applicants(proposals)
+            for proposal in proposals:
+                send_..._email(proposal)
+        logger.info('\\n'.join(render_stats.report()))
+    """
+    with email_user_scope(), collect_render_stats() as render_stats:
+        # The sender of every email logged
+        get_user_as_email_user(settings.DEFAULT_FROM_EMAIL)
+        yield render_stats
+
+
+def applicant_email_user_ids(proposals):
+    email_user_ids = []
+    for proposal in proposals:
+        try:
+            email_user_ids.append(proposal.proposal_applicant.email_user_id)
+        except (AttributeError, ObjectDoesNotExist):
+            # No proposal or no applicant
+            pass
+    return email_user_ids
+
+
+def preload_applicants(proposals):
+    """
+    Fetch the EmailUserROs of the applicants of the proposals into the active bulk_notifications with one query per 1000.
+    The proposal_applicants should have been selected along with the proposals (select_related('proposal_applicant')).
+    """
+    email_user_ids = applicant_email_user_ids(proposals)
+    preload_email_users(email_user_ids)
+    logger.info(f'{len(set(email_user_ids))} applicant(s) preloaded for {len(proposals)} proposal(s).')
@@ -1,9 +1,13 @@
 import logging
 import mimetypes
+import threading
+import time
+from contextlib import contextmanager
 from confy import env
 
 import six
 from django.conf import settings
+from django.core.files.base import ContentFile
 from django.core.mail import EmailMultiAlternatives, EmailMessage
 from django.template import loader, Template
 from django.utils.encoding import smart_str
@@ -12,11 +16,83 @@ from confy import env
 
 from ledger_api_client.ledger_models import Document
 
+from mooringlicensing.components.emails.outbox import enqueue
 from mooringlicensing.settings import SYSTEM_NAME
 
 logger = logging.getLogger(__name__)
 
 
+#compiled templates by name, see get_compiled_template
+_compiled_templates = {}
+_compiled_templates_lock = threading.Lock()
+
+#RenderStats collecting the render times in this thread, see collect_render_stats
+_render_stats = threading.local()
+
+
+def get_compiled_template(template_name):
+    """
+    loader.get_template, compiled once per process.  Not cached when DEBUG is on, so that the changes to the templates show.
+    """
+    if settings.DEBUG:
+        return loader.get_template(template_name)
+    template = _compiled_templates.get(template_name)
+    if template is None:
+        # The next line will throw a TemplateDoesNotExist if the template cannot be found
+        template = loader.get_template(template_name)
+        with _compiled_templates_lock:
+            _compiled_templates[template_name] = template
+    return template
+
+
+class RenderStats(object):
+    """
+    Number of emails rendered and the time spent rendering them, per html template
+    """
+
+    def __init__(self):
+        self.templates = {}
+        self.started = time.monotonic()
+
+    def add(self, template_name, seconds):
+        count, total = self.templates.get(template_name, (0, 0.0))
+        self.templates[template_name] = (count + 1, total + seconds)
+
+    @property
+    def count(self):
+        return sum(count for count, _ in self.templates.values())
+
+    def report(self):
+        """
+        Lines of the render time and throughput per template, and the throughput of the whole run (rendering and queueing)
+        """
+        lines = []
+        for template_name, (count, total) in sorted(self.templates.items()):
+            per_second = count / total if total else 0
+            lines.append(f'{template_name}: {count} email(s) rendered in {total:.3f}s ({total / count * 1000:.1f}ms each, {per_second:.1f}/s)')
+        elapsed = time.monotonic() - self.started
+        per_second = self.count / elapsed if elapsed else 0
+        lines.append(f'Total: {self.count} email(s) in {elapsed:.3f}s ({per_second:.1f}/s)')
+        return lines
+
+
+@contextmanager
+def collect_render_stats():
+    """
+    Collect the render times of the emails sent in this thread within the block into a RenderStats
+
+        with collect_render_stats() as render_stats:
+            ...
+        logger.info('\n'.join(render_stats.report()))
+    """
+    outer = getattr(_render_stats, 'stats', None)
+    _render_stats.stats = RenderStats()
+    try:
+        yield _render_stats.stats
+    finally:
+        _render_stats.stats = outer
+
+
 def _render(template, context):
     if isinstance(context, dict):
         context.update({'settings': settings})
@@ -56,15 +132,18 @@ class TemplateEmailBase(object):
         logger.info(f'TemplateEmailBase.send() is called with the subject: {self.subject}')
 
         email_instance = env('EMAIL_INSTANCE','DEV')
-        # The next line will throw a TemplateDoesNotExist if html template cannot be found
-        html_template = loader.get_template(self.html_template)
+        started = time.monotonic()
+        html_template = get_compiled_template(self.html_template)
         # render html
         html_body = _render(html_template, context)
         if self.txt_template is not None:
-            txt_template = loader.get_template(self.txt_template)
+            txt_template = get_compiled_template(self.txt_template)
             txt_body = _render(txt_template, context)
         else:
             txt_body = strip_tags(html_body)
+        render_stats = getattr(_render_stats, 'stats', None)
+        if render_stats is not None:
+            render_stats.add(self.html_template, time.monotonic() - started)
 
         # build message
         if isinstance(to_addresses, six.string_types):
@@ -77,6 +156,20 @@ class TemplateEmailBase(object):
         if attachments is None:
             attachments = []
 
+        if settings.EMAIL_OUTBOX_ENABLED and not settings.DISABLE_EMAIL:
+            # Sent by the outbox dispatcher once the transaction of the caller has been committed
+            msg = EmailMultiAlternatives(self.subject, txt_body, from_email=from_address, to=to_addresses, cc=cc, bcc=bcc,
+                    headers={'System-Environment': email_instance, 'ITSystem-ID':settings.LEDGER_SYSTEM_ID}
+                    )
+            msg.attach_alternative(html_body, 'text/html')
+            try:
+                outbox_email = enqueue(msg, attachments)
+                logger.info(f'Email has been queued: [{outbox_email.id}]. Subject: [{msg.subject}], to: [{msg.to}], cc: [{msg.cc}], bcc: [{msg.bcc}], attachments: [{[attachment.name for attachment in msg.outbox_attachments]}].')
+                return msg
+            except Exception as e:
+                logger.exception(f'Error while queueing email: To [{to_addresses}] with Subject: [{self.subject}], cc: [{cc}], bcc: [{bcc}], error: [{e}]')
+                return None
+
         # Convert Documents to (filename, content, mime) attachment
         _attachments = []
         for attachment in attachments:
@@ -102,6 +195,32 @@ class TemplateEmailBase(object):
             return None
 
 
+def log_email_attachments(email_entry, email_message, attachments):
+    """
+    Add the attachments of the email to the documents of the comms log entry.
+    The files the outbox stored for the email are referred to instead of being copied.
+    """
+    from mooringlicensing.components.main.utils import get_file_extension_whitelist
+
+    outbox_files = {attachment.name: attachment._file.name for attachment in getattr(email_message, 'outbox_attachments', [])}
+    for attachment in attachments:
+        check = attachment[0].split(".")
+        filename = attachment[0]
+        try:
+            if len(check) < 2 or check[len(check)-1].lower() not in [whitelisted.name for whitelisted in get_file_extension_whitelist()]:
+                filename = attachment[0] + ".pdf"
+        except Exception as e:
+            logger.error(e)
+            filename = attachment[0] + ".pdf"
+        email_entry_document = email_entry.documents.create(name=filename)
+        if attachment[0] in outbox_files:
+            # save() would store a copy of the file
+            type(email_entry_document).objects.filter(id=email_entry_document.id).update(_file=outbox_files[attachment[0]])
+        else:
+            email_entry_document._file.save(filename, ContentFile(attachment[1]), save=False)
+            email_entry_document.save()
+
+
 def _extract_email_headers(email_message, sender=None):
     if isinstance(email_message, (EmailMultiAlternatives, EmailMessage,)):
         # instead
@@ -0,0 +1,73 @@
+from __future__ import unicode_literals
+
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.db.models import JSONField
+from django.utils import timezone
+
+from mooringlicensing import settings
+
+private_storage = FileSystemStorage(  # We want to store files in secure place (outside of the media folder)
+    location=settings.PRIVATE_MEDIA_STORAGE_LOCATION,
+    base_url=settings.PRIVATE_MEDIA_BASE_URL,
+)
+
+
+class OutboxEmail(models.Model):
+    """
+    A rendered email waiting to be sent by the dispatcher (see components/emails/outbox.py).
+    Saved in the same transaction as the change it is about, so that it is sent if and only if the change is committed.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    subject = models.TextField(blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    html_body = models.TextField(blank=True, default='')
+    from_email = models.CharField(max_length=255, blank=True, default='')
+    to = JSONField(default=list)
+    cc = JSONField(default=list)
+    bcc = JSONField(default=list)
+    headers = JSONField(default=dict)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} to: {self.to} ({self.status})'
+
+
+def update_outbox_attachment_filename(instance, filename):
+    return '{}/email_outbox/{}/{}'.format(settings.MEDIA_APP_DIR, instance.outbox_email_id, filename)
+
+
+class OutboxEmailAttachment(models.Model):
+    """
+    The file is stored once; the comms log documents of the email refer to the same file.
+    """
+    outbox_email = models.ForeignKey(OutboxEmail, related_name='attachments', on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    mimetype = models.CharField(max_length=255, blank=True, null=True)
+    _file = models.FileField(storage=private_storage, upload_to=update_outbox_attachment_filename, max_length=512)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,154 @@
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+from ledger_api_client.ledger_models import Document
+
+from mooringlicensing.components.emails.models import OutboxEmail, OutboxEmailAttachment
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(msg, attachments=()):
+    """
+    Save the EmailMultiAlternatives to the outbox, in the transaction of the caller.
+    attachments: (filename, content, mimetype) triples or Documents; the Documents are copied to the outbox in chunks.
+
+    The OutboxEmail and its OutboxEmailAttachments are set to msg.outbox_email and msg.outbox_attachments, for the comms
+    log to refer to the stored files.
+    """
+    html_body = ''
+    for content, mimetype in msg.alternatives:
+        if mimetype == 'text/html':
+            html_body = content
+            break
+
+    with transaction.atomic():
+        outbox_email = OutboxEmail.objects.create(
+            subject=msg.subject,
+            body=msg.body,
+            html_body=html_body,
+            from_email=msg.from_email or '',
+            to=list(msg.to),
+            cc=list(msg.cc),
+            bcc=list(msg.bcc),
+            headers=msg.extra_headers,
+        )
+        outbox_attachments = []
+        for attachment in attachments:
+            if isinstance(attachment, Document):
+                outbox_attachment = OutboxEmailAttachment(outbox_email=outbox_email, name=str(attachment))
+                outbox_attachment._file.save(str(attachment), File(attachment.file), save=False)
+            else:
+                filename, content, mimetype = attachment
+                outbox_attachment = OutboxEmailAttachment(outbox_email=outbox_email, name=filename, mimetype=mimetype)
+                outbox_attachment._file.save(filename, ContentFile(content), save=False)
+            outbox_attachment.save()
+            outbox_attachments.append(outbox_attachment)
+
+    msg.outbox_email = outbox_email
+    msg.outbox_attachments = outbox_attachments
+    return outbox_email
+
+
+def build_message(outbox_email, connection=None):
+    msg = EmailMultiAlternatives(
+        outbox_email.subject,
+        outbox_email.body,
+        from_email=outbox_email.from_email or None,
+        to=outbox_email.to,
+        cc=outbox_email.cc,
+        bcc=outbox_email.bcc,
+        headers=outbox_email.headers,
+        connection=connection,
+    )
+    if outbox_email.html_body:
+        msg.attach_alternative(outbox_email.html_body, 'text/html')
+    for attachment in outbox_email.attachments.all():
+        with attachment._file.open('rb') as f:
+            msg.attach(attachment.name, f.read(), attachment.mimetype)
+    return msg
+
+
+def claim_due_emails(batch_size):
+    """
+    Take the due emails, oldest first, out of the reach of the other workers for EMAIL_OUTBOX_CLAIM_TIMEOUT seconds
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        outbox_emails = list(OutboxEmail.objects.select_for_update(skip_locked=True).filter(
+            status=OutboxEmail.STATUS_PENDING,
+            next_attempt_at__lte=now,
+        ).order_by('next_attempt_at', 'id')[:batch_size])
+        OutboxEmail.objects.filter(id__in=[outbox_email.id for outbox_email in outbox_emails]).update(
+            next_attempt_at=now + datetime.timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_TIMEOUT),
+        )
+    return outbox_emails
+
+
+def _record_failure(outbox_email, error):
+    outbox_email.attempts += 1
+    outbox_email.last_error = str(error)
+    if outbox_email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        outbox_email.status = OutboxEmail.STATUS_FAILED
+        logger.error(f'Email: [{outbox_email}] could not be sent after {outbox_email.attempts} attempts.  Error: [{error}]')
+    else:
+        delay = min(settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (outbox_email.attempts - 1), settings.EMAIL_OUTBOX_MAX_RETRY_DELAY)
+        outbox_email.next_attempt_at = timezone.now() + datetime.timedelta(seconds=delay)
+        logger.warning(f'Email: [{outbox_email}] failed, retrying in {delay} seconds.  Error: [{error}]')
+    outbox_email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def dispatch(batch_size=None, connection=None):
+    """
+    Send a batch of the due emails over one connection, at most EMAIL_OUTBOX_RATE_LIMIT emails a second.
+    Every email is marked as sent as soon as it has been sent, so a crash can only cause the email being sent to be sent again.
+
+    Returns (number of emails sent, number of emails failed)
+    """
+    outbox_emails = claim_due_emails(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not outbox_emails:
+        return 0, 0
+
+    connection = connection or get_connection()
+    interval = 1.0 / settings.EMAIL_OUTBOX_RATE_LIMIT if settings.EMAIL_OUTBOX_RATE_LIMIT else 0
+    sent = failed = 0
+    try:
+        connection.open()
+    except Exception as e:
+        # Each email opens a connection of its own below, and is retried if that fails as well
+        logger.error(f'Failed to open the email connection.  Error: [{e}]')
+
+    try:
+        for outbox_email in outbox_emails:
+            started = time.monotonic()
+            try:
+                build_message(outbox_email, connection).send(fail_silently=False)
+            except Exception as e:
+                _record_failure(outbox_email, e)
+                failed += 1
+                # The connection may be broken, start a new one for the rest of the batch
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception as e:
+                    logger.error(f'Failed to reopen the email connection.  Error: [{e}]')
+            else:
+                outbox_email.status = OutboxEmail.STATUS_SENT
+                outbox_email.sent_at = timezone.now()
+                outbox_email.attempts += 1
+                outbox_email.save(update_fields=['status', 'sent_at', 'attempts'])
+                sent += 1
+                logger.info(f'Email has been sent. Subject: [{outbox_email.subject}], to: [{outbox_email.to}], cc: [{outbox_email.cc}], bcc: [{outbox_email.bcc}].')
+            wait = interval - (time.monotonic() - started)
+            if wait > 0:
+                time.sleep(wait)
+    finally:
+        connection.close()
+    return sent, failed
@@ -5,10 +5,18 @@ import logging
 logger = logging.getLogger(__name__)
 
 def get_user_as_email_user(sender):
+    from mooringlicensing.ledger_api_utils import get_email_user_scope
+
+    users = get_email_user_scope()
+    key = sender.lower() if isinstance(sender, str) else sender
+    if users is not None and key in users['by_email']:
+        return users['by_email'][key]
     try:
         sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
     except:
         sender_user = None
+    if users is not None:
+        users['by_email'][key] = sender_user
     return sender_user
 
 
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from mooringlicensing.components.main.models import (
         GlobalSettings,
         )
+from mooringlicensing.ledger_api_utils import fill_invoice_property_caches
 
 import logging
 
@@ -17,6 +18,23 @@ class GetExternalDashboardSectionsList(views.APIView):
     """
     permission_classes=[IsAuthenticated]
     def get(self, request, format=None):
-        data = GlobalSettings.objects.get(key=GlobalSettings.KEY_EXTERNAL_DASHBOARD_SECTIONS_LIST).value
+        data = GlobalSettings.get_value(GlobalSettings.KEY_EXTERNAL_DASHBOARD_SECTIONS_LIST)
         data = [item.strip() for item in data.split(",")]
-        return Response(data)
\ No newline at end of file
+        return Response(data)
+
+
+class InvoicePropertyCachePageMixin:
+    """
+    Fill the empty invoice_property_cache of the objects on the page with one batched ledger fetch (through the shared cache),
+    rather than one ledger call per invoice while serializing each row.
+    The page is only filled in memory, the list stays read-only: the caches never refreshed are persisted by the
+    sync_invoice_properties job.
+    """
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            try:
+                fill_invoice_property_caches(page, use_cache=True, save=False)
+            except Exception as e:
+                logger.exception(f'Failed to fill the invoice property caches for the page.  Error: [{e}].')
+        return page
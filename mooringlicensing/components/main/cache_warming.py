@@ -0,0 +1,55 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_file_extension_whitelist():
+    from mooringlicensing.components.main.utils import get_file_extension_whitelist
+    return len(get_file_extension_whitelist())
+
+
+def _warm_group_memberships():
+    from mooringlicensing.components.main.group_membership import get_group_membership_snapshot
+    return len(get_group_membership_snapshot().members)
+
+
+def _warm_fee_constructors():
+    from mooringlicensing.components.payments_ml import fee_item_lookup
+    from mooringlicensing.components.payments_ml.models import FeeConstructor
+    fee_constructors = FeeConstructor.objects.filter(enabled=True).select_related('fee_season', 'vessel_size_category_group')
+    for fee_constructor in fee_constructors:
+        fee_item_lookup.get_lookup_table(fee_constructor)
+    return len(fee_constructors)
+
+
+def _warm_global_settings():
+    from mooringlicensing.components.main.models import GlobalSettings
+    warmed = 0
+    for key in GlobalSettings.objects.exclude(key__in=GlobalSettings.keys_for_file).values_list('key', flat=True).distinct():
+        GlobalSettings.get_value(key)
+        warmed += 1
+    return warmed
+
+
+WARMERS = (
+    ('file extension whitelist', _warm_file_extension_whitelist),
+    ('group memberships', _warm_group_memberships),
+    ('fee constructors', _warm_fee_constructors),
+    ('global settings', _warm_global_settings),
+)
+
+
+def warm_caches():
+    """
+    Load the hot keys into the shared cache and into the memory of this process.
+    A warmer failing is logged and never stops the others, the keys are then loaded by the first request instead.
+    Returns {name: number of entries loaded}
+    """
+    warmed = {}
+    for name, warmer in WARMERS:
+        try:
+            warmed[name] = warmer()
+        except Exception as e:
+            logger.error(f'Failed to warm the cache of the {name}.  Error: [{e}]')
+    logger.info(f'Caches warmed: {warmed}')
+    return warmed
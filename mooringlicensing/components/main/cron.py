@@ -0,0 +1,157 @@
+import logging
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.core.management import call_command
+from django.db import connection, connections
+from django.utils import timezone
+
+from mooringlicensing.components.main.models import CronJobRun
+
+logger = logging.getLogger('cron_tasks')
+
+#statements whose cursor.rowcount is counted as rows touched
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE',)
+
+
+class CronJob(object):
+    """
+    A management command run by cron_tasks.
+    Jobs run one after another in the order they are listed, unless concurrent is set: a concurrent job runs
+    alongside the others as soon as the jobs it depends on have finished, so it must not write the rows
+    (e.g. Approval or Sticker) that any other job touches.
+    """
+
+    def __init__(self, name, depends_on=(), concurrent=False):
+        self.name = name
+        self.depends_on = tuple(depends_on)
+        self.concurrent = concurrent
+
+    def __str__(self):
+        return self.name
+
+
+#The nightly jobs, in the order cron_tasks used to run them in.  A job only starts once the jobs it depends on
+#have finished (whether they succeeded or not).
+NIGHTLY_JOBS = (
+    # For Compliances, which only touch compliance rows
+    CronJob('update_compliance_status', concurrent=True),
+    CronJob('send_compliance_reminder', depends_on=['update_compliance_status'], concurrent=True),
+
+    # For the others
+    CronJob('send_endorser_reminder'),
+    CronJob('send_vessel_nominate_reminder'),
+    CronJob('cancel_approvals_due_to_no_vessels_nominated'),
+    CronJob('expire_mooring_licence_application_due_to_no_documents'),
+    CronJob('expire_mooring_licence_application_due_to_no_submit'),
+    CronJob('update_approval_status'),
+    CronJob('approval_renewal_notices'),
+    CronJob('send_mooring_licence_application_submit_due_reminder'),
+    CronJob('remove_unpaid_dcv_submissions'),
+    CronJob('expire_dcv_permits_out_of_season'),
+    CronJob('check_proposal_endorsements'),
+    CronJob('expire_application_due_to_no_payment'),
+    CronJob('send_application_payment_due_reminder'),
+)
+
+
+def get_dependencies(jobs):
+    """
+    Return {job name: names of the jobs it has to wait for}, each job which is not concurrent waiting for the
+    one listed before it
+    """
+    job_names = [job.name for job in jobs]
+    dependencies = {}
+    previous = None
+    for job in jobs:
+        for name in job.depends_on:
+            if name not in job_names:
+                raise ValueError('Cron job: [{}] depends on an unknown job: [{}]'.format(job, name))
+        dependencies[job.name] = set(job.depends_on)
+        if not job.concurrent:
+            if previous:
+                dependencies[job.name].add(previous.name)
+            previous = job
+    return dependencies
+
+
+class RowCounter(object):
+    """
+    Database execute wrapper counting the rows written through a connection
+    """
+
+    def __init__(self):
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if sql.lstrip()[:6].upper() in WRITE_STATEMENTS:
+            rowcount = context['cursor'].rowcount
+            if rowcount and rowcount > 0:
+                self.rows += rowcount
+        return result
+
+
+def run_job(run_id, job):
+    """
+    Run the management command of the job in this thread and record it as a CronJobRun
+    """
+    job_run = CronJobRun.objects.create(run_id=run_id, job_name=job.name, started_at=timezone.now())
+    logger.info(f'Cron job: [{job}] started.')
+    started = time.monotonic()
+    row_counter = RowCounter()
+    try:
+        with connection.execute_wrapper(row_counter):
+            call_command(job.name)
+        job_run.status = CronJobRun.STATUS_SUCCEEDED
+    except (Exception, SystemExit) as e:
+        #SystemExit is caught as well so that a job cannot stop the others
+        logger.error(f'Cron job: [{job}] failed.  Error: [{e}]')
+        job_run.status = CronJobRun.STATUS_FAILED
+        job_run.error = traceback.format_exc()
+    job_run.duration = time.monotonic() - started
+    job_run.finished_at = timezone.now()
+    job_run.rows_touched = row_counter.rows
+    job_run.save()
+    logger.info(f'Cron job: [{job}] {job_run.status} in {job_run.duration:.1f}s ({job_run.rows_touched} rows touched).')
+    return job_run
+
+
+def _run_job_in_thread(run_id, job):
+    try:
+        return run_job(run_id, job)
+    finally:
+        #each thread has its own connections
+        connections.close_all()
+
+
+def run_jobs(jobs, max_workers):
+    """
+    Run the jobs on a pool of max_workers threads, honouring their dependencies and order (see CronJob).
+    Returns the CronJobRun of every job.
+    """
+    run_id = uuid.uuid4()
+    dependencies = get_dependencies(jobs)
+
+    pending = list(jobs)
+    finished = set()
+    job_runs = []
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for job in [job for job in pending if all(name in finished for name in dependencies[job.name])]:
+                pending.remove(job)
+                running[executor.submit(_run_job_in_thread, run_id, job)] = job
+            if not running:
+                raise ValueError('Cron jobs have circular dependencies: {}'.format([str(job) for job in pending]))
+            done, not_done = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    job_runs.append(future.result())
+                except Exception as e:
+                    logger.exception(f'Cron job: [{job}] could not be run.  Error: [{e}]')
+                finished.add(job.name)
+    return job_runs
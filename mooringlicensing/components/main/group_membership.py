@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+#bumped whenever a group membership changes, so that every process reloads its snapshot
+VERSION_CACHE_KEY = 'group_membership_version'
+
+
+class GroupMembershipSnapshot(object):
+    """
+    Member ids of the internal groups, as they were at loaded_at
+    """
+
+    def __init__(self, members, version):
+        self.members = members
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.internal_member_ids = frozenset().union(*[members.get(group_name, frozenset()) for group_name in settings.INTERNAL_GROUPS])
+
+    def has_group(self, group_name):
+        return group_name in self.members
+
+    def belongs_to(self, user_id, group_name):
+        return user_id in self.members[group_name]
+
+    def is_internal(self, user_id):
+        return user_id in self.internal_member_ids
+
+
+def _load_members():
+    from ledger_api_client.managed_models import SystemGroup
+
+    group_names = set(settings.INTERNAL_GROUPS) | set(settings.CUSTOM_GROUPS)
+    # A group which does not exist has no members
+    members = {group_name: frozenset() for group_name in group_names}
+    for system_group in SystemGroup.objects.filter(name__in=group_names):
+        members[system_group.name] = frozenset(system_group.get_system_group_member_ids())
+    return members
+
+
+class GroupMembershipService(object):
+    """
+    Keeps a snapshot of the members of the internal groups in memory.
+
+    The snapshot is replaced once it is older than ttl seconds or the version published through the cache has changed
+    (checked at most every version_check_interval seconds).  The version is changed whenever a SystemGroup or a
+    SystemGroupPermission (a member of a group) is saved or deleted in this application.  Only the very first snapshot is loaded in the request,
+    later ones are loaded in a background thread while the previous snapshot keeps answering.
+    """
+
+    def __init__(self, ttl=None, version_check_interval=None):
+        self.ttl = ttl if ttl is not None else settings.GROUP_MEMBERSHIP_SNAPSHOT_TTL
+        self.version_check_interval = version_check_interval if version_check_interval is not None else settings.GROUP_MEMBERSHIP_VERSION_CHECK_INTERVAL
+        self._snapshot = None
+        self._version = None
+        self._version_checked_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _get_version(self):
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked_at > self.version_check_interval:
+            self._version = cache.get_or_set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+            self._version_checked_at = now
+        return self._version
+
+    def _load(self, version):
+        snapshot = GroupMembershipSnapshot(_load_members(), version)
+        self._snapshot = snapshot
+        logger.debug(f'Group membership snapshot: [{version}] loaded.')
+        return snapshot
+
+    def _refresh_in_background(self, version):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _refresh():
+            try:
+                self._load(version)
+            except Exception as e:
+                logger.error(f'Failed to refresh the group membership snapshot.  Error: [{e}]')
+            finally:
+                self._refreshing = False
+                # The thread must not leave its database connection behind
+                connection.close()
+
+        threading.Thread(target=_refresh, daemon=True).start()
+
+    def get_snapshot(self):
+        version = self._get_version()
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    return self._load(version)
+                snapshot = self._snapshot
+        if snapshot.version != version or time.monotonic() - snapshot.loaded_at > self.ttl:
+            self._refresh_in_background(version)
+        return snapshot
+
+    def invalidate(self):
+        """
+        Make every process reload its snapshot
+        """
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        self._version = None
+
+
+group_membership_service = GroupMembershipService()
+
+
+def get_group_membership_snapshot():
+    return group_membership_service.get_snapshot()
@@ -0,0 +1,28 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_alter_notice_page'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('proposal', 'Proposal'), ('approval', 'Approval'), ('sticker', 'Sticker')], max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('search_text', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('object_type', 'object_id')},
+                'indexes': [GinIndex(fields=['search_text'], name='main_searchdoc_text_trgm', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_searchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CronJobRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.UUIDField(db_index=True)),
+                ('job_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, help_text='seconds', null=True)),
+                ('rows_touched', models.IntegerField(default=0, help_text='rows inserted, updated or deleted')),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
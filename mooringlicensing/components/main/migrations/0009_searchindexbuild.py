@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_cronjobrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexBuild',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('proposal', 'Proposal'), ('approval', 'Approval'), ('sticker', 'Sticker')], max_length=20, unique=True)),
+                ('built_at', models.DateTimeField()),
+            ],
+        ),
+    ]
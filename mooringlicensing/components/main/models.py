@@ -14,8 +14,10 @@ from django.core.files.storage import FileSystemStorage
 from django.core.cache import cache
 from django.core.files.base import ContentFile
 from dirtyfields import DirtyFieldsMixin
+from django.contrib.postgres.indexes import GinIndex
 from django.utils import timezone
 from django.utils.html import strip_tags
+from mooringlicensing.components.main.sanitiser import sanitise_instance
 
 import uuid
 
@@ -30,11 +32,10 @@ class SanitiseMixin(models.Model):
     """
 
     def save(self, **kwargs):
-        from mooringlicensing.components.main.utils import sanitise_fields
         #sanitise
         exclude = kwargs.pop("exclude_sanitise", []) #fields that should not be subject to full tag removal
         error_on_change = kwargs.pop("error_on_sanitise", []) #fields that should not be modified through tag removal (and should throw and error if they are)
-        self = sanitise_fields(self, exclude, error_on_change)
+        self = sanitise_instance(self, exclude, error_on_change)
         super(SanitiseMixin, self).save(**kwargs)
 
     class Meta:
@@ -347,6 +348,26 @@ class GlobalSettings(models.Model):
         app_label = 'mooringlicensing'
         verbose_name_plural = "Global Settings"
 
+    @classmethod
+    def get_value(cls, key):
+        """
+        Return the value of the setting, read through the cache
+        """
+        cache_key = settings.CACHE_KEY_GLOBAL_SETTING.format(key)
+        value = cache.get(cache_key)
+        if value is None:
+            value = cls.objects.get(key=key).value
+            cache.set(cache_key, value, settings.CACHE_TIMEOUT_2_HOURS)
+        return value
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(settings.CACHE_KEY_GLOBAL_SETTING.format(self.key))
+
+    def delete(self, *args, **kwargs):
+        cache.delete(settings.CACHE_KEY_GLOBAL_SETTING.format(self.key))
+        return super().delete(*args, **kwargs)
+
 
 class SystemMaintenance(models.Model):
     name = models.CharField(max_length=100)
@@ -371,6 +392,25 @@ def update_electoral_roll_doc_filename(instance, filename):
     return '{}/emailusers/{}/documents/{}'.format(settings.MEDIA_APP_DIR, instance.emailuser.id,filename)
 
 
+class ChildObjQuerySet(models.QuerySet):
+    """
+    QuerySet of a multi-table inheritance base model (Proposal, Approval) whose CHILD_RELATIONS maps
+    the child_type column to the reverse one-to-one of each subclass
+    """
+
+    def select_child_objs(self):
+        """
+        Fetch the subclass rows in the same query (a join per subclass), so that child_obj does not query again
+        """
+        if self.model._meta.parents:
+            # Already a subclass
+            return self
+        return self.select_related(*self.model.CHILD_RELATIONS.values())
+
+    def filter_child_type(self, *child_types):
+        return self.filter(child_type__in=child_types)
+
+
 class RevisionedMixin(SanitiseMixin):
     """
     A model tracked by reversion through the save method.
@@ -583,6 +623,89 @@ class JobQueue(models.Model):
     def __str__(self):
         return self.job_cmd   
 
+class CronJobRun(models.Model):
+    """
+    Outcome of one job of a cron_tasks run
+    """
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    run_id = models.UUIDField(db_index=True)
+    job_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True, help_text='seconds')
+    rows_touched = models.IntegerField(default=0, help_text='rows inserted, updated or deleted')
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return '{} ({})'.format(self.job_name, self.status)
+
+
+class SearchDocument(models.Model):
+    """
+    Denormalised, lower-cased search text (holder names and emails, vessel regos, lodgement/sticker numbers) for
+    the free-text search of the proposal, approval and sticker lists.
+    Kept in sync by the signals in components/main/signals.py and rebuilt by the rebuild_search_index command.
+    """
+    OBJECT_TYPE_PROPOSAL = 'proposal'
+    OBJECT_TYPE_APPROVAL = 'approval'
+    OBJECT_TYPE_STICKER = 'sticker'
+    OBJECT_TYPE_CHOICES = (
+        (OBJECT_TYPE_PROPOSAL, 'Proposal'),
+        (OBJECT_TYPE_APPROVAL, 'Approval'),
+        (OBJECT_TYPE_STICKER, 'Sticker'),
+    )
+
+    object_type = models.CharField(max_length=20, choices=OBJECT_TYPE_CHOICES)
+    object_id = models.IntegerField()
+    search_text = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('object_type', 'object_id',)
+        indexes = [
+            #trigram index - answers LIKE '%term%' without a sequential scan
+            GinIndex(fields=['search_text'], name='main_searchdoc_text_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.object_type, self.object_id)
+
+    @classmethod
+    def search(cls, object_type, term):
+        """
+        Return the ids of the objects of object_type whose search text contains term.
+        search_text is stored lower-cased so a plain LIKE (which can use the trigram index) is used rather than icontains (UPPER(...) LIKE ...)
+        """
+        return cls.objects.filter(
+            object_type=object_type,
+            search_text__contains=term.strip().lower(),
+        ).values_list('object_id', flat=True)
+
+
+class SearchIndexBuild(models.Model):
+    """
+    Written by the rebuild_search_index command once all the search documents of object_type have been built.
+    Until then the list searches of object_type are answered without the index.
+    """
+    object_type = models.CharField(max_length=20, choices=SearchDocument.OBJECT_TYPE_CHOICES, unique=True)
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return '{} {}'.format(self.object_type, self.built_at)
+
+
 import reversion
 #reversion.register(GlobalSettings, follow=[])
 #reversion.register(VesselSizeCategoryGroup, follow=['vessel_size_categories', 'fee_constructors']) - cannot be changed after use
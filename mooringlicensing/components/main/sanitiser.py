@@ -0,0 +1,231 @@
+import re
+import logging
+from copy import deepcopy
+
+from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+#NOTE: all patterns are compiled once at import - they used to be rebuilt on every call to remove_html_tags/remove_script_tags
+HTML_TAGS_WRAPPED = re.compile(r'<[^>]+>.+</[^>]+>')
+HTML_TAGS_NO_WRAPPED = re.compile(r'<[^>]+>')
+
+SCRIPT_TAGS_WRAPPED = re.compile(r'(?i)<script[^>]+>.+</script[^>]+>')
+SCRIPT_TAGS_NO_WRAPPED = re.compile(r'(?i)<script[^>]+>')
+
+ATTR_BLACKLIST = ['onresize','onvolumechange','onsuspend','onpopstate','onbeforeunload','oncontextmenu',
+    'ondragstart','oncuechange','onselect','onafterprint','onmouseover','ondragleave','onstorage',
+    'onbeforeprint','onhashchange','onabort','ondragover','onwaiting','onclick','onmousemove','onkeyup',
+    'onmousedown','ononline','onsearch','onprogress','onfocus','onmouseup','onplaying','onstalled','oninvalid',
+    'ontimeupdate','onkeypress','onseeked','onreset','onwheel','onemptied','oninput','onpagehide','onpause',
+    'onloadeddata','onseeking','onunload','onpageshow','onerror','ondrop','oncanplay','oncopy','onended','oncut',
+    'onsubmit','ondrag','onblur','ondragend','onplay','onratechange','onloadedmetadata','oncanplaythrough',
+    'ondurationchange','onchange','ondblclick','onmousewheel','onpaste','onload','onscroll','onkeydown',
+    'ontoggle','onmouseout','onoffline','onloadstart','ondragenter']
+ATTR_BLACKLIST_STR = ('|').join(ATTR_BLACKLIST)
+
+#NOTE: the [\\s] character class is kept as is (matches a backslash or "s") so the output is identical to the previous implementation
+HTML_TAGS_WITH_ATTR_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>.+</[^>]+>')
+HTML_TAGS_WITH_ATTR_NO_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>')
+
+HTML_TAGS_ERROR = "html tags included in field"
+SCRIPT_TAGS_ERROR = "script tags included in field"
+
+#model fields whose values can hold strings, lists or dicts
+TEXT_FIELD_TYPES = (models.CharField, models.TextField,)
+JSON_FIELD_TYPES = (models.JSONField, ArrayField,)
+
+FIELD_KIND_TEXT = 'text'
+FIELD_KIND_JSON = 'json'
+
+#attribute used to remember the last sanitised value of the json fields of an instance
+SANITISED_JSON_ATTR = '_sanitised_json_fields'
+
+_sanitise_plans = {}
+
+
+def remove_html_tags(text):
+    if text is None:
+        return None
+    #every pattern requires a "<", so there is nothing to remove
+    if '<' not in text:
+        return text
+
+    text = HTML_TAGS_WRAPPED.sub('', text)
+    text = HTML_TAGS_NO_WRAPPED.sub('', text)
+    return text
+
+
+def remove_script_tags(text):
+    if text is None:
+        return None
+    if '<' not in text:
+        return text
+
+    text = SCRIPT_TAGS_WRAPPED.sub('', text)
+    text = SCRIPT_TAGS_NO_WRAPPED.sub('', text)
+
+    text = HTML_TAGS_WITH_ATTR_WRAPPED.sub('', text)
+    text = HTML_TAGS_WITH_ATTR_NO_WRAPPED.sub('', text)
+    return text
+
+
+def contains_markup(value):
+    """
+    Return True if any string (or dict key) within value contains a "<"
+    """
+    if isinstance(value, str):
+        return '<' in value
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if isinstance(k, str) and '<' in k:
+                return True
+            if contains_markup(v):
+                return True
+        return False
+    if isinstance(value, list):
+        for v in value:
+            if contains_markup(v):
+                return True
+        return False
+    return False
+
+
+def _sub_lists(name, exclude, error_on_change):
+    #we use . notation to identify sub fields that should be carried over to the exclude and error on change lists
+    prefix = name + "."
+    exclude_list = [e.replace(prefix, "", 1) for e in exclude if e.startswith(prefix)]
+    error_on_change_list = [e.replace(prefix, "", 1) for e in error_on_change if e.startswith(prefix)]
+    return exclude_list, error_on_change_list
+
+
+def _sanitise_list(value, excluded, exclude_list, error_on_change_list, raise_error, error_message):
+    """
+    Sanitise the items of a list in place
+    """
+    for j in range(0, len(value)):
+        item = value[j]
+        if isinstance(item, str):
+            #strings in an excluded list will be treated as excluded
+            value[j] = remove_script_tags(item) if excluded else remove_html_tags(item)
+        elif isinstance(item, list):
+            _sanitise_list(item, excluded, exclude_list, error_on_change_list, False, error_message)
+        elif isinstance(item, dict):
+            sanitise_dict(item, exclude_list, error_on_change_list)
+        if raise_error and item != value[j]:
+            raise serializers.ValidationError(error_message)
+    return value
+
+
+def _sanitise_value(name, value, exclude, error_on_change, excluded_error_message):
+    """
+    Sanitise a single string/list/dict value held under name (an attribute or a dict key)
+    """
+    excluded = name in exclude
+    check_change = name in error_on_change
+
+    if isinstance(value, str):
+        if excluded:
+            #even though excluded, we still check to remove script tags
+            sanitised = remove_script_tags(value)
+            message = SCRIPT_TAGS_ERROR
+        else:
+            sanitised = remove_html_tags(value)
+            message = HTML_TAGS_ERROR
+        if check_change and sanitised != value:
+            #only fields that cannot be allowed to change through sanitisation just before saving will throw an error
+            raise serializers.ValidationError(message)
+        return sanitised
+
+    if not excluded:
+        if isinstance(value, dict):
+            return sanitise_dict(value)
+        if isinstance(value, list):
+            return _sanitise_list(value, False, [], [], check_change, HTML_TAGS_ERROR)
+        return value
+
+    if isinstance(value, dict) or isinstance(value, list):
+        #if we have reached this point, it means we have a json object with fields that are allowed to contain tags
+        #NOTE: to allow sub fields to be sanitised, the parent field should be included in both lists required for their respective children
+        exclude_list, error_on_change_list = _sub_lists(name, exclude, error_on_change)
+        if isinstance(value, dict):
+            #dicts are sanitised in place, so they never compare as changed
+            return sanitise_dict(value, exclude_list, error_on_change_list)
+        return _sanitise_list(value, True, exclude_list, error_on_change_list, check_change, excluded_error_message)
+
+    return value
+
+
+def sanitise_dict(value, exclude=[], error_on_change=[]):
+    """
+    Sanitise a (json) dict in place, dropping any keys that contain tags
+    """
+    remove_keys = []
+    for key in value:
+        #for dicts we also check the keys - they are removed completely if not sanitary (should not change keys)
+        if isinstance(key, str) and '<' in key and remove_html_tags(key) != key:
+            remove_keys.append(key)
+            continue
+        value[key] = _sanitise_value(key, value[key], exclude, error_on_change, SCRIPT_TAGS_ERROR)
+
+    for key in remove_keys:
+        del value[key]
+    return value
+
+
+def get_sanitise_plan(model):
+    """
+    Return the (attname, kind) pairs of the concrete fields of model that need sanitising.
+    Plans are built once per model class.
+    """
+    plan = _sanitise_plans.get(model)
+    if plan is None:
+        plan = []
+        for field in model._meta.concrete_fields:
+            if isinstance(field, JSON_FIELD_TYPES):
+                plan.append((field.attname, FIELD_KIND_JSON))
+            elif isinstance(field, TEXT_FIELD_TYPES):
+                plan.append((field.attname, FIELD_KIND_TEXT))
+        plan = tuple(plan)
+        _sanitise_plans[model] = plan
+    return plan
+
+
+def sanitise_instance(instance, exclude=[], error_on_change=[]):
+    """
+    Sanitise the text and json fields of a model instance.
+
+    Json fields whose value is unchanged since the last time they were sanitised (and that hold no markup) are skipped.
+    """
+    values = instance.__dict__
+    sanitised_json = values.get(SANITISED_JSON_ATTR)
+    if sanitised_json is None:
+        sanitised_json = {}
+
+    for attname, kind in get_sanitise_plan(type(instance)):
+        if attname not in values:
+            #deferred field
+            continue
+        value = values[attname]
+        if value is None:
+            continue
+
+        if kind == FIELD_KIND_JSON and isinstance(value, (dict, list)):
+            if attname in sanitised_json and sanitised_json[attname] == value:
+                #clean since the last save
+                continue
+            value = _sanitise_value(attname, value, exclude, error_on_change, HTML_TAGS_ERROR)
+            if contains_markup(value):
+                sanitised_json.pop(attname, None)
+            else:
+                sanitised_json[attname] = deepcopy(value)
+        elif isinstance(value, (str, dict, list)):
+            value = _sanitise_value(attname, value, exclude, error_on_change, HTML_TAGS_ERROR)
+        else:
+            continue
+        values[attname] = value
+
+    values[SANITISED_JSON_ATTR] = sanitised_json
+    return instance
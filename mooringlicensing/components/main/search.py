@@ -0,0 +1,236 @@
+import logging
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Concat
+from ledger_api_client.managed_models import SystemUser
+
+from mooringlicensing.components.main.models import SearchDocument, SearchIndexBuild
+
+logger = logging.getLogger(__name__)
+
+INDEX_BATCH_SIZE = 500
+
+
+def _join(parts):
+    #one value per line - a search term will not span two values
+    return '\n'.join([str(part).strip().lower() for part in parts if part])
+
+
+def _name_parts(first_name, last_name, email):
+    return [first_name, last_name, '{} {}'.format(first_name or '', last_name or '').strip(), email]
+
+
+def _applicant_parts(proposal):
+    if not proposal:
+        return []
+    try:
+        applicant = proposal.proposal_applicant
+    except ObjectDoesNotExist:
+        #no ProposalApplicant yet (e.g. new draft proposals)
+        return []
+    return _name_parts(applicant.first_name, applicant.last_name, applicant.email)
+
+
+def _system_user_parts(ledger_ids):
+    """
+    Return {ledger_id: [name and email parts]} for the system users of ledger_ids in one query
+    """
+    ledger_ids = set([ledger_id for ledger_id in ledger_ids if ledger_id])
+    if not ledger_ids:
+        return {}
+    parts = {}
+    for ledger_id, first_name, last_name, email in SystemUser.objects.filter(ledger_id__id__in=ledger_ids).values_list(
+        'ledger_id', 'legal_first_name', 'legal_last_name', 'email'
+    ):
+        parts[ledger_id] = _name_parts(first_name, last_name, email)
+    return parts
+
+
+def _vessel_rego(proposal):
+    if proposal and proposal.vessel_details and proposal.vessel_details.vessel:
+        return proposal.vessel_details.vessel.rego_no
+    return None
+
+
+def _save_documents(object_type, texts):
+    """
+    Upsert the search documents of object_type from {object_id: search_text}
+    """
+    if not texts:
+        return
+    documents = [SearchDocument(object_type=object_type, object_id=object_id, search_text=text) for object_id, text in texts.items()]
+    SearchDocument.objects.bulk_create(
+        documents,
+        batch_size=INDEX_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['object_type', 'object_id'],
+        update_fields=['search_text', 'updated_at'],
+    )
+
+
+def index_proposals(proposals):
+    from mooringlicensing.components.proposals.models import Proposal
+    proposals = Proposal.objects.filter(id__in=proposals).select_related('proposal_applicant', 'vessel_details__vessel')
+    proposals = list(proposals)
+    system_users = _system_user_parts([proposal.submitter for proposal in proposals])
+
+    texts = {}
+    for proposal in proposals:
+        parts = _applicant_parts(proposal)
+        parts += system_users.get(proposal.submitter, [])
+        parts += [proposal.lodgement_number, _vessel_rego(proposal)]
+        texts[proposal.id] = _join(parts)
+    _save_documents(SearchDocument.OBJECT_TYPE_PROPOSAL, texts)
+
+
+def index_approvals(approvals):
+    from mooringlicensing.components.approvals.models import Approval, VesselOwnershipOnApproval
+    approvals = Approval.objects.filter(id__in=approvals).select_related(
+        'current_proposal__proposal_applicant', 'current_proposal__vessel_details__vessel'
+    )
+    approvals = list(approvals)
+    system_users = _system_user_parts([approval.current_proposal.submitter for approval in approvals if approval.current_proposal])
+
+    vessel_regos = {}
+    for approval_id, rego_no in VesselOwnershipOnApproval.objects.filter(approval__in=approvals).values_list(
+        'approval_id', 'vessel_ownership__vessel__rego_no'
+    ):
+        vessel_regos.setdefault(approval_id, []).append(rego_no)
+
+    texts = {}
+    for approval in approvals:
+        proposal = approval.current_proposal
+        parts = _applicant_parts(proposal)
+        if proposal:
+            parts += system_users.get(proposal.submitter, [])
+        parts += [approval.lodgement_number, _vessel_rego(proposal)]
+        parts += vessel_regos.get(approval.id, [])
+        texts[approval.id] = _join(parts)
+    _save_documents(SearchDocument.OBJECT_TYPE_APPROVAL, texts)
+
+
+def index_stickers(stickers):
+    from mooringlicensing.components.approvals.models import Sticker
+    stickers = Sticker.objects.filter(id__in=stickers).select_related(
+        'approval__current_proposal__proposal_applicant', 'vessel_ownership__vessel'
+    )
+    stickers = list(stickers)
+    system_users = _system_user_parts([sticker.approval.submitter for sticker in stickers if sticker.approval])
+
+    texts = {}
+    for sticker in stickers:
+        parts = []
+        if sticker.approval:
+            parts += _applicant_parts(sticker.approval.current_proposal)
+            parts += system_users.get(sticker.approval.submitter, [])
+        if sticker.vessel_ownership and sticker.vessel_ownership.vessel:
+            parts.append(sticker.vessel_ownership.vessel.rego_no)
+        parts.append(sticker.number)
+        texts[sticker.id] = _join(parts)
+    _save_documents(SearchDocument.OBJECT_TYPE_STICKER, texts)
+
+
+def reindex_approvals(approval_ids):
+    """
+    Index the approvals and their stickers
+    """
+    from mooringlicensing.components.approvals.models import Sticker
+    approval_ids = list(approval_ids)
+    index_approvals(approval_ids)
+    index_stickers(Sticker.objects.filter(approval__in=approval_ids).values_list('id', flat=True))
+
+
+def reindex_proposals(proposal_ids):
+    """
+    Index the proposals and the approvals (and their stickers) they are the current proposal of
+    """
+    from mooringlicensing.components.approvals.models import Approval
+    proposal_ids = list(proposal_ids)
+    index_proposals(proposal_ids)
+    reindex_approvals(Approval.objects.filter(current_proposal__in=proposal_ids).values_list('id', flat=True))
+
+
+def reindex_system_users(ledger_ids):
+    """
+    Index everything that is searched by the names/email of the system users with ledger_ids
+    """
+    from mooringlicensing.components.approvals.models import Approval
+    from mooringlicensing.components.proposals.models import Proposal
+    ledger_ids = list(ledger_ids)
+    reindex_proposals(Proposal.objects.filter(submitter__in=ledger_ids).values_list('id', flat=True))
+    reindex_approvals(Approval.objects.filter(submitter__in=ledger_ids).values_list('id', flat=True))
+
+
+def reindex_vessels(vessel_ids):
+    """
+    Index everything that is searched by the rego_no of the vessels
+    """
+    from mooringlicensing.components.approvals.models import Approval, Sticker
+    from mooringlicensing.components.proposals.models import Proposal
+    vessel_ids = list(vessel_ids)
+    proposal_ids = list(Proposal.objects.filter(vessel_details__vessel_id__in=vessel_ids).values_list('id', flat=True))
+    index_proposals(proposal_ids)
+    index_approvals(Approval.objects.filter(
+        Q(current_proposal__in=proposal_ids) |
+        Q(vesselownershiponapproval__vessel_ownership__vessel_id__in=vessel_ids)
+    ).distinct().values_list('id', flat=True))
+    index_stickers(Sticker.objects.filter(vessel_ownership__vessel_id__in=vessel_ids).values_list('id', flat=True))
+
+
+def delete_documents(object_type, object_ids):
+    SearchDocument.objects.filter(object_type=object_type, object_id__in=object_ids).delete()
+
+
+def _orm_search_system_user_ids(term):
+    return SystemUser.objects.annotate(full_name=Concat('legal_first_name', Value(" "), 'legal_last_name', output_field=CharField())).filter(
+        Q(legal_first_name__icontains=term) | Q(legal_last_name__icontains=term) | Q(email__icontains=term) | Q(full_name__icontains=term)
+    ).values_list('ledger_id', flat=True)
+
+
+def _orm_search_applicant_proposal_ids(term):
+    from mooringlicensing.components.proposals.models import ProposalApplicant
+    return ProposalApplicant.objects.annotate(full_name=Concat('first_name', Value(" "), 'last_name', output_field=CharField())).filter(
+        Q(first_name__icontains=term) | Q(last_name__icontains=term) | Q(email__icontains=term) | Q(full_name__icontains=term)
+    ).values_list('proposal_id', flat=True)
+
+
+def _orm_search(object_type, term):
+    """
+    The search without the index, used while the documents of object_type have not been built
+    """
+    from mooringlicensing.components.approvals.models import Approval, Sticker, VesselOwnershipOnApproval
+    from mooringlicensing.components.proposals.models import Proposal
+    # The SystemUsers are in the ledger database, so their ids are fetched rather than joined
+    system_user_ids = list(_orm_search_system_user_ids(term))
+    applicant_proposal_ids = _orm_search_applicant_proposal_ids(term)
+    if object_type == SearchDocument.OBJECT_TYPE_PROPOSAL:
+        queryset = Proposal.objects.filter(Q(id__in=applicant_proposal_ids) | Q(submitter__in=system_user_ids))
+    elif object_type == SearchDocument.OBJECT_TYPE_APPROVAL:
+        queryset = Approval.objects.filter(
+            Q(current_proposal__id__in=applicant_proposal_ids) |
+            Q(current_proposal__submitter__in=system_user_ids) |
+            Q(id__in=VesselOwnershipOnApproval.objects.filter(vessel_ownership__vessel__rego_no__icontains=term).values_list('approval__id', flat=True)) |
+            Q(current_proposal__vessel_details__vessel__rego_no__icontains=term)
+        )
+    else:
+        queryset = Sticker.objects.filter(
+            Q(approval__current_proposal__id__in=applicant_proposal_ids) |
+            Q(approval__submitter__in=system_user_ids) |
+            Q(vessel_ownership__vessel__rego_no__icontains=term) |
+            Q(number__icontains=term)
+        )
+    return queryset.values_list('id', flat=True)
+
+
+def search(object_type, term):
+    """
+    Return the ids of the objects of object_type matching term.
+    Until the rebuild_search_index command has built all the documents of object_type (e.g. straight after the
+    migration, when only the objects saved since have a document), the search is answered by the ORM queries the
+    index replaced, so that the lists keep working.
+    """
+    if SearchIndexBuild.objects.filter(object_type=object_type).exists():
+        return SearchDocument.search(object_type, term)
+    logger.warning(f'The search documents of type: [{object_type}] have not been built.  Run the rebuild_search_index command.')
+    return _orm_search(object_type, term.strip())
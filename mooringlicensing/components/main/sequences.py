@@ -0,0 +1,81 @@
+import logging
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+#database sequences the lodgement/sticker numbers are allocated from
+SEQUENCE_APPROVAL_LODGEMENT_NUMBER = 'mooringlicensing_approval_lodgement_number_seq'  # shared by every approval type
+SEQUENCE_DCV_ADMISSION_LODGEMENT_NUMBER = 'mooringlicensing_dcvadmission_lodgement_number_seq'
+SEQUENCE_DCV_PERMIT_LODGEMENT_NUMBER = 'mooringlicensing_dcvpermit_lodgement_number_seq'
+SEQUENCE_STICKER_NUMBER = 'mooringlicensing_sticker_number_seq'
+
+
+def _get_numbered_fields():
+    """
+    Return {sequence: (model, field)} of the numbers allocated from each sequence
+    """
+    from mooringlicensing.components.approvals.models import Approval, DcvAdmission, DcvPermit, Sticker
+    return {
+        SEQUENCE_APPROVAL_LODGEMENT_NUMBER: (Approval, 'lodgement_number'),
+        SEQUENCE_DCV_ADMISSION_LODGEMENT_NUMBER: (DcvAdmission, 'lodgement_number'),
+        SEQUENCE_DCV_PERMIT_LODGEMENT_NUMBER: (DcvPermit, 'lodgement_number'),
+        SEQUENCE_STICKER_NUMBER: (Sticker, 'number'),
+    }
+
+
+def next_value(sequence):
+    """
+    Allocate the next number of the sequence.
+    Safe under concurrency; a number is never handed out twice, even when the transaction allocating it is rolled back.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [sequence])
+        return cursor.fetchone()[0]
+
+
+def reserve_values(sequence, count):
+    """
+    Allocate count numbers of the sequence in one round trip, in ascending order
+    """
+    if count <= 0:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [sequence, count])
+        return sorted([row[0] for row in cursor.fetchall()])
+
+
+def get_max_number(sequence):
+    """
+    Return the largest number currently held in the field numbered from the sequence, ignoring any letters before it
+    """
+    model, field_name = _get_numbered_fields()[sequence]
+    column = connection.ops.quote_name(model._meta.get_field(field_name).column)
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT MAX(CAST(regexp_replace({column}, '^[A-Za-z]*', '') AS bigint)) FROM {table} "
+            "WHERE {column} ~ '^[A-Za-z]*[0-9]+$'".format(column=column, table=table)
+        )
+        return cursor.fetchone()[0] or 0
+
+
+def seed_sequence(sequence):
+    """
+    Move the sequence past the largest number in use.  It is never moved backwards.
+    Returns the next number the sequence will allocate.
+    """
+    max_number = get_max_number(sequence)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT last_value, is_called FROM {}'.format(connection.ops.quote_name(sequence)))
+        last_value, is_called = cursor.fetchone()
+        last_allocated = last_value if is_called else last_value - 1
+        if max_number > last_allocated:
+            cursor.execute('SELECT setval(%s, %s, true)', [sequence, max_number])
+            logger.info(f'Sequence: [{sequence}] moved from {last_allocated} to {max_number}.')
+            last_allocated = max_number
+    return last_allocated + 1
+
+
+def seed_sequences():
+    return {sequence: seed_sequence(sequence) for sequence in _get_numbered_fields()}
@@ -0,0 +1,217 @@
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from ledger_api_client.managed_models import SystemGroup, SystemGroupPermission, SystemUser, SystemUserAddress
+
+from mooringlicensing.components.approvals.models import (
+    Approval, WaitingListAllocation, AnnualAdmissionPermit, AuthorisedUserPermit, MooringLicence,
+    Sticker, VesselOwnershipOnApproval,
+)
+from mooringlicensing.components.main.models import SearchDocument
+from mooringlicensing.components.main import search
+from mooringlicensing.components.main.group_membership import group_membership_service
+from mooringlicensing.helpers import invalidate_profile_complete
+from mooringlicensing.components.proposals.models import (
+    Proposal, WaitingListApplication, AnnualAdmissionApplication, AuthorisedUserApplication, MooringLicenceApplication,
+    ProposalApplicant, Vessel, VesselOwnership,
+)
+from mooringlicensing.components.proposals import vessel_occupancy
+
+logger = logging.getLogger(__name__)
+
+#post_save is sent with the concrete class, so each subclass has to be connected
+PROPOSAL_CLASSES = (Proposal, WaitingListApplication, AnnualAdmissionApplication, AuthorisedUserApplication, MooringLicenceApplication,)
+APPROVAL_CLASSES = (Approval, WaitingListAllocation, AnnualAdmissionPermit, AuthorisedUserPermit, MooringLicence,)
+
+
+class _SearchIndexBatch(object):
+    """
+    The ids to index once the transaction has been committed, so that an object saved several times in a
+    transaction (and the objects it cascades to) is indexed once, in bulk
+    """
+
+    def __init__(self):
+        self.ids = defaultdict(set)  # {index function taking a list of ids: ids}
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        # In the order the functions were first requested in
+        for func, ids in self.ids.items():
+            try:
+                func(sorted(ids))
+            except Exception as e:
+                # A failure to index is logged and never affects the save
+                logger.exception(f'Failed to update the search index.  Error: [{e}]')
+
+
+def _reindex_on_commit(func, ids):
+    """
+    Index ids with func once the transaction has been committed, batched with the other ids of the transaction
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        # Autocommit, there is nothing to batch with
+        batch = _SearchIndexBatch()
+        batch.ids[func].update(ids)
+        batch()
+        return
+    batch = getattr(connection, 'search_index_batch', None)
+    if batch is None or batch.done or not any(callback is batch for _, callback, _ in connection.run_on_commit):
+        # None pending: the previous batch has been run, or discarded with a rollback
+        batch = connection.search_index_batch = _SearchIndexBatch()
+        transaction.on_commit(batch)
+    batch.ids[func].update(ids)
+
+
+class SearchIndexListener(object):
+
+    @staticmethod
+    def _proposal_post_save(sender, instance, **kwargs):
+        _reindex_on_commit(search.reindex_proposals, [instance.id])
+
+    @staticmethod
+    def _proposal_post_delete(sender, instance, **kwargs):
+        search.delete_documents(SearchDocument.OBJECT_TYPE_PROPOSAL, [instance.id])
+
+    @staticmethod
+    def _approval_post_save(sender, instance, **kwargs):
+        _reindex_on_commit(search.reindex_approvals, [instance.id])
+
+    @staticmethod
+    def _approval_post_delete(sender, instance, **kwargs):
+        search.delete_documents(SearchDocument.OBJECT_TYPE_APPROVAL, [instance.id])
+
+    @staticmethod
+    def _proposal_applicant_post_save(sender, instance, **kwargs):
+        if instance.proposal_id:
+            _reindex_on_commit(search.reindex_proposals, [instance.proposal_id])
+
+    @staticmethod
+    def _sticker_post_save(sender, instance, **kwargs):
+        _reindex_on_commit(search.index_stickers, [instance.id])
+
+    @staticmethod
+    def _sticker_post_delete(sender, instance, **kwargs):
+        search.delete_documents(SearchDocument.OBJECT_TYPE_STICKER, [instance.id])
+
+    @staticmethod
+    def _vessel_ownership_on_approval_changed(sender, instance, **kwargs):
+        if instance.approval_id:
+            _reindex_on_commit(search.index_approvals, [instance.approval_id])
+
+    @staticmethod
+    def _vessel_post_save(sender, instance, created, **kwargs):
+        if not created:
+            _reindex_on_commit(search.reindex_vessels, [instance.id])
+
+    @staticmethod
+    def _system_user_post_save(sender, instance, **kwargs):
+        if instance.ledger_id_id:
+            _reindex_on_commit(search.reindex_system_users, [instance.ledger_id_id])
+
+
+for proposal_class in PROPOSAL_CLASSES:
+    post_save.connect(SearchIndexListener._proposal_post_save, sender=proposal_class, dispatch_uid=f'search_index_{proposal_class.__name__}_save')
+    post_delete.connect(SearchIndexListener._proposal_post_delete, sender=proposal_class, dispatch_uid=f'search_index_{proposal_class.__name__}_delete')
+for approval_class in APPROVAL_CLASSES:
+    post_save.connect(SearchIndexListener._approval_post_save, sender=approval_class, dispatch_uid=f'search_index_{approval_class.__name__}_save')
+    post_delete.connect(SearchIndexListener._approval_post_delete, sender=approval_class, dispatch_uid=f'search_index_{approval_class.__name__}_delete')
+post_save.connect(SearchIndexListener._proposal_applicant_post_save, sender=ProposalApplicant, dispatch_uid='search_index_ProposalApplicant_save')
+post_save.connect(SearchIndexListener._sticker_post_save, sender=Sticker, dispatch_uid='search_index_Sticker_save')
+post_delete.connect(SearchIndexListener._sticker_post_delete, sender=Sticker, dispatch_uid='search_index_Sticker_delete')
+post_save.connect(SearchIndexListener._vessel_ownership_on_approval_changed, sender=VesselOwnershipOnApproval, dispatch_uid='search_index_VesselOwnershipOnApproval_save')
+post_delete.connect(SearchIndexListener._vessel_ownership_on_approval_changed, sender=VesselOwnershipOnApproval, dispatch_uid='search_index_VesselOwnershipOnApproval_delete')
+post_save.connect(SearchIndexListener._vessel_post_save, sender=Vessel, dispatch_uid='search_index_Vessel_save')
+post_save.connect(SearchIndexListener._system_user_post_save, sender=SystemUser, dispatch_uid='search_index_SystemUser_save')
+
+
+class ChildTypeListener(object):
+
+    @staticmethod
+    def _pre_save(sender, instance, **kwargs):
+        # The code of the subclass saved, for the type checks and filters to use without joining the subclass tables
+        if not instance.child_type:
+            instance.child_type = sender.code
+
+
+for child_class in PROPOSAL_CLASSES[1:] + APPROVAL_CLASSES[1:]:
+    pre_save.connect(ChildTypeListener._pre_save, sender=child_class, dispatch_uid=f'child_type_{child_class.__name__}_pre_save')
+
+
+class VesselOccupancyListener(object):
+
+    @staticmethod
+    def _proposal_post_save(sender, instance, **kwargs):
+        vessel_occupancy.sync_on_commit(proposal_ids=[instance.id])
+
+    @staticmethod
+    def _approval_post_save(sender, instance, **kwargs):
+        vessel_occupancy.sync_on_commit(approval_ids=[instance.id])
+
+    @staticmethod
+    def _proposal_applicant_post_save(sender, instance, **kwargs):
+        if instance.proposal_id:
+            vessel_occupancy.sync_on_commit(proposal_ids=[instance.proposal_id])
+
+    @staticmethod
+    def _vessel_ownership_post_save(sender, instance, **kwargs):
+        vessel_occupancy.sync_on_commit(vessel_ownership_ids=[instance.id])
+
+    @staticmethod
+    def _vessel_ownership_on_approval_changed(sender, instance, **kwargs):
+        if instance.approval_id:
+            vessel_occupancy.sync_on_commit(approval_ids=[instance.approval_id])
+
+    @staticmethod
+    def _vessel_post_save(sender, instance, created, **kwargs):
+        # The rego no of the vessel is stored in the rows of the licences/permits
+        if not created:
+            vessel_occupancy.sync_on_commit(vessel_ownership_ids=VesselOwnership.objects.filter(vessel=instance).values_list('id', flat=True))
+
+
+for proposal_class in PROPOSAL_CLASSES:
+    post_save.connect(VesselOccupancyListener._proposal_post_save, sender=proposal_class, dispatch_uid=f'vessel_occupancy_{proposal_class.__name__}_save')
+for approval_class in APPROVAL_CLASSES:
+    post_save.connect(VesselOccupancyListener._approval_post_save, sender=approval_class, dispatch_uid=f'vessel_occupancy_{approval_class.__name__}_save')
+post_save.connect(VesselOccupancyListener._proposal_applicant_post_save, sender=ProposalApplicant, dispatch_uid='vessel_occupancy_ProposalApplicant_save')
+post_save.connect(VesselOccupancyListener._vessel_ownership_post_save, sender=VesselOwnership, dispatch_uid='vessel_occupancy_VesselOwnership_save')
+post_save.connect(VesselOccupancyListener._vessel_ownership_on_approval_changed, sender=VesselOwnershipOnApproval, dispatch_uid='vessel_occupancy_VesselOwnershipOnApproval_save')
+post_delete.connect(VesselOccupancyListener._vessel_ownership_on_approval_changed, sender=VesselOwnershipOnApproval, dispatch_uid='vessel_occupancy_VesselOwnershipOnApproval_delete')
+post_save.connect(VesselOccupancyListener._vessel_post_save, sender=Vessel, dispatch_uid='vessel_occupancy_Vessel_save')
+
+
+class GroupMembershipListener(object):
+
+    @staticmethod
+    @receiver(post_save, sender=SystemGroup)
+    @receiver(post_delete, sender=SystemGroup)
+    def _post_save(sender, instance, **kwargs):
+        transaction.on_commit(group_membership_service.invalidate)
+
+    @staticmethod
+    @receiver(post_save, sender=SystemGroupPermission)
+    @receiver(post_delete, sender=SystemGroupPermission)
+    def _system_group_permission_post_save(sender, instance, **kwargs):
+        # A member added to or removed from a group
+        transaction.on_commit(group_membership_service.invalidate)
+
+
+class ProfileCompleteListener(object):
+
+    @staticmethod
+    @receiver(post_save, sender=SystemUser)
+    @receiver(post_delete, sender=SystemUser)
+    def _system_user_post_save(sender, instance, **kwargs):
+        if instance.ledger_id_id:
+            invalidate_profile_complete(instance.ledger_id_id)
+
+    @staticmethod
+    @receiver(post_save, sender=SystemUserAddress)
+    @receiver(post_delete, sender=SystemUserAddress)
+    def _system_user_address_post_save(sender, instance, **kwargs):
+        if instance.system_user and instance.system_user.ledger_id_id:
+            invalidate_profile_complete(instance.system_user.ledger_id_id)
@@ -1,3 +1,4 @@
+import io
 import os
 from django.core.files.base import ContentFile
 import csv
@@ -14,11 +15,14 @@ from django.conf import settings
 from django.core.cache import cache
 from django.db import connection, transaction
 from django.db.models import Q, F
+from django.http import StreamingHttpResponse
 from mooringlicensing.components.approvals.models import (
     Sticker, AnnualAdmissionPermit, AuthorisedUserPermit, DcvPermitDocument,
     MooringLicence, Approval, WaitingListAllocation,
     ApprovalHistory, DcvPermit, DcvAdmission, Approval, VesselOwnershipOnApproval
 )
+from mooringlicensing.components.approvals.pdf import generate_approval_docs, generate_dcv_permit_docs
+from mooringlicensing.components.approvals.sticker_printing import write_sticker_batch
 from mooringlicensing.components.compliances.models import Compliance
 from mooringlicensing.components.proposals.email import send_sticker_printing_batch_email
 from mooringlicensing.components.proposals.models import (
@@ -34,7 +38,13 @@ from ledger_api_client.managed_models import SystemUser
 from rest_framework import serializers
 from copy import deepcopy
 import logging
-from mooringlicensing.settings import MAX_NUM_ROWS_MODEL_EXPORT
+from mooringlicensing.settings import MAX_NUM_ROWS_MODEL_EXPORT, EXPORT_CHUNK_SIZE
+from mooringlicensing.components.main.sanitiser import (
+    remove_html_tags,
+    remove_script_tags,
+    sanitise_dict,
+    sanitise_instance,
+)
 from django.db.models import Case, Value, When, CharField, Count, OuterRef, Subquery, Min, Max
 from django.contrib.postgres.fields import ArrayField
 from django.db.models.functions import Concat, Cast
@@ -160,16 +170,21 @@ def create_pdf_licence(approvals):
         errors = []
         updates = []
 
+        #documents are converted to pdf in batches (a LibreOffice run per batch rather than per document)
+        if isinstance(approvals[0], DcvPermit):
+            targets = [a for a in approvals if len(a.dcv_permit_documents.all())==0]
+            failed = generate_dcv_permit_docs(targets)
+        else:
+            targets = [a for a in approvals if not hasattr(a, 'licence_document') or a.licence_document is None]
+            failed = generate_approval_docs(targets) #NOTE: this is exclusively called via mgt cmd. This does not need to be delayed but making a note in case things change.
+        failed_ids = [a.id for a, e in failed]
+
         for idx, a in enumerate(approvals):
-            try:
-                if isinstance(a, DcvPermit) and len(a.dcv_permit_documents.all())==0:
-                    a.generate_dcv_permit_doc()
-                elif not hasattr(a, 'licence_document') or a.licence_document is None: 
-                    a.generate_doc() #NOTE: this is exclusively called via mgt cmd. This does not need to be delayed but making a note in case things change.
-                print(f'{idx}, Created PDF for {permit_name}: {a}')
-                updates.append(a.lodgement_number)
-            except Exception as e:
-                errors.append(e)
+            if a.id in failed_ids:
+                continue
+            print(f'{idx}, Created PDF for {permit_name}: {a}')
+            updates.append(a.lodgement_number)
+        errors.extend([e for a, e in failed])
 
         return errors, updates
     else:
@@ -356,118 +371,46 @@ def sticker_export():
     """
     logger = logging.getLogger('cron_tasks')
 
-    stickers = Sticker.objects.filter(
-        sticker_printing_batch__isnull=True,
-        status=Sticker.STICKER_STATUS_READY,
-    )
-
     errors = []
     updates = []
     today = timezone.localtime(timezone.now()).date()
 
-    if stickers.count():
-        try:
-
-            data = []
-
-            data.append([
-                'Date',
-                'First Name',
-                'Last Name',
-                'Address Line 1',
-                'Address Line 2',
-                'Suburb',
-                'State',
-                'Postcode',
-                'Sticker Type',
-                'Sticker Number',
-                'Vessel Registration Number',
-                'Moorings',
-                'Length Colour',
-                'White info',
-                'Vessel Length',
-                'Season',
-            ])
-            for sticker in stickers:
-                try:
-                    # Sticker is being printed.  We assign a new number here.
-                    sticker.number = '{0:07d}'.format(sticker.next_number)
-                    sticker.save()
-
-                    moorings = sticker.get_moorings()
-                    mooring_names = [mooring.name for mooring in moorings]
-                    mooring_names = ', '.join(mooring_names)
+    stickers = Sticker.objects.filter(
+        sticker_printing_batch__isnull=True,
+        status=Sticker.STICKER_STATUS_READY,
+    )
+    if not stickers.exists():
+        return updates, errors
 
-                    if not sticker.postal_address_line1 or not sticker.postal_address_locality or not sticker.postal_address_state or not sticker.postal_address_postcode:
-                        logger.warning(f'Postal address not found for the Sticker: [{sticker}].')
-                        continue
-                    
-                    sticker_batch_property_values = [
-                        today.strftime('%d/%m/%Y'),
-                        sticker.first_name,
-                        sticker.last_name,
-                        sticker.postal_address_line1,
-                        sticker.postal_address_line2,
-                        sticker.postal_address_locality.upper(),
-                        sticker.postal_address_state.upper(),
-                        sticker.postal_address_postcode,
-                        sticker.approval.description,
-                        sticker.number,
-                        sticker.vessel_registration_number.upper(),
-                        mooring_names,
-                        sticker.get_sticker_colour(),
-                        sticker.get_white_info(),
-                        sticker.vessel_applicable_length,
-                        sticker.fee_season.name if sticker.fee_season and sticker.fee_season.name else ''
-                    ]
-
-                    sticker_batch_properties = {}
-                    for i in range (0,len(sticker_batch_property_values)-1):
-                        sticker_batch_properties[data[0][i].lower().replace(" ","_")] = sticker_batch_property_values[i]
-
-                    sticker.batch_property_cache = sticker_batch_properties
-                    data.append(sticker_batch_property_values)
-                    logger.info('Sticker: {} details added to the spreadsheet'.format(sticker.number))
-                    updates.append(sticker.number)
-                    sticker.save()
-                    new_approval_history_entry = ApprovalHistory.objects.create(
-                        vessel_ownership=sticker.approval.current_proposal.vessel_ownership,
-                        approval=sticker.approval,
-                        proposal=sticker.approval.current_proposal,
-                        start_date=sticker.approval.issue_date,
-                        approval_letter=sticker.approval.licence_document,
-                    )
-                    new_approval_history_entry.stickers.add(sticker)
-                    new_approval_history_entry.save()
-
-                except Exception as e:
-                    err_msg = 'Error adding sticker: {} details to spreadsheet.'.format(sticker.number)
-                    logger.error('{}\n{}'.format(err_msg, str(e)))
-                    errors.append(err_msg)
+    sticker_ids = []
+    try:
+        with transaction.atomic():
+            # The stickers of the batch are locked so that a concurrent run cannot export them again
+            stickers = stickers.select_for_update(of=('self',))
+            sticker_ids = list(stickers.values_list('id', flat=True))
+            stickers = Sticker.objects.filter(id__in=sticker_ids)
 
             batch_obj = StickerPrintingBatch.objects.create()
             filename = 'RIA-{}.csv'.format(batch_obj.uploaded_date.astimezone(pytz.timezone(TIME_ZONE)).strftime('%Y%m%d'))
 
-            csv_file = str(settings.BASE_DIR)+'/tmp/{}'.format(filename)
-            with open(csv_file, 'w', newline='') as new_file:
-                writer = csv.writer(new_file)
-                for i in data:
-                    writer.writerow(i)
+            csv_file = io.StringIO()
+            exported, errors = write_sticker_batch(stickers, csv_file, today)
+            updates = [sticker.number for sticker in exported]
 
-            with open(csv_file, 'rb') as f:
-                batch_obj._file.save(filename, ContentFile(f.read()), save=False)
-                batch_obj.name = filename
-                batch_obj.save()
-                logger.info('Sticker printing batch file {} generated successfully.'.format(batch_obj.name))
+            batch_obj._file.save(filename, ContentFile(csv_file.getvalue().encode('utf-8')), save=False)
+            batch_obj.name = filename
+            batch_obj.save()
+            logger.info('Sticker printing batch file {} generated successfully.'.format(batch_obj.name))
 
             # Update sticker objects
             stickers.update(
                 sticker_printing_batch=batch_obj,  # Keep status 'printing' because we still have to wait for the sticker printed.
             )
-        except Exception as e:
-            err_msg = 'Error generating the sticker printing batch spreadsheet file for the stickers: {}'.format(', '.join([sticker.number for sticker in stickers]))
-            logger.error('{}\n{}'.format(err_msg, str(e)))
-            errors.append(err_msg)
+    except Exception as e:
+        err_msg = 'Error generating the sticker printing batch spreadsheet file for the stickers: {}'.format(', '.join([str(sticker_id) for sticker_id in sticker_ids]))
+        logger.error('{}\n{}'.format(err_msg, str(e)))
+        errors.append(err_msg)
+        updates = []
     return updates, errors
 
 
@@ -573,11 +516,11 @@ def get_removed_vessels_in_current_season(approval):
 
     vessel_ownership_ids = list(set(vessel_ownership_ids))
 
-    if type(approval.child_obj) in [AnnualAdmissionPermit, AuthorisedUserPermit]:
+    if approval.child_type in [AnnualAdmissionPermit.code, AuthorisedUserPermit.code]:
         #if the vo has an end date OR is not the current proposal's vo, include in list
         current_vo_id = approval.current_proposal.vessel_ownership.id if approval.current_proposal.vessel_ownership else None
         return VesselOwnership.objects.filter(id__in=vessel_ownership_ids).filter(Q(end_date__isnull=False)|~Q(id=current_vo_id))
-    elif type(approval.child_obj) == MooringLicence:
+    elif approval.child_type == MooringLicence.code:
         #if the vo has an end date OR is not on a current vooa for the approval, include in list
         current_vooa_ids = list(approval.child_obj.get_current_vessel_ownership_on_approvals().values_list("vessel_ownership_id",flat=True))
         return VesselOwnership.objects.filter(id__in=vessel_ownership_ids).filter(Q(end_date__isnull=False)|~Q(id__in=current_vooa_ids))
@@ -588,18 +531,18 @@ def export_to_mooring_booking(approval_id):
         approval = Approval.objects.get(id=approval_id)
         status = 'active' if approval.status == 'current' else 'cancelled'
         licence_type = None
-        if type(approval.child_obj) == MooringLicence:
+        if approval.child_type == MooringLicence.code:
             licence_type = 1
-        elif type(approval.child_obj) == AuthorisedUserPermit:
+        elif approval.child_type == AuthorisedUserPermit.code:
             licence_type = 2
-        elif type(approval.child_obj) == AnnualAdmissionPermit:
+        elif approval.child_type == AnnualAdmissionPermit.code:
             licence_type = 3
 
         errors = []
         updates = []
         
         if (approval 
-            and type(approval.child_obj) in [AnnualAdmissionPermit, AuthorisedUserPermit] 
+            and approval.child_type in [AnnualAdmissionPermit.code, AuthorisedUserPermit.code] 
             and approval.current_proposal 
             and approval.current_proposal.vessel_ownership and not approval.current_proposal.vessel_ownership.end_date and approval.current_proposal.vessel_ownership.vessel):
             myobj = {
@@ -620,7 +563,7 @@ def export_to_mooring_booking(approval_id):
                 updates.append('approval_id: {}, vessel_id: {}'.format(approval.id, approval.current_proposal.vessel_ownership.vessel.id))
             else:
                 errors.append('approval_id: {}, vessel_id: {}, error_message: {}'.format(approval.id, approval.current_proposal.vessel_ownership.vessel.id, resp.text))
-        elif approval and type(approval.child_obj) == MooringLicence:
+        elif approval and approval.child_type == MooringLicence.code:
             for vessel_ownership in approval.child_obj.vessel_ownership_list:
                 if vessel_ownership.vessel:
                     myobj = {
@@ -780,48 +723,6 @@ def reorder_wla(target_bay):
         logger.info(f'Allocation order: [{w.wla_order}] has been set to the WaitingListAllocation: [{w}].')
         place += 1
 
-def remove_html_tags(text):
-
-    if text is None:
-        return None
-
-    HTML_TAGS_WRAPPED = re.compile(r'<[^>]+>.+</[^>]+>')
-    HTML_TAGS_NO_WRAPPED = re.compile(r'<[^>]+>')
-
-    text = HTML_TAGS_WRAPPED.sub('', text)
-    text = HTML_TAGS_NO_WRAPPED.sub('', text)
-    return text
-
-def remove_script_tags(text):
-
-    if text is None:
-        return None
-
-    SCRIPT_TAGS_WRAPPED = re.compile(r'(?i)<script[^>]+>.+</script[^>]+>')
-    SCRIPT_TAGS_NO_WRAPPED = re.compile(r'(?i)<script[^>]+>')
-
-    text = SCRIPT_TAGS_WRAPPED.sub('', text)
-    text = SCRIPT_TAGS_NO_WRAPPED.sub('', text)
-
-    ATTR_BLACKLIST = ['onresize','onvolumechange','onsuspend','onpopstate','onbeforeunload','oncontextmenu',
-        'ondragstart','oncuechange','onselect','onafterprint','onmouseover','ondragleave','onstorage',
-        'onbeforeprint','onhashchange','onabort','ondragover','onwaiting','onclick','onmousemove','onkeyup',
-        'onmousedown','ononline','onsearch','onprogress','onfocus','onmouseup','onplaying','onstalled','oninvalid',
-        'ontimeupdate','onkeypress','onseeked','onreset','onwheel','onemptied','oninput','onpagehide','onpause',
-        'onloadeddata','onseeking','onunload','onpageshow','onerror','ondrop','oncanplay','oncopy','onended','oncut',
-        'onsubmit','ondrag','onblur','ondragend','onplay','onratechange','onloadedmetadata','oncanplaythrough',
-        'ondurationchange','onchange','ondblclick','onmousewheel','onpaste','onload','onscroll','onkeydown',
-        'ontoggle','onmouseout','onoffline','onloadstart','ondragenter']
-    ATTR_BLACKLIST_STR=('|').join(ATTR_BLACKLIST)
-
-    HTML_TAGS_WITH_ATTR_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>.+</[^>]+>')
-    HTML_TAGS_WITH_ATTR_NO_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>')
-
-    text = HTML_TAGS_WITH_ATTR_WRAPPED.sub('', text)
-    text = HTML_TAGS_WITH_ATTR_NO_WRAPPED.sub('', text)
-
-    return text
-
 def is_json(value):
     try:
         json.loads(value)
@@ -830,126 +731,9 @@ def is_json(value):
     return True
 
 def sanitise_fields(instance, exclude=[], error_on_change=[]):
-    if hasattr(instance,"__dict__"):
-        for i in instance.__dict__:
-            #remove html tags for all string fields not in the exclude list
-            if not i in exclude and (isinstance(instance.__dict__[i], dict)):
-                instance.__dict__[i] = sanitise_fields(instance.__dict__[i])
-            
-            elif isinstance(instance.__dict__[i], list) and not i in exclude:
-                for j in range(0, len(instance.__dict__[i])):
-                    check = instance.__dict__[i][j]
-                    if isinstance(instance.__dict__[i][j],str):
-                        instance.__dict__[i][j] = remove_html_tags(instance.__dict__[i][j])
-                    elif isinstance(instance.__dict__[i][j], list) or isinstance(instance.__dict__[i][j], dict):
-                        instance.__dict__[i][j] = sanitise_fields(instance.__dict__[i][j])
-                    if i in error_on_change and check != instance.__dict__[i][j]:
-                        raise serializers.ValidationError("html tags included in field")
-            
-            elif isinstance(instance.__dict__[i], str) and not i in exclude:
-                check = instance.__dict__[i]
-                setattr(instance, i, remove_html_tags(instance.__dict__[i]))
-                if i in error_on_change and check != instance.__dict__[i]:
-                    #only fields that cannot be allowed to change through sanitisation just before saving will throw an error
-                    raise serializers.ValidationError("html tags included in field")
-            elif isinstance(instance.__dict__[i], str) and i in exclude:
-                #even though excluded, we still check to remove script tags
-                setattr(instance, i, remove_script_tags(instance.__dict__[i]))
-                if i in error_on_change and check != instance.__dict__[i]:
-                    #only fields that cannot be allowed to change through sanitisation just before saving will throw an error
-                    raise serializers.ValidationError("script tags included in field")
-            elif (isinstance(instance.__dict__[i], list) or isinstance(instance.__dict__[i], dict)) and i in exclude:
-                #if we have reached this point, it means we have a json object with fields that are allowed to contain tags
-                #we'll use . notation to identify sub fields that should be carried over to the exclude and error on change lists
-                #NOTE: to allow sub fields to be sanitised, the parent field should be included in both lists required for their respective children
-                sub_exclude_list = list(filter(lambda e:e.startswith(i+"."), exclude))
-                exclude_list = list(map(lambda e:e.replace(i+".","",1), sub_exclude_list))
-                #NOTE: a sub error on change list will require the parent field to be in the exclude list, to reach this point (but not necessarily in the error_on_change list)
-                sub_error_on_change_list = list(filter(lambda e:e.startswith(i+"."), error_on_change))
-                error_on_change_list = list(map(lambda e:e.replace(i+".","",1), sub_error_on_change_list))
-
-                if isinstance(instance.__dict__[i], dict):
-                    check = instance.__dict__[i]
-                    instance.__dict__[i] = sanitise_fields(instance.__dict__[i], exclude=exclude_list, error_on_change=error_on_change_list)
-                    if i in error_on_change and check != instance.__dict__[i]:
-                        raise serializers.ValidationError("html tags included in field")
-                elif isinstance(instance.__dict__[i], list):
-                    for j in range(0, len(instance.__dict__[i])):
-                        check = instance.__dict__[i][j]
-                        if isinstance(instance.__dict__[i][j],str):
-                            #strings in an excluded list will be treated as excluded
-                            instance.__dict__[i][j] = remove_script_tags(instance.__dict__[i][j])
-                        elif isinstance(instance.__dict__[i][j], list) or isinstance(instance.__dict__[i][j], dict):
-                            instance.__dict__[i][j] = sanitise_fields(instance.__dict__[i][j], exclude=exclude_list, error_on_change=error_on_change_list)
-                        if i in error_on_change and check != instance.__dict__[i][j]:
-                            raise serializers.ValidationError("html tags included in field")
-    else:
-        remove_keys = []
-        for i in instance:
-            #for dicts we also check the keys - they are removed completely if not sanitary (should not change keys)
-            original_key = i
-            if isinstance(original_key, str):
-                sanitised_key = remove_html_tags(i)
-                if original_key != sanitised_key:
-                    remove_keys.append(original_key)
-                    continue
-
-            #remove html tags for all string fields not in the exclude list
-            if not i in exclude and (isinstance(instance[i], dict)):
-                instance[i] = sanitise_fields(instance[i])
-
-            elif isinstance(instance[i], list) and not i in exclude:
-                for j in range(0, len(instance[i])):
-                    check = instance[i][j]
-                    if isinstance(instance[i][j],str):
-                        instance[i][j] = remove_html_tags(instance[i][j])
-                    elif isinstance(instance[i][j], list) or isinstance(instance[i][j], dict):
-                        instance[i][j] = sanitise_fields(instance[i][j])
-                    if i in error_on_change and check != instance[i][j]:
-                        raise serializers.ValidationError("html tags included in field")
-
-            else:
-                if isinstance(instance[i], str) and not i in exclude:
-                    check = instance[i]
-                    instance[i] = remove_html_tags(instance[i])
-                    if i in error_on_change and check != instance[i]:
-                        #only fields that cannot be allowed to change through sanitisation just before saving will throw an error
-                        raise serializers.ValidationError("html tags included in field")
-                elif isinstance(instance[i], str) and i in exclude:
-                    #even though excluded, we still check to remove script tags
-                    instance[i] = remove_script_tags(instance[i])
-                    if i in error_on_change and check != instance[i]:
-                        #only fields that cannot be allowed to change through sanitisation just before saving will throw an error
-                        raise serializers.ValidationError("script tags included in field")
-                elif (isinstance(instance[i], list) or isinstance(instance[i], dict)) and i in exclude:
-                    #if we have reached this point, it means we have a json object with fields that are allowed to contain tags
-                    #we'll use . notation to identify sub fields that should be carried over to the exclude and error on change lists
-                    #NOTE: to allow sub fields to be sanitised, the parent field should be included in both lists required for their respective children
-                    sub_exclude_list = list(filter(lambda e:e.startswith(i+"."), exclude))
-                    exclude_list = list(map(lambda e:e.replace(i+".","",1), sub_exclude_list))
-                    #NOTE: a sub error on change list will require the parent field to be in the exclude list, to reach this point (but not necessarily in the error_on_change list)
-                    sub_error_on_change_list = list(filter(lambda e:e.startswith(i+"."), error_on_change))
-                    error_on_change_list = list(map(lambda e:e.replace(i+".","",1), sub_error_on_change_list))
-
-                    if isinstance(instance[i], dict):
-                        check = instance[i]
-                        instance[i] = sanitise_fields(instance[i], exclude=exclude_list, error_on_change=error_on_change_list)
-                        if i in error_on_change and check != instance[i]:
-                            raise serializers.ValidationError("script tags included in field")
-                    elif isinstance(instance[i], list):                        
-                        for j in range(0, len(instance[i])):
-                            check = instance[i][j]
-                            if isinstance(instance[i][j],str):
-                                #strings in an excluded list will be treated as excluded
-                                instance[i][j] = remove_script_tags(instance[i][j])
-                            elif isinstance(instance[i][j], list) or isinstance(instance[i][j], dict):
-                                instance[i][j] = sanitise_fields(instance[i][j], exclude=exclude_list, error_on_change=error_on_change_list)
-                            if i in error_on_change and check != instance[i][j]:
-                                raise serializers.ValidationError("script tags included in field")
-                    
-        for i in remove_keys:
-            del instance[i]
-    return instance
+    if hasattr(instance, "_meta") and hasattr(instance, "__dict__"):
+        return sanitise_instance(instance, exclude, error_on_change)
+    return sanitise_dict(instance, exclude, error_on_change)
 
 def file_extension_valid(file, whitelist, model):
     _, extension = os.path.splitext(file)
@@ -962,15 +746,20 @@ def file_extension_valid(file, whitelist, model):
 
     return valid
 
-def check_file(file, model_name):
+def get_file_extension_whitelist():
     from mooringlicensing.components.main.models import FileExtensionWhitelist
 
-    # check if extension in whitelist
     cache_key = settings.CACHE_KEY_FILE_EXTENSION_WHITELIST
     whitelist = cache.get(cache_key)
     if whitelist is None:
         whitelist = FileExtensionWhitelist.objects.all()
         cache.set(cache_key, whitelist, settings.CACHE_TIMEOUT_2_HOURS)
+    return whitelist
+
+
+def check_file(file, model_name):
+    # check if extension in whitelist
+    whitelist = get_file_extension_whitelist()
 
     valid = file_extension_valid(str(file), whitelist, model_name)
 
@@ -1208,19 +997,26 @@ def exportModelData(model, filters, num_records):
     else:
         return
 
+def iterateExportRows(data):
+    #rows are fetched from the database in chunks as they are written out rather than being loaded all at once
+    return data.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+def getExportFileName(model, extension):
+    return str(settings.BASE_DIR)+'/tmp/{}_{}_{}.{}'.format(model,uuid.uuid4(),int(datetime.datetime.now().timestamp()*100000),extension)
+
 def csvExportData(model, header, columns):
     
-    csv_file = str(settings.BASE_DIR)+'/tmp/{}_{}_{}.csv'.format(model,uuid.uuid4(),int(datetime.datetime.now().timestamp()*100000))
+    csv_file = getExportFileName(model, 'csv')
     with open(csv_file, 'w', newline='') as new_file:
         writer = csv.writer(new_file)
         writer.writerow(header)
-        for i in columns:
-            writer.writerow(i)
+        writer.writerows(columns)
     return csv_file
 
 def excelExportData(model, header, columns):
-    excel_file = str(settings.BASE_DIR)+'/tmp/{}_{}_{}.xlsx'.format(model,uuid.uuid4(),int(datetime.datetime.now().timestamp()*100000))
-    workbook = xlsxwriter.Workbook(excel_file) 
+    excel_file = getExportFileName(model, 'xlsx')
+    #constant_memory flushes each row to disk once the next row is started
+    workbook = xlsxwriter.Workbook(excel_file, {'constant_memory': True})
     worksheet = workbook.add_worksheet("{} Report".format(model.capitalize()))
     format = workbook.add_format()
 
@@ -1232,28 +1028,78 @@ def excelExportData(model, header, columns):
     for i in header:
         worksheet.write(row, col, str(i), format)
         col_lens[col] = len(str(i))+2
-        worksheet.set_column(col, col, col_lens[col])
         col += 1
     col = 0 
     row += 1
     for i in columns:
         for j in i:
-            worksheet.write(row, col, str(j), format)
-            if len(str(j)) > col_lens[col]:
-                col_lens[col] = len(str(j))+2
-                worksheet.set_column(col, col, col_lens[col])
+            value = str(j)
+            worksheet.write(row, col, value, format)
+            if len(value) > col_lens[col]:
+                col_lens[col] = len(value)+2
             col += 1
         col = 0
         row += 1
 
+    #column widths are only set once all the rows have been written
+    for col in range(len(col_lens)):
+        worksheet.set_column(col, col, col_lens[col])
+
     workbook.close() 
 
     return excel_file
 
+class Echo:
+    """
+    File-like object that returns what is written to it, for csv.writer to stream rows with
+    """
+    def write(self, value):
+        return value
+
+def streamExportData(model, data, format):
+    """
+    Return a StreamingHttpResponse to download the export of data directly
+    """
+    export_fields = getExportFields(model, data)
+    if not export_fields:
+        return
+    header, columns = export_fields
+
+    if format == "excel":
+        if os.path.isdir(str(settings.BASE_DIR)+'/tmp/') is False:
+            os.makedirs(str(settings.BASE_DIR)+'/tmp/')
+        #an xlsx file is a zip archive, so it is built on disk before being streamed
+        file_name = excelExportData(model, header, columns)
+
+        def stream_file():
+            try:
+                with open(file_name, 'rb') as f:
+                    while True:
+                        chunk = f.read(65536)
+                        if not chunk:
+                            break
+                        yield chunk
+            finally:
+                os.remove(file_name)
+
+        response = StreamingHttpResponse(stream_file(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = 'attachment; filename="Mooring Licensing - {} Report.xlsx"'.format(model.capitalize())
+    else:
+        writer = csv.writer(Echo())
+
+        def stream_rows():
+            yield writer.writerow(header)
+            for row in columns:
+                yield writer.writerow(row)
+
+        response = StreamingHttpResponse(stream_rows(), content_type='application/csv')
+        response['Content-Disposition'] = 'attachment; filename="Mooring Licensing - {} Report.csv"'.format(model.capitalize())
+    return response
+
 def getProposalExportFields(data):
     header = ["Lodgement Number", "Type", "Category" , "Applicant", "Status", "Auto Approved","Lodged On", "Application Vessel Rego No", "Application Vessel Length", "Application Vessel Draft", "Application Vessel Weight", "Invoice Properties"]
 
-    columns = list(data.annotate(type=
+    columns = iterateExportRows(data.annotate(type=
         Case(
             When(
                 lodgement_number__startswith='ML',
@@ -1301,7 +1147,7 @@ def getProposalExportFields(data):
 def getApprovalExportFields(data):
     header = ["Number", "Application Number", "Type", "Sticker Number/s" , "Sticker Mailed Date/s", "Holder", "Holder Email", "Holder Mobile Number", "Holder Phone Number", "Status", "Mooring", "Issue Date", "Start Date", "Expiry Date", "Vessel Registration"]
 
-    columns = list(data.annotate(type=
+    columns = iterateExportRows(data.annotate(type=
         Case(
             When(
                 lodgement_number__startswith='MOL',
@@ -1393,7 +1239,7 @@ def getApprovalExportFields(data):
 def getComplianceExportFields(data):
     header = ["Lodgement Number", "Type", "Approval Number", "Holder", "Holder Email", "Holder Mobile Number", "Holder Phone Number", "Status", "Due Date"]
 
-    columns = list(data.annotate(type=
+    columns = iterateExportRows(data.annotate(type=
         Case(
             When(
                 approval__lodgement_number__startswith='MOL',
@@ -1434,7 +1280,7 @@ def getComplianceExportFields(data):
 def getWaitingListExportFields(data):
     header = ["Lodgement Number", "Holder", "Holder Email", "Holder Mobile Number", "Holder Phone Number", "Status", "Bay", "Issue Date", "Start Date", "Expiry Date", "Vessel Registration"]
 
-    columns = list(data.annotate(
+    columns = iterateExportRows(data.annotate(
         holder=Concat(
             'current_proposal__proposal_applicant__first_name',
             Value(" "),
@@ -1469,7 +1315,7 @@ def getWaitingListExportFields(data):
 def getMooringExportFields(data):
     header = ["Mooring", "Bay", "Status", "Holder", "Holder Email", "Holder Mobile Number", "Holder Phone Number", "Authorised User Permits (RIA)", "Authorised User Permits (LIC)", "Max Vessel Length (M)", "Max Vessel Draft (M)"]
 
-    columns = list(data.annotate(
+    columns = iterateExportRows(data.annotate(
         holder=Concat(
             'mooring_licence__current_proposal__proposal_applicant__first_name',
             Value(" "),
@@ -1548,7 +1394,7 @@ def getMooringExportFields(data):
 def getDcvPermitExportFields(data):
     header = ["Lodgement Number", "Organisation", "Status", "Invoice Properties", "Season", "Sticker", "Vessel Registration"]
 
-    columns = list(data.annotate(
+    columns = iterateExportRows(data.annotate(
         sticker_numbers=ArrayAgg(
             'stickers__number', 
             filter=(
@@ -1572,7 +1418,7 @@ def getDcvPermitExportFields(data):
 def getDcvAdmissionExportFields(data):
     header = ["Lodgement Number", "Invoice Properties", "Arrival Dates", "Lodgement Date"]
 
-    columns = list(data.annotate(
+    columns = iterateExportRows(data.annotate(
         arrival_dates=ArrayAgg(
             Cast('dcv_admission_arrivals__arrival_date', CharField()),
             distinct=True
@@ -1622,7 +1468,7 @@ def getStickerExportFields(data):
         ).values('vessel_length')[:1]
     )
 
-    columns = list(
+    columns = iterateExportRows(
     data.annotate(
         holder=Concat(
             'approval__current_proposal__proposal_applicant__first_name',
@@ -1756,7 +1602,7 @@ def getStickerExportFields(data):
 def getSystemUserExportFields(data):
     header = ["Ledger ID", "Account Name", "Legal Name", "Legal DOB", "Email"]
 
-    columns = list(data.annotate(
+    columns = iterateExportRows(data.annotate(
         account_name=Concat(
             'first_name',
             Value(" "),
@@ -1792,7 +1638,7 @@ def getInvoiceExportFields(data):
     for i in sticker_action_references:
         sticker_action_references_dict[i["invoice_reference"]] = i["sticker_action_details__approval__lodgement_number"] 
 
-    columns = list(data.annotate(
+    columns = iterateExportRows(data.annotate(
         fee_source_type=Case(
             When(
                 reference__in=application_references_dict,
@@ -1834,41 +1680,49 @@ def getInvoiceExportFields(data):
         )
     )
 
-    for i in range(len(columns)):
-        values = list(columns[i])
-        if values[2] == "Application":
-            values[1] = application_references_dict[values[1]]
-        if values[2] == "Sticker Action":
-            values[1] = sticker_action_references_dict[values[1]]
-        columns[i] = tuple(values)
+    def replace_fee_source(rows):
+        for row in rows:
+            values = list(row)
+            if values[2] == "Application":
+                values[1] = application_references_dict[values[1]]
+            if values[2] == "Sticker Action":
+                values[1] = sticker_action_references_dict[values[1]]
+            yield tuple(values)
 
-    return header, columns
+    return header, replace_fee_source(columns)
 
-def formatExportData(model, data, format):
+def getExportFields(model, data):
 
     if model == "proposal":
-        header, columns = getProposalExportFields(data)
+        return getProposalExportFields(data)
     elif model == "approval": #exclude waiting list
-        header, columns = getApprovalExportFields(data)
+        return getApprovalExportFields(data)
     elif model == "compliance":
-        header, columns = getComplianceExportFields(data)
+        return getComplianceExportFields(data)
     elif model == "waiting_list":
-        header, columns = getWaitingListExportFields(data)
+        return getWaitingListExportFields(data)
     elif model == "mooring":
-        header, columns = getMooringExportFields(data)
+        return getMooringExportFields(data)
     elif model == "dcv_permit":
-        header, columns = getDcvPermitExportFields(data)
+        return getDcvPermitExportFields(data)
     elif model == "dcv_admission":
-        header, columns = getDcvAdmissionExportFields(data)
+        return getDcvAdmissionExportFields(data)
     elif model == "sticker":
-        header, columns = getStickerExportFields(data)
+        return getStickerExportFields(data)
     elif model == "system_user":
-        header, columns = getSystemUserExportFields(data)
+        return getSystemUserExportFields(data)
     elif model == "invoice":
-        header, columns = getInvoiceExportFields(data)
+        return getInvoiceExportFields(data)
     else:
         return
 
+def formatExportData(model, data, format):
+
+    export_fields = getExportFields(model, data)
+    if not export_fields:
+        return
+    header, columns = export_fields
+
     if os.path.isdir(str(settings.BASE_DIR)+'/tmp/') is False:
         os.makedirs(str(settings.BASE_DIR)+'/tmp/')
 
@@ -1877,10 +1731,12 @@ def formatExportData(model, data, format):
         file_buffer = None
         with open(file_name, 'rb') as f:
             file_buffer = f.read()    
+        os.remove(file_name)
         return ('Mooring Licensing - {} Report.xlsx'.format(model.capitalize()), file_buffer, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     else:
         file_name =  csvExportData(model, header, columns)
         file_buffer = None
         with open(file_name, 'rb') as f:
             file_buffer = f.read()    
+        os.remove(file_name)
         return ('Mooring Licensing - {} Report.csv'.format(model.capitalize()), file_buffer, 'application/csv')
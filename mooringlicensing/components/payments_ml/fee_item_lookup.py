@@ -0,0 +1,164 @@
+import datetime
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+logger = logging.getLogger(__name__)
+
+#the version of a fee constructor's lookup table is shared between processes through the cache,
+#so a change made in one process rebuilds the table in every other process on its next lookup
+VERSION_CACHE_KEY = 'fee_item_lookup_version_{}'
+
+NULL_VESSEL_CATEGORY_NOT_FOUND = 'Null vessel size category not found under the vessel size category group: {}'
+VESSEL_SIZE_CATEGORY_NOT_FOUND = 'Provided vessel dimensions do not fit any existing vessel size categories.'
+
+_tables = {}
+_lock = threading.Lock()
+
+
+def _get_id(obj):
+    if obj is None:
+        return None
+    return obj.id if hasattr(obj, 'id') else obj
+
+
+def _values(queryset):
+    """
+    The field values of the objects of the queryset, as (field names, [values]), to build new instances from
+    """
+    field_names = [field.attname for field in queryset.model._meta.concrete_fields]
+    return field_names, list(queryset.values_list(*field_names))
+
+
+def _instance(model, field_names, values):
+    """
+    A new instance for every lookup, so that a change made to it by the caller is never seen by the other lookups
+    """
+    return model.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
+
+def get_version(fee_constructor_id):
+    return cache.get_or_set(VERSION_CACHE_KEY.format(fee_constructor_id), uuid.uuid4().hex, None)
+
+
+def invalidate(fee_constructor_id):
+    """
+    Discard the lookup table of the fee constructor in this and every other process.
+    The new version is only published once the transaction has been committed, so no process can build a table from uncommitted data.
+    """
+    def _invalidate():
+        cache.set(VERSION_CACHE_KEY.format(fee_constructor_id), uuid.uuid4().hex, None)
+        with _lock:
+            _tables.pop(fee_constructor_id, None)
+
+    with _lock:
+        _tables.pop(fee_constructor_id, None)
+    transaction.on_commit(_invalidate)
+
+
+class FeeItemLookupTable(object):
+    """
+    In memory copy of the field values of the fee periods, vessel size categories and fee items of a fee constructor.
+    The lookups return new instances built from the values.
+    """
+
+    def __init__(self, fee_constructor, version):
+        from mooringlicensing.components.main.models import VesselSizeCategory
+        from mooringlicensing.components.payments_ml.models import FeeItem, FeePeriod
+
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.vessel_size_category_group = str(fee_constructor.vessel_size_category_group)
+
+        fee_periods = fee_constructor.fee_season.fee_periods.exclude(start_date=None).order_by('start_date', 'id') if fee_constructor.fee_season else FeePeriod.objects.none()
+        self.fee_period_fields, self.fee_periods = _values(fee_periods)
+        start_date_index = self.fee_period_fields.index('start_date')
+        self.fee_period_start_dates = [fee_period[start_date_index] for fee_period in self.fee_periods]
+
+        self.vessel_size_category_fields, vessel_size_categories = _values(
+            VesselSizeCategory.objects.filter(vessel_size_category_group_id=fee_constructor.vessel_size_category_group_id).order_by('start_size', 'id')
+        )
+        null_vessel_index = self.vessel_size_category_fields.index('null_vessel')
+        self.null_vessel_categories = [category for category in vessel_size_categories if category[null_vessel_index]]
+        self.vessel_size_categories = [category for category in vessel_size_categories if not category[null_vessel_index]]
+        start_size_index = self.vessel_size_category_fields.index('start_size')
+        include_start_size_index = self.vessel_size_category_fields.index('include_start_size')
+        self.start_sizes = [float(category[start_size_index]) for category in self.vessel_size_categories]
+        self.include_start_sizes = [category[include_start_size_index] for category in self.vessel_size_categories]
+
+        self.fee_item_fields, fee_items = _values(FeeItem.objects.filter(fee_constructor=fee_constructor).order_by('-id'))
+        key_indexes = [self.fee_item_fields.index(field_name) for field_name in (
+            'fee_period_id', 'vessel_size_category_id', 'proposal_type_id', 'age_group_id', 'admission_type_id',
+        )]
+        self.fee_items = {}
+        for fee_item in fee_items:
+            #when there are duplicates, the item with the lowest id is kept
+            self.fee_items[tuple(fee_item[index] for index in key_indexes)] = fee_item
+
+    def get_fee_period(self, target_date):
+        from mooringlicensing.components.payments_ml.models import FeePeriod
+        if isinstance(target_date, datetime.datetime):
+            target_date = target_date.date()
+        index = bisect_right(self.fee_period_start_dates, target_date)
+        return _instance(FeePeriod, self.fee_period_fields, self.fee_periods[index - 1]) if index else None
+
+    def _vessel_size_category(self, values):
+        from mooringlicensing.components.main.models import VesselSizeCategory
+        return _instance(VesselSizeCategory, self.vessel_size_category_fields, values)
+
+    def get_null_vessel_category(self):
+        if len(self.null_vessel_categories) == 1:
+            return self._vessel_size_category(self.null_vessel_categories[0])
+        msg = NULL_VESSEL_CATEGORY_NOT_FOUND.format(self.vessel_size_category_group)
+        logger.error(msg)
+        raise ValueError(msg)
+
+    def get_vessel_size_category(self, vessel_length):
+        if vessel_length is None:
+            raise ValueError(VESSEL_SIZE_CATEGORY_NOT_FOUND)
+        vessel_length = float(vessel_length)
+        index = bisect_right(self.start_sizes, vessel_length)
+        if not index:
+            raise ValueError(VESSEL_SIZE_CATEGORY_NOT_FOUND)
+        index -= 1
+        if self.start_sizes[index] == vessel_length and not self.include_start_sizes[index]:
+            #one smaller category
+            index = self.start_sizes.index(vessel_length) - 1
+            return self._vessel_size_category(self.vessel_size_categories[index]) if index >= 0 else None
+        return self._vessel_size_category(self.vessel_size_categories[index])
+
+    def get_fee_item(self, vessel_size_category, fee_period, proposal_type=None, age_group=None, admission_type=None):
+        from mooringlicensing.components.payments_ml.models import FeeItem
+        fee_item = self.fee_items.get((
+            _get_id(fee_period),
+            _get_id(vessel_size_category),
+            _get_id(proposal_type),
+            _get_id(age_group),
+            _get_id(admission_type),
+        ))
+        return _instance(FeeItem, self.fee_item_fields, fee_item) if fee_item else None
+
+
+def get_lookup_table(fee_constructor):
+    """
+    Return the lookup table of the fee constructor, (re)building it when its version has changed.
+    The version is read from the shared cache at most every FEE_ITEM_LOOKUP_VERSION_CHECK_INTERVAL seconds;
+    the changes made in this process discard the table at once.
+    """
+    table = _tables.get(fee_constructor.id)
+    if table is not None and time.monotonic() - table.checked_at < settings.FEE_ITEM_LOOKUP_VERSION_CHECK_INTERVAL:
+        return table
+    version = get_version(fee_constructor.id)
+    if table is not None and table.version == version:
+        table.checked_at = time.monotonic()
+        return table
+    table = FeeItemLookupTable(fee_constructor, version)
+    with _lock:
+        _tables[fee_constructor.id] = table
+    return table
@@ -0,0 +1,148 @@
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from mooringlicensing import settings
+from mooringlicensing.components.payments_ml.models import InvoicePropertySyncRequest
+from mooringlicensing.ledger_api_utils import fill_invoice_property_caches
+
+logger = logging.getLogger(__name__)
+
+#an invoice with this payment status does not change any more, so it is not refreshed by the reconciliation
+FINAL_PAYMENT_STATUSES = ('paid',)
+
+
+def get_model(object_type):
+    from mooringlicensing.components.approvals.models import DcvAdmission, DcvPermit, Sticker
+    from mooringlicensing.components.proposals.models import Proposal
+    return {
+        InvoicePropertySyncRequest.OBJECT_TYPE_PROPOSAL: Proposal,
+        InvoicePropertySyncRequest.OBJECT_TYPE_STICKER: Sticker,
+        InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION: DcvAdmission,
+        InvoicePropertySyncRequest.OBJECT_TYPE_DCV_PERMIT: DcvPermit,
+    }[object_type]
+
+
+def request_sync(object_type, object_ids):
+    """
+    Ask for the invoice_property_cache of the objects to be refreshed by the next sync_invoice_properties run.
+    Only costs an upsert, an object already waiting is moved back to the end of the queue.
+    """
+    requested_at = timezone.now()
+    InvoicePropertySyncRequest.objects.bulk_create(
+        [InvoicePropertySyncRequest(object_type=object_type, object_id=object_id, requested_at=requested_at) for object_id in set(object_ids) if object_id],
+        update_conflicts=True,
+        unique_fields=['object_type', 'object_id'],
+        update_fields=['requested_at'],
+    )
+
+
+def _refresh(object_type, objs):
+    """
+    Returns (number of objects refreshed, objects with an invoice which could not be fetched)
+    """
+    objs = list(objs)
+    failed_objs = []
+    if objs:
+        failed_objs = fill_invoice_property_caches(objs, only_empty=False, use_cache=False)
+        logger.info(f'invoice_property_cache of {len(objs) - len(failed_objs)} {object_type}(s) refreshed, {len(failed_objs)} failed.')
+    return len(objs), failed_objs
+
+
+def refresh(object_type, object_ids):
+    """
+    Refresh the invoice_property_caches of the objects now with one batched fetch, e.g. once their invoices have been paid,
+    and drop their requests.  The requests of the objects whose invoices could not all be fetched are kept for the next
+    sync_invoice_properties run.
+    Returns the number of objects refreshed.
+    """
+    started_at = timezone.now()
+    object_ids = set(object_ids)
+    count, failed_objs = _refresh(object_type, get_model(object_type).objects.filter(id__in=object_ids))
+    InvoicePropertySyncRequest.objects.filter(
+        object_type=object_type,
+        object_id__in=object_ids - {obj.id for obj in failed_objs},
+        requested_at__lte=started_at,
+    ).delete()
+    return count
+
+
+def refresh_on_commit(object_type, object_ids):
+    """
+    Refresh the invoice_property_caches of the objects once the transaction has been committed (see refresh), for the
+    payment to show straight away rather than after the next sync_invoice_properties run.
+    A failure is logged and never affects the payment; the objects are then refreshed by the sync.
+    """
+    object_ids = list(object_ids)
+
+    def _refresh_now():
+        try:
+            refresh(object_type, object_ids)
+        except Exception as e:
+            logger.exception(f'Failed to refresh the invoice_property_cache of the {object_type}(s): [{object_ids}].  Error: [{e}]')
+    transaction.on_commit(_refresh_now)
+
+
+def sync_requested(batch_size):
+    """
+    Refresh the invoice_property_caches of up to batch_size requested objects, oldest requests first.
+    The requests of the objects whose invoices could not all be fetched are kept for the next run.
+    Returns the number of objects refreshed.
+    """
+    started_at = timezone.now()
+    requests = list(InvoicePropertySyncRequest.objects.order_by('requested_at', 'id')[:batch_size])
+    object_ids = {}
+    for sync_request in requests:
+        object_ids.setdefault(sync_request.object_type, []).append(sync_request.object_id)
+
+    refreshed = 0
+    failed = set()
+    for object_type, ids in object_ids.items():
+        count, failed_objs = _refresh(object_type, get_model(object_type).objects.filter(id__in=ids))
+        refreshed += count
+        failed |= {(object_type, obj.id) for obj in failed_objs}
+
+    # Requests made during the refresh have a later requested_at, they are kept for the next run
+    InvoicePropertySyncRequest.objects.filter(
+        id__in=[sync_request.id for sync_request in requests if (sync_request.object_type, sync_request.object_id) not in failed],
+        requested_at__lte=started_at,
+    ).delete()
+    return refreshed
+
+
+def reconcile(batch_size, max_age):
+    """
+    Refresh up to batch_size invoice_property_caches in total, oldest first: the caches which have never been refreshed,
+    and the caches older than max_age hours holding an invoice which had not been paid (payment status not in FINAL_PAYMENT_STATUSES).
+    Picks up the changes made in ledger without a payment callback (e.g. invoices paid at reception).
+    Returns the number of objects refreshed.
+    """
+    stale_before = timezone.now() - datetime.timedelta(hours=max_age)
+    payment_pending_path = '$.*.payment_status ? ({})'.format(' && '.join(f'@ != "{status}"' for status in FINAL_PAYMENT_STATUSES))
+    refreshed = 0
+    for object_type, _ in InvoicePropertySyncRequest.OBJECT_TYPE_CHOICES:
+        if refreshed >= batch_size:
+            break
+        objs = get_model(object_type).objects.annotate(
+            invoice_payment_pending=RawSQL('jsonb_path_exists(invoice_property_cache, %s::jsonpath)', (payment_pending_path,), output_field=BooleanField()),
+        ).filter(
+            Q(invoice_property_cache_updated_at__isnull=True) |
+            Q(invoice_property_cache_updated_at__lt=stale_before, invoice_payment_pending=True)
+        ).order_by('invoice_property_cache_updated_at', 'id')[:batch_size - refreshed]
+        count, _ = _refresh(object_type, objs)
+        refreshed += count
+    return refreshed
+
+
+def sync(batch_size=None, max_age=None):
+    batch_size = batch_size or settings.INVOICE_PROPERTY_SYNC_BATCH_SIZE
+    max_age = max_age or settings.INVOICE_PROPERTY_SYNC_MAX_AGE
+    refreshed = sync_requested(batch_size)
+    if refreshed < batch_size:
+        # The reconciliation only uses what is left of the batch
+        refreshed += reconcile(batch_size - refreshed, max_age)
+    return refreshed
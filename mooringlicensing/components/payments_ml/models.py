@@ -9,10 +9,12 @@ from dateutil.relativedelta import relativedelta
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Min
+from django.utils import timezone
 from ledger_api_client.ledger_models import Invoice
 from mooringlicensing.settings import TIME_ZONE
 
 from mooringlicensing import settings
+from mooringlicensing.components.payments_ml import fee_item_lookup
 from mooringlicensing.components.main.models import ApplicationType, VesselSizeCategoryGroup, VesselSizeCategory
 from mooringlicensing.components.proposals.models import (
     ProposalType, AnnualAdmissionApplication, 
@@ -321,44 +323,28 @@ class FeeConstructor(models.Model):
         return 'ApplicationType: {}, Season: {}, VesselSizeCategoryGroup: {}'.format(self.application_type.description, self.fee_season, self.vessel_size_category_group)
 
     def get_fee_item(self, vessel_length, proposal_type=None, target_date=datetime.datetime.now(pytz.timezone(TIME_ZONE)).date(), age_group=None, admission_type=None, accept_null_vessel=False):
-        logger.info(f'Getting FeeItem for vessel_length:[{vessel_length}], proposal_type: [{proposal_type}], target_date: [{target_date}], accept_null_vessel: [{accept_null_vessel}], age_group: [{age_group}], admission_type: [{admission_type}]...')
-        fee_period = self.fee_season.fee_periods.filter(start_date__lte=target_date).order_by('start_date').last()
+        logger.debug(f'Getting FeeItem for vessel_length:[{vessel_length}], proposal_type: [{proposal_type}], target_date: [{target_date}], accept_null_vessel: [{accept_null_vessel}], age_group: [{age_group}], admission_type: [{admission_type}]...')
+        lookup_table = fee_item_lookup.get_lookup_table(self)
+        fee_period = lookup_table.get_fee_period(target_date)
         if accept_null_vessel:
-            vessel_size_category = self.vessel_size_category_group.vessel_size_categories.filter(null_vessel=True)
-            if vessel_size_category.count() == 1:
-                vessel_size_category = vessel_size_category[0]
-            else:
-                msg = f'Null vessel size category not found under the vessel size category group: {self.vessel_size_category_group}'
-                logger.error(msg)
-                raise ValueError(msg)
+            vessel_size_category = lookup_table.get_null_vessel_category()
         else:
-            vessel_size_category = self.vessel_size_category_group.vessel_size_categories.filter(start_size__lte=vessel_length, null_vessel=False).order_by('start_size').last()
-            if not vessel_size_category:
-                raise ValueError("Provided vessel dimensions do not fit any existing vessel size categories.")
-            if float(vessel_size_category.start_size) == vessel_length and not vessel_size_category.include_start_size:
-                vessel_size_category = vessel_size_category.get_one_smaller_category()
-        fee_item = self.get_fee_item_for_adjustment(vessel_size_category, fee_period, proposal_type=proposal_type, age_group=age_group, admission_type=admission_type)
+            vessel_size_category = lookup_table.get_vessel_size_category(vessel_length)
+        fee_item = lookup_table.get_fee_item(vessel_size_category, fee_period, proposal_type=proposal_type, age_group=age_group, admission_type=admission_type)
 
         if fee_item:
-            logger.info(f'FeeItem: [{fee_item}] has been retrieved.')
+            logger.debug(f'FeeItem: [{fee_item}] has been retrieved.')
         else:
             logger.exception(f'FeeItem not found for  vessel_length:[{vessel_length}], proposal_type: [{proposal_type}], target_date: [{target_date}], accept_null_vessel: [{accept_null_vessel}], age_group: [{age_group}], admission_type: [{admission_type}]...')
         return fee_item
 
     def get_fee_item_for_adjustment(self, vessel_size_category, fee_period, proposal_type=None, age_group=None, admission_type=None):
-        logger.info(f'Getting fee_item for the fee_constructor: [{self}], fee_period: [{fee_period}], vessel_size_category: [{vessel_size_category}], proposal_type: [{proposal_type}], age_group: [{age_group}], admission_type: [{admission_type}]')
+        logger.debug(f'Getting fee_item for the fee_constructor: [{self}], fee_period: [{fee_period}], vessel_size_category: [{vessel_size_category}], proposal_type: [{proposal_type}], age_group: [{age_group}], admission_type: [{admission_type}]')
 
-        fee_item = FeeItem.objects.filter(
-            fee_constructor=self,
-            fee_period=fee_period,
-            vessel_size_category=vessel_size_category,
-            proposal_type=proposal_type,
-            age_group=age_group,
-            admission_type=admission_type,
-        )
+        fee_item = fee_item_lookup.get_lookup_table(self).get_fee_item(vessel_size_category, fee_period, proposal_type=proposal_type, age_group=age_group, admission_type=admission_type)
 
         if fee_item:
-            return fee_item[0]
+            return fee_item
         else:
             # Fees are probably not configured yet...
             logger.info(f'FeeItem not found for the fee_constructor: [{self}], fee_period: [{fee_period}], vessel_size_category: [{vessel_size_category}], proposal_type: [{proposal_type}], age_group: [{age_group}], admission_type: [{admission_type}]')
@@ -572,6 +558,8 @@ class FeeConstructor(models.Model):
                     logger.info('FeeItem deleted: FeeItem ids: {}'.format(unneeded_fee_item_ids))
         except Exception as e:
             print(e)
+        finally:
+            fee_item_lookup.invalidate(self.id)
 
     class Meta:
         app_label = 'mooringlicensing'
@@ -694,4 +682,27 @@ class FeeCalculation(models.Model):
     data = models.JSONField(blank=True, null=True)
 
     class Meta:
-        app_label = 'mooringlicensing'
\ No newline at end of file
+        app_label = 'mooringlicensing'
+
+class InvoicePropertySyncRequest(models.Model):
+    '''
+    An object whose invoice_property_cache is to be refreshed from ledger by the sync_invoice_properties command.
+    '''
+    OBJECT_TYPE_PROPOSAL = 'proposal'
+    OBJECT_TYPE_STICKER = 'sticker'
+    OBJECT_TYPE_DCV_ADMISSION = 'dcv_admission'
+    OBJECT_TYPE_DCV_PERMIT = 'dcv_permit'
+    OBJECT_TYPE_CHOICES = (
+        (OBJECT_TYPE_PROPOSAL, 'Proposal'),
+        (OBJECT_TYPE_STICKER, 'Sticker'),
+        (OBJECT_TYPE_DCV_ADMISSION, 'DcvAdmission'),
+        (OBJECT_TYPE_DCV_PERMIT, 'DcvPermit'),
+    )
+
+    object_type = models.CharField(max_length=20, choices=OBJECT_TYPE_CHOICES)
+    object_id = models.IntegerField()
+    requested_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        unique_together = ('object_type', 'object_id')
@@ -1,7 +1,13 @@
 import logging
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from mooringlicensing.components.payments_ml.models import FeeConstructor
+from mooringlicensing.components.approvals.models import Sticker, StickerActionDetail
+from mooringlicensing.components.payments_ml import fee_item_lookup
+from mooringlicensing.components.payments_ml.invoice_property_sync import request_sync
+from mooringlicensing.components.payments_ml.models import (
+    FeeConstructor, FeeItem, FeePeriod,
+    ApplicationFee, DcvAdmissionFee, DcvPermitFee, StickerActionFee, InvoicePropertySyncRequest,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -11,3 +17,61 @@ class FeeConstructorListener(object):
     @receiver(post_save, sender=FeeConstructor)
     def _post_save(sender, instance, **kwargs):
         instance.reconstruct_fees()
+
+
+class FeeItemListener(object):
+
+    @staticmethod
+    @receiver(post_save, sender=FeeItem)
+    @receiver(post_delete, sender=FeeItem)
+    def _post_save(sender, instance, **kwargs):
+        if instance.fee_constructor_id:
+            fee_item_lookup.invalidate(instance.fee_constructor_id)
+
+
+class FeePeriodListener(object):
+
+    @staticmethod
+    @receiver(post_save, sender=FeePeriod)
+    @receiver(post_delete, sender=FeePeriod)
+    def _post_save(sender, instance, **kwargs):
+        if instance.fee_season_id:
+            for fee_constructor_id in FeeConstructor.objects.filter(fee_season_id=instance.fee_season_id).values_list('id', flat=True):
+                fee_item_lookup.invalidate(fee_constructor_id)
+
+
+class InvoicePropertySyncListener(object):
+    """
+    Queue the objects whose invoices have been created or paid for their invoice_property_cache to be refreshed
+    """
+
+    @staticmethod
+    @receiver(post_save, sender=ApplicationFee)
+    def _post_save_application_fee(sender, instance, **kwargs):
+        if instance.invoice_reference and instance.proposal_id:
+            request_sync(InvoicePropertySyncRequest.OBJECT_TYPE_PROPOSAL, [instance.proposal_id])
+
+    @staticmethod
+    @receiver(post_save, sender=DcvAdmissionFee)
+    def _post_save_dcv_admission_fee(sender, instance, **kwargs):
+        if instance.invoice_reference and instance.dcv_admission_id:
+            request_sync(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION, [instance.dcv_admission_id])
+
+    @staticmethod
+    @receiver(post_save, sender=DcvPermitFee)
+    def _post_save_dcv_permit_fee(sender, instance, **kwargs):
+        if instance.invoice_reference and instance.dcv_permit_id:
+            request_sync(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_PERMIT, [instance.dcv_permit_id])
+
+    @staticmethod
+    @receiver(post_save, sender=StickerActionFee)
+    def _post_save_sticker_action_fee(sender, instance, **kwargs):
+        if instance.invoice_reference:
+            sticker_ids = Sticker.objects.filter(sticker_action_details__sticker_action_fee=instance).values_list('id', flat=True)
+            request_sync(InvoicePropertySyncRequest.OBJECT_TYPE_STICKER, sticker_ids)
+
+    @staticmethod
+    @receiver(post_save, sender=StickerActionDetail)
+    def _post_save_sticker_action_detail(sender, instance, **kwargs):
+        if instance.sticker_id and instance.sticker_action_fee_id:
+            request_sync(InvoicePropertySyncRequest.OBJECT_TYPE_STICKER, [instance.sticker_id])
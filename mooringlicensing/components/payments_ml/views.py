@@ -36,8 +36,9 @@ from mooringlicensing.components.payments_ml.models import (
     ApplicationFee, DcvPermitFee, 
     DcvAdmissionFee, FeeItem, StickerActionFee, 
     FeeItemStickerReplacement, FeeItemApplicationFee, FeeCalculation,
-    OracleCodeItem
+    OracleCodeItem, InvoicePropertySyncRequest
 )
+from mooringlicensing.components.payments_ml.invoice_property_sync import refresh_on_commit
 from mooringlicensing.components.payments_ml.utils import (
     checkout
 )
@@ -402,7 +403,7 @@ class StickerReplacementFeeSuccessViewPreload(APIView):
                                             MooringLicence, AuthorisedUserPermit, AnnualAdmissionPermit,
                                         )
 
-                                        if type(sticker_action_detail.approval.child_obj) == AnnualAdmissionPermit:
+                                        if sticker_action_detail.approval.child_type == AnnualAdmissionPermit.code:
                                             #vessel ownership should be whatever is on the current proposal
                                             #raise an error if there is not one
                                             if not sticker_action_detail.approval.current_proposal or not sticker_action_detail.approval.current_proposal.vessel_ownership or sticker_action_detail.approval.current_proposal.vessel_ownership.end_date:
@@ -416,7 +417,7 @@ class StickerReplacementFeeSuccessViewPreload(APIView):
                                             ).exists():
                                                 raise serializers.ValidationError(f"Valid sticker already exists. If payment has been taken for sticker replacement, it should be refunded. Invoice: {invoice_reference}")
 
-                                        elif type(sticker_action_detail.approval.child_obj) == MooringLicence:
+                                        elif sticker_action_detail.approval.child_type == MooringLicence.code:
                                             #vessel ownership in vessel ownership on approval table
                                             #raise an error is none exist
                                             vooa = sticker_action_detail.approval.child_obj.get_current_vessel_ownership_on_approvals()
@@ -451,7 +452,7 @@ class StickerReplacementFeeSuccessViewPreload(APIView):
                                                 new_sticker.fee_constructor = proposal.fee_constructor
                                                 new_sticker.save()
                                         
-                                        elif type(sticker_action_detail.approval.child_obj) == AuthorisedUserPermit:
+                                        elif sticker_action_detail.approval.child_type == AuthorisedUserPermit.code:
                                             #vessel ownership should be whatever is on the current proposal
                                             #raise an error if there is not one
                                             if not sticker_action_detail.approval.current_proposal or not sticker_action_detail.approval.current_proposal.vessel_ownership or sticker_action_detail.approval.current_proposal.vessel_ownership.end_date:
@@ -487,6 +488,11 @@ class StickerReplacementFeeSuccessViewPreload(APIView):
                             if new_sticker:
                                 # Send email with the invoice
                                 send_sticker_replacement_email(request, old_sticker_numbers, new_sticker.approval, invoice.reference)
+
+                    refresh_on_commit(
+                        InvoicePropertySyncRequest.OBJECT_TYPE_STICKER,
+                        Sticker.objects.filter(sticker_action_details__sticker_action_fee=sticker_action_fee).values_list('id', flat=True),
+                    )
         except Exception as e:
             logger.error(e)
             if error_message:
@@ -738,6 +744,7 @@ class DcvAdmissionFeeSuccessViewPreload(APIView):
                 dcv_admission_fee.save()
 
                 email = send_dcv_admission_mail(dcv_admission, invoice, request)
+            refresh_on_commit(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION, [dcv_admission.id])
             logger.info(
                 "Returning status.HTTP_200_OK. Order created successfully.",
             )
@@ -842,6 +849,7 @@ class DcvPermitFeeSuccessViewPreload(APIView):
 
                 send_dcv_permit_mail(dcv_permit, invoice, request)
 
+            refresh_on_commit(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_PERMIT, [dcv_permit.id])
             logger.info(
                 "Returning status.HTTP_200_OK. Order created successfully.",
             )
@@ -1029,6 +1037,7 @@ class ApplicationFeeSuccessViewPreload(APIView):
                     application_fee.handled_in_preload = datetime.datetime.now()
                     application_fee.save()
 
+                refresh_on_commit(InvoicePropertySyncRequest.OBJECT_TYPE_PROPOSAL, [proposal.id])
                 logger.info(
                     "Returning status.HTTP_200_OK. Order created successfully.",
                 )
@@ -1050,7 +1059,7 @@ class ApplicationFeeSuccessView(TemplateView):
             applicant = proposal.applicant_obj
 
             if (is_internal(request) or applicant.id == request.user.id):
-                if type(proposal.child_obj) in [WaitingListApplication, AnnualAdmissionApplication]:
+                if proposal.child_type in [WaitingListApplication.code, AnnualAdmissionApplication.code]:
                     if proposal.auto_approve:
                         proposal.final_approval_for_WLA_AAA(request, details={})
 
@@ -17,7 +17,8 @@ from datetime import datetime
 from ledger_api_client.settings_base import TIME_ZONE
 from ledger_api_client.ledger_models import EmailUserRO as EmailUser
 from mooringlicensing import settings
-from mooringlicensing.components.main.models import GlobalSettings
+from mooringlicensing.components.main.models import GlobalSettings, SearchDocument
+from mooringlicensing.components.main import search
 from mooringlicensing.components.proposals.utils import (
     construct_dict_from_docs, 
     save_proponent_data, 
@@ -94,6 +95,7 @@ from mooringlicensing.components.approvals.models import (
     DcvPermit, DcvAdmission, DcvAdmissionArrival
 )
 from mooringlicensing.components.main.models import ApplicationType
+from mooringlicensing.components.main.api import InvoicePropertyCachePageMixin
 from mooringlicensing.components.payments_ml.models import FeeConstructor
 from mooringlicensing.components.approvals.email import (
     send_reissue_ml_after_sale_recorded_email, send_reissue_wla_after_sale_recorded_email, 
@@ -317,7 +319,7 @@ class GetMooringPerBay(views.APIView):
         wla_id = request.GET.get('wla_id')
         aup_id = request.GET.get('aup_id')
         search_term = request.GET.get('term', '')
-        num_of_moorings_to_return = int(GlobalSettings.objects.get(key=GlobalSettings.KEY_NUMBER_OF_MOORINGS_TO_RETURN_FOR_LOOKUP).value)
+        num_of_moorings_to_return = int(GlobalSettings.get_value(GlobalSettings.KEY_NUMBER_OF_MOORINGS_TO_RETURN_FOR_LOOKUP))
 
         if search_term:
             if available_moorings:
@@ -542,34 +544,15 @@ class ProposalFilterBackend(DatatablesFilterBackend):
         search_text = request.GET.get('search[value]')
         if search_text:
             #the search conducted by the superclass only accomodates the ProposalApplicant users
-            #this misses any new draft proposals, which do not yet have a ProposalApplicant record assigned - so we will do that here
-            system_user_ids = list(SystemUser.objects.annotate(full_name=Concat('legal_first_name',Value(" "),'legal_last_name',output_field=CharField()))
-            .filter(
-                Q(legal_first_name__icontains=search_text) | Q(legal_last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-            ).values_list("ledger_id", flat=True))
-            #the search also does not accomodate combining first names and last names even with ProposalApplicant - so we will also do that here
-            proposal_applicant_proposals = list(ProposalApplicant.objects.annotate(full_name=Concat('first_name',Value(" "),'last_name',output_field=CharField()))
-            .filter(
-                Q(first_name__icontains=search_text) | Q(last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-            ).values_list("proposal_id", flat=True))
-            queryset = queryset.filter(Q(id__in=proposal_applicant_proposals)|Q(submitter__in=system_user_ids))
+            #this misses any new draft proposals, which do not yet have a ProposalApplicant record assigned, and combined first and last names
+            #the search index holds both (as well as the submitter, lodgement number and vessel rego)
+            queryset = queryset.filter(id__in=search.search(SearchDocument.OBJECT_TYPE_PROPOSAL, search_text))
             queryset = queryset.distinct() | super_queryset    
 
-        mla_list = MooringLicenceApplication.objects.all()
-        aua_list = AuthorisedUserApplication.objects.all()
-        aaa_list = AnnualAdmissionApplication.objects.all()
-        wla_list = WaitingListApplication.objects.all()
-
         filter_application_type = request.GET.get('filter_application_type')
         if filter_application_type and not filter_application_type.lower() == 'all':
-            if filter_application_type == 'mla':
-                filter_query &= Q(id__in=mla_list)
-            elif filter_application_type == 'aua':
-                filter_query &= Q(id__in=aua_list)
-            elif filter_application_type == 'aaa':
-                filter_query &= Q(id__in=aaa_list)
-            elif filter_application_type == 'wla':
-                filter_query &= Q(id__in=wla_list)
+            if filter_application_type in [MooringLicenceApplication.code, AuthorisedUserApplication.code, AnnualAdmissionApplication.code, WaitingListApplication.code]:
+                filter_query &= Q(child_type=filter_application_type)
 
         filter_application_category = request.GET.get('filter_application_category')
         if filter_application_category and not filter_application_category.lower() == 'all':
@@ -704,7 +687,7 @@ class SiteLicenseeMooringRequestPaginatedViewSet(viewsets.ReadOnlyModelViewSet):
         return ProposalSiteLicenseeMooringRequest.objects.none()
          
 
-class ProposalPaginatedViewSet(viewsets.ReadOnlyModelViewSet):
+class ProposalPaginatedViewSet(InvoicePropertyCachePageMixin, viewsets.ReadOnlyModelViewSet):
     filter_backends = (ProposalFilterBackend,)
     pagination_class = DatatablesPageNumberPagination
     queryset = Proposal.objects.none()
@@ -713,7 +696,7 @@ class ProposalPaginatedViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         request_user = self.request.user
-        all = Proposal.objects.all()
+        all = Proposal.objects.select_child_objs()
 
         target_email_user_id = int(self.request.GET.get('target_email_user_id', 0))
 
@@ -2203,7 +2186,7 @@ class VesselOwnershipViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin)
                 ## collect impacted Approvals
                 approval_list = []
                 for prop in Proposal.objects.filter(vessel_ownership_id__in=affected_vessel_ownership_ids,approval__status__in=Approval.APPROVED_STATUSES):
-                    if (type(prop.approval.child_obj) in [WaitingListAllocation, AnnualAdmissionPermit, AuthorisedUserPermit] and
+                    if (prop.approval.child_type in [WaitingListAllocation.code, AnnualAdmissionPermit.code, AuthorisedUserPermit.code] and
                             prop.approval not in approval_list):
                         approval_list.append(prop.approval)
 
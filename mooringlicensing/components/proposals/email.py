@@ -8,14 +8,13 @@ from django.core.mail import EmailMultiAlternatives, EmailMessage
 from django.utils.encoding import smart_str
 from django.urls import reverse
 from django.conf import settings
-from django.core.files.base import ContentFile
 
 from mooringlicensing.components.approvals.email import log_mla_created_proposal_email, _log_approval_email
 from mooringlicensing.components.compliances.email import _log_compliance_email
-from mooringlicensing.components.emails.emails import TemplateEmailBase
+from mooringlicensing.components.emails.emails import TemplateEmailBase, log_email_attachments
 from datetime import datetime
 
-from mooringlicensing.components.main.models import NumberOfDaysType, NumberOfDaysSetting, private_storage, FileExtensionWhitelist
+from mooringlicensing.components.main.models import NumberOfDaysType, NumberOfDaysSetting, private_storage
 from mooringlicensing.components.emails.utils import get_user_as_email_user, make_url_for_internal, get_public_url, \
     make_http_https
 from mooringlicensing.components.users.utils import _log_user_email
@@ -30,7 +29,7 @@ SYSTEM_NAME = settings.SYSTEM_NAME_SHORT + ' Automated Message'
 
 def log_proposal_email(msg, proposal, sender, attachments=[]):
     try:
-        sender_user = sender if isinstance(sender, EmailUser) else EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
+        sender_user = sender if isinstance(sender, EmailUser) else get_user_as_email_user(sender)
     except:
         sender_user = None
 
@@ -81,18 +80,7 @@ def _log_proposal_email(email_message, proposal, sender=None, file_bytes=None, f
 
     email_entry = ProposalLogEntry.objects.create(**kwargs)
 
-    for attachment in attachments:
-        check = attachment[0].split(".")
-        filename = attachment[0]
-        try:
-            if len(check) < 2 or not FileExtensionWhitelist.objects.filter(name=check[len(check)-1].lower()).exists():
-                filename = attachment[0] + ".pdf"
-        except Exception as e:
-            logger.error(e)
-            filename = attachment[0] + ".pdf"
-        email_entry_document = email_entry.documents.create(name=filename)
-        email_entry_document._file.save(filename, ContentFile(attachment[1]), save=False)
-        email_entry_document.save()
+    log_email_attachments(email_entry, email_message, attachments)
 
     return email_entry
 
@@ -267,10 +255,7 @@ def send_create_mooring_licence_application_email_notification(request, waiting_
         'details': details,
     }
     sender = settings.DEFAULT_FROM_EMAIL
-    try:
-        sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-    except:
-        sender_user = None
+    sender_user = get_user_as_email_user(sender)
 
     attachments = []
     if waiting_list_allocation.waiting_list_offer_documents.all():
@@ -405,10 +390,7 @@ def send_invitee_reminder_email(approval, due_date, request=None):
     )
     
     sender = settings.DEFAULT_FROM_EMAIL
-    try:
-        sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-    except:
-        sender_user = None
+    sender_user = get_user_as_email_user(sender)
         
     context = {
         'public_url': get_public_url(),
@@ -653,11 +635,7 @@ def send_endorser_reminder_email(proposal, request=None):
 
     msgs = []
     for site_licensee_mooring in proposal.site_licensee_mooring_request.filter(enabled=True,endorser_reminder_sent=False):
-        try:
-            endorser = EmailUser.objects.filter(email__iexact=site_licensee_mooring.site_licensee_email, is_active=True).order_by('-id').first()
-        except:
-            # Should not reach here
-            continue
+        endorser = get_user_as_email_user(site_licensee_mooring.site_licensee_email)
 
         mooring_name = site_licensee_mooring.mooring.name if proposal.mooring else ''
         due_date = proposal.get_due_date_for_endorsement_by_target_date()
@@ -737,10 +715,7 @@ def send_approval_renewal_email_notification(approval):
     }
 
     sender = settings.DEFAULT_FROM_EMAIL
-    try:
-        sender_user = EmailUser.objects.filter(email__iexact=sender, is_active=True).order_by('-id').first()
-    except:
-        sender_user = None
+    sender_user = get_user_as_email_user(sender)
 
     msg = email.send(proposal.applicant_obj.email, cc=[], attachments=[], context=context)
     if msg:
@@ -11,15 +11,18 @@ import pytz
 import uuid
 from mooringlicensing.components.approvals.email import send_aup_revoked_due_to_mooring_swap_email
 from mooringlicensing.components.proposals.email import send_aua_declined_by_endorser_email
+from mooringlicensing.components.proposals import vessel_occupancy
 
 from mooringlicensing.ledger_api_utils import (
-    retrieve_email_userro, get_invoice_payment_status, retrieve_system_user
+    retrieve_email_userro, get_invoice_payment_status, retrieve_system_user, get_invoice_property_cache_entries
 )
 from ledger_api_client.utils import calculate_excl_gst, get_invoice_properties, cancel_invoice
 from mooringlicensing.settings import (
     PROPOSAL_TYPE_SWAP_MOORINGS, TIME_ZONE,
     GROUP_ASSESSOR_MOORING_LICENCE, 
     GROUP_APPROVER_MOORING_LICENCE, 
+    GROUP_ASSESSOR_WAITING_LIST, GROUP_ASSESSOR_ANNUAL_ADMISSION,
+    GROUP_ASSESSOR_AUTHORISED_USER, GROUP_APPROVER_AUTHORISED_USER,
     PRIVATE_MEDIA_STORAGE_LOCATION, PRIVATE_MEDIA_BASE_URL,
     PROPOSAL_TYPE_AMENDMENT, PROPOSAL_TYPE_RENEWAL, 
     PROPOSAL_TYPE_NEW, CODE_DAYS_FOR_ENDORSER_AUA, STICKER_EXPORT_RUN_TIME_MESSAGE
@@ -40,7 +43,7 @@ from mooringlicensing.components.main.models import (
     CommunicationsLogEntry,
     GlobalSettings,
     UserAction,
-    Document, ApplicationType, NumberOfDaysType, NumberOfDaysSetting, RevisionedMixin, SanitiseMixin
+    Document, ApplicationType, NumberOfDaysType, NumberOfDaysSetting, RevisionedMixin, SanitiseMixin, ChildObjQuerySet
 )
 
 import requests
@@ -202,6 +205,20 @@ class ProposalSignedLicenceAgreementDocument(models.Model):
 
 class Proposal(RevisionedMixin):
 
+    CHILD_TYPE_CHOICES = (
+        ('wla', 'Waiting List Application'),
+        ('aaa', 'Annual Admission Application'),
+        ('aua', 'Authorised User Application'),
+        ('mla', 'Mooring Licence Application'),
+    )
+    # child_type: reverse one-to-one of the subclass
+    CHILD_RELATIONS = {
+        'wla': 'waitinglistapplication',
+        'aaa': 'annualadmissionapplication',
+        'aua': 'authoriseduserapplication',
+        'mla': 'mooringlicenceapplication',
+    }
+
     CUSTOMER_STATUS_DRAFT = 'draft'
     CUSTOMER_STATUS_WITH_ASSESSOR = 'with_assessor'
     CUSTOMER_STATUS_WITH_APPROVER = 'with_approver'
@@ -283,6 +300,7 @@ class Proposal(RevisionedMixin):
     proposed_issuance_approval = JSONField(blank=True, null=True)
 
     invoice_property_cache = JSONField(null=True, blank=True, default=dict)
+    invoice_property_cache_updated_at = models.DateTimeField(blank=True, null=True)
 
     reissue_vessel_properties = JSONField(null=True, blank=True, default=dict) #store vessel and vessel ownership details for a reissued approval to compare to on re-approval
 
@@ -291,6 +309,10 @@ class Proposal(RevisionedMixin):
         default=CUSTOMER_STATUS_CHOICES[0][0])
 
     lodgement_number = models.CharField(max_length=9, blank=True, default='')
+    # code of the subclass, set on save
+    child_type = models.CharField(max_length=3, choices=CHILD_TYPE_CHOICES, blank=True, default='', db_index=True)
+
+    objects = ChildObjQuerySet.as_manager()
 
     lodgement_date = models.DateTimeField(blank=True, null=True)
 
@@ -992,7 +1014,7 @@ class Proposal(RevisionedMixin):
                 proposal_id_list.append(proposal.id)
 
                 fee_item_application_fee_vessels = []
-                if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
+                if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and proposal.child_type == MooringLicenceApplication.code:
                     #specialised function to get CORRECT fee_item_application_fee vessels 
                     fee_item_application_fee_vessels = self.get_AA_fee_item_application_vessels(proposal)
 
@@ -1001,7 +1023,7 @@ class Proposal(RevisionedMixin):
                     logger.info(f'FeeItemApplicationFee: [{fee_item_application_fee}] found through the proposal: [{proposal}]')
                     try:
                         target_vessel = fee_item_application_fee.vessel_details.vessel
-                        if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
+                        if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and proposal.child_type == MooringLicenceApplication.code:
                             incorrect_vessel = target_vessel
                             target_vessel = fee_item_application_fee_vessels[fee_item_application_fee.id]
                             if incorrect_vessel != target_vessel:
@@ -1056,7 +1078,7 @@ class Proposal(RevisionedMixin):
                 proposal_id_list.append(proposal.id)
 
                 fee_item_application_fee_vessels = []
-                if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
+                if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and proposal.child_type == MooringLicenceApplication.code:
                     #specialised function to get CORRECT fee_item_application_fee vessels 
                     fee_item_application_fee_vessels = self.get_AA_fee_item_application_vessels(proposal)
 
@@ -1065,7 +1087,7 @@ class Proposal(RevisionedMixin):
                     logger.info(f'FeeItemApplicationFee: [{fee_item_application_fee}] found through the proposal: [{proposal}]')
                     try:
                         target_vessel = fee_item_application_fee.vessel_details.vessel
-                        if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
+                        if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and proposal.child_type == MooringLicenceApplication.code:
                             incorrect_vessel = target_vessel
                             target_vessel = fee_item_application_fee_vessels[fee_item_application_fee.id]
                             if incorrect_vessel != target_vessel:
@@ -1091,7 +1113,7 @@ class Proposal(RevisionedMixin):
                     #We calculate deductions here to factor instances where another vessel has been removed from the approval, to discount from the total cost
                     if target_vessel and target_vessel != vessel:
                         
-                        if proposal.approval and proposal.approval.child_obj and type(proposal.approval.child_obj) == MooringLicence:
+                        if proposal.approval and proposal.approval.child_obj and proposal.approval.child_type == MooringLicence.code:
                             # When ML, customer is adding a new vessel to the ML
                             if not current_approvals['aaps'] and not current_approvals['aups'] and not current_approvals['mls']:
                                 # However, old vessel (target vessel) is no longer on any licence/permit.
@@ -1102,7 +1124,7 @@ class Proposal(RevisionedMixin):
                                 logger.info(f'Vessel: [{vessel}] is being added to the approval: [{proposal.approval}] and the vessel: [{target_vessel}] is still on another licence/permit.  We cannot transfer the amount paid: [{fee_item_application_fee}] for the vessel: [{vessel}].')
                                 deduct = False
                                 #continue
-                        if proposal.approval and proposal.approval.child_obj and type(proposal.approval.child_obj) == AuthorisedUserPermit:
+                        if proposal.approval and proposal.approval.child_obj and proposal.approval.child_type == AuthorisedUserPermit.code:
                             # When AU, customer is replacing the current vessel
                             for key, qs in current_approvals.items():
                                 # We want to exclude the approval being amended(modified) because the target_vessel is being removed from it.
@@ -1336,21 +1358,22 @@ class Proposal(RevisionedMixin):
             return None
 
     def get_invoice_property_cache(self):
-        if len(self.invoice_property_cache) == 0:
+        # Not fetched again for the objects filled in memory for a list page
+        if len(self.invoice_property_cache) == 0 and not getattr(self, 'invoice_property_cache_loaded', False):
             self.update_invoice_property_cache()
         return self.invoice_property_cache
     
+    def get_invoices_for_property_cache(self):
+        return self.invoices_display()
+
     def update_invoice_property_cache(self, save=True):
-        for inv in self.invoices_display():
-            inv_props = get_invoice_properties(inv.id)
-
-            self.invoice_property_cache[inv.id] = {
-                'payment_status': inv_props['data']['invoice']['payment_status'],
-                'reference': inv_props['data']['invoice']['reference'],
-                'amount': inv_props['data']['invoice']['amount'],
-                'settlement_date': inv_props['data']['invoice']['settlement_date'],
-            }
-            
+        # All the invoices are fetched from ledger as one batch
+        entries, failed_invoice_ids = get_invoice_property_cache_entries(self.get_invoices_for_property_cache())
+        self.invoice_property_cache.update(entries)
+        if not failed_invoice_ids:
+            # Otherwise left as it was, for the invoices which could not be fetched to be refreshed again
+            self.invoice_property_cache_updated_at = timezone.now()
+
         if save:
            self.save()
         return self.invoice_property_cache
@@ -1389,7 +1412,7 @@ class Proposal(RevisionedMixin):
     def vessel_removed(self):
         # for AUP, AAP manage_stickers
         if type(self) is Proposal:
-            if type(self.child_obj) not in [AuthorisedUserApplication, AnnualAdmissionApplication]:
+            if self.child_type not in [AuthorisedUserApplication.code, AnnualAdmissionApplication.code]:
                 raise ValidationError("Only for AUP, AAA")
         else:
             if type(self) not in [AuthorisedUserApplication, AnnualAdmissionApplication]:
@@ -1415,7 +1438,7 @@ class Proposal(RevisionedMixin):
     def vessel_swapped(self):
         # for AUP, AAP manage_stickers
         if type(self) is Proposal:
-            if type(self.child_obj) not in [AuthorisedUserApplication, AnnualAdmissionApplication]:
+            if self.child_type not in [AuthorisedUserApplication.code, AnnualAdmissionApplication.code]:
                 raise ValidationError("Only for AUP, AAA")
         else:
             if type(self) not in [AuthorisedUserApplication, AnnualAdmissionApplication]:
@@ -1448,7 +1471,7 @@ class Proposal(RevisionedMixin):
     def vessel_null_to_new(self):
         # for AUP, AAP manage_stickers
         if type(self) is Proposal:
-            if type(self.child_obj) not in [AuthorisedUserApplication, AnnualAdmissionApplication]:
+            if self.child_type not in [AuthorisedUserApplication.code, AnnualAdmissionApplication.code]:
                 raise ValidationError("Only for AUP, AAA")
         else:
             if type(self) not in [AuthorisedUserApplication, AnnualAdmissionApplication]:
@@ -1531,8 +1554,6 @@ class Proposal(RevisionedMixin):
         #kwargs['no_revision'] = True
         self.update_customer_status()
         self.rego_no_uppercase()
-        if self.pk:
-            self.update_invoice_property_cache(save=False)
         super(Proposal, self).save(**kwargs)
         if type(self) == Proposal:
             self.child_obj.refresh_from_db()
@@ -1895,7 +1916,7 @@ class Proposal(RevisionedMixin):
 
     def bypass_endorsement(self,request):
         if self.is_assessor(request.user):
-            if type(self.child_obj) == AuthorisedUserApplication and self.processing_status == Proposal.PROCESSING_STATUS_AWAITING_ENDORSEMENT:
+            if self.child_type == AuthorisedUserApplication.code and self.processing_status == Proposal.PROCESSING_STATUS_AWAITING_ENDORSEMENT:
                 self.processing_status = Proposal.PROCESSING_STATUS_WITH_ASSESSOR
                 self.save()
                 send_notification_email_upon_submit_to_assessor(request, self)
@@ -1906,7 +1927,7 @@ class Proposal(RevisionedMixin):
 
     def request_endorsement(self,request):
         if self.is_assessor(request.user):
-            if type(self.child_obj) == AuthorisedUserApplication and self.processing_status == Proposal.PROCESSING_STATUS_WITH_ASSESSOR:
+            if self.child_type == AuthorisedUserApplication.code and self.processing_status == Proposal.PROCESSING_STATUS_WITH_ASSESSOR:
                 if self.site_licensee_mooring_request.filter(enabled=True,declined_by_endorser=False,approved_by_endorser=False).exists():
                     #run function to move to awaiting_endorsement
                     self.processing_status = Proposal.PROCESSING_STATUS_AWAITING_ENDORSEMENT
@@ -1922,7 +1943,7 @@ class Proposal(RevisionedMixin):
     def reissue_approval(self, request):
         with transaction.atomic():
             vessels = []
-            if type(self.child_obj) == MooringLicenceApplication:
+            if self.child_type == MooringLicenceApplication.code:
                 vessels.extend([vo.vessel for vo in self.listed_vessels.all()])
             else:
                 if self.vessel_details:
@@ -2035,7 +2056,7 @@ class Proposal(RevisionedMixin):
                 self.log_user_action(ProposalUserAction.ACTION_DECLINE.format(self.id),request)
                 # update WLA internal_status
                 ## ML
-                if type(self.child_obj) == MooringLicenceApplication and self.waiting_list_allocation:
+                if self.child_type == MooringLicenceApplication.code and self.waiting_list_allocation:
                     # Originated WLAllocation should gets the status 'waiting' again.
                     self.waiting_list_allocation.internal_status = WaitingListAllocation.INTERNAL_STATUS_WAITING
                     self.waiting_list_allocation.save()
@@ -2267,7 +2288,7 @@ class Proposal(RevisionedMixin):
                 if self.proposal_type.code == PROPOSAL_TYPE_RENEWAL:
                     approval.renewal_sent = False
                 
-                if type(self.child_obj) == AnnualAdmissionApplication:
+                if self.child_type == AnnualAdmissionApplication.code:
                     approval.export_to_mooring_booking = True
                 approval.save()
                 # set auto_approve ProposalRequirement due dates to those from previous application + 12 months
@@ -2746,36 +2767,39 @@ class Proposal(RevisionedMixin):
         application_type = ApplicationType.objects.get(code=self.application_type_code)
         return application_type
 
+    def get_child_type(self):
+        if not self.child_type:
+            for child_type, relation in self.CHILD_RELATIONS.items():
+                if hasattr(self, relation):
+                    return child_type
+        return self.child_type
+
     @property
     def child_obj(self):
-        if hasattr(self, 'waitinglistapplication'):
-            return self.waitinglistapplication
-        elif hasattr(self, 'annualadmissionapplication'):
-            return self.annualadmissionapplication
-        elif hasattr(self, 'authoriseduserapplication'):
-            return self.authoriseduserapplication
-        elif hasattr(self, 'mooringlicenceapplication'):
-            return self.mooringlicenceapplication
-        else:
-            raise ObjectDoesNotExist("Proposal must have an associated child object - WLA, AA, AU or ML")
-        
+        child_type = self.get_child_type()
+        if child_type and hasattr(self, self.CHILD_RELATIONS[child_type]):
+            return getattr(self, self.CHILD_RELATIONS[child_type])
+        raise ObjectDoesNotExist("Proposal must have an associated child object - WLA, AA, AU or ML")
+
     @property
     def approval_class(self):
         from mooringlicensing.components.approvals.models import WaitingListAllocation, AnnualAdmissionPermit, AuthorisedUserPermit, MooringLicence
-        if hasattr(self, 'waitinglistapplication'):
-            return WaitingListAllocation
-        elif hasattr(self, 'annualadmissionapplication'):
-            return AnnualAdmissionPermit
-        elif hasattr(self, 'authoriseduserapplication'):
-            return AuthorisedUserPermit
-        elif hasattr(self, 'mooringlicenceapplication'):
-            return MooringLicence
-        else:
+        approval_classes = {
+            WaitingListApplication.code: WaitingListAllocation,
+            AnnualAdmissionApplication.code: AnnualAdmissionPermit,
+            AuthorisedUserApplication.code: AuthorisedUserPermit,
+            MooringLicenceApplication.code: MooringLicence,
+        }
+        child_type = self.get_child_type()
+        if not child_type:
             raise ObjectDoesNotExist("Proposal must have an associated child object - WLA, AA, AU or ML")
+        return approval_classes[child_type]
 
     @property
     def application_type_code(self):
-        if type(self) == Proposal:
+        if self.child_type:
+            return self.child_type
+        elif type(self) == Proposal:
             return self.child_obj.code
         else:
             return self.code
@@ -2863,7 +2887,7 @@ class Proposal(RevisionedMixin):
         from mooringlicensing.components.approvals.models import MooringLicence
         # Test to see if vessel should be read in from submitted data
         vessel_exists = False
-        if self.approval and not(type(self.approval) is MooringLicence or type(self.approval.child_obj) is MooringLicence):
+        if self.approval and not(type(self.approval) is MooringLicence or self.approval.child_type == MooringLicence.code):
             vessel_exists = (True if
                 self.approval and self.approval.current_proposal and 
                 self.approval.current_proposal.vessel_details and
@@ -2881,6 +2905,38 @@ class Proposal(RevisionedMixin):
     def validate_against_existing_proposals_and_approvals(self, request=None):
         self.child_obj.validate_against_existing_proposals_and_approvals(request)
 
+    def get_vessel_occupants(self, vessel, today):
+        """
+        The other active applications for the vessel (by the vessel details) or for the rego no of this proposal, and the
+        other current/suspended licences/permits for the vessel (only when a vessel is given), as ([Proposal], [Approval]).
+        Looked up in the vessel occupancy index; the objects are fetched only when there are any.
+        """
+        from mooringlicensing.components.approvals.models import Approval
+
+        vessel_occupancy.flush()
+        not_sold = Q(end_date__gt=today) | Q(end_date__isnull=True)
+        queries = Q(source=VesselOccupancy.SOURCE_PROPOSAL) & ~Q(proposal_id=self.id) & (
+            Q(details_vessel=vessel) & ~Q(details_vessel=None) & not_sold | Q(rego_no=self.rego_no)
+        )
+        if vessel:
+            approval_queries = Q(source=VesselOccupancy.SOURCE_APPROVAL) & not_sold & (
+                Q(vessel=vessel) | Q(rego_no=self.rego_no)
+            )
+            if self.approval_id:
+                approval_queries &= ~Q(approval_id=self.approval_id)
+            queries |= approval_queries
+
+        proposal_ids, approval_ids = [], []
+        for source, proposal_id, approval_id in VesselOccupancy.objects.filter(queries).values_list('source', 'proposal_id', 'approval_id'):
+            if source == VesselOccupancy.SOURCE_PROPOSAL:
+                proposal_ids.append(proposal_id)
+            else:
+                approval_ids.append(approval_id)
+
+        proposals = list(Proposal.objects.filter(id__in=proposal_ids).select_child_objs().select_related('proposal_applicant')) if proposal_ids else []
+        approvals = list(Approval.objects.filter(id__in=approval_ids).select_child_objs().select_related('current_proposal__proposal_applicant')) if approval_ids else []
+        return proposals, approvals
+
     #determines if the preferred mooring bay has changed (evaluate as true if the bay has been chosen for the first time for the application)
     def mooring_preference_changed(self):
         
@@ -3195,7 +3251,7 @@ class StickerPrintingResponseEmail(SanitiseMixin):
     email_body = models.TextField(null=True, blank=True)
     email_date = models.CharField(max_length=255, blank=True, null=True)
     email_from = models.CharField(max_length=255, blank=True, null=True)
-    email_message_id = models.CharField(max_length=255, blank=True, null=True)
+    email_message_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
 
     class Meta:
         app_label = 'mooringlicensing'
@@ -3204,6 +3260,26 @@ class StickerPrintingResponseEmail(SanitiseMixin):
         return f'Id: {self.id}, subject: {self.email_subject}'
 
 
+class StickerPrintingResponseMailbox(models.Model):
+    """
+    How far a sticker printing response mailbox has been imported.
+    A UID is only meaningful together with the UIDVALIDITY of the mailbox it was read from.
+    """
+    host = models.CharField(max_length=255)
+    username = models.CharField(max_length=255)
+    mailbox = models.CharField(max_length=255, default='INBOX')
+    uid_validity = models.BigIntegerField(null=True, blank=True)
+    last_uid = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        unique_together = ('host', 'username', 'mailbox')
+
+    def __str__(self):
+        return f'{self.username}@{self.host}/{self.mailbox}: UIDVALIDITY {self.uid_validity}, last UID {self.last_uid}'
+
+
 class StickerPrintingResponse(Document):
     _file = models.FileField(storage=private_storage,upload_to=update_sticker_response_doc_filename, max_length=512)
     sticker_printing_response_email = models.ForeignKey(StickerPrintingResponseEmail, blank=True, null=True, on_delete=models.SET_NULL)
@@ -3274,25 +3350,13 @@ class WaitingListApplication(Proposal):
         
 
     def validate_against_existing_proposals_and_approvals(self,request=None):
-        from mooringlicensing.components.approvals.models import Approval, WaitingListAllocation, MooringLicence
+        from mooringlicensing.components.approvals.models import WaitingListAllocation, MooringLicence
         today = datetime.datetime.now(pytz.timezone(TIME_ZONE)).date()
 
         vessel = self.vessel_ownership.vessel if self.vessel_ownership and (not self.vessel_ownership.end_date or self.vessel_ownership.end_date > today) else None
 
-        # Get blocking proposals 
-        # Checking if there are any applications still in progress
-        proposals = Proposal.objects.filter(
-            ((Q(vessel_details__vessel=vessel) & ~Q(vessel_details__vessel=None)) &
-            (Q(vessel_ownership__end_date__gt=today) | Q(vessel_ownership__end_date__isnull=True)) |
-            Q(rego_no=self.rego_no)) & # Vessel has not been sold yet
-            ~Q(processing_status__in=[  # Blocking proposal's status is not in the statuses listed
-            Proposal.PROCESSING_STATUS_APPROVED,
-            Proposal.PROCESSING_STATUS_PRINTING_STICKER, #printing sticker is treated the same as approved
-            Proposal.PROCESSING_STATUS_DECLINED,
-            Proposal.PROCESSING_STATUS_EXPIRED,
-            Proposal.PROCESSING_STATUS_DISCARDED,
-        ])
-        ).exclude(id=self.id)
+        # Get blocking proposals and approvals
+        proposals, approvals = self.get_vessel_occupants(vessel, today)
 
         child_proposals = [proposal.child_obj for proposal in proposals]
         logger.debug(f'child_proposals: [{child_proposals}]')
@@ -3307,30 +3371,15 @@ class WaitingListApplication(Proposal):
                     proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):            
                     blocking_proposals.append(proposal)
 
-        # Get blocking approvals
-        if vessel:
-            approvals = Approval.objects.filter(
-                (
-                    (Q(current_proposal__vessel_ownership__vessel=vessel) & ~Q(current_proposal__vessel_ownership__vessel=None)) | 
-                    Q(current_proposal__vessel_ownership__vessel__rego_no=self.rego_no)
-                ) &
-                (
-                    Q(current_proposal__vessel_ownership__end_date__gt=today) | 
-                    Q(current_proposal__vessel_ownership__end_date=None)
-                )
-            ).exclude(id=self.approval_id).filter(status__in=Approval.APPROVED_STATUSES)
-        else:
-            approvals = []
-
         blocking_approvals = []
 
         for approval in approvals:
-            if type(approval.child_obj) == WaitingListAllocation or type(approval.child_obj) == MooringLicence:
+            if approval.child_type == WaitingListAllocation.code or approval.child_type == MooringLicence.code:
                 blocking_approvals.append(approval)
-            elif (approval.child_obj.current_proposal and 
-                approval.child_obj.current_proposal.proposal_applicant and 
+            elif (approval.current_proposal and 
+                approval.current_proposal.proposal_applicant and 
                 self.proposal_applicant and 
-                approval.child_obj.current_proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):     
+                approval.current_proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):     
                 blocking_approvals.append(approval) 
 
         if (blocking_proposals):
@@ -3362,7 +3411,7 @@ class WaitingListApplication(Proposal):
     
     
     def validate_vessel_length(self, request):
-        min_mooring_vessel_size_str = GlobalSettings.objects.get(key=GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH).value
+        min_mooring_vessel_size_str = GlobalSettings.get_value(GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH)
         min_mooring_vessel_size = float(min_mooring_vessel_size_str)
 
         if self.vessel_details.vessel_applicable_length < min_mooring_vessel_size:
@@ -3472,13 +3521,13 @@ class WaitingListApplication(Proposal):
 
     def is_assessor(self, user):
         from mooringlicensing.helpers import belongs_to
-        if isinstance(user, EmailUserRO) and self.assessor_group:
-            return belongs_to(user, self.assessor_group.name)
+        if isinstance(user, EmailUserRO):
+            return belongs_to(user, GROUP_ASSESSOR_WAITING_LIST)
 
     def is_approver(self, user):
         from mooringlicensing.helpers import belongs_to
-        if isinstance(user, EmailUserRO) and self.assessor_group:
-            return belongs_to(user, self.assessor_group.name)
+        if isinstance(user, EmailUserRO):
+            return belongs_to(user, GROUP_ASSESSOR_WAITING_LIST)
 
     def save(self, *args, **kwargs):
         super(WaitingListApplication, self).save(*args, **kwargs)
@@ -3555,24 +3604,13 @@ class AnnualAdmissionApplication(Proposal):
                     self.save()
 
     def validate_against_existing_proposals_and_approvals(self,request=None):
-        from mooringlicensing.components.approvals.models import Approval, WaitingListAllocation, AnnualAdmissionPermit, MooringLicence, AuthorisedUserPermit
+        from mooringlicensing.components.approvals.models import WaitingListAllocation, AnnualAdmissionPermit, MooringLicence, AuthorisedUserPermit
         today = datetime.datetime.now(pytz.timezone(TIME_ZONE)).date()
 
         vessel = self.vessel_ownership.vessel if self.vessel_ownership and (not self.vessel_ownership.end_date or self.vessel_ownership.end_date > today) else None
 
-        # Get blocking proposals
-        proposals = Proposal.objects.filter(
-            ((Q(vessel_details__vessel=vessel) & ~Q(vessel_details__vessel=None)) &
-            (Q(vessel_ownership__end_date__gt=today) | Q(vessel_ownership__end_date__isnull=True)) |
-            Q(rego_no=self.rego_no)) & # Vessel has not been sold yet
-            ~Q(processing_status__in=[  # Blocking proposal's status is not in the statuses listed
-            Proposal.PROCESSING_STATUS_APPROVED,
-            Proposal.PROCESSING_STATUS_PRINTING_STICKER, #printing sticker is treated the same as approved
-            Proposal.PROCESSING_STATUS_DECLINED,
-            Proposal.PROCESSING_STATUS_EXPIRED,
-            Proposal.PROCESSING_STATUS_DISCARDED,
-        ])
-        ).exclude(id=self.id)
+        # Get blocking proposals and approvals
+        proposals, approvals = self.get_vessel_occupants(vessel, today)
 
         child_proposals = [proposal.child_obj for proposal in proposals]
         logger.debug(f'child_proposals: [{child_proposals}]')
@@ -3594,38 +3632,23 @@ class AnnualAdmissionApplication(Proposal):
                     proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):
                     proposals_wla.append(proposal)
 
-        # Get blocking approvals
-        if vessel:
-            approvals = Approval.objects.filter(
-                (
-                    (Q(current_proposal__vessel_ownership__vessel=vessel) & ~Q(current_proposal__vessel_ownership__vessel=None)) | 
-                    Q(current_proposal__vessel_ownership__vessel__rego_no=self.rego_no)
-                ) &
-                (
-                    Q(current_proposal__vessel_ownership__end_date__gt=today) | 
-                    Q(current_proposal__vessel_ownership__end_date=None)
-                )
-            ).exclude(id=self.approval_id).filter(status__in=Approval.APPROVED_STATUSES)
-        else:
-            approvals = []
-
         approvals_ml = []
         approvals_aap = []
         approvals_aup = []
         approvals_wla = []
         for approval in approvals:
-            if type(approval.child_obj) == MooringLicence:
+            if approval.child_type == MooringLicence.code:
                 approvals_ml.append(approval)
-            if type(approval.child_obj) == AnnualAdmissionPermit:
+            if approval.child_type == AnnualAdmissionPermit.code:
                 approvals_aap.append(approval)
-            if type(approval.child_obj) == AuthorisedUserPermit:
+            if approval.child_type == AuthorisedUserPermit.code:
                 approvals_aup.append(approval)
-            if type(approval.child_obj) == WaitingListAllocation:
+            if approval.child_type == WaitingListAllocation.code:
                 #only blocks if from a different user/owner
-                if (approval.child_obj.current_proposal and 
-                    approval.child_obj.current_proposal.proposal_applicant and 
+                if (approval.current_proposal and 
+                    approval.current_proposal.proposal_applicant and 
                     self.proposal_applicant and 
-                    approval.child_obj.current_proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):
+                    approval.current_proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):
                     approvals_wla.append(approval)
 
         if proposals_aaa or approvals_aap or proposals_aua or approvals_aup or proposals_mla or approvals_ml or proposals_wla or approvals_wla:
@@ -3634,7 +3657,7 @@ class AnnualAdmissionApplication(Proposal):
             ", ".join(['{} {} '.format(item.description, item.lodgement_number) for item in list_sum]))
 
     def validate_vessel_length(self, request):
-        min_vessel_size_str = GlobalSettings.objects.get(key=GlobalSettings.KEY_MINIMUM_VESSEL_LENGTH).value
+        min_vessel_size_str = GlobalSettings.get_value(GlobalSettings.KEY_MINIMUM_VESSEL_LENGTH)
         min_vessel_size = float(min_vessel_size_str)
 
         if self.vessel_details.vessel_applicable_length < min_vessel_size:
@@ -3743,13 +3766,13 @@ class AnnualAdmissionApplication(Proposal):
 
     def is_assessor(self, user):
         from mooringlicensing.helpers import belongs_to
-        if isinstance(user, EmailUserRO) and self.assessor_group:
-            return belongs_to(user, self.assessor_group.name)
+        if isinstance(user, EmailUserRO):
+            return belongs_to(user, GROUP_ASSESSOR_ANNUAL_ADMISSION)
 
     def is_approver(self, user):
         from mooringlicensing.helpers import belongs_to
-        if isinstance(user, EmailUserRO) and self.assessor_group:
-            return belongs_to(user, self.assessor_group.name)
+        if isinstance(user, EmailUserRO):
+            return belongs_to(user, GROUP_ASSESSOR_ANNUAL_ADMISSION)
 
     def save(self, *args, **kwargs):
         super(AnnualAdmissionApplication, self).save(*args,**kwargs)
@@ -3800,24 +3823,13 @@ class AuthorisedUserApplication(Proposal):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False)
 
     def validate_against_existing_proposals_and_approvals(self,request=None):
-        from mooringlicensing.components.approvals.models import Approval, AuthorisedUserPermit
+        from mooringlicensing.components.approvals.models import AuthorisedUserPermit
         today = datetime.datetime.now(pytz.timezone(TIME_ZONE)).date()
 
         vessel = self.vessel_ownership.vessel if self.vessel_ownership and (not self.vessel_ownership.end_date or self.vessel_ownership.end_date > today) else None
 
-        # Get blocking proposals
-        proposals = Proposal.objects.filter(
-            ((Q(vessel_details__vessel=vessel) & ~Q(vessel_details__vessel=None)) &
-            (Q(vessel_ownership__end_date__gt=today) | Q(vessel_ownership__end_date__isnull=True)) |
-            Q(rego_no=self.rego_no)) & # Vessel has not been sold yet
-            ~Q(processing_status__in=[  # Blocking proposal's status is not in the statuses listed
-            Proposal.PROCESSING_STATUS_APPROVED,
-            Proposal.PROCESSING_STATUS_PRINTING_STICKER, #printing sticker is treated the same as approved
-            Proposal.PROCESSING_STATUS_DECLINED,
-            Proposal.PROCESSING_STATUS_EXPIRED,
-            Proposal.PROCESSING_STATUS_DISCARDED,
-        ])
-        ).exclude(id=self.id)
+        # Get blocking proposals and approvals
+        proposals, approvals = self.get_vessel_occupants(vessel, today)
 
         child_proposals = [proposal.child_obj for proposal in proposals]
         logger.debug(f'child_proposals: [{child_proposals}]')
@@ -3832,30 +3844,16 @@ class AuthorisedUserApplication(Proposal):
                 proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):
                 proposals_other.append(proposal)
 
-        # Get blocking approvals
-        if vessel:
-            approvals = Approval.objects.filter(
-                (
-                    (Q(current_proposal__vessel_ownership__vessel=vessel) & ~Q(current_proposal__vessel_ownership__vessel=None)) | 
-                    Q(current_proposal__vessel_ownership__vessel__rego_no=self.rego_no)
-                ) &
-                (
-                    Q(current_proposal__vessel_ownership__end_date__gt=today) | 
-                    Q(current_proposal__vessel_ownership__end_date=None)
-                )
-            ).exclude(id=self.approval_id).filter(status__in=Approval.APPROVED_STATUSES)
-        else:
-            approvals = []
         
         approvals_aup = []
         approvals_other = []
         for approval in approvals:
-            if type(approval.child_obj) == AuthorisedUserPermit:
+            if approval.child_type == AuthorisedUserPermit.code:
                 approvals_aup.append(approval)
-            elif (approval.child_obj.current_proposal and 
-                approval.child_obj.current_proposal.proposal_applicant and 
+            elif (approval.current_proposal and 
+                approval.current_proposal.proposal_applicant and 
                 self.proposal_applicant and 
-                approval.child_obj.current_proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):
+                approval.current_proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):
                 approvals_other.append(approval)
 
         if proposals_aua or approvals_aup:
@@ -3870,7 +3868,7 @@ class AuthorisedUserApplication(Proposal):
             )
 
     def validate_vessel_length(self, request):
-        min_vessel_size_str = GlobalSettings.objects.get(key=GlobalSettings.KEY_MINIMUM_VESSEL_LENGTH).value
+        min_vessel_size_str = GlobalSettings.get_value(GlobalSettings.KEY_MINIMUM_VESSEL_LENGTH)
         min_vessel_size = float(min_vessel_size_str)
 
         if self.vessel_details.vessel_applicable_length < min_vessel_size:
@@ -4062,13 +4060,13 @@ class AuthorisedUserApplication(Proposal):
 
     def is_assessor(self, user):
         from mooringlicensing.helpers import belongs_to
-        if isinstance(user, EmailUserRO) and self.assessor_group:
-            return belongs_to(user, self.assessor_group.name)
+        if isinstance(user, EmailUserRO):
+            return belongs_to(user, GROUP_ASSESSOR_AUTHORISED_USER)
 
     def is_approver(self, user):
         from mooringlicensing.helpers import belongs_to
-        if isinstance(user, EmailUserRO) and self.approver_group:
-            return belongs_to(user, self.approver_group.name)
+        if isinstance(user, EmailUserRO):
+            return belongs_to(user, GROUP_APPROVER_AUTHORISED_USER)
 
     def save(self, *args, **kwargs):
         super(AuthorisedUserApplication, self).save(*args, **kwargs)
@@ -4389,7 +4387,7 @@ class MooringLicenceApplication(Proposal):
         return wlallocation
 
     def validate_against_existing_proposals_and_approvals(self,request=None):
-        from mooringlicensing.components.approvals.models import Approval, ApprovalHistory, MooringLicence
+        from mooringlicensing.components.approvals.models import ApprovalHistory, MooringLicence
         today = datetime.datetime.now(pytz.timezone(TIME_ZONE)).date()
 
         vessel = self.vessel_ownership.vessel if self.vessel_ownership and (not self.vessel_ownership.end_date or self.vessel_ownership.end_date > today) else None
@@ -4397,19 +4395,8 @@ class MooringLicenceApplication(Proposal):
         if vessel and vessel.rego_no != self.rego_no: #if the VO vessel and rego_no do not match, exclude the VO vessel
             vessel = None
 
-        # Get blocking proposals
-        proposals = Proposal.objects.filter(
-            ((Q(vessel_details__vessel=vessel) & ~Q(vessel_details__vessel=None)) &
-            (Q(vessel_ownership__end_date__gt=today) | Q(vessel_ownership__end_date__isnull=True)) |
-            Q(rego_no=self.rego_no)) & # Vessel has not been sold yet
-            ~Q(processing_status__in=[  # Blocking proposal's status is not in the statuses listed
-            Proposal.PROCESSING_STATUS_APPROVED,
-            Proposal.PROCESSING_STATUS_PRINTING_STICKER, #printing sticker is treated the same as approved
-            Proposal.PROCESSING_STATUS_DECLINED,
-            Proposal.PROCESSING_STATUS_EXPIRED,
-            Proposal.PROCESSING_STATUS_DISCARDED,
-        ])
-        ).exclude(id=self.id)
+        # Get blocking proposals and approvals
+        proposals, approvals = self.get_vessel_occupants(vessel, today)
 
         child_proposals = [proposal.child_obj for proposal in proposals]
         logger.debug(f'child_proposals: [{child_proposals}]')
@@ -4424,30 +4411,15 @@ class MooringLicenceApplication(Proposal):
                 proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):
                 proposals_other.append(proposal)
 
-        # Get blocking approvals
-        if vessel:
-            approvals = Approval.objects.filter(
-                (
-                    (Q(current_proposal__vessel_ownership__vessel=vessel) & ~Q(current_proposal__vessel_ownership__vessel=None)) | 
-                    Q(current_proposal__vessel_ownership__vessel__rego_no=self.rego_no)
-                ) &
-                (
-                    Q(current_proposal__vessel_ownership__end_date__gt=today) | 
-                    Q(current_proposal__vessel_ownership__end_date=None)
-                )
-            ).exclude(id=self.approval_id).filter(status__in=Approval.APPROVED_STATUSES)
-        else:
-            approvals = []
-
         approvals_ml = []
         approvals_other = []
         for approval in approvals:
-            if type(approval.child_obj) == MooringLicence:
+            if approval.child_type == MooringLicence.code:
                 approvals_ml.append(approval)
-            elif (approval.child_obj.current_proposal and 
-                approval.child_obj.current_proposal.proposal_applicant and 
+            elif (approval.current_proposal and 
+                approval.current_proposal.proposal_applicant and 
                 self.proposal_applicant and 
-                approval.child_obj.current_proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):
+                approval.current_proposal.proposal_applicant.email_user_id != self.proposal_applicant.email_user_id):
                 approvals_other.append(approval)
 
         if proposals_mla or approvals_ml:
@@ -4462,9 +4434,9 @@ class MooringLicenceApplication(Proposal):
             )
 
     def validate_vessel_length(self, request):
-        min_vessel_size_str = GlobalSettings.objects.get(key=GlobalSettings.KEY_MINIMUM_VESSEL_LENGTH).value
+        min_vessel_size_str = GlobalSettings.get_value(GlobalSettings.KEY_MINIMUM_VESSEL_LENGTH)
         min_vessel_size = float(min_vessel_size_str)
-        min_mooring_vessel_size_str = GlobalSettings.objects.get(key=GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH).value
+        min_mooring_vessel_size_str = GlobalSettings.get_value(GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH)
         min_mooring_vessel_size = float(min_mooring_vessel_size_str)
 
         if self.proposal_type.code in [PROPOSAL_TYPE_RENEWAL, PROPOSAL_TYPE_AMENDMENT]:
@@ -4524,8 +4496,8 @@ class MooringLicenceApplication(Proposal):
 
         if self.proposal_type.code == PROPOSAL_TYPE_SWAP_MOORINGS:
             from mooringlicensing.components.payments_ml.models import OracleCodeItem
-            total_amount = float(GlobalSettings.objects.get(key=GlobalSettings.KEY_FEE_AMOUNT_OF_SWAP_MOORINGS).value)
-            incur_gst = True if GlobalSettings.objects.get(key=GlobalSettings.KEY_SWAP_MOORINGS_INCLUDES_GST).value.lower() in ['true', 't', 'yes', 'y'] else False
+            total_amount = float(GlobalSettings.get_value(GlobalSettings.KEY_FEE_AMOUNT_OF_SWAP_MOORINGS))
+            incur_gst = True if GlobalSettings.get_value(GlobalSettings.KEY_SWAP_MOORINGS_INCLUDES_GST).lower() in ['true', 't', 'yes', 'y'] else False
             if settings.ROUND_FEE_ITEMS:
                 # In debug environment, we want to avoid decimal number which may cause some kind of error.
                 total_amount = round(float(total_amount))
@@ -4719,13 +4691,13 @@ class MooringLicenceApplication(Proposal):
 
     def is_assessor(self, user):
         from mooringlicensing.helpers import belongs_to
-        if isinstance(user, EmailUserRO) and self.assessor_group:
-            return belongs_to(user, self.assessor_group.name)
+        if isinstance(user, EmailUserRO):
+            return belongs_to(user, GROUP_ASSESSOR_MOORING_LICENCE)
 
     def is_approver(self, user):
         from mooringlicensing.helpers import belongs_to
-        if isinstance(user, EmailUserRO) and self.approver_group:
-            return belongs_to(user, self.approver_group.name)
+        if isinstance(user, EmailUserRO):
+            return belongs_to(user, GROUP_APPROVER_MOORING_LICENCE)
 
     def save(self, *args, **kwargs):
         super(MooringLicenceApplication, self).save(*args, **kwargs)
@@ -5310,72 +5282,76 @@ class Vessel(RevisionedMixin):
         self.rego_no_uppercase()
         super(Vessel, self).save(**kwargs)
 
-    def get_current_wlas(self, target_date):
-        from mooringlicensing.components.approvals.models import Approval, WaitingListAllocation
-        existing_wlas = WaitingListAllocation.objects.filter(
-            status__in=(Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED,),
+    def get_current_approval_occupancies(self, target_date):
+        """
+        The rows of the vessel occupancy index of the licences/permits this vessel is currently on
+        """
+        from mooringlicensing.components.approvals.models import WaitingListAllocation, AnnualAdmissionPermit, AuthorisedUserPermit
+        vessel_occupancy.flush()
+        return VesselOccupancy.objects.filter(
+            # WLA, AAP and AUP: the vessel of the current proposal, which has not been sold
+            Q(
+                source=VesselOccupancy.SOURCE_APPROVAL,
+                details_vessel=self,
+                end_date__isnull=True,
+                child_type__in=(WaitingListAllocation.code, AnnualAdmissionPermit.code, AuthorisedUserPermit.code,),
+            ) |
+            # ML: the vessels on the licence
+            Q(source=VesselOccupancy.SOURCE_APPROVAL_VESSEL, vessel=self),
             start_date__lte=target_date,
             expiry_date__gte=target_date,
-            current_proposal__vessel_details__vessel=self,
-            current_proposal__vessel_ownership__end_date__isnull=True,
-        ).distinct()
+        )
+
+    def get_current_wlas(self, target_date):
+        from mooringlicensing.components.approvals.models import WaitingListAllocation
+        existing_wlas = WaitingListAllocation.objects.filter(
+            id__in=self.get_current_approval_occupancies(target_date).filter(child_type=WaitingListAllocation.code).values('approval_id'),
+        )
         return existing_wlas
 
     def get_current_aaps(self, target_date):
-        from mooringlicensing.components.approvals.models import Approval, AnnualAdmissionPermit
+        from mooringlicensing.components.approvals.models import AnnualAdmissionPermit
         existing_aaps = AnnualAdmissionPermit.objects.filter(
-            status__in=(Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED,),
-            start_date__lte=target_date,
-            expiry_date__gte=target_date,
-            current_proposal__vessel_details__vessel=self,
-            current_proposal__vessel_ownership__end_date__isnull=True,
-        ).distinct()
+            id__in=self.get_current_approval_occupancies(target_date).filter(child_type=AnnualAdmissionPermit.code).values('approval_id'),
+        )
         return existing_aaps
 
     def get_current_aups(self, target_date):
-        from mooringlicensing.components.approvals.models import Approval, AuthorisedUserPermit
+        from mooringlicensing.components.approvals.models import AuthorisedUserPermit
         existing_aups = AuthorisedUserPermit.objects.filter(
-            status__in=(Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED,),
-            start_date__lte=target_date,
-            expiry_date__gte=target_date,
-            current_proposal__vessel_details__vessel=self,
-            current_proposal__vessel_ownership__end_date__isnull=True,
-        ).distinct()
+            id__in=self.get_current_approval_occupancies(target_date).filter(child_type=AuthorisedUserPermit.code).values('approval_id'),
+        )
         return existing_aups
 
     def get_current_mls(self, target_date):
-        from mooringlicensing.components.approvals.models import Approval, MooringLicence, VesselOwnershipOnApproval
-        
-        approval_ids = list(VesselOwnershipOnApproval.objects.filter(vessel_ownership__vessel=self,vessel_ownership__end_date__isnull=True,end_date__isnull=True).values_list("approval__id", flat=True))
-        
+        from mooringlicensing.components.approvals.models import MooringLicence
         existing_mls = MooringLicence.objects.filter(
-            status__in=(Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED,),
-            start_date__lte=target_date,
-            expiry_date__gte=target_date,
-            proposal__processing_status__in=(Proposal.PROCESSING_STATUS_PRINTING_STICKER, Proposal.PROCESSING_STATUS_APPROVED,),
-            id__in=approval_ids
-        ).distinct()
+            id__in=self.get_current_approval_occupancies(target_date).filter(child_type=MooringLicence.code).values('approval_id'),
+        )
         return existing_mls
 
     def get_current_approvals(self, target_date):
         # Return all the approvals where this vessel is on.
-        existing_wla = self.get_current_wlas(target_date)
-        existing_aaps = self.get_current_aaps(target_date)
-        existing_aups = self.get_current_aups(target_date)
-        existing_mls = self.get_current_mls(target_date)
+        from mooringlicensing.components.approvals.models import (
+            WaitingListAllocation, AnnualAdmissionPermit, AuthorisedUserPermit, MooringLicence,
+        )
+        # One query for all the types; the querysets of the types with no approvals are answered without a query
+        approval_ids = {}
+        for child_type, approval_id in self.get_current_approval_occupancies(target_date).values_list('child_type', 'approval_id'):
+            approval_ids.setdefault(child_type, set()).add(approval_id)
 
         return {
-            'wla': existing_wla,
-            'aaps': existing_aaps,
-            'aups': existing_aups,
-            'mls': existing_mls
+            'wla': WaitingListAllocation.objects.filter(id__in=approval_ids.get(WaitingListAllocation.code, [])),
+            'aaps': AnnualAdmissionPermit.objects.filter(id__in=approval_ids.get(AnnualAdmissionPermit.code, [])),
+            'aups': AuthorisedUserPermit.objects.filter(id__in=approval_ids.get(AuthorisedUserPermit.code, [])),
+            'mls': MooringLicence.objects.filter(id__in=approval_ids.get(MooringLicence.code, [])),
         }
 
     ## at submit
     def check_blocking_ownership(self, vessel_ownership, proposal_being_processed, request):
         logger.info(f'Checking blocking ownership for the proposal: [{proposal_being_processed}]...')
         from mooringlicensing.components.approvals.models import (
-            Approval, MooringLicence, AuthorisedUserPermit, AnnualAdmissionPermit, WaitingListAllocation
+            MooringLicence, AuthorisedUserPermit, AnnualAdmissionPermit, WaitingListAllocation
         )
 
         #common blocks
@@ -5385,68 +5361,51 @@ class Vessel(RevisionedMixin):
         #another approval of any other kind (though effectively all kinds) where the vessel is owned by another user that is current or suspended
 
         #WL, AA, (and ML but that is taken care of above) blocks
-        #a mooring license application that is not accepted, (printing sticker,) discarded, or declined 
+        #a mooring license application that is not accepted, (printing sticker,) discarded, or declined
         #a current or suspended mooring approval
 
         #AA blocks
         #an authorised User application that is not accepted, (printing sticker,) discarded, or declined (does not apply in reverse)
         #a current or suspended Authorised User Permit (does not apply in reverse)
 
-        #application/proposal block
-        today = datetime.datetime.now(pytz.timezone(TIME_ZONE)).date()
-        proposals_filter = Q()
-        proposals_filter &= ((Q(vessel_ownership__vessel=self) & 
-                            (Q(vessel_ownership__end_date__gt=today) | 
-                            Q(vessel_ownership__end_date=None)) |
-                            Q(rego_no=self.rego_no)))  # Blocking proposal is for the same vessel which has not been sold yet
-        proposals_filter &= ~Q(processing_status__in=[  # Blocking proposal's status is not in the statuses listed
-            Proposal.PROCESSING_STATUS_APPROVED,
-            Proposal.PROCESSING_STATUS_PRINTING_STICKER, #printing sticker is treated the same as approved
-            Proposal.PROCESSING_STATUS_DECLINED,
-            Proposal.PROCESSING_STATUS_EXPIRED,
-            Proposal.PROCESSING_STATUS_DISCARDED,
-        ])
-        proposals_filter &= ~Q(id=proposal_being_processed.id)  # Blocking proposal is not the proposal being processed
-
-        blocking_proposals = []
-        blocking_aua = []
-        blocking_mla = []
-
         if not vessel_ownership.owner or not vessel_ownership.owner.emailuser:
             raise serializers.ValidationError("Invalid vessel ownership")
+        owner = vessel_ownership.owner.emailuser
 
-        blocking_ownerships = Proposal.objects.filter(proposals_filter).exclude(proposal_applicant__email_user_id=vessel_ownership.owner.emailuser).exclude(vessel_ownership__owner__emailuser=vessel_ownership.owner.emailuser)
-        for bp in blocking_ownerships:
-            logger.debug(f'blocking_ownership: [{bp}]')
+        # All the active applications and licences/permits for this vessel are looked up at once in the vessel occupancy index
+        vessel_occupancy.flush()
+        today = datetime.datetime.now(pytz.timezone(TIME_ZONE)).date()
+        not_sold = Q(end_date__gt=today) | Q(end_date=None)
+        proposals_filter = Q(source=VesselOccupancy.SOURCE_PROPOSAL)
+        proposals_filter &= (Q(vessel=self) & not_sold | Q(rego_no=self.rego_no))  # Blocking proposal is for the same vessel which has not been sold yet
+        proposals_filter &= ~Q(proposal_id=proposal_being_processed.id)  # Blocking proposal is not the proposal being processed
+        approval_filter = Q(source=VesselOccupancy.SOURCE_APPROVAL, vessel=self) & not_sold  # Approval is for the same vessel which has not been sold yet
+        approval_filter &= ~Q(approval_id=proposal_being_processed.approval_id) if proposal_being_processed.approval_id else Q()  # We don't want to include the approval that this the proposal is for
+        occupancies = list(VesselOccupancy.objects.filter(proposals_filter | approval_filter).order_by('id'))
+        proposal_occupancies = [o for o in occupancies if o.source == VesselOccupancy.SOURCE_PROPOSAL]
+        approval_occupancies = [o for o in occupancies if o.source == VesselOccupancy.SOURCE_APPROVAL]
 
+        #application/proposal block
+        blocking_ownerships = [o for o in proposal_occupancies if o.applicant_email_user_id != owner and o.owner_email_user_id != owner]
         if blocking_ownerships:
             from mooringlicensing.helpers import is_internal
             logger.info(f'Blocking ownerships(s): [{blocking_ownerships}] found.  This vessel: [{self}] is already listed with RIA under another owner.')
             if request and is_internal(request):
-                raise serializers.ValidationError(f"Blocking application(s): {str(list(blocking_ownerships.values_list("lodgement_number",flat=True)))} found. This vessel is already listed with RIA under another active application with another owner.")
+                raise serializers.ValidationError(f"Blocking application(s): {str([o.lodgement_number for o in blocking_ownerships])} found. This vessel is already listed with RIA under another active application with another owner.")
             else:
                 raise serializers.ValidationError("This vessel is already listed with RIA under another active application with another owner.")
 
-        if proposal_being_processed.application_type_code == 'aua':
-            blocking_proposals = AuthorisedUserApplication.objects.filter(proposals_filter)
-        elif proposal_being_processed.application_type_code == 'aaa':
-            blocking_proposals = AnnualAdmissionApplication.objects.filter(proposals_filter)
-            blocking_aua = AuthorisedUserApplication.objects.filter(proposals_filter)
-            blocking_mla = MooringLicenceApplication.objects.filter(proposals_filter)
-        elif proposal_being_processed.application_type_code == 'wla':
-            blocking_proposals = WaitingListApplication.objects.filter(proposals_filter)
-            blocking_mla = MooringLicenceApplication.objects.filter(proposals_filter)
-        elif proposal_being_processed.application_type_code == 'mla':
-            blocking_proposals = MooringLicenceApplication.objects.filter(proposals_filter)
-        else:
+        application_type_code = proposal_being_processed.application_type_code
+        if application_type_code not in (AuthorisedUserApplication.code, AnnualAdmissionApplication.code, WaitingListApplication.code, MooringLicenceApplication.code,):
             raise serializers.ValidationError("Invalid application type")
-        
-        for bp in blocking_proposals:
-            logger.debug(f'blocking_proposal: [{bp}]')
-        for bp in blocking_aua:
-            logger.debug(f'blocking_aua: [{bp}]')
-        for bp in blocking_mla:
-            logger.debug(f'blocking_mla: [{bp}]')      
+
+        blocking_proposals = [o for o in proposal_occupancies if o.child_type == application_type_code]
+        blocking_aua = []
+        blocking_mla = []
+        if application_type_code == AnnualAdmissionApplication.code:
+            blocking_aua = [o for o in proposal_occupancies if o.child_type == AuthorisedUserApplication.code]
+        if application_type_code in (AnnualAdmissionApplication.code, WaitingListApplication.code,):
+            blocking_mla = [o for o in proposal_occupancies if o.child_type == MooringLicenceApplication.code]
 
         if blocking_proposals:
             logger.info(f'Blocking proposal(s): [{blocking_proposals}] found.')
@@ -5459,38 +5418,24 @@ class Vessel(RevisionedMixin):
             raise serializers.ValidationError("This vessel is already listed with RIA under another active Mooring License Application")
 
         #license/permit/approval block
-        approval_filter = Q()
-        approval_filter &= Q(current_proposal__vessel_ownership__vessel=self) # Approval is for the same vessel
-        approval_filter &= (Q(current_proposal__vessel_ownership__end_date__gt=today) | Q(current_proposal__vessel_ownership__end_date=None)) # The vessel has not been sold yet
-        approval_filter &= ~Q(id=proposal_being_processed.approval.id) if proposal_being_processed.approval else Q() # We don't want to include the approval that this the proposal is for
-        approval_filter &= ~Q(status__in=[
-                    Approval.APPROVAL_STATUS_CANCELLED,
-                    Approval.APPROVAL_STATUS_EXPIRED,
-                    Approval.APPROVAL_STATUS_SURRENDERED,
-                    Approval.APPROVAL_STATUS_FULFILLED])
-        
-        blocking_approvals = []
-        blocking_aup = []
-        blocking_ml = []
-
-        blocking_approved_ownerships = Approval.objects.filter(approval_filter).exclude(current_proposal__vessel_ownership__owner__emailuser=vessel_ownership.owner.emailuser)
+        blocking_approved_ownerships = [o for o in approval_occupancies if o.owner_email_user_id != owner]
         if blocking_approved_ownerships:
             logger.info(f'Blocking ownerships(s): [{blocking_approved_ownerships}] found.  Another owner of this vessel: [{self}] holds a current Licence/Permit.')
             raise serializers.ValidationError("This vessel is already listed under a current Licence/Permit under another owner")
 
-        if proposal_being_processed.application_type_code == 'aua':
-            blocking_approvals = AuthorisedUserPermit.objects.filter(approval_filter)
-        elif proposal_being_processed.application_type_code == 'aaa':
-            blocking_approvals = AnnualAdmissionPermit.objects.filter(approval_filter)
-            blocking_aup = AuthorisedUserPermit.objects.filter(approval_filter)
-            blocking_ml = MooringLicence.objects.filter(approval_filter)
-        elif proposal_being_processed.application_type_code == 'wla':
-            blocking_approvals = WaitingListAllocation.objects.filter(approval_filter)
-            blocking_ml = MooringLicence.objects.filter(approval_filter)
-        elif proposal_being_processed.application_type_code == 'mla':
-            blocking_approvals = MooringLicence.objects.filter(approval_filter)
-        else:
-            raise serializers.ValidationError("Invalid application type")
+        approval_type_codes = {
+            AuthorisedUserApplication.code: AuthorisedUserPermit.code,
+            AnnualAdmissionApplication.code: AnnualAdmissionPermit.code,
+            WaitingListApplication.code: WaitingListAllocation.code,
+            MooringLicenceApplication.code: MooringLicence.code,
+        }
+        blocking_approvals = [o for o in approval_occupancies if o.child_type == approval_type_codes[application_type_code]]
+        blocking_aup = []
+        blocking_ml = []
+        if application_type_code == AnnualAdmissionApplication.code:
+            blocking_aup = [o for o in approval_occupancies if o.child_type == AuthorisedUserPermit.code]
+        if application_type_code in (AnnualAdmissionApplication.code, WaitingListApplication.code,):
+            blocking_ml = [o for o in approval_occupancies if o.child_type == MooringLicence.code]
 
         if blocking_approvals:
             logger.info(f'Blocking approval(s): [{blocking_approvals}] found.  Another owner of this vessel: [{self}] holds a current Licence/Permit.')
@@ -5501,7 +5446,7 @@ class Vessel(RevisionedMixin):
         if blocking_ml:
             logger.info(f'Blocking Mooring License: [{blocking_ml}] found.  Another owner of this vessel: [{self}] holds a current Licence/Permit.')
             raise serializers.ValidationError("This vessel is listed under a current Mooring License - cannot submit a new " + proposal_being_processed.application_type.description)
-        
+
     @property
     def latest_vessel_details(self):
         return self.filtered_vesseldetails_set.first()
@@ -5531,6 +5476,48 @@ class Vessel(RevisionedMixin):
                 )
 
 
+class VesselOccupancy(models.Model):
+    """
+    A row per active application or current/suspended licence/permit and the vessel it is for, kept in sync by
+    components/proposals/vessel_occupancy.py.  The vessel checks at submit look the conflicts up here in one indexed
+    query, however long the history of the vessel is.
+    """
+    SOURCE_PROPOSAL = 'proposal'  # An application, through its vessel ownership/details
+    SOURCE_APPROVAL = 'approval'  # A licence/permit, through the vessel ownership/details of its current proposal
+    SOURCE_APPROVAL_VESSEL = 'approval_vessel'  # A vessel currently on a mooring licence
+    SOURCE_CHOICES = (
+        (SOURCE_PROPOSAL, 'Application'),
+        (SOURCE_APPROVAL, 'Licence/Permit'),
+        (SOURCE_APPROVAL_VESSEL, 'Vessel on the mooring licence'),
+    )
+
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    proposal = models.ForeignKey('Proposal', null=True, blank=True, related_name='+', on_delete=models.CASCADE)
+    approval = models.ForeignKey('mooringlicensing.Approval', null=True, blank=True, related_name='+', on_delete=models.CASCADE)
+    lodgement_number = models.CharField(max_length=9, blank=True, default='')
+    child_type = models.CharField(max_length=3, blank=True, default='')
+    status = models.CharField(max_length=40, blank=True, default='')
+    vessel = models.ForeignKey(Vessel, null=True, blank=True, related_name='+', on_delete=models.SET_NULL)  # of the vessel ownership
+    details_vessel = models.ForeignKey(Vessel, null=True, blank=True, related_name='+', on_delete=models.SET_NULL)  # of the vessel details
+    rego_no = models.CharField(max_length=200, blank=True, null=True)
+    owner_email_user_id = models.IntegerField(null=True, blank=True)
+    applicant_email_user_id = models.IntegerField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)  # of the vessel ownership, None while the vessel has not been sold
+    start_date = models.DateField(null=True, blank=True)
+    expiry_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        indexes = [
+            models.Index(fields=['vessel', 'source', 'end_date'], name='vessel_occupancy_vessel_idx'),
+            models.Index(fields=['details_vessel', 'source', 'end_date'], name='vessel_occupancy_details_idx'),
+            models.Index(fields=['rego_no'], name='vessel_occupancy_rego_no_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.lodgement_number} ({self.source}: {self.proposal_id or self.approval_id})'
+
+
 class VesselLogDocument(Document):#
     log_entry = models.ForeignKey('VesselLogEntry',related_name='documents', on_delete=models.CASCADE)
     _file = models.FileField(storage=private_storage,upload_to=update_vessel_comms_log_filename, max_length=512)
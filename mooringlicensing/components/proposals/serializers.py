@@ -283,7 +283,7 @@ class BaseProposalSerializer(serializers.ModelSerializer):
             return VesselOwnershipSerializer(obj.previous_application.vessel_ownership).data
 
     def get_authorised_user_moorings_str(self, obj):
-        if type(obj.child_obj) == AuthorisedUserApplication and obj.approval:
+        if obj.child_type == AuthorisedUserApplication.code and obj.approval:
             moorings_str = ''
             moorings_str += ', '.join([mooring.name for mooring in obj.listed_moorings.all()])
             return moorings_str
@@ -310,7 +310,7 @@ class BaseProposalSerializer(serializers.ModelSerializer):
         return lodgement_number
 
     def get_current_vessels_rego_list(self, obj):
-        if obj.approval and type(obj.approval.child_obj) is MooringLicence:
+        if obj.approval and obj.approval.child_type == MooringLicence.code:
             vessels_str = ''
             vessels_str += ', '.join([vo.vessel.rego_no for vo in obj.listed_vessels.filter(end_date__isnull=True)])
 
@@ -1199,7 +1199,7 @@ class InternalProposalSerializer(BaseProposalSerializer):
         return obj.application_type_code
 
     def get_current_vessels_rego_list(self, obj):
-        if obj.approval and type(obj.approval.child_obj) is MooringLicence:
+        if obj.approval and obj.approval.child_type == MooringLicence.code:
             vessels_str = ''
             vessels_str += ', '.join([vo.vessel.rego_no for vo in obj.listed_vessels.filter(end_date__isnull=True)])
 
@@ -1213,14 +1213,14 @@ class InternalProposalSerializer(BaseProposalSerializer):
         return obj.approval.reissued if obj.approval else False
 
     def get_authorised_user_moorings_str(self, obj):
-        if type(obj.child_obj) == AuthorisedUserApplication and obj.approval:
+        if obj.child_type == AuthorisedUserApplication.code and obj.approval:
             moorings_str = ''
             moorings_str += ', '.join([mooring.name for mooring in obj.listed_moorings.all()])
             return moorings_str
 
     def get_authorised_user_moorings(self, obj):
         moorings = []
-        if type(obj.child_obj) == AuthorisedUserApplication and obj.approval:
+        if obj.child_type == AuthorisedUserApplication.code and obj.approval:
             for moa in obj.approval.mooringonapproval_set.all():
                 suitable_for_mooring = True
                 # only do check if vessel details exist
@@ -1252,7 +1252,7 @@ class InternalProposalSerializer(BaseProposalSerializer):
     def get_mooring_licence_vessels(self, obj):
         vessels = []
         vessel_details = []
-        if type(obj.child_obj) == MooringLicenceApplication and obj.approval:
+        if obj.child_type == MooringLicenceApplication.code and obj.approval:
             for vooa in obj.approval.vesselownershiponapproval_set.filter(vessel_ownership__end_date__isnull=True):
                 vessel = vooa.vessel_ownership.vessel
                 vessels.append(vessel)
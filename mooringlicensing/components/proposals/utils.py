@@ -73,13 +73,13 @@ def save_proponent_data(instance, request, action, being_auto_approved=False):
 
         if action == 'submit':
             logger.info('Proposal {} has been submitted'.format(instance.lodgement_number))
-        if type(instance.child_obj) == WaitingListApplication:
+        if instance.child_type == WaitingListApplication.code:
             save_proponent_data_wla(instance, request, action)
-        elif type(instance.child_obj) == AnnualAdmissionApplication:
+        elif instance.child_type == AnnualAdmissionApplication.code:
             save_proponent_data_aaa(instance, request, action)
-        elif type(instance.child_obj) == AuthorisedUserApplication:
+        elif instance.child_type == AuthorisedUserApplication.code:
             save_proponent_data_aua(instance, request, action)
-        elif type(instance.child_obj) == MooringLicenceApplication:
+        elif instance.child_type == MooringLicenceApplication.code:
             save_proponent_data_mla(instance, request, action)        
         
     else:
@@ -506,14 +506,14 @@ def submit_vessel_data(instance, request, vessel_data=None, approving=False):
             except:
                 raise serializers.ValidationError("Provided vessel details invalid")
             
-            if (hasattr(instance, 'child_obj') and isinstance(instance.child_obj,WaitingListApplication)) or (isinstance(instance,WaitingListApplication)):
+            if (hasattr(instance, 'child_obj') and instance.child_type == WaitingListApplication.code) or (isinstance(instance,WaitingListApplication)):
                 try:
-                    minimum_length = float(GlobalSettings.objects.get(key=GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH).value)
+                    minimum_length = float(GlobalSettings.get_value(GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH))
                 except:
                     minimum_length = float(GlobalSettings.default_values[GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH])
             else:
                 try:
-                    minimum_length = float(GlobalSettings.objects.get(key=GlobalSettings.KEY_MINIMUM_VESSEL_LENGTH).value)
+                    minimum_length = float(GlobalSettings.get_value(GlobalSettings.KEY_MINIMUM_VESSEL_LENGTH))
                 except:
                     minimum_length = float(GlobalSettings.default_values[GlobalSettings.KEY_MINIMUM_VESSEL_LENGTH])
 
@@ -526,12 +526,12 @@ def submit_vessel_data(instance, request, vessel_data=None, approving=False):
     # Mooring Licence vessel history
     # Migrated records do not have DOT name, so only run dot check for new vessel submissions
     if (
-        ((hasattr(instance, 'child_obj') and isinstance(instance.child_obj,MooringLicenceApplication)) or 
+        ((hasattr(instance, 'child_obj') and instance.child_type == MooringLicenceApplication.code) or 
         isinstance(instance,MooringLicenceApplication)) and 
         instance.approval and 
         not instance.approval.migrated
         ):
-        if isinstance(instance.approval.child_obj,MooringLicence) and instance.approval.child_obj.vessel_ownership_list:
+        if instance.approval.child_type == MooringLicence.code and instance.approval.child_obj.vessel_ownership_list:
             for vo in instance.approval.child_obj.vessel_ownership_list:
                 if vo.dot_name:
                     dot_name = vo.dot_name
@@ -588,7 +588,7 @@ def submit_vessel_data(instance, request, vessel_data=None, approving=False):
     if not vessel_data.get('rego_no'):
         #MLA and WLA do not need a vessel to be submitted
         if (
-            hasattr(instance,"child_obj") and (isinstance(instance.child_obj, MooringLicenceApplication) or isinstance(instance.child_obj, WaitingListApplication))
+            hasattr(instance,"child_obj") and (instance.child_type == MooringLicenceApplication.code or instance.child_type == WaitingListApplication.code)
             or 
             (isinstance(instance, MooringLicenceApplication) or isinstance(instance, WaitingListApplication))
         ):
@@ -0,0 +1,230 @@
+import logging
+import threading
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+#the applications with these statuses do not occupy the vessel
+INACTIVE_PROPOSAL_STATUSES = (
+    'approved',
+    'printing_sticker',  # printing sticker is treated the same as approved
+    'declined',
+    'expired',
+    'discarded',
+)
+#only the licences/permits with these statuses occupy the vessel
+ACTIVE_APPROVAL_STATUSES = ('current', 'suspended',)
+#a vessel on a mooring licence is current once one of the applications for the licence has been approved
+APPROVED_PROPOSAL_STATUSES = ('printing_sticker', 'approved',)
+
+_pending = threading.local()
+
+
+def _get_models(apps):
+    return (
+        apps.get_model('mooringlicensing', 'Proposal'),
+        apps.get_model('mooringlicensing', 'Approval'),
+        apps.get_model('mooringlicensing', 'VesselOwnershipOnApproval'),
+        apps.get_model('mooringlicensing', 'VesselOccupancy'),
+    )
+
+
+def build_rows(proposal_ids=None, approval_ids=None, apps=global_apps):
+    """
+    The VesselOccupancy rows of the proposals and approvals (all of them when the ids are None), unsaved.
+    Only the fields are read, so that the migration can build the rows with the historical models.
+    """
+    # The historical models of the migrations have no class attributes, the sources are taken from the model
+    from mooringlicensing.components.proposals.models import VesselOccupancy as sources
+    Proposal, Approval, VesselOwnershipOnApproval, VesselOccupancy = _get_models(apps)
+    rows = []
+
+    proposals = Proposal.objects.exclude(processing_status__in=INACTIVE_PROPOSAL_STATUSES)
+    if proposal_ids is not None:
+        proposals = proposals.filter(id__in=proposal_ids)
+    for proposal in proposals.values(
+        'id', 'lodgement_number', 'child_type', 'processing_status', 'rego_no', 'vessel_details__vessel_id',
+        'vessel_ownership__vessel_id', 'vessel_ownership__owner__emailuser', 'vessel_ownership__end_date',
+        'proposal_applicant__email_user_id',
+    ):
+        rows.append(VesselOccupancy(
+            source=sources.SOURCE_PROPOSAL,
+            proposal_id=proposal['id'],
+            lodgement_number=proposal['lodgement_number'] or '',
+            child_type=proposal['child_type'],
+            status=proposal['processing_status'],
+            vessel_id=proposal['vessel_ownership__vessel_id'],
+            details_vessel_id=proposal['vessel_details__vessel_id'],
+            rego_no=proposal['rego_no'],
+            owner_email_user_id=proposal['vessel_ownership__owner__emailuser'],
+            applicant_email_user_id=proposal['proposal_applicant__email_user_id'],
+            end_date=proposal['vessel_ownership__end_date'],
+        ))
+
+    approvals = Approval.objects.filter(status__in=ACTIVE_APPROVAL_STATUSES)
+    if approval_ids is not None:
+        approvals = approvals.filter(id__in=approval_ids)
+    approval_rows = {}
+    for approval in approvals.values(
+        'id', 'lodgement_number', 'child_type', 'status', 'start_date', 'expiry_date',
+        'current_proposal__vessel_details__vessel_id', 'current_proposal__vessel_ownership__vessel_id',
+        'current_proposal__vessel_ownership__vessel__rego_no', 'current_proposal__vessel_ownership__owner__emailuser',
+        'current_proposal__vessel_ownership__end_date', 'current_proposal__proposal_applicant__email_user_id',
+    ):
+        approval_rows[approval['id']] = VesselOccupancy(
+            source=sources.SOURCE_APPROVAL,
+            approval_id=approval['id'],
+            lodgement_number=approval['lodgement_number'] or '',
+            child_type=approval['child_type'],
+            status=approval['status'],
+            vessel_id=approval['current_proposal__vessel_ownership__vessel_id'],
+            details_vessel_id=approval['current_proposal__vessel_details__vessel_id'],
+            rego_no=approval['current_proposal__vessel_ownership__vessel__rego_no'],
+            owner_email_user_id=approval['current_proposal__vessel_ownership__owner__emailuser'],
+            applicant_email_user_id=approval['current_proposal__proposal_applicant__email_user_id'],
+            end_date=approval['current_proposal__vessel_ownership__end_date'],
+            start_date=approval['start_date'],
+            expiry_date=approval['expiry_date'],
+        )
+    rows += approval_rows.values()
+
+    # The vessels currently on the mooring licences
+    vessels_on_approvals = VesselOwnershipOnApproval.objects.filter(
+        approval__child_type='ml',
+        approval__status__in=ACTIVE_APPROVAL_STATUSES,
+        approval__proposal__processing_status__in=APPROVED_PROPOSAL_STATUSES,
+        end_date__isnull=True,
+        vessel_ownership__end_date__isnull=True,
+    )
+    if approval_ids is not None:
+        vessels_on_approvals = vessels_on_approvals.filter(approval_id__in=approval_ids)
+    for approval_id, vessel_id, owner_email_user_id in set(vessels_on_approvals.values_list(
+        'approval_id', 'vessel_ownership__vessel_id', 'vessel_ownership__owner__emailuser',
+    )):
+        approval_row = approval_rows[approval_id]
+        rows.append(VesselOccupancy(
+            source=sources.SOURCE_APPROVAL_VESSEL,
+            approval_id=approval_id,
+            lodgement_number=approval_row.lodgement_number,
+            child_type=approval_row.child_type,
+            status=approval_row.status,
+            vessel_id=vessel_id,
+            owner_email_user_id=owner_email_user_id,
+            start_date=approval_row.start_date,
+            expiry_date=approval_row.expiry_date,
+        ))
+    return rows
+
+
+def _dependants(proposal_ids, approval_ids, vessel_ownership_ids, apps):
+    """
+    Add the proposals and approvals whose rows depend on the objects changed
+    """
+    Proposal, Approval, VesselOwnershipOnApproval, VesselOccupancy = _get_models(apps)
+    if vessel_ownership_ids:
+        proposal_ids |= set(Proposal.objects.filter(vessel_ownership_id__in=vessel_ownership_ids).values_list('id', flat=True))
+        approval_ids |= set(VesselOwnershipOnApproval.objects.filter(vessel_ownership_id__in=vessel_ownership_ids).values_list('approval_id', flat=True))
+    if proposal_ids:
+        # The approvals the proposals are the current proposal of, and the approvals the proposals are for
+        approval_ids |= set(Approval.objects.filter(current_proposal_id__in=proposal_ids).values_list('id', flat=True))
+        approval_ids |= set(Proposal.objects.filter(id__in=proposal_ids, approval__isnull=False).values_list('approval_id', flat=True))
+    return proposal_ids, approval_ids
+
+
+def sync(proposal_ids=(), approval_ids=(), vessel_ownership_ids=(), apps=global_apps):
+    """
+    Replace the rows of the proposals and approvals, and of the proposals and approvals depending on them
+    or on the vessel ownerships
+    """
+    Proposal, Approval, VesselOwnershipOnApproval, VesselOccupancy = _get_models(apps)
+    proposal_ids, approval_ids = _dependants(set(proposal_ids), set(approval_ids), set(vessel_ownership_ids), apps)
+    if not proposal_ids and not approval_ids:
+        return
+
+    with transaction.atomic():
+        # Concurrent syncs of the same objects run one after the other, so that the rows are not doubled up
+        list(Proposal.objects.select_for_update().filter(id__in=proposal_ids).values_list('id', flat=True))
+        list(Approval.objects.select_for_update().filter(id__in=approval_ids).values_list('id', flat=True))
+        VesselOccupancy.objects.filter(Q(proposal_id__in=proposal_ids) | Q(approval_id__in=approval_ids)).delete()
+        VesselOccupancy.objects.bulk_create(build_rows(proposal_ids, approval_ids, apps=apps))
+
+
+def rebuild(apps=global_apps, batch_size=1000):
+    Proposal, Approval, VesselOwnershipOnApproval, VesselOccupancy = _get_models(apps)
+    with transaction.atomic():
+        VesselOccupancy.objects.all().delete()
+        rows = VesselOccupancy.objects.bulk_create(build_rows(apps=apps), batch_size=batch_size)
+    return len(rows)
+
+
+def _row_key(row):
+    return tuple(getattr(row, field.attname) for field in row._meta.concrete_fields if field.name != 'id')
+
+
+def verify():
+    """
+    Compare the rows stored with the rows built from scratch.  Returns (rows missing, rows out of date)
+    """
+    VesselOccupancy = global_apps.get_model('mooringlicensing', 'VesselOccupancy')
+    expected = {_row_key(row) for row in build_rows()}
+    stored = {_row_key(row) for row in VesselOccupancy.objects.all()}
+    return expected - stored, stored - expected
+
+
+def _add_pending(proposal_ids=(), approval_ids=(), vessel_ownership_ids=()):
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        pending = _pending.ids = {'proposal_ids': set(), 'approval_ids': set(), 'vessel_ownership_ids': set()}
+    pending['proposal_ids'].update(proposal_ids)
+    pending['approval_ids'].update(approval_ids)
+    pending['vessel_ownership_ids'].update(vessel_ownership_ids)
+
+
+def _take_pending():
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        return None
+    ids = {key: set(value) for key, value in pending.items()}
+    for value in pending.values():
+        value.clear()
+    return ids if any(ids.values()) else None
+
+
+def flush():
+    """
+    Sync the rows of the objects changed so far in the transaction, before the index is read in the same transaction.
+    The rows are otherwise only synced once the transaction has been committed.
+    A failure is raised, for a check never to pass on rows out of date; the objects are kept for the sync on commit.
+    """
+    ids = _take_pending()
+    if not ids:
+        return
+    try:
+        sync(**ids)
+    except Exception as e:
+        logger.error(f'Failed to sync the vessel occupancy of: [{ids}] before reading it.  Error: [{e}]')
+        _add_pending(**ids)
+        raise
+
+
+def sync_on_commit(proposal_ids=(), approval_ids=(), vessel_ownership_ids=()):
+    """
+    Sync the rows once the transaction has been committed, or before, when the index is read in the transaction (flush).
+    Every object changed in a transaction is synced once, by the first callback to run.
+    A failure to sync is logged and never affects the save; the rebuild_vessel_occupancy command puts it right.
+    """
+    _add_pending(proposal_ids, approval_ids, vessel_ownership_ids)
+
+    def _sync():
+        # Ids left over from a rolled back transaction are synced too, which does no harm
+        ids = _take_pending()
+        if not ids:
+            return
+        try:
+            sync(**ids)
+        except Exception as e:
+            logger.exception(f'Failed to sync the vessel occupancy of: [{ids}].  Error: [{e}]')
+    transaction.on_commit(_sync)
@@ -1,12 +1,185 @@
+import atexit
 import os
+import queue
+import re
+import shutil
+import subprocess
+import tempfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 from docxtpl import DocxTemplate
 from mooringlicensing.components.main.models import GlobalSettings
 
+logger = logging.getLogger(__name__)
+
+
+class LibreOfficeConverterPool(object):
+    """
+    Converts docx files to pdf with at most max_workers LibreOffice processes at a time.
+
+    Each worker keeps its own LibreOffice user profile (concurrent LibreOffice processes sharing a profile
+    fail or block each other), which is reused between runs so only the first run of a worker pays for creating it.
+    Each run converts a whole batch of files, so the LibreOffice start up is paid once per batch rather than once per document.
+    """
+
+    PROFILE_NAME = 'libreoffice_profile_{}_{}'
+    PROFILE_NAME_RE = re.compile(r'^libreoffice_profile_(\d+)_\d+$')
+
+    def __init__(self, max_workers, batch_size, timeout):
+        self.max_workers = max(1, max_workers)
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self._profiles = queue.Queue()
+        self._profile_directories = []
+        remove_stale_profiles()
+        for i in range(self.max_workers):
+            profile = os.path.join(get_temp_directory(), self.PROFILE_NAME.format(os.getpid(), i))
+            self._profile_directories.append(profile)
+            self._profiles.put(profile)
+        atexit.register(self.remove_profiles)
+
+    def remove_profiles(self):
+        for profile in self._profile_directories:
+            shutil.rmtree(profile, ignore_errors=True)
+
+    def _convert_batch(self, docx_files, outdir):
+        """
+        Returns None, or the exception raised when LibreOffice could not be run (e.g. timed out or not installed)
+        """
+        profile = self._profiles.get()
+        try:
+            command = [
+                'libreoffice',
+                '-env:UserInstallation=file://{}'.format(profile),
+                '--headless',
+                '--norestore',
+                '--convert-to', 'pdf',
+                '--outdir', outdir,
+            ] + docx_files
+            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=self.timeout)
+            if result.returncode:
+                logger.error(f'LibreOffice exited with [{result.returncode}]: [{result.stderr.decode(errors="ignore")}]')
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.error(f'LibreOffice failed to convert {len(docx_files)} file(s).  Error: [{e}]')
+            return e
+        finally:
+            self._profiles.put(profile)
+
+    def convert(self, docx_files, outdir):
+        """
+        Convert docx_files into pdf files with the same base names in outdir.
+        Returns {docx_file: exception} for the files of the batches LibreOffice could not be run for.
+        """
+        batches = [docx_files[i:i + self.batch_size] for i in range(0, len(docx_files), self.batch_size)]
+        if len(batches) == 1:
+            errors = [self._convert_batch(batches[0], outdir)]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                errors = list(executor.map(lambda batch: self._convert_batch(batch, outdir), batches))
+        return {docx_file: error for batch, error in zip(batches, errors) if error for docx_file in batch}
+
+
+def remove_stale_profiles():
+    """
+    Remove the LibreOffice profiles left behind by the processes which have exited without cleaning up (e.g. killed workers)
+    """
+    temp_directory = get_temp_directory()
+    for name in os.listdir(temp_directory):
+        match = LibreOfficeConverterPool.PROFILE_NAME_RE.match(name)
+        if not match:
+            continue
+        try:
+            os.kill(int(match.group(1)), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(temp_directory, name), ignore_errors=True)
+        except OSError:
+            # Running, under another user
+            pass
+
+
+_converter_pool = None
+
+
+def get_temp_directory():
+    temp_directory = settings.BASE_DIR + "/tmp/"
+    try:
+        os.stat(temp_directory)
+    except:
+        os.mkdir(temp_directory)
+    return temp_directory
+
+
+def get_converter_pool():
+    global _converter_pool
+    if _converter_pool is None:
+        _converter_pool = LibreOfficeConverterPool(
+            settings.LIBREOFFICE_MAX_WORKERS,
+            settings.LIBREOFFICE_BATCH_SIZE,
+            settings.LIBREOFFICE_TIMEOUT,
+        )
+    return _converter_pool
+
+
+def convert_docs_to_pdf_bytes(docs):
+    """
+    Convert rendered DocxTemplates into pdf bytes.
+
+    Returns a list in the same order as docs, holding the bytes of each pdf or the exception raised for it.
+    The files are written to a directory unique to this call so concurrent conversions cannot collide.
+    """
+    work_directory = tempfile.mkdtemp(dir=get_temp_directory())
+    try:
+        docx_files = []
+        results = [None] * len(docs)
+        for idx, doc in enumerate(docs):
+            if isinstance(doc, Exception):
+                results[idx] = doc
+                continue
+            docx_file = os.path.join(work_directory, 'document_{}.docx'.format(idx))
+            doc.save(docx_file)
+            docx_files.append(docx_file)
+
+        errors = get_converter_pool().convert(docx_files, work_directory) if docx_files else {}
+
+        for idx in range(len(docs)):
+            if results[idx] is not None:
+                continue
+            docx_file = os.path.join(work_directory, 'document_{}.docx'.format(idx))
+            if docx_file in errors:
+                results[idx] = Exception('PDF could not be generated: {}'.format(errors[docx_file]))
+                continue
+            pdf_file = os.path.join(work_directory, 'document_{}.pdf'.format(idx))
+            try:
+                with open(pdf_file, 'rb') as f:
+                    results[idx] = f.read()
+            except Exception as e:
+                results[idx] = Exception('PDF could not be generated: {}'.format(e))
+        return results
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+
+def _convert_doc_to_pdf_bytes(doc):
+    file_contents = convert_docs_to_pdf_bytes([doc])[0]
+    if isinstance(file_contents, Exception):
+        raise file_contents
+    return file_contents
 
-def create_dcv_permit_pdf_bytes(dcv_permit):
 
+def _render_docs(objs, render):
+    docs = []
+    for obj in objs:
+        try:
+            docs.append(render(obj))
+        except Exception as e:
+            logger.exception(f'Failed to render the document for: [{obj}].  Error: [{e}]')
+            docs.append(e)
+    return docs
+
+
+def render_dcv_permit_doc(dcv_permit):
     licence_template = GlobalSettings.objects.get(key=GlobalSettings.KEY_DCV_PERMIT_TEMPLATE_FILE)
 
     if licence_template._file:
@@ -15,33 +188,23 @@ def create_dcv_permit_pdf_bytes(dcv_permit):
         raise Exception('DcvPermit template file not found.')
 
     doc = DocxTemplate(path_to_template)
-    
+
     context = dcv_permit.get_context_for_licence_permit()
     if 'p_address_line2' in context and context['p_address_line2'] is None:
-        context['p_address_line2'] = '' 
+        context['p_address_line2'] = ''
     doc.render(context)
+    return doc
 
-    temp_directory = settings.BASE_DIR + "/tmp/"
-    try:
-        os.stat(temp_directory)
-    except:
-        os.mkdir(temp_directory)
 
-    f_name = temp_directory + 'dcv_permit_' + str(dcv_permit.id)
-    new_doc_file = f_name + '.docx'
-    new_pdf_file = f_name + '.pdf'
-    doc.save(new_doc_file)
-    os.system("libreoffice --headless --convert-to pdf " + new_doc_file + " --outdir " + temp_directory)
-
-    file_contents = None
-    with open(new_pdf_file, 'rb') as f:
-        file_contents = f.read()
-    os.remove(new_doc_file)
-    os.remove(new_pdf_file)
-    return file_contents
+def create_dcv_permit_pdf_bytes(dcv_permit):
+    return _convert_doc_to_pdf_bytes(render_dcv_permit_doc(dcv_permit))
 
 
-def create_dcv_admission_pdf_bytes(dcv_admission_arrival):
+def create_dcv_permit_pdf_bytes_batch(dcv_permits):
+    return convert_docs_to_pdf_bytes(_render_docs(dcv_permits, render_dcv_permit_doc))
+
+
+def render_dcv_admission_doc(dcv_admission_arrival):
     licence_template = GlobalSettings.objects.get(key=GlobalSettings.KEY_DCV_ADMISSION_TEMPLATE_FILE)
 
     if licence_template._file:
@@ -53,28 +216,14 @@ def create_dcv_admission_pdf_bytes(dcv_admission_arrival):
 
     context = dcv_admission_arrival.get_context_for_licence_permit()
     doc.render(context)
+    return doc
 
-    temp_directory = settings.BASE_DIR + "/tmp/"
-    try:
-        os.stat(temp_directory)
-    except:
-        os.mkdir(temp_directory)
 
-    f_name = temp_directory + 'dcv_admission' + str(dcv_admission_arrival.dcv_admission.id)
-    new_doc_file = f_name + '.docx'
-    new_pdf_file = f_name + '.pdf'
-    doc.save(new_doc_file)
-    os.system("libreoffice --headless --convert-to pdf " + new_doc_file + " --outdir " + temp_directory)
-
-    file_contents = None
-    with open(new_pdf_file, 'rb') as f:
-        file_contents = f.read()
-    os.remove(new_doc_file)
-    os.remove(new_pdf_file)
-    return file_contents
+def create_dcv_admission_pdf_bytes(dcv_admission_arrival):
+    return _convert_doc_to_pdf_bytes(render_dcv_admission_doc(dcv_admission_arrival))
 
 
-def create_authorised_user_summary_doc_bytes(approval):
+def render_authorised_user_summary_doc(approval):
     from mooringlicensing.components.approvals.models import Approval
 
     # Retrieve a template according to the approval type
@@ -88,27 +237,18 @@ def create_authorised_user_summary_doc_bytes(approval):
     doc = DocxTemplate(path_to_template)
     context = approval.child_obj.get_context_for_au_summary() if type(approval) == Approval else approval.get_context_for_au_summary()
     doc.render(context)
+    return doc
 
-    temp_directory = settings.BASE_DIR + "/tmp/"
-    try:
-        os.stat(temp_directory)
-    except:
-        os.mkdir(temp_directory)
 
-    f_name = temp_directory + 'approval' + str(approval.id)
-    new_doc_file = f_name + '.docx'
-    new_pdf_file = f_name + '.pdf'
-    doc.save(new_doc_file)
-    os.system("libreoffice --headless --convert-to pdf " + new_doc_file + " --outdir " + temp_directory)
+def create_authorised_user_summary_doc_bytes(approval):
+    return _convert_doc_to_pdf_bytes(render_authorised_user_summary_doc(approval))
 
-    with open(new_pdf_file, 'rb') as f:
-        file_contents = f.read()
-    os.remove(new_doc_file)
-    os.remove(new_pdf_file)
-    return file_contents
 
+def create_authorised_user_summary_doc_bytes_batch(approvals):
+    return convert_docs_to_pdf_bytes(_render_docs(approvals, render_authorised_user_summary_doc))
 
-def create_approval_doc_bytes(approval):
+
+def render_approval_doc(approval):
     from mooringlicensing.components.approvals.models import Approval
 
     # Retrieve a template according to the approval type
@@ -126,21 +266,12 @@ def create_approval_doc_bytes(approval):
     if 'p_address_line2' in context and context['p_address_line2'] is None:
         context['p_address_line2'] = ''
     doc.render(context)
+    return doc
+
+
+def create_approval_doc_bytes(approval):
+    return _convert_doc_to_pdf_bytes(render_approval_doc(approval))
 
-    temp_directory = settings.BASE_DIR + "/tmp/"
-    try:
-        os.stat(temp_directory)
-    except:
-        os.mkdir(temp_directory)
 
-    f_name = temp_directory + 'approval' + str(approval.id)
-    new_doc_file = f_name + '.docx'
-    new_pdf_file = f_name + '.pdf'
-    doc.save(new_doc_file)
-    os.system("libreoffice --headless --convert-to pdf " + new_doc_file + " --outdir " + temp_directory)
-
-    with open(new_pdf_file, 'rb') as f:
-        file_contents = f.read()
-    os.remove(new_doc_file)
-    os.remove(new_pdf_file)
-    return file_contents
\ No newline at end of file
+def create_approval_doc_bytes_batch(approvals):
+    return convert_docs_to_pdf_bytes(_render_docs(approvals, render_approval_doc))
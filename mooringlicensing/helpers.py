@@ -4,9 +4,11 @@ from django.core.cache import cache
 
 import logging
 import ledger_api_client
+from ledger_api_client.managed_models import SystemUser, SystemUserAddress
 
 from rest_framework import serializers
 
+from mooringlicensing.components.main.group_membership import get_group_membership_snapshot
 from mooringlicensing.components.proposals.models import Proposal
 
 logger = logging.getLogger(__name__)
@@ -20,7 +22,11 @@ def belongs_to(user, group_name):
     """
     if user.is_superuser:
         return True
-    
+
+    snapshot = get_group_membership_snapshot()
+    if snapshot.has_group(group_name):
+        return snapshot.belongs_to(user.id, group_name)
+
     belongs_to_value = cache.get(
         "User-belongs_to" + str(user.id) + "group_name:" + group_name
     )
@@ -37,6 +43,34 @@ def belongs_to(user, group_name):
             )
     return belongs_to_value
 
+PROFILE_COMPLETE_CACHE_KEY = 'profile_complete_{}'
+
+def get_profile_complete(ledger_id):
+    """
+    Check if the system user of ledger_id has completed the details asked for on the first time page.
+    Only a complete profile is cached, until the system user or one of their addresses is saved.
+    """
+    cache_key = PROFILE_COMPLETE_CACHE_KEY.format(ledger_id)
+    if cache.get(cache_key):
+        return True
+
+    system_user = SystemUser.objects.filter(ledger_id=ledger_id).first()
+    profile_complete = bool(
+        system_user and
+        system_user.legal_first_name and
+        system_user.legal_last_name and
+        system_user.legal_dob and
+        system_user.mobile_number and
+        SystemUserAddress.objects.filter(system_user=system_user, address_type=SystemUserAddress.ADDRESS_TYPE[0][0]).exists() and
+        SystemUserAddress.objects.filter(system_user=system_user, address_type=SystemUserAddress.ADDRESS_TYPE[1][0]).exists()
+    )
+    if profile_complete:
+        cache.set(cache_key, True, settings.PROFILE_COMPLETE_CACHE_TIMEOUT)
+    return profile_complete
+
+def invalidate_profile_complete(ledger_id):
+    cache.delete(PROFILE_COMPLETE_CACHE_KEY.format(ledger_id))
+
 def is_model_backend(request):
     # Return True if user logged in via single sign-on (i.e. an internal)
     return 'ModelBackend' in request.session.get('_auth_user_backend')
@@ -58,17 +92,11 @@ def is_customer(request):
     return request.user.is_authenticated and (is_model_backend(request) or is_email_auth_backend(request))
 
 def is_internal(request):
-    if request.user.is_authenticated:
-        for i in settings.INTERNAL_GROUPS:
-            if belongs_to(request.user, i):
-                return True
-    return False
+    return is_internal_user(request.user)
 
 def is_internal_user(user):
     if user.is_authenticated:
-        for i in settings.INTERNAL_GROUPS:
-            if belongs_to(user, i):
-                return True
+        return user.is_superuser or get_group_membership_snapshot().is_internal(user.id)
     return False
 
 def is_authorised_to_pay_auto_approved(request, instance):
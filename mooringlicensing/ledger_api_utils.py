@@ -1,18 +1,72 @@
 from ledger_api_client import utils
 from ledger_api_client.ledger_models import EmailUserRO
 from ledger_api_client.managed_models import SystemUser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
 import logging
+import threading
+import time
 from mooringlicensing.components.main.decorators import basic_exception_handler
 
 logger = logging.getLogger(__name__)
 
 
+#EmailUserROs remembered by the email_user_scope active in the thread: {'by_id': {id: user}, 'by_email': {email: user}}
+_email_user_scope = threading.local()
+
+
+@contextmanager
+def email_user_scope():
+    """
+    Remember the EmailUserROs retrieved in this thread until the scope exits, for the jobs (e.g. the reminder commands)
+    needing the same users again and again.  A nested scope shares the outer one.
+    """
+    if getattr(_email_user_scope, 'users', None) is not None:
+        yield
+        return
+    _email_user_scope.users = {'by_id': {}, 'by_email': {}}
+    try:
+        yield
+    finally:
+        _email_user_scope.users = None
+
+
+def get_email_user_scope():
+    return getattr(_email_user_scope, 'users', None)
+
+
+def preload_email_users(email_user_ids, chunk_size=1000):
+    """
+    Fetch the EmailUserROs into the active email_user_scope with one query per chunk.  Does nothing outside a scope.
+    """
+    users = get_email_user_scope()
+    if users is None:
+        return
+    to_fetch = list({email_user_id for email_user_id in email_user_ids if email_user_id and email_user_id not in users['by_id']})
+    for i in range(0, len(to_fetch), chunk_size):
+        chunk = to_fetch[i:i + chunk_size]
+        fetched = EmailUserRO.objects.in_bulk(chunk)
+        for email_user_id in chunk:
+            users['by_id'][email_user_id] = fetched.get(email_user_id)
+
+
 @basic_exception_handler
 def retrieve_email_userro(email_user_id):
+    users = get_email_user_scope()
+    if users is not None and email_user_id in users['by_id']:
+        return users['by_id'][email_user_id]
     try:
-        return EmailUserRO.objects.get(id=email_user_id)
+        email_user = EmailUserRO.objects.get(id=email_user_id)
     except Exception as e:
         print(e)
+        return None
+    if users is not None:
+        users['by_id'][email_user_id] = email_user
+    return email_user
 
 @basic_exception_handler
 def retrieve_system_user(email_user_id):
@@ -21,9 +75,190 @@ def retrieve_system_user(email_user_id):
     except Exception as e:
         print(e)
 
-def get_invoice_payment_status(invoice_id):
+class InvoicePropertyCache:
+    """
+    Thread safe, in-process cache of ledger invoice properties keyed by invoice id.
+    Entries expire after ttl seconds and the least recently used entries are evicted beyond max_size.
+    """
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, invoice_id):
+        with self._lock:
+            entry = self._entries.get(invoice_id)
+            if entry is None:
+                return None
+            expires_at, inv_props = entry
+            if expires_at < time.monotonic():
+                del self._entries[invoice_id]
+                return None
+            self._entries.move_to_end(invoice_id)
+            return inv_props
+
+    def set(self, invoice_id, inv_props):
+        with self._lock:
+            self._entries[invoice_id] = (time.monotonic() + self.ttl, inv_props)
+            self._entries.move_to_end(invoice_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, invoice_id=None):
+        with self._lock:
+            if invoice_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(invoice_id, None)
+
+
+class InvoicePropertyService:
+    """
+    Fetches invoice properties from ledger, concurrently for batches of invoices, through a shared cache.
+    fetch defaults to ledger_api_client.utils.get_invoice_properties (a stub can be passed in for testing).
+    """
+    def __init__(self, fetch=None, max_workers=None, ttl=None, max_size=None):
+        self.fetch = fetch
+        self.max_workers = max_workers if max_workers else settings.LEDGER_INVOICE_PROPERTIES_MAX_WORKERS
+        self.cache = InvoicePropertyCache(
+            ttl if ttl is not None else settings.LEDGER_INVOICE_PROPERTIES_CACHE_TTL,
+            max_size if max_size else settings.LEDGER_INVOICE_PROPERTIES_CACHE_MAX_SIZE,
+        )
+
+    def _fetch(self, invoice_id):
+        fetch = self.fetch if self.fetch else utils.get_invoice_properties
+        return fetch(invoice_id)
+
+    def _fetch_in_worker(self, invoice_id):
+        try:
+            return self._fetch(invoice_id)
+        finally:
+            # Worker threads must not leave database connections behind
+            connection.close()
+
+    def get(self, invoice_id, use_cache=True):
+        if use_cache:
+            inv_props = self.cache.get(invoice_id)
+            if inv_props is not None:
+                return inv_props
+        inv_props = self._fetch(invoice_id)
+        self.cache.set(invoice_id, inv_props)
+        return inv_props
+
+    def get_many(self, invoice_ids, use_cache=True):
+        """
+        Return ({invoice_id: inv_props}, {invoice_id: exception}) for invoice_ids.
+        The invoices which could not be retrieved are logged and returned with the error raised, never left out silently.
+        """
+        results = {}
+        errors = {}
+        to_fetch = []
+        for invoice_id in dict.fromkeys(invoice_ids):
+            inv_props = self.cache.get(invoice_id) if use_cache else None
+            if inv_props is None:
+                to_fetch.append(invoice_id)
+            else:
+                results[invoice_id] = inv_props
+
+        if len(to_fetch) == 1:
+            try:
+                results[to_fetch[0]] = self.get(to_fetch[0], use_cache=False)
+            except Exception as e:
+                errors[to_fetch[0]] = e
+        elif to_fetch:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(to_fetch))) as executor:
+                futures = {invoice_id: executor.submit(self._fetch_in_worker, invoice_id) for invoice_id in to_fetch}
+            for invoice_id, future in futures.items():
+                try:
+                    inv_props = future.result()
+                    self.cache.set(invoice_id, inv_props)
+                    results[invoice_id] = inv_props
+                except Exception as e:
+                    errors[invoice_id] = e
+        for invoice_id, e in errors.items():
+            logger.error(f'Error raised when getting the properties of the invoice (invoice_id: {invoice_id}). exception: [{e}]')
+        return results, errors
+
+    def invalidate(self, invoice_id=None):
+        self.cache.invalidate(invoice_id)
+
+
+invoice_property_service = InvoicePropertyService()
+
+
+def get_invoice_properties_cached(invoice_id, use_cache=True):
+    return invoice_property_service.get(invoice_id, use_cache=use_cache)
+
+
+def get_invoice_property_cache_entries(invoices, use_cache=False):
+    """
+    Return the invoice_property_cache entries ({invoice_id: {payment_status, reference, amount, settlement_date, updated_at}})
+    for the invoices, fetched as one batch, and the ids of the invoices which could not be fetched.
+    The entries are persisted with a fresh updated_at, so they are fetched from ledger rather than from the shared cache
+    unless use_cache is given.
+    """
+    inv_props_by_id, errors = invoice_property_service.get_many([inv.id for inv in invoices], use_cache=use_cache)
+    entries = {}
+    updated_at = timezone.now().isoformat()
+    for invoice_id, inv_props in inv_props_by_id.items():
+        entries[invoice_id] = {
+            'payment_status': inv_props['data']['invoice']['payment_status'],
+            'reference': inv_props['data']['invoice']['reference'],
+            'amount': inv_props['data']['invoice']['amount'],
+            'settlement_date': inv_props['data']['invoice']['settlement_date'],
+            'updated_at': updated_at,
+        }
+    return entries, list(errors)
+
+
+def fill_invoice_property_caches(objs, only_empty=True, use_cache=False, save=True):
+    """
+    Fill the invoice_property_cache of a page of proposals/stickers/dcv admissions/dcv permits
+    with a single batched fetch and a single bulk update per model.
+    Returns the objects with an invoice which could not be fetched.  Their entries for the invoices fetched are saved,
+    but their invoice_property_cache_updated_at is left as it was, so that they are refreshed again.
+    Without save, the objects are only filled in memory (e.g. for display) and marked invoice_property_cache_loaded,
+    persisting is left to the sync_invoice_properties job.
+    """
+    invoices_by_obj = []
+    for obj in objs:
+        if only_empty and obj.invoice_property_cache:
+            continue
+        invoices_by_obj.append((obj, list(obj.get_invoices_for_property_cache())))
+    if not invoices_by_obj:
+        return []
+
+    entries, failed_invoice_ids = get_invoice_property_cache_entries([inv for _, invoices in invoices_by_obj for inv in invoices], use_cache=use_cache)
+    failed_invoice_ids = set(failed_invoice_ids)
+
+    updated_at = timezone.now()
+    objs_by_model = {}
+    failed_objs = []
+    for obj, invoices in invoices_by_obj:
+        for inv in invoices:
+            if inv.id in entries:
+                obj.invoice_property_cache[inv.id] = entries[inv.id]
+        failed = any(inv.id in failed_invoice_ids for inv in invoices)
+        if failed:
+            failed_objs.append(obj)
+        if not save:
+            obj.invoice_property_cache_loaded = True
+            continue
+        if not failed:
+            obj.invoice_property_cache_updated_at = updated_at
+        objs_by_model.setdefault(obj._meta.get_field('invoice_property_cache').model, []).append(obj)
+    for model, model_objs in objs_by_model.items():
+        model.objects.bulk_update(model_objs, ['invoice_property_cache', 'invoice_property_cache_updated_at'])
+    if failed_objs:
+        logger.warning(f'invoice_property_cache of {len(failed_objs)} object(s) not refreshed fully: [{failed_objs}]')
+    return failed_objs
+
+
+def get_invoice_payment_status(invoice_id, use_cache=False):
+    # Payment handling needs the latest status, so the cache is only used when asked for.  A fresh fetch refreshes the cache.
     try:
-        inv_props = utils.get_invoice_properties(invoice_id)
+        inv_props = get_invoice_properties_cached(invoice_id, use_cache=use_cache)
         invoice_payment_status = inv_props['data']['invoice']['payment_status']
         return invoice_payment_status
     except Exception as e:
@@ -12,6 +12,7 @@ from mooringlicensing.components.approvals.models import (
 )
 from datetime import timedelta
 from mooringlicensing.components.proposals.email import send_approval_renewal_email_notification
+from mooringlicensing.components.emails.bulk import bulk_notifications, preload_applicants
 
 import logging
 
@@ -64,10 +65,19 @@ class Command(BaseCommand):
                 queries &= Q(current_proposal__vessel_ownership__end_date=None)
 
         approvals = approval_class.objects.filter(queries).order_by('issue_date')[:max_renewal_notices]
+        if not approval_class == DcvPermit:
+            # Everything the emails need, fetched for all the approvals at once
+            approvals_by_id = Approval.objects.select_related(
+                'current_proposal__proposal_applicant',
+                'current_proposal__vessel_ownership',
+                'current_proposal__vessel_details__vessel',
+                *Approval.CHILD_RELATIONS.values(),
+            ).in_bulk([a.id for a in approvals])
+            preload_applicants([approval.current_proposal for approval in approvals_by_id.values()])
         for a in approvals:
             try:
                 if not approval_class == DcvPermit:
-                    approval = Approval.objects.get(id=a.id)
+                    approval = approvals_by_id[a.id]
                     approval.generate_renewal_doc()
                     logger.info(f'Renewal document has been generated for the approval: [{approval}]')
                 else:
@@ -89,12 +99,13 @@ class Command(BaseCommand):
 
         max_renewal_notices = int(MAX_RENEWAL_NOTICES_PER_RUN)
 
-        self.perform_per_type(CODE_DAYS_FOR_RENEWAL_WLA, WaitingListAllocation, updates, errors, max_renewal_notices)
-        self.perform_per_type(CODE_DAYS_FOR_RENEWAL_AAP, AnnualAdmissionPermit, updates, errors, max_renewal_notices)
-        self.perform_per_type(CODE_DAYS_FOR_RENEWAL_AUP, AuthorisedUserPermit, updates, errors, max_renewal_notices)
-        self.perform_per_type(CODE_DAYS_FOR_RENEWAL_ML, MooringLicence, updates, errors, max_renewal_notices)
+        with bulk_notifications() as render_stats:
+            self.perform_per_type(CODE_DAYS_FOR_RENEWAL_WLA, WaitingListAllocation, updates, errors, max_renewal_notices)
+            self.perform_per_type(CODE_DAYS_FOR_RENEWAL_AAP, AnnualAdmissionPermit, updates, errors, max_renewal_notices)
+            self.perform_per_type(CODE_DAYS_FOR_RENEWAL_AUP, AuthorisedUserPermit, updates, errors, max_renewal_notices)
+            self.perform_per_type(CODE_DAYS_FOR_RENEWAL_ML, MooringLicence, updates, errors, max_renewal_notices)
 
         cmd_name = __name__.split('.')[-1].replace('_', ' ').upper()
-        msg = construct_email_message(cmd_name, errors, updates)
+        msg = construct_email_message(cmd_name, errors, updates, render_stats)
         logger.info(msg)
         cron_email.info(msg)
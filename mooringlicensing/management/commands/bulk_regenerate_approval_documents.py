@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+import logging
+
+from mooringlicensing.components.approvals.document_regeneration import regenerate_approval_documents
+from mooringlicensing.components.approvals.models import (
+    Approval, ApprovalDocumentRegeneration, AnnualAdmissionPermit, AuthorisedUserPermit, MooringLicence, WaitingListAllocation,
+)
+
+logger = logging.getLogger('cron_tasks')
+
+APPROVAL_CLASSES = {
+    'ml': MooringLicence,
+    'aup': AuthorisedUserPermit,
+    'aap': AnnualAdmissionPermit,
+    'wla': WaitingListAllocation,
+}
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the documents of current/suspended approvals (e.g. after a licence template change) across a pool of worker processes.  ' \
+           'Runs are checkpointed: re-running with the same --run resumes where it stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', type=str, default=None, help='Name of the run to start or resume (default: regenerate_<date>)')
+        parser.add_argument('--type', type=str, choices=APPROVAL_CLASSES.keys(), action='append', dest='types', help='Approval type(s) to regenerate (default: all)')
+        parser.add_argument('--workers', type=int, default=None, help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=None, help='Approvals per worker task')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry the approvals that failed in a previous attempt of the run')
+        parser.add_argument('--status', action='store_true', help='Only report the status of the run')
+
+    def handle(self, *args, **options):
+        run_name = options['run'] or 'regenerate_{}'.format(timezone.localtime(timezone.now()).strftime('%Y%m%d'))
+
+        if options['status']:
+            for status, name in ApprovalDocumentRegeneration.STATUS_CHOICES:
+                count = ApprovalDocumentRegeneration.objects.filter(run_name=run_name, status=status).count()
+                self.stdout.write('{}: {}'.format(name, count))
+            return
+
+        logger.info('Running command {} for the run: [{}]'.format(__name__, run_name))
+
+        approval_ids = []
+        for code, approval_class in APPROVAL_CLASSES.items():
+            if options['types'] and code not in options['types']:
+                continue
+            approval_ids += list(approval_class.objects.filter(
+                status__in=[Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED,]
+            ).values_list('id', flat=True))
+        approvals = Approval.objects.filter(id__in=approval_ids)
+
+        def report(msg):
+            logger.info(msg)
+            self.stdout.write(msg)
+
+        progress = regenerate_approval_documents(
+            run_name,
+            approvals,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            retry_failed=options['retry_failed'],
+            report=report,
+        )
+        report('Run: [{}] finished. {} completed, {} failed'.format(run_name, progress.completed, progress.failed))
@@ -2,10 +2,10 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from pathlib import Path
-import subprocess
 import logging
 
 from mooringlicensing.settings import CRON_EMAIL_FILE_NAME
+from mooringlicensing.components.main.cron import NIGHTLY_JOBS, run_jobs
 
 logger = logging.getLogger('cron_tasks')
 cron_email = logging.getLogger('cron_email')
@@ -24,27 +24,10 @@ class Command(BaseCommand):
         cron_email.info('<div><strong>Running command: {}</strong></div>'.format(__name__))
         cron_email.info('<div style="margin-left: 1em;">')
 
-        # For Compliances
-        subprocess.call('python manage_ml.py update_compliance_status', shell=True)  # 1. Update status
-        subprocess.call('python manage_ml.py send_compliance_reminder', shell=True)  # 2. Send notification
-
-        # For the others
-        subprocess.call('python manage_ml.py send_endorser_reminder', shell=True)
-        subprocess.call('python manage_ml.py send_vessel_nominate_reminder', shell=True)
-        subprocess.call('python manage_ml.py cancel_approvals_due_to_no_vessels_nominated', shell=True)
-        subprocess.call('python manage_ml.py expire_mooring_licence_application_due_to_no_documents', shell=True)
-        subprocess.call('python manage_ml.py expire_mooring_licence_application_due_to_no_submit', shell=True)
-        subprocess.call('python manage_ml.py update_approval_status', shell=True)
-        subprocess.call('python manage_ml.py approval_renewal_notices', shell=True)
-        #subprocess.call('python manage_ml.py import_mooring_bookings_data', shell=True)
-        #subprocess.call('python manage_ml.py export_and_email_sticker_data', shell=True)
-        #subprocess.call('python manage_ml.py import_sticker_data', shell=True)
-        subprocess.call('python manage_ml.py send_mooring_licence_application_submit_due_reminder', shell=True)
-        subprocess.call('python manage_ml.py remove_unpaid_dcv_submissions', shell=True)
-        subprocess.call('python manage_ml.py expire_dcv_permits_out_of_season', shell=True)
-        subprocess.call('python manage_ml.py check_proposal_endorsements', shell=True)
-        subprocess.call('python manage_ml.py expire_application_due_to_no_payment', shell=True)
-        subprocess.call('python manage_ml.py send_application_payment_due_reminder', shell=True)
+        # The jobs run in this process one after another, apart from those which are marked concurrent
+        job_runs = run_jobs(NIGHTLY_JOBS, settings.CRON_MAX_WORKERS)
+        for job_run in sorted(job_runs, key=lambda job_run: job_run.started_at):
+            logger.info('{}: {} in {:.1f}s, {} rows touched'.format(job_run.job_name, job_run.status, job_run.duration, job_run.rows_touched))
 
         logger.info('===== Completed command: {} ====='.format(__name__))
         cron_email.info('</div>')
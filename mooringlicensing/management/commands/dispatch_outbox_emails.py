@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+import logging
+import time
+
+from django.conf import settings
+from mooringlicensing.components.emails import outbox
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Send the emails waiting in the outbox.  With --loop, keep polling the outbox (run as a worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, polling the outbox every EMAIL_OUTBOX_POLL_INTERVAL seconds')
+        parser.add_argument('--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+
+        while True:
+            total_sent = total_failed = 0
+            while True:
+                sent, failed = outbox.dispatch(batch_size=options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < options['batch_size']:
+                    # Nothing more is due
+                    break
+            if total_sent or total_failed:
+                logger.info(f'{total_sent} email(s) sent, {total_failed} failed')
+            if not options['loop']:
+                break
+            time.sleep(settings.EMAIL_OUTBOX_POLL_INTERVAL)
+
+        logger.info('Command {} completed'.format(__name__))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+import logging
+import json
+
+from mooringlicensing.components.approvals.models import Approval
+from mooringlicensing.components.approvals.status_transitions import (
+    SIDE_EFFECTS_MAX_ATTEMPTS,
+    process_side_effects,
+    queue_side_effects,
+)
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Send the notifications and run the side effects of the approval status transitions queued by update_approval_status.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("parameters", type=str)
+        # run_queue_job passes the user of the job, there is none for these jobs
+        parser.add_argument("user_id", type=str, nargs="?")
+
+    def handle(self, *args, **options):
+        params = json.loads(options["parameters"])
+        transitions = params.get("transitions", [])
+        attempt = params.get("attempt", 1)
+        approvals = Approval.objects.in_bulk([transition["approval_id"] for transition in transitions])
+
+        failed = []
+        for transition in transitions:
+            approval = approvals.get(transition["approval_id"])
+            if not approval:
+                logger.error("Approval: [{}] not found".format(transition["approval_id"]))
+                continue
+            try:
+                process_side_effects(transition["transition"], approval, transition.get("stickers_to_be_returned", []))
+            except Exception as e:
+                logger.exception("Failed to process the transition: [{}] of the Approval: [{}].  Error: [{}]".format(transition["transition"], approval, e))
+                failed.append(transition)
+
+        if failed:
+            failed_ids = [transition["approval_id"] for transition in failed]
+            if attempt >= SIDE_EFFECTS_MAX_ATTEMPTS:
+                # marks the job as failed
+                raise Exception("Failed to process the status transitions of the approvals: {} after {} attempts".format(failed_ids, attempt))
+            # Only the failed ones are run again, the side effects of the other approvals have been processed
+            job = queue_side_effects(failed, attempt + 1)
+            logger.warning("The status transitions of the approvals: {} have been queued again as the job: [{}]".format(failed_ids, job.id))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+import logging
+
+from mooringlicensing.components.approvals.models import Approval, Sticker
+from mooringlicensing.components.main import search
+from mooringlicensing.components.main.models import SearchDocument, SearchIndexBuild
+from mooringlicensing.components.proposals.models import Proposal
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search documents used by the proposal, approval and sticker list searches.  Run nightly, as the names/emails edited in ledger do not reach the signals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.INDEX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+        batch_size = options['batch_size']
+
+        for model, index, object_type in (
+            (Proposal, search.index_proposals, SearchDocument.OBJECT_TYPE_PROPOSAL),
+            (Approval, search.index_approvals, SearchDocument.OBJECT_TYPE_APPROVAL),
+            (Sticker, search.index_stickers, SearchDocument.OBJECT_TYPE_STICKER),
+        ):
+            ids = list(model.objects.order_by('id').values_list('id', flat=True))
+            for i in range(0, len(ids), batch_size):
+                index(ids[i:i + batch_size])
+            # From now on the searches of object_type use the index
+            SearchIndexBuild.objects.update_or_create(object_type=object_type, defaults={'built_at': timezone.now()})
+            logger.info('{} {} search documents rebuilt'.format(len(ids), model.__name__))
+
+        logger.info('Command {} completed'.format(__name__))
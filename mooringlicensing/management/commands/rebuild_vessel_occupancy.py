@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+import logging
+
+from mooringlicensing.components.proposals import vessel_occupancy
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the vessel occupancy index used by the vessel checks at submit when any of its rows are out of sync, or with --verify only report them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only compare the index with the applications and licences/permits, without rebuilding it')
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+
+        # The rows which failed to sync are reported before they are put right
+        missing, out_of_date = vessel_occupancy.verify()
+        for row in missing:
+            logger.warning(f'Vessel occupancy missing: [{row}]')
+        for row in out_of_date:
+            logger.warning(f'Vessel occupancy out of date: [{row}]')
+        logger.info(f'{len(missing)} vessel occupancy row(s) missing, {len(out_of_date)} out of date')
+
+        if not options['verify'] and (missing or out_of_date):
+            count = vessel_occupancy.rebuild()
+            logger.info(f'Vessel occupancy rebuilt with {count} row(s)')
+        logger.info('Command {} completed'.format(__name__))
@@ -5,6 +5,8 @@ from mooringlicensing.components.proposals.email import (
     send_au_summary_to_ml_holder
 )
 from mooringlicensing.components.approvals.email import send_aup_revoked_due_to_mooring_swap_email
+from mooringlicensing.doctopdf import create_approval_doc_bytes_batch, create_authorised_user_summary_doc_bytes_batch
+from mooringlicensing import settings
 
 import logging
 
@@ -18,18 +20,32 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         logger.info("Running regenerate_approval_documents")
         #check approvals that need document regen (requires bool field)
-        regen_approvals = Approval.objects.filter(regenerate_documents=True)
+        regen_approvals = list(Approval.objects.filter(regenerate_documents=True))
+
+        #the pdfs are converted in batches up front (a LibreOffice run per batch rather than per document)
+        #any document that failed to convert is generated on its own below
+        licence_docs = {}
+        au_summary_docs = {}
+        for i in range(0, len(regen_approvals), settings.LIBREOFFICE_BATCH_SIZE):
+            batch = regen_approvals[i:i + settings.LIBREOFFICE_BATCH_SIZE]
+            for approval, contents_as_bytes in zip(batch, create_approval_doc_bytes_batch(batch)):
+                if not isinstance(contents_as_bytes, Exception):
+                    licence_docs[approval.id] = contents_as_bytes
+            ml_batch = [approval.child_obj for approval in batch if approval.child_obj and approval.child_obj.code == 'ml']
+            for mooring_licence, contents_as_bytes in zip(ml_batch, create_authorised_user_summary_doc_bytes_batch(ml_batch)):
+                if not isinstance(contents_as_bytes, Exception):
+                    au_summary_docs[mooring_licence.id] = contents_as_bytes
 
         #regen docs
         for approval in regen_approvals:
 
             approval.refresh_from_db() #in case the cron job run crosses over so we avoid doing this more than once (not critical but preferable)
             if approval.regenerate_documents:
-                approval.generate_doc()
+                approval.generate_doc(contents_as_bytes=licence_docs.pop(approval.id, None))
                 approval.refresh_from_db()
                 if approval.child_obj and approval.child_obj.code == 'ml':
                     #ML regen authorised user summary as as approval doc
-                    approval.child_obj.generate_au_summary_doc()
+                    approval.child_obj.generate_au_summary_doc(contents_as_bytes=au_summary_docs.pop(approval.id, None))
                     approval.refresh_from_db()
 
                 #create history record
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+import logging
+
+from mooringlicensing.components.main.sequences import seed_sequences
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Move the lodgement/sticker number sequences past the largest numbers in use (e.g. after numbers have been imported)'
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+        for sequence, next_number in seed_sequences().items():
+            logger.info('Sequence: [{}] will allocate {} next'.format(sequence, next_number))
+            self.stdout.write('{}: {}'.format(sequence, next_number))
@@ -8,6 +8,7 @@ from django.db.models import Q
 import logging
 
 from mooringlicensing.components.proposals.email import send_payment_reminder_email
+from mooringlicensing.components.emails.bulk import bulk_notifications, preload_applicants
 from mooringlicensing.components.main.models import NumberOfDaysType, NumberOfDaysSetting
 from mooringlicensing.components.proposals.models import Proposal
 from mooringlicensing.management.commands.utils import construct_email_message
@@ -40,19 +41,22 @@ class Command(BaseCommand):
         queries &= Q(payment_due_date__lt=boundary_date)
         queries &= Q(payment_reminder_sent=False)
 
-        for p in Proposal.objects.filter(queries):
-            try:
-                p.payment_reminder_sent = True
-                p.save()
-                send_payment_reminder_email(p)
-                logger.info('Payment reminder sent for Proposal {}'.format(p.lodgement_number))
-                updates.append(p.lodgement_number)
-            except Exception as e:
-                err_msg = 'Error sending payment reminder for Proposal {}'.format(p.lodgement_number)
-                logger.error('{}\n{}'.format(err_msg, str(e)))
-                errors.append(err_msg)
+        proposals = list(Proposal.objects.filter(queries).select_related('proposal_applicant'))
+        with bulk_notifications() as render_stats:
+            preload_applicants(proposals)
+            for p in proposals:
+                try:
+                    p.payment_reminder_sent = True
+                    p.save()
+                    send_payment_reminder_email(p)
+                    logger.info('Payment reminder sent for Proposal {}'.format(p.lodgement_number))
+                    updates.append(p.lodgement_number)
+                except Exception as e:
+                    err_msg = 'Error sending payment reminder for Proposal {}'.format(p.lodgement_number)
+                    logger.error('{}\n{}'.format(err_msg, str(e)))
+                    errors.append(err_msg)
 
         cmd_name = __name__.split('.')[-1].replace('_', ' ').upper()
-        msg = construct_email_message(cmd_name, errors, updates)
+        msg = construct_email_message(cmd_name, errors, updates, render_stats)
         logger.info(msg)
         cron_email.info(msg)
@@ -5,6 +5,8 @@ from datetime import timedelta
 from django.db.models import Q
 from django.conf import settings
 from mooringlicensing.components.compliances.models import Compliance, ComplianceUserAction
+from mooringlicensing.components.emails.bulk import bulk_notifications, preload_applicants
+from mooringlicensing.components.proposals.models import Proposal
 from mooringlicensing.components.main.models import NumberOfDaysType, NumberOfDaysSetting
 from django.core.exceptions import ImproperlyConfigured
 from mooringlicensing.settings import CODE_DAYS_FOR_FIRST_REMINDER, CODE_DAYS_FOR_SECOND_REMINDER, CODE_DAYS_FOR_FINAL_REMINDER, CODE_DAYS_FOR_SUBMIT_DOCUMENTS_MLA
@@ -52,16 +54,29 @@ class Command(BaseCommand):
         due_date_second = today + timedelta(days=days_second_reminder) 
         due_date_final = today + timedelta(days=days_final_reminder)
         
+        # Everything the emails need is selected along with the compliances
+        related = ['proposal__proposal_applicant', 'approval'] + ['proposal__' + relation for relation in Proposal.CHILD_RELATIONS.values()]
+
         queries = Q()
         queries &= Q(processing_status = Compliance.PROCESSING_STATUS_DUE)
         queries &= (Q(due_date=due_date_first) | Q(due_date=due_date_second) | Q(due_date=due_date_final))
-        compliance_due_reminder = Compliance.objects.filter(queries)
+        compliance_due_reminder = list(Compliance.objects.filter(queries).select_related(*related))
 
         queries = Q()
         queries &= Q(processing_status = Compliance.PROCESSING_STATUS_OVERDUE)
         queries &= Q(post_reminder_sent = False)
-        compliance_overdue_reminder = Compliance.objects.filter(queries)
-                
+        compliance_overdue_reminder = list(Compliance.objects.filter(queries).select_related(*related))
+
+        with bulk_notifications() as render_stats:
+            preload_applicants([c.proposal for c in compliance_due_reminder + compliance_overdue_reminder])
+            self.send_reminders(compliance_due_reminder, compliance_overdue_reminder, updates, errors)
+
+        cmd_name = __name__.split('.')[-1].replace('_', ' ').upper()
+        msg = construct_email_message(cmd_name, errors, updates, render_stats)
+        logger.info(msg)
+        cron_email.info(msg)
+
+    def send_reminders(self, compliance_due_reminder, compliance_overdue_reminder, updates, errors):
         for c in compliance_due_reminder:
             with transaction.atomic():
                 try:
@@ -92,7 +107,3 @@ class Command(BaseCommand):
                     err_msg = 'Error sending Overdue Compliance Reminder {}'.format(c.lodgement_number)
                     logger.error('{}\n{}'.format(err_msg, str(e)))
                     errors.append(err_msg)
-        cmd_name = __name__.split('.')[-1].replace('_', ' ').upper()
-        msg = construct_email_message(cmd_name, errors, updates)
-        logger.info(msg)
-        cron_email.info(msg)
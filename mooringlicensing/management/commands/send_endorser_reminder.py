@@ -8,6 +8,7 @@ from django.db.models import Q
 import logging
 
 from mooringlicensing.components.proposals.email import send_endorser_reminder_email
+from mooringlicensing.components.emails.bulk import bulk_notifications, preload_applicants
 from mooringlicensing.components.main.models import NumberOfDaysType, NumberOfDaysSetting
 from mooringlicensing.components.proposals.models import Proposal, AuthorisedUserApplication
 from mooringlicensing.management.commands.utils import construct_email_message
@@ -41,18 +42,21 @@ class Command(BaseCommand):
         queries &= Q(processing_status=Proposal.PROCESSING_STATUS_AWAITING_ENDORSEMENT)
         queries &= Q(lodgement_date__lt=boundary_date)
 
-        for a in AuthorisedUserApplication.objects.filter(queries):
-            try:
-                send_endorser_reminder_email(a)
-                a.save()
-                logger.info('Reminder to endorser sent for Proposal {}'.format(a.lodgement_number))
-                updates.append(a.lodgement_number)
-            except Exception as e:
-                err_msg = 'Error sending reminder to endorser for Proposal {}'.format(a.lodgement_number)
-                logger.error('{}\n{}'.format(err_msg, str(e)))
-                errors.append(err_msg)
+        proposals = list(AuthorisedUserApplication.objects.filter(queries).select_related('proposal_applicant'))
+        with bulk_notifications() as render_stats:
+            preload_applicants(proposals)
+            for a in proposals:
+                try:
+                    send_endorser_reminder_email(a)
+                    a.save()
+                    logger.info('Reminder to endorser sent for Proposal {}'.format(a.lodgement_number))
+                    updates.append(a.lodgement_number)
+                except Exception as e:
+                    err_msg = 'Error sending reminder to endorser for Proposal {}'.format(a.lodgement_number)
+                    logger.error('{}\n{}'.format(err_msg, str(e)))
+                    errors.append(err_msg)
 
         cmd_name = __name__.split('.')[-1].replace('_', ' ').upper()
-        msg = construct_email_message(cmd_name, errors, updates)
+        msg = construct_email_message(cmd_name, errors, updates, render_stats)
         logger.info(msg)
         cron_email.info(msg)
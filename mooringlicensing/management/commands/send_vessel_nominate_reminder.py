@@ -2,14 +2,16 @@ from dateutil.relativedelta import relativedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.core.exceptions import ImproperlyConfigured
-from django.db.models import Q
+from django.db.models import Q, Prefetch
 
 import logging
 
 from mooringlicensing.components.approvals.email import send_vessel_nomination_reminder_mail
 from mooringlicensing.components.approvals.models import Approval, WaitingListAllocation, \
     MooringLicence, AuthorisedUserPermit
+from mooringlicensing.components.emails.bulk import bulk_notifications, preload_applicants
 from mooringlicensing.components.main.models import NumberOfDaysType, NumberOfDaysSetting
+from mooringlicensing.components.proposals.models import Proposal
 from mooringlicensing.management.commands.utils import ml_meet_vessel_requirement, construct_email_message
 from mooringlicensing.settings import (
         CODE_DAYS_BEFORE_END_OF_SIX_MONTH_PERIOD_ML,
@@ -55,19 +57,22 @@ class Command(BaseCommand):
 
         logger.info('Running command {}'.format(__name__))
 
-        # Get approvals
+        # Get approvals, along with everything the email needs
+        related = ('current_proposal__proposal_applicant', 'current_proposal__vessel_ownership',)
         if approval_type == WaitingListAllocation.code:
             queries = Q()
             queries &= Q(status__in=(Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED))
             queries &= Q(current_proposal__vessel_ownership__end_date__isnull=False)
             queries &= Q(current_proposal__vessel_ownership__end_date__lt=boundary_date)
             queries &= Q(vessel_nomination_reminder_sent=False)
-            approvals = approval_class.objects.filter(queries)
+            approvals = approval_class.objects.filter(queries).select_related(*related)
         elif approval_type == MooringLicence.code:
             queries = Q()
             queries &= Q(status__in=(Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED))
             queries &= Q(vessel_nomination_reminder_sent=False)
-            possible_approvals = approval_class.objects.filter(queries)
+            possible_approvals = approval_class.objects.filter(queries).select_related(*related).prefetch_related(
+                Prefetch('proposal_set', queryset=Proposal.objects.select_related('vessel_details__vessel', 'vessel_ownership__vessel')),
+            )
 
             approvals = []
             for approval in possible_approvals:
@@ -79,21 +84,24 @@ class Command(BaseCommand):
             queries &= Q(status__in=(Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED))
             queries &= Q(current_proposal__vessel_ownership__end_date__lt=boundary_date)
             queries &= Q(vessel_nomination_reminder_sent=False)
-            approvals = approval_class.objects.filter(queries)
+            approvals = approval_class.objects.filter(queries).select_related(*related)
 
-        for a in approvals:
-            try:
-                send_vessel_nomination_reminder_mail(a)
-                a.vessel_nomination_reminder_sent = True
-                a.save()
-                logger.info('Reminder to permission holder sent for Approval {}'.format(a.lodgement_number))
-                updates.append(a.lodgement_number)
-            except Exception as e:
-                err_msg = 'Error sending reminder to permission holder for Approval {}'.format(a.lodgement_number)
-                logger.error('{}\n{}'.format(err_msg, str(e)))
-                errors.append(err_msg)
+        approvals = list(approvals)
+        with bulk_notifications() as render_stats:
+            preload_applicants([a.current_proposal for a in approvals])
+            for a in approvals:
+                try:
+                    send_vessel_nomination_reminder_mail(a)
+                    a.vessel_nomination_reminder_sent = True
+                    a.save()
+                    logger.info('Reminder to permission holder sent for Approval {}'.format(a.lodgement_number))
+                    updates.append(a.lodgement_number)
+                except Exception as e:
+                    err_msg = 'Error sending reminder to permission holder for Approval {}'.format(a.lodgement_number)
+                    logger.error('{}\n{}'.format(err_msg, str(e)))
+                    errors.append(err_msg)
 
         cmd_name = __name__.split('.')[-1].replace('_', ' ').upper()
-        msg = construct_email_message(cmd_name, errors, updates)
+        msg = construct_email_message(cmd_name, errors, updates, render_stats)
         logger.info(msg)
         cron_email.info(msg)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from mooringlicensing.components.payments_ml.invoice_property_sync import sync
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Refresh the invoice properties cached on proposals, stickers, dcv admissions and dcv permits from ledger.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Maximum number of objects refreshed in this run')
+        parser.add_argument('--max-age', type=int, default=None, help='Hours after which a cached invoice property is refreshed')
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+        refreshed = sync(options['batch_size'], options['max_age'])
+        logger.info('Invoice properties of {} objects refreshed.'.format(refreshed))
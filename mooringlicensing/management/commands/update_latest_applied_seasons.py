@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+import logging
+
+from mooringlicensing.components.approvals.models import Approval
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Fill in the latest_applied_season_cache of the approvals, or with --verify report the approvals whose cache is out of date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only compare the caches with the latest applied seasons, without updating them')
+        parser.add_argument('--missing-only', action='store_true', help='Only the approvals which have never had the cache computed')
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+
+        approvals = Approval.objects.order_by('id')
+        if options['missing_only']:
+            approvals = approvals.filter(latest_applied_season_cache_updated_at__isnull=True)
+
+        count = 0
+        mismatches = []
+        for approval in approvals.iterator():
+            count += 1
+            if options['verify']:
+                latest_applied_season = approval.latest_applied_season
+                latest_applied_season_id = latest_applied_season.id if latest_applied_season else None
+                if not approval.latest_applied_season_cache_updated_at or approval.latest_applied_season_cache_id != latest_applied_season_id:
+                    mismatches.append(approval)
+                    logger.warning(f'Approval: [{approval}] latest_applied_season_cache: [{approval.latest_applied_season_cache_id}], latest applied season: [{latest_applied_season_id}]')
+            else:
+                approval.update_latest_applied_season_cache()
+
+        if options['verify']:
+            logger.info(f'{len(mismatches)} out of {count} approvals have an out of date latest_applied_season_cache')
+        else:
+            logger.info(f'latest_applied_season_cache of {count} approvals updated')
+        logger.info('Command {} completed'.format(__name__))
@@ -310,8 +310,7 @@ def check_invalid_expired_approval(approvals):
     return ("Approvals with an Expired status but still in date:", numbers)
 
 def ml_meet_vessel_requirement(mooring_licence, boundary_date):
-    min_length_setting = GlobalSettings.objects.get(key=GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH)
-    min_length = float(min_length_setting.value)
+    min_length = float(GlobalSettings.get_value(GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH))
 
     # Return True when mooring_licence has at least one vessel whoose size is more than 6.4m and not sold or sold after the boundary_date
     for proposal in mooring_licence.proposal_set.all():
@@ -324,7 +323,7 @@ def ml_meet_vessel_requirement(mooring_licence, boundary_date):
     # All the vessels have been sold more than X months ago
     return False
 
-def construct_email_message(cmd_name, errors, updates):
+def construct_email_message(cmd_name, errors, updates, render_stats=None):
     cmd_str = '<div>{} completed.</div>'.format(cmd_name)
 
     if len(errors) > 0:
@@ -338,6 +337,13 @@ def construct_email_message(cmd_name, errors, updates):
 
     updates_str = '<div>IDs updated: {}</div>'.format(updates)
 
+    if render_stats is not None:
+        # Render time and throughput per email template, see components/emails/bulk.py
+        updates_str += '<div>Emails:</div><ul>'
+        for line in render_stats.report():
+            updates_str += '<li>{}</li>'.format(line)
+        updates_str += '</ul>'
+
     msg = '<div style="margin: 0 0 1em 0;">' + cmd_str + '<div style="margin:0 0 0 1em;">' + err_str + updates_str + '</div></div>'
     return msg
 
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+import logging
+
+from mooringlicensing.components.main.cache_warming import warm_caches
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Load the hot cache keys (file extension whitelist, group memberships, fee constructors, global settings)'
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+        for name, count in warm_caches().items():
+            self.stdout.write('{}: {}'.format(name, count))
@@ -4,11 +4,10 @@ from urllib.parse import quote_plus
 from django.http import HttpResponse
 import hashlib
 import re
+import time
 from reversion.middleware  import RevisionMiddleware
 from reversion.views import _request_creates_revision
-from ledger_api_client.managed_models import SystemUser, SystemUserAddress
-from django.core.exceptions import ObjectDoesNotExist
-from mooringlicensing.helpers import is_internal
+from mooringlicensing.helpers import is_internal, get_profile_complete
 from mooringlicensing.components.proposals.models import Proposal
 from mooringlicensing.components.approvals.models import DcvAdmission, DcvPermit, StickerActionDetail
 
@@ -31,30 +30,22 @@ class FirstTimeNagScreenMiddleware(object):
             and "/ledger-ui/" not in request.get_full_path()):
             path_first_time = '/ledger-ui/system-accounts-firsttime'
             path_logout = reverse('logout')
-            system_user_exists = True
-            try:
-                system_user = SystemUser.objects.get(ledger_id=request.user)
-            except ObjectDoesNotExist:
-                system_user_exists = False
-
-            if system_user_exists:
-                system_user_addresses = SystemUserAddress.objects.filter(system_user=system_user)
-                residential_address = system_user_addresses.filter(address_type=SystemUserAddress.ADDRESS_TYPE[0][0])
-                postal_address = system_user_addresses.filter(address_type=SystemUserAddress.ADDRESS_TYPE[1][0])
-
-            if (not system_user_exists or
-                not system_user.legal_first_name or 
-                not system_user.legal_last_name or 
-                not system_user.legal_dob or
-                not residential_address.exists() or 
-                not postal_address.exists() or
-                not system_user.mobile_number
-                ):
+
+            started = time.perf_counter()
+            profile_complete = get_profile_complete(request.user.id)
+            duration = (time.perf_counter() - started) * 1000
+            logger.debug(f'FirstTimeNagScreenMiddleware took {duration:.2f}ms')
+
+            if not profile_complete:
                 # We don't want to redirect the user when the user is accessing the firsttime page or logout page.
                 if request.path not in (path_logout):
                     logger.info('redirect')
                     return redirect(path_first_time + "?next=" + quote_plus(request.get_full_path()))
-                    
+
+            response = self.get_response(request)
+            response['Server-Timing'] = ', '.join([t for t in [response.get('Server-Timing'), f'nagscreen;dur={duration:.2f}'] if t])
+            return response
+
         response = self.get_response(request)
         return response
 
@@ -0,0 +1,71 @@
+import datetime
+
+from django.db import migrations, models
+
+
+def parse_date(details, key):
+    if details and details.get(key):
+        try:
+            return datetime.datetime.strptime(details[key], '%d/%m/%Y').date()
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def set_scheduled_dates(apps, schema_editor):
+    Approval = apps.get_model('mooringlicensing', 'Approval')
+    approvals = Approval.objects.filter(
+        models.Q(suspension_details__isnull=False) | models.Q(surrender_details__isnull=False)
+    ).only('id', 'suspension_details', 'surrender_details')
+    for approval in approvals.iterator(chunk_size=1000):
+        Approval.objects.filter(id=approval.id).update(
+            suspension_from_date=parse_date(approval.suspension_details, 'from_date'),
+            suspension_to_date=parse_date(approval.suspension_details, 'to_date'),
+            surrender_date=parse_date(approval.surrender_details, 'surrender_date'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0407_approvaldocumentregeneration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='approval',
+            name='suspension_from_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='approval',
+            name='suspension_to_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='approval',
+            name='surrender_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(fields=['status', 'expiry_date'], name='approval_status_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(condition=models.Q(('set_to_suspend', True)), fields=['suspension_from_date'], name='approval_to_suspend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(condition=models.Q(('status', 'suspended')), fields=['suspension_to_date'], name='approval_suspended_to_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(condition=models.Q(('set_to_cancel', True)), fields=['cancellation_date'], name='approval_to_cancel_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(condition=models.Q(('set_to_surrender', True)), fields=['surrender_date'], name='approval_to_surrender_idx'),
+        ),
+        migrations.RunPython(set_scheduled_dates, migrations.RunPython.noop),
+    ]
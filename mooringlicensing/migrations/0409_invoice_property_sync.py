@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0408_approval_scheduled_dates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposal',
+            name='invoice_property_cache_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sticker',
+            name='invoice_property_cache_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dcvadmission',
+            name='invoice_property_cache_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dcvpermit',
+            name='invoice_property_cache_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='InvoicePropertySyncRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('proposal', 'Proposal'), ('sticker', 'Sticker'), ('dcv_admission', 'DcvAdmission'), ('dcv_permit', 'DcvPermit')], max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('requested_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('object_type', 'object_id')},
+            },
+        ),
+    ]
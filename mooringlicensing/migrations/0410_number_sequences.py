@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# sequence: (table, column) of the numbers allocated from it
+SEQUENCES = {
+    'mooringlicensing_approval_lodgement_number_seq': ('mooringlicensing_approval', 'lodgement_number'),
+    'mooringlicensing_dcvadmission_lodgement_number_seq': ('mooringlicensing_dcvadmission', 'lodgement_number'),
+    'mooringlicensing_dcvpermit_lodgement_number_seq': ('mooringlicensing_dcvpermit', 'lodgement_number'),
+    'mooringlicensing_sticker_number_seq': ('mooringlicensing_sticker', 'number'),
+}
+
+
+def create_sequences(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for sequence, (table, column) in SEQUENCES.items():
+            cursor.execute('CREATE SEQUENCE IF NOT EXISTS {}'.format(sequence))
+            # Seeded from the largest number in use, the same as the numbers used to be calculated
+            cursor.execute(
+                "SELECT setval('{sequence}', COALESCE(MAX(CAST(regexp_replace({column}, '^[A-Za-z]*', '') AS bigint)), 0) + 1, false) "
+                "FROM {table} WHERE {column} ~ '^[A-Za-z]*[0-9]+$'".format(sequence=sequence, table=table, column=column)
+            )
+
+
+def drop_sequences(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for sequence in SEQUENCES:
+            cursor.execute('DROP SEQUENCE IF EXISTS {}'.format(sequence))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0409_invoice_property_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequences, drop_sequences),
+    ]
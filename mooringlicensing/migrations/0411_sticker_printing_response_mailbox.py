@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0410_number_sequences'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stickerprintingresponseemail',
+            name='email_message_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.CreateModel(
+            name='StickerPrintingResponseMailbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(max_length=255)),
+                ('username', models.CharField(max_length=255)),
+                ('mailbox', models.CharField(default='INBOX', max_length=255)),
+                ('uid_validity', models.BigIntegerField(blank=True, null=True)),
+                ('last_uid', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('host', 'username', 'mailbox')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0411_sticker_printing_response_mailbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='approval',
+            name='latest_applied_season_cache',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mooringlicensing.feeseason'),
+        ),
+        migrations.AddField(
+            model_name='approval',
+            name='latest_applied_season_cache_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # The default is added afterwards so that the existing approvals are left NULL, to be computed
+        migrations.AlterField(
+            model_name='approval',
+            name='latest_applied_season_cache_updated_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+    ]
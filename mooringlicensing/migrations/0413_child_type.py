@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+# base model: {child_type: subclass model}
+CHILD_MODELS = {
+    'proposal': {
+        'wla': 'waitinglistapplication',
+        'aaa': 'annualadmissionapplication',
+        'aua': 'authoriseduserapplication',
+        'mla': 'mooringlicenceapplication',
+    },
+    'approval': {
+        'wla': 'waitinglistallocation',
+        'aap': 'annualadmissionpermit',
+        'aup': 'authoriseduserpermit',
+        'ml': 'mooringlicence',
+    },
+}
+
+
+def set_child_types(apps, schema_editor):
+    for base_model_name, child_models in CHILD_MODELS.items():
+        base_model = apps.get_model('mooringlicensing', base_model_name)
+        for child_type, child_model_name in child_models.items():
+            child_model = apps.get_model('mooringlicensing', child_model_name)
+            base_model.objects.filter(id__in=child_model.objects.values('pk')).update(child_type=child_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0412_approval_latest_applied_season_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposal',
+            name='child_type',
+            field=models.CharField(blank=True, choices=[('wla', 'Waiting List Application'), ('aaa', 'Annual Admission Application'), ('aua', 'Authorised User Application'), ('mla', 'Mooring Licence Application')], db_index=True, default='', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='approval',
+            name='child_type',
+            field=models.CharField(blank=True, choices=[('wla', 'Waiting List Allocation'), ('aap', 'Annual Admission Permit'), ('aup', 'Authorised User Permit'), ('ml', 'Mooring Site Licence')], db_index=True, default='', max_length=3),
+        ),
+        migrations.RunPython(set_child_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+import django.core.files.storage
+import django.db.models.deletion
+import django.utils.timezone
+import mooringlicensing.components.emails.models
+from mooringlicensing import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0413_child_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.TextField(blank=True, default='')),
+                ('body', models.TextField(blank=True, default='')),
+                ('html_body', models.TextField(blank=True, default='')),
+                ('from_email', models.CharField(blank=True, default='', max_length=255)),
+                ('to', models.JSONField(default=list)),
+                ('cc', models.JSONField(default=list)),
+                ('bcc', models.JSONField(default=list)),
+                ('headers', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_email_due_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEmailAttachment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('mimetype', models.CharField(blank=True, max_length=255, null=True)),
+                ('_file', models.FileField(max_length=512, storage=django.core.files.storage.FileSystemStorage(base_url=settings.PRIVATE_MEDIA_BASE_URL, location=settings.PRIVATE_MEDIA_STORAGE_LOCATION), upload_to=mooringlicensing.components.emails.models.update_outbox_attachment_filename)),
+                ('outbox_email', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='mooringlicensing.outboxemail')),
+            ],
+        ),
+    ]
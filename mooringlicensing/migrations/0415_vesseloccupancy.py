@@ -0,0 +1,45 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_vessel_occupancy(apps, schema_editor):
+    from mooringlicensing.components.proposals import vessel_occupancy
+    vessel_occupancy.rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0414_outbox_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VesselOccupancy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('proposal', 'Application'), ('approval', 'Licence/Permit'), ('approval_vessel', 'Vessel on the mooring licence')], max_length=20)),
+                ('lodgement_number', models.CharField(blank=True, default='', max_length=9)),
+                ('child_type', models.CharField(blank=True, default='', max_length=3)),
+                ('status', models.CharField(blank=True, default='', max_length=40)),
+                ('rego_no', models.CharField(blank=True, max_length=200, null=True)),
+                ('owner_email_user_id', models.IntegerField(blank=True, null=True)),
+                ('applicant_email_user_id', models.IntegerField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('expiry_date', models.DateField(blank=True, null=True)),
+                ('approval', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mooringlicensing.approval')),
+                ('details_vessel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mooringlicensing.vessel')),
+                ('proposal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mooringlicensing.proposal')),
+                ('vessel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mooringlicensing.vessel')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['vessel', 'source', 'end_date'], name='vessel_occupancy_vessel_idx'),
+                    models.Index(fields=['details_vessel', 'source', 'end_date'], name='vessel_occupancy_details_idx'),
+                    models.Index(fields=['rego_no'], name='vessel_occupancy_rego_no_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(build_vessel_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker(object):
+    """
+    Opens after max_failures consecutive failures and stays open for reset_timeout seconds.
+    While it is open the queue backend is not called at all.
+    """
+
+    def __init__(self, max_failures, reset_timeout):
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half open: the next call is let through to see if the backend has recovered
+                self.opened_at = None
+                self.failures = self.max_failures - 1
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.max_failures and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                logger.warning(f'Queue backend circuit breaker opened after {self.failures} failures.')
+
+
+class QueueBackendClient(object):
+    """
+    Client of the waiting queue backend, sharing a pool of keep-alive connections between requests.
+    check_create_session returns None whenever the backend cannot answer in time, so that visitors are let through.
+    """
+
+    def __init__(self, base_url, queue_group, timeout, max_failures, reset_timeout, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.queue_group = queue_group
+        self.timeout = timeout
+        self.circuit_breaker = CircuitBreaker(max_failures, reset_timeout)
+        self.session = requests.Session()
+        self.session.verify = False
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def check_create_session(self, session_key=''):
+        if self.circuit_breaker.is_open():
+            return None
+        try:
+            resp = self.session.get(
+                self.base_url + '/api/check-create-session/',
+                params={'session_key': session_key, 'queue_group': self.queue_group},
+                timeout=self.timeout,
+            )
+            resp.raise_for_status()
+            queue_json = resp.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f'Queue backend check failed.  Error: [{e}]')
+            self.circuit_breaker.record_failure()
+            return None
+        self.circuit_breaker.record_success()
+        return queue_json
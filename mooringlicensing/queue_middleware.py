@@ -1,53 +1,131 @@
-import requests
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
 from django.http import HttpResponse
 from mooringlicensing.helpers import is_internal
+from mooringlicensing.queue_client import QueueBackendClient
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_queue_backend_client = None
+
+
+def get_queue_backend_client():
+    global _queue_backend_client
+    if _queue_backend_client is None:
+        _queue_backend_client = QueueBackendClient(
+            settings.QUEUE_BACKEND_URL,
+            settings.QUEUE_GROUP_NAME,
+            settings.QUEUE_BACKEND_TIMEOUT,
+            settings.QUEUE_BACKEND_MAX_FAILURES,
+            settings.QUEUE_BACKEND_RESET_TIMEOUT,
+        )
+    return _queue_backend_client
+
 
 class QueueControl(object):
+    """
+    Sends new external visitors to the waiting room while the site is busy.
+
+    Visitors with a sitequeuesession cookie have been let in already and are not checked again.
+    Works as both a sync (WSGI) and an async (ASGI) middleware; under ASGI the call to the queue backend runs outside of the event loop.
+    """
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
-    def __call__(self, request):
+    def _is_exempt(self, request):
+        if settings.WAITING_QUEUE_ENABLED is not True:
+            return True
+        # Required for ledger to send completion signal after payment is received.
+        # NOTE: add dcv admission/permit payment views when implemented
+        if (request.path.startswith('/ledger-api-success-callback/')
+            or request.path.startswith('/success/fee/')
+            or request.path.startswith('/sticker_replacement_fee_success/')
+            or request.path.startswith('/sticker_replacement_fee_success_preload/')):
+            return True
+        return False
+
+    def _needs_queue_check(self, request):
+        """
+        Whether the visitor has to be checked with the queue backend.  May query the database (is_internal).
+        """
+        sitequeuesession = request.COOKIES.get('sitequeuesession', None)
+        if sitequeuesession is not None:
+            return False
+        if settings.QUEUE_ACTIVE_HOSTS != request.META.get('HTTP_HOST', '') or not settings.QUEUE_WAITING_URL:
+            return False
+        if is_internal(request):
+            return False
+        return True
+
+    def _queue_response(self, queue_json):
+        """
+        Returns (waiting room response or None, session key to be set as the cookie) for the answer of the queue backend
+        """
         session_key = ''
-        if settings.WAITING_QUEUE_ENABLED is True:
-            # Required for ledger to send completion signal after payment is received.
-            # NOTE: add dcv admission/permit payment views when implemented
-            if (request.path.startswith('/ledger-api-success-callback/') 
-                or request.path.startswith('/success/fee/') 
-                or request.path.startswith('/sticker_replacement_fee_success/') 
-                or request.path.startswith('/sticker_replacement_fee_success_preload/')):
-                response= self.get_response(request)
-                return response
-            
-            sitequeuesession = request.COOKIES.get('sitequeuesession', None)
-            if (request.path.startswith('/') and not is_internal(request)):
-                try:
-                    if 'HTTP_HOST' in request.META:
-                        if settings.QUEUE_ACTIVE_HOSTS == request.META.get('HTTP_HOST',''):
-                            if settings.QUEUE_WAITING_URL:
-                                if sitequeuesession is None:
-                                    sitequeuesession=''
-                                         
-                                    url = settings.QUEUE_BACKEND_URL+"/api/check-create-session/?session_key="+sitequeuesession+"&queue_group="+settings.QUEUE_GROUP_NAME
-                                    resp = requests.get(url, data = {}, cookies={},  verify=False, timeout=10)
-                                                                 
-                                    queue_json = resp.json()
-                                    if 'session_key' in queue_json:
-                                        session_key = queue_json['session_key']
-                                   
-                                    if queue_json['status'] == 'Waiting': 
-                                        response =HttpResponse("<script>window.location.replace('"+queue_json['queue_waiting_room_url']+"');</script>Redirecting")
-                                        print('You are waiting : '+str(sitequeuesession))
-                                        return response
-                                else:
-                                    print('Active Session')
-                                               
-                except Exception as e:
-                    print(e)
-                    print("ERROR LOADING QUEUE")
+        if queue_json is None:
+            # The queue backend is down or slow, let the visitor through
+            return None, session_key
 
-        response = self.get_response(request)
+        if 'session_key' in queue_json:
+            session_key = queue_json['session_key']
+        if queue_json.get('status') == 'Waiting':
+            logger.info('Visitor sent to the waiting room')
+            return HttpResponse("<script>window.location.replace('"+queue_json['queue_waiting_room_url']+"');</script>Redirecting"), session_key
+        return None, session_key
+
+    def _check_queue(self, request):
+        """
+        Returns (waiting room response or None, session key to be set as the cookie)
+        """
+        if not self._needs_queue_check(request):
+            return None, ''
+        return self._queue_response(get_queue_backend_client().check_create_session())
+
+    async def _acheck_queue(self, request):
+        # The checks using the database (and the lazy request.user) run in the thread used for the ORM,
+        # only the call to the queue backend runs in another thread: a surge of checks must not queue up behind the ORM thread
+        if not await sync_to_async(self._needs_queue_check)(request):
+            return None, ''
+        queue_json = await sync_to_async(get_queue_backend_client().check_create_session, thread_sensitive=False)()
+        return self._queue_response(queue_json)
+
+    def _set_cookie(self, response, session_key):
         if len(session_key) > 5:
             response.set_cookie('sitequeuesession', session_key, domain=settings.QUEUE_DOMAIN)
-        return response
\ No newline at end of file
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        session_key = ''
+        if not self._is_exempt(request):
+            try:
+                waiting_response, session_key = self._check_queue(request)
+                if waiting_response:
+                    return waiting_response
+            except Exception as e:
+                logger.error(f'ERROR LOADING QUEUE: [{e}]')
+
+        response = self.get_response(request)
+        return self._set_cookie(response, session_key)
+
+    async def __acall__(self, request):
+        session_key = ''
+        if not self._is_exempt(request):
+            try:
+                waiting_response, session_key = await self._acheck_queue(request)
+                if waiting_response:
+                    return waiting_response
+            except Exception as e:
+                logger.error(f'ERROR LOADING QUEUE: [{e}]')
+
+        response = await self.get_response(request)
+        return self._set_cookie(response, session_key)
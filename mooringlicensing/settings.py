@@ -20,10 +20,27 @@ SHOW_DEBUG_TOOLBAR = env('SHOW_DEBUG_TOOLBAR', False)
 SHOW_API_ROOT = env('SHOW_API_ROOT', False)
 MAX_RENEWAL_NOTICES_PER_RUN = env('MAX_RENEWAL_NOTICES_PER_RUN', 5)
 NUMBER_OF_QUEUE_JOBS = env('NUMBER_OF_QUEUE_JOBS', 3)
+CRON_MAX_WORKERS = env('CRON_MAX_WORKERS', 4) # nightly cron jobs run at the same time, of those marked concurrent
+APPROVAL_STATUS_TRANSITION_BATCH_SIZE = env('APPROVAL_STATUS_TRANSITION_BATCH_SIZE', 100) # approvals per transaction of update_approval_status
 MAX_NUM_ROWS_MODEL_EXPORT = env('MAX_NUM_ROWS_MODEL_EXPORT', 500000)
+EXPORT_CHUNK_SIZE = env('EXPORT_CHUNK_SIZE', 2000) # rows fetched per database round trip when exporting
+
+#Settings for fetching invoice properties from ledger
+LEDGER_INVOICE_PROPERTIES_MAX_WORKERS = env('LEDGER_INVOICE_PROPERTIES_MAX_WORKERS', 8)
+LEDGER_INVOICE_PROPERTIES_CACHE_TTL = env('LEDGER_INVOICE_PROPERTIES_CACHE_TTL', 60) # seconds
+LEDGER_INVOICE_PROPERTIES_CACHE_MAX_SIZE = env('LEDGER_INVOICE_PROPERTIES_CACHE_MAX_SIZE', 10000)
+INVOICE_PROPERTY_SYNC_BATCH_SIZE = env('INVOICE_PROPERTY_SYNC_BATCH_SIZE', 500) # objects refreshed per run of sync_invoice_properties
+INVOICE_PROPERTY_SYNC_MAX_AGE = env('INVOICE_PROPERTY_SYNC_MAX_AGE', 24) # hours before an invoice_property_cache holding an invoice not paid yet is refreshed by the reconciliation
+
+#Settings for converting documents to pdf with LibreOffice
+LIBREOFFICE_MAX_WORKERS = env('LIBREOFFICE_MAX_WORKERS', 2) # LibreOffice processes allowed to run at once (per process)
+LIBREOFFICE_BATCH_SIZE = env('LIBREOFFICE_BATCH_SIZE', 25) # documents converted per LibreOffice run
+LIBREOFFICE_TIMEOUT = env('LIBREOFFICE_TIMEOUT', 600) # seconds
+DOCUMENT_REGENERATION_WORKERS = env('DOCUMENT_REGENERATION_WORKERS', 4) # worker processes used by bulk_regenerate_approval_documents
 
 #Settings for rounding application fee items
 ROUND_FEE_ITEMS = env('ROUND_FEE_ITEMS', False)
+FEE_ITEM_LOOKUP_VERSION_CHECK_INTERVAL = env('FEE_ITEM_LOOKUP_VERSION_CHECK_INTERVAL', 1) # seconds between checks for fee changes made by other processes
 
 if SHOW_DEBUG_TOOLBAR:
 
@@ -98,15 +115,45 @@ TEMPLATES[0]['DIRS'].append(os.path.join(BASE_DIR, 'mooringlicensing', 'template
 TEMPLATES[0]['OPTIONS']['context_processors'].append('mooringlicensing.context_processors.mooringlicensing_processor')
 #del BOOTSTRAP3['css_url']
 
-CACHES = {
-    'default': {
+CACHE_SHARED_BACKEND = env('CACHE_SHARED_BACKEND', 'file') # file, redis or locmem (tests and single process setups only)
+CACHE_REDIS_URL = env('CACHE_REDIS_URL', '') # e.g. redis://redis:6379/1, required by the redis backend
+if CACHE_SHARED_BACKEND == 'redis':
+    if not CACHE_REDIS_URL:
+        raise ImproperlyConfigured('If CACHE_SHARED_BACKEND is redis, CACHE_REDIS_URL has to be set')
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    }
+elif CACHE_SHARED_BACKEND == 'locmem':
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+else:
+    SHARED_CACHE = {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': os.path.join(BASE_DIR, 'mooringlicensing', 'cache'),
     }
+SHARED_CACHE['KEY_PREFIX'] = env('CACHE_KEY_PREFIX', 'mooringlicensing')
+SHARED_CACHE['VERSION'] = env('CACHE_VERSION', 1) # bump to invalidate every cached value at once
+CACHES = {
+    'default': {
+        'BACKEND': 'mooringlicensing.cache_backends.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': env('CACHE_LOCAL_MAX_ENTRIES', 1000), # entries kept in the memory of each process
+            'LOCAL_TIMEOUT': env('CACHE_LOCAL_TIMEOUT', 5), # seconds a process answers from its own copy of a value
+            'GENERATION_CHECK_INTERVAL': env('CACHE_GENERATION_CHECK_INTERVAL', 1), # seconds between checks for deletes made by other processes
+            # Version keys other processes are notified through are always read from the shared cache
+            'LOCAL_EXCLUDE': ['fee_item_lookup_version_', 'group_membership_version'],
+        },
+    },
+    'shared': SHARED_CACHE,
 }
+CACHE_WARM_ON_STARTUP = env('CACHE_WARM_ON_STARTUP', True) # load the hot cache keys when a worker starts
 
 CACHE_TIMEOUT_2_HOURS = 60 * 60 * 2
 CACHE_KEY_FILE_EXTENSION_WHITELIST = "file-extension-whitelist"
+CACHE_KEY_GLOBAL_SETTING = "global-setting-{}"
 FILE_SIZE_LIMIT_BYTES = env('FILE_SIZE_LIMIT_BYTES' ,128000000)
 
 STATIC_ROOT=os.path.join(BASE_DIR, 'staticfiles_ml')
@@ -162,6 +209,16 @@ CONSOLE_EMAIL_BACKEND = env('CONSOLE_EMAIL_BACKEND', False)
 if CONSOLE_EMAIL_BACKEND:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Emails are saved to the outbox and sent by the dispatch_outbox_emails command (every minute in python-cron), instead of during the request
+EMAIL_OUTBOX_ENABLED = env('EMAIL_OUTBOX_ENABLED', True)
+EMAIL_OUTBOX_BATCH_SIZE = env('EMAIL_OUTBOX_BATCH_SIZE', 50) # emails claimed by a worker at a time
+EMAIL_OUTBOX_RATE_LIMIT = env('EMAIL_OUTBOX_RATE_LIMIT', 5) # emails per second per worker, 0: no limit
+EMAIL_OUTBOX_MAX_ATTEMPTS = env('EMAIL_OUTBOX_MAX_ATTEMPTS', 8) # before an email is marked as failed
+EMAIL_OUTBOX_RETRY_DELAY = env('EMAIL_OUTBOX_RETRY_DELAY', 60) # seconds before the first retry, doubled on every further failure
+EMAIL_OUTBOX_MAX_RETRY_DELAY = env('EMAIL_OUTBOX_MAX_RETRY_DELAY', 3600) # seconds
+EMAIL_OUTBOX_CLAIM_TIMEOUT = env('EMAIL_OUTBOX_CLAIM_TIMEOUT', 600) # seconds before the emails claimed by a worker which died are sent by another one
+EMAIL_OUTBOX_POLL_INTERVAL = env('EMAIL_OUTBOX_POLL_INTERVAL', 5) # seconds
+
 OSCAR_BASKET_COOKIE_OPEN = 'mooringlicensing_basket'
 LEDGER_SYSTEM_ID = env('PAYMENT_INTERFACE_SYSTEM_PROJECT_CODE', 'PAYMENT_INTERFACE_SYSTEM_PROJECT_CODE not configured')
 PAYMENT_SYSTEM_ID = LEDGER_SYSTEM_ID.replace('0', 'S')
@@ -307,6 +364,9 @@ INTERNAL_GROUPS = [
     GROUP_APPROVER_MOORING_LICENCE,
     GROUP_DCV_PERMIT_ADMIN,
 ]
+GROUP_MEMBERSHIP_SNAPSHOT_TTL = env('GROUP_MEMBERSHIP_SNAPSHOT_TTL', 60) # seconds before the members of the internal groups are reloaded, bounds how long a membership changed outside of this application keeps applying
+GROUP_MEMBERSHIP_VERSION_CHECK_INTERVAL = env('GROUP_MEMBERSHIP_VERSION_CHECK_INTERVAL', 10) # seconds between checks for group membership changes
+PROFILE_COMPLETE_CACHE_TIMEOUT = env('PROFILE_COMPLETE_CACHE_TIMEOUT', 86400) # seconds a complete profile is remembered by FirstTimeNagScreenMiddleware
 
 # For NumberOfDaysSettings
 CODE_DAYS_BEFORE_DUE_PAYMENT = 'PaymentDueDate'
@@ -542,6 +602,8 @@ PRIVATE_MEDIA_DIR_NAME = env('PRIVATE_MEDIA_DIR_NAME', 'private-media')
 PRIVATE_MEDIA_STORAGE_LOCATION = os.path.join(BASE_DIR, PRIVATE_MEDIA_DIR_NAME)
 PRIVATE_MEDIA_BASE_URL = f'/{PRIVATE_MEDIA_DIR_NAME}/'
 MAKE_PRIVATE_MEDIA_FILENAME_NON_GUESSABLE = env('MAKE_PRIVATE_MEDIA_FILENAME_NON_GUESSABLE', False)
+PRIVATE_MEDIA_X_ACCEL_REDIRECT_PREFIX = env('PRIVATE_MEDIA_X_ACCEL_REDIRECT_PREFIX', '') # internal location of the front proxy serving BASE_DIR, private files are streamed by django when empty
+PRIVATE_DOCUMENT_AUTHORISATION_CACHE_TTL = env('PRIVATE_DOCUMENT_AUTHORISATION_CACHE_TTL', 60) # seconds a customer's access to a document is remembered
 LEDGER_UI_CARDS_MANAGEMENT = env('LEDGER_UI_CARDS_MANAGEMENT', True)
 SESSION_COOKIE_SECURE = env('SESSION_COOKIE_SECURE', True)
 CSRF_COOKIE_SECURE  = env('CSRF_COOKIE_SECURE', True)
@@ -564,6 +626,9 @@ QUEUE_DOMAIN = decouple.config('QUEUE_DOMAIN',default='')
 QUEUE_URL = decouple.config('QUEUE_URL',default='')
 QUEUE_BACKEND_URL = decouple.config('QUEUE_BACKEND_URL',default='')
 QUEUE_ACTIVE_HOSTS = decouple.config('QUEUE_ACTIVE_HOSTS',default='')
+QUEUE_BACKEND_TIMEOUT = decouple.config('QUEUE_BACKEND_TIMEOUT', default=2, cast=float) # seconds; visitors are let through when the queue backend is slower
+QUEUE_BACKEND_MAX_FAILURES = decouple.config('QUEUE_BACKEND_MAX_FAILURES', default=3, cast=int) # consecutive failures before the queue backend is no longer called
+QUEUE_BACKEND_RESET_TIMEOUT = decouple.config('QUEUE_BACKEND_RESET_TIMEOUT', default=30, cast=int) # seconds before the queue backend is tried again
 ENABLE_QUEUE_MIDDLEWARE = decouple.config('ENABLE_QUEUE_MIDDLEWARE',default=False, cast=bool)
 if ENABLE_QUEUE_MIDDLEWARE is True or ENABLE_QUEUE_MIDDLEWARE == 'True':
     MIDDLEWARE_CLASSES += [
@@ -0,0 +1,92 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from mooringlicensing.components.approvals.models import (
+        Approval,
+        AnnualAdmissionPermit,
+        AuthorisedUserPermit,
+        Sticker,
+        )
+from mooringlicensing.components.approvals.serializers import ListApprovalSerializer
+from mooringlicensing.components.approvals.utils import ApprovalListPageLoader
+from mooringlicensing.components.proposals.models import AnnualAdmissionApplication, Proposal, ProposalType
+from mooringlicensing.settings import PROPOSAL_TYPE_RENEWAL
+
+
+class ApprovalListPageQueryTests(TestCase):
+    """
+    The number of queries used to load the related data of a page of approvals must not grow with the page size
+    """
+
+    # child objs, stickers, sticker action details, moas, vessel ownership on approvals, reissue blocking and pending applications
+    PAGE_LOADER_QUERIES = 7
+
+    def create_approvals(self, num):
+        approvals = []
+        for i in range(num):
+            approval_class = AnnualAdmissionPermit if i % 2 else AuthorisedUserPermit
+            approval = approval_class.objects.create(issue_date=timezone.now())
+            Sticker.objects.create(approval=approval, number='{0:07d}'.format(approval.id), status=Sticker.STICKER_STATUS_CURRENT)
+            Sticker.objects.create(approval=approval, number='{0:07d}'.format(approval.id + 1000), status=Sticker.STICKER_STATUS_EXPIRED)
+            approvals.append(approval)
+        # Serialize fresh base class instances as the paginated viewset does
+        return list(Approval.objects.filter(id__in=[a.id for a in approvals]))
+
+    def count_page_queries(self, approvals):
+        with CaptureQueriesContext(connection) as context:
+            loader = ApprovalListPageLoader(approvals)
+        return loader, len(context.captured_queries)
+
+    def test_page_loader_queries_are_fixed(self):
+        _, small_page_queries = self.count_page_queries(self.create_approvals(2))
+        _, large_page_queries = self.count_page_queries(self.create_approvals(10))
+
+        self.assertEqual(small_page_queries, self.PAGE_LOADER_QUERIES)
+        self.assertEqual(large_page_queries, self.PAGE_LOADER_QUERIES)
+
+    def test_serializer_methods_use_page_loader(self):
+        approvals = self.create_approvals(6)
+        loader, _ = self.count_page_queries(approvals)
+        serializer = ListApprovalSerializer(approvals, many=True, context={'approval_page_loader': loader})
+
+        with self.assertNumQueries(0):
+            for approval in approvals:
+                approval.child_obj
+                serializer.child.get_has_sticker(approval)
+                serializer.child.get_moorings(approval)
+                serializer.child.get_stickers(approval)
+                serializer.child.get_stickers_historical(approval)
+
+        for approval in approvals:
+            self.assertTrue(serializer.child.get_has_sticker(approval))
+            self.assertEqual(len(serializer.child.get_stickers_historical(approval)), 2)
+
+    def count_serialization_queries(self, approvals):
+        with CaptureQueriesContext(connection) as context:
+            data = ListApprovalSerializer(approvals, many=True).data
+        return data, len(context.captured_queries)
+
+    def test_page_serialization_queries_are_fixed(self):
+        # The whole page as the list viewset serializes it, the loader being built by the serializer itself
+        small_page, small_page_queries = self.count_serialization_queries(self.create_approvals(2))
+        large_page, large_page_queries = self.count_serialization_queries(self.create_approvals(10))
+
+        self.assertEqual(len(small_page), 2)
+        self.assertEqual(len(large_page), 10)
+        self.assertEqual(small_page_queries, large_page_queries)
+
+    def test_page_loader_matches_approval_properties(self):
+        approvals = self.create_approvals(4)
+        renewal_type, _ = ProposalType.objects.get_or_create(code=PROPOSAL_TYPE_RENEWAL)
+        AnnualAdmissionApplication.objects.create(
+            approval=approvals[0], proposal_type=renewal_type, processing_status=Proposal.PROCESSING_STATUS_DRAFT,
+        )
+        Approval.objects.filter(id=approvals[1].id).update(status=Approval.APPROVAL_STATUS_EXPIRED)
+        approvals = list(Approval.objects.filter(id__in=[a.id for a in approvals]))
+
+        loader = ApprovalListPageLoader(approvals)
+        for approval in approvals:
+            self.assertEqual(loader.can_reissue(approval), approval.can_reissue)
+            self.assertEqual(loader.amend_or_renew(approval), approval.amend_or_renew)
@@ -0,0 +1,170 @@
+import datetime
+import json
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from mooringlicensing.components.approvals import status_transitions
+from mooringlicensing.components.approvals.models import Approval, AnnualAdmissionPermit, AuthorisedUserPermit, Sticker
+from mooringlicensing.components.main.models import JobQueue
+from mooringlicensing.components.proposals.models import AnnualAdmissionApplication
+
+
+@mock.patch('mooringlicensing.components.approvals.models.send_approval_expire_email_notification')
+class ApprovalStatusTransitionTests(TestCase):
+    """
+    The approvals selected and updated are those the update_approval_status command used to update
+    """
+
+    def setUp(self):
+        self.today = timezone.localtime(timezone.now()).date()
+
+    def date_str(self, days):
+        return (self.today + datetime.timedelta(days=days)).strftime('%d/%m/%Y')
+
+    def create_approval(self, approval_class=AnnualAdmissionPermit, **kwargs):
+        fields = {
+            'issue_date': timezone.now(),
+            'start_date': self.today - datetime.timedelta(days=30),
+            'expiry_date': self.today + datetime.timedelta(days=30),
+            'status': Approval.APPROVAL_STATUS_CURRENT,
+            'current_proposal': AnnualAdmissionApplication.objects.create(),
+        }
+        fields.update(kwargs)
+        return approval_class.objects.create(**fields)
+
+    def candidate_ids(self, transition):
+        return set(status_transitions.get_candidates(transition, self.today).values_list('id', flat=True))
+
+    def test_expire_candidates(self, send_expire_email):
+        expired = self.create_approval(expiry_date=self.today - datetime.timedelta(days=1))
+        self.create_approval(expiry_date=self.today)
+        self.create_approval(expiry_date=self.today - datetime.timedelta(days=1), status=Approval.APPROVAL_STATUS_SUSPENDED)
+        self.assertEqual(self.candidate_ids(status_transitions.TRANSITION_EXPIRE), {expired.id})
+
+    def test_suspend_candidates(self, send_expire_email):
+        due = self.create_approval(set_to_suspend=True, suspension_details={'from_date': self.date_str(0), 'to_date': self.date_str(10)})
+        self.create_approval(set_to_suspend=True, suspension_details={'from_date': self.date_str(1), 'to_date': self.date_str(10)})
+        self.create_approval(set_to_suspend=False, suspension_details={'from_date': self.date_str(-1), 'to_date': self.date_str(10)})
+        self.assertEqual(self.candidate_ids(status_transitions.TRANSITION_SUSPEND), {due.id})
+
+    def test_cancel_candidates(self, send_expire_email):
+        current = self.create_approval(set_to_cancel=True, cancellation_date=self.today)
+        suspended = self.create_approval(set_to_cancel=True, cancellation_date=self.today - datetime.timedelta(days=1), status=Approval.APPROVAL_STATUS_SUSPENDED)
+        self.create_approval(set_to_cancel=True, cancellation_date=self.today + datetime.timedelta(days=1))
+        self.create_approval(set_to_cancel=True, cancellation_date=self.today, status=Approval.APPROVAL_STATUS_EXPIRED)
+        self.assertEqual(self.candidate_ids(status_transitions.TRANSITION_CANCEL), {current.id, suspended.id})
+
+    def test_surrender_candidates(self, send_expire_email):
+        current = self.create_approval(set_to_surrender=True, surrender_details={'surrender_date': self.date_str(0)})
+        suspended = self.create_approval(set_to_surrender=True, surrender_details={'surrender_date': self.date_str(-1)}, status=Approval.APPROVAL_STATUS_SUSPENDED)
+        self.create_approval(set_to_surrender=True, surrender_details={'surrender_date': self.date_str(1)})
+        self.create_approval(set_to_surrender=False, surrender_details={'surrender_date': self.date_str(-1)})
+        self.assertEqual(self.candidate_ids(status_transitions.TRANSITION_SURRENDER), {current.id, suspended.id})
+
+    def test_reinstate_candidates(self, send_expire_email):
+        due = self.create_approval(status=Approval.APPROVAL_STATUS_SUSPENDED, suspension_details={'from_date': self.date_str(-10), 'to_date': self.date_str(0)})
+        self.create_approval(status=Approval.APPROVAL_STATUS_SUSPENDED, suspension_details={'from_date': self.date_str(-10), 'to_date': self.date_str(1)})
+        # Not reinstated once it has passed its expiry date
+        self.create_approval(status=Approval.APPROVAL_STATUS_SUSPENDED, suspension_details={'from_date': self.date_str(-10), 'to_date': self.date_str(-1)}, expiry_date=self.today)
+        self.assertEqual(self.candidate_ids(status_transitions.TRANSITION_REINSTATE), {due.id})
+
+    def test_transitions_and_side_effect_payloads(self, send_expire_email):
+        expired = self.create_approval(expiry_date=self.today - datetime.timedelta(days=1))
+        suspended = self.create_approval(set_to_suspend=True, suspension_details={'from_date': self.date_str(0), 'to_date': self.date_str(10)})
+        cancelled = self.create_approval(AuthorisedUserPermit, set_to_cancel=True, cancellation_date=self.today)
+        surrendered = self.create_approval(set_to_surrender=True, surrender_details={'surrender_date': self.date_str(0)})
+        sticker = Sticker.objects.create(approval=surrendered, number='0000001', status=Sticker.STICKER_STATUS_CURRENT)
+        reinstated = self.create_approval(status=Approval.APPROVAL_STATUS_SUSPENDED, suspension_details={'from_date': self.date_str(-10), 'to_date': self.date_str(0)})
+
+        errors, updates = status_transitions.apply_transitions(self.today, batch_size=10)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(updates), 5)
+        for approval, status in [
+            (expired, Approval.APPROVAL_STATUS_EXPIRED),
+            (suspended, Approval.APPROVAL_STATUS_SUSPENDED),
+            (cancelled, Approval.APPROVAL_STATUS_CANCELLED),
+            (surrendered, Approval.APPROVAL_STATUS_SURRENDERED),
+            (reinstated, Approval.APPROVAL_STATUS_CURRENT),
+        ]:
+            approval.refresh_from_db()
+            self.assertEqual(approval.status, status)
+        self.assertFalse(suspended.set_to_suspend)
+        self.assertFalse(cancelled.set_to_cancel)
+        self.assertFalse(surrendered.set_to_surrender)
+        send_expire_email.assert_called_once()
+        sticker.refresh_from_db()
+        self.assertEqual(sticker.status, Sticker.STICKER_STATUS_TO_BE_RETURNED)
+
+        # The expiry sends its own notification and a reinstatement has none, the others are queued
+        transitions = []
+        for job in JobQueue.objects.filter(job_cmd=status_transitions.SIDE_EFFECTS_JOB_CMD):
+            transitions += job.parameters_json['transitions']
+        self.assertEqual(sorted(transitions, key=lambda transition: transition['approval_id']), [
+            {'approval_id': suspended.id, 'transition': status_transitions.TRANSITION_SUSPEND},
+            {'approval_id': cancelled.id, 'transition': status_transitions.TRANSITION_CANCEL},
+            {'approval_id': surrendered.id, 'transition': status_transitions.TRANSITION_SURRENDER, 'stickers_to_be_returned': [sticker.id]},
+        ])
+
+        # Applied once only
+        self.assertEqual(status_transitions.apply_transitions(self.today, batch_size=10), ([], []))
+
+
+@mock.patch('mooringlicensing.components.approvals.status_transitions.send_approval_surrender_email_notification')
+@mock.patch('mooringlicensing.components.approvals.status_transitions.send_approval_cancel_email_notification')
+@mock.patch('mooringlicensing.components.approvals.status_transitions.send_approval_suspend_email_notification')
+class ApprovalStatusSideEffectTests(TestCase):
+
+    def create_approval(self, approval_class):
+        return Approval.objects.get(id=approval_class.objects.create(issue_date=timezone.now()).id)
+
+    def test_side_effects(self, send_suspend_email, send_cancel_email, send_surrender_email):
+        aap = self.create_approval(AnnualAdmissionPermit)
+        aup = self.create_approval(AuthorisedUserPermit)
+        sticker = Sticker.objects.create(approval=aup, number='0000001', status=Sticker.STICKER_STATUS_TO_BE_RETURNED)
+
+        with mock.patch.object(AuthorisedUserPermit, 'processes_after_cancel') as processes_after_cancel:
+            status_transitions.process_side_effects(status_transitions.TRANSITION_SUSPEND, aap)
+            send_suspend_email.assert_called_once_with(aap)
+
+            # As before, the mooring licences and authorised user permits are processed after a cancellation or surrender
+            status_transitions.process_side_effects(status_transitions.TRANSITION_CANCEL, aap)
+            processes_after_cancel.assert_not_called()
+            status_transitions.process_side_effects(status_transitions.TRANSITION_CANCEL, aup)
+            self.assertEqual(processes_after_cancel.call_count, 1)
+            self.assertEqual(send_cancel_email.call_count, 2)
+
+            status_transitions.process_side_effects(status_transitions.TRANSITION_SURRENDER, aup, [sticker.id])
+            self.assertEqual(processes_after_cancel.call_count, 2)
+            send_surrender_email.assert_called_once_with(aup, stickers_to_be_returned=[sticker])
+
+    def test_failed_side_effects_are_queued_again(self, send_suspend_email, send_cancel_email, send_surrender_email):
+        approvals = [self.create_approval(AnnualAdmissionPermit) for i in range(3)]
+        failing = approvals[1]
+
+        def send_email(approval):
+            if approval.id == failing.id:
+                raise Exception('SMTP error')
+        send_suspend_email.side_effect = send_email
+        transitions = [{'approval_id': approval.id, 'transition': status_transitions.TRANSITION_SUSPEND} for approval in approvals]
+
+        call_command('process_approval_status_transitions', json.dumps({'transitions': transitions, 'attempt': 1}))
+
+        # The others are not sent again
+        self.assertEqual(send_suspend_email.call_count, 3)
+        job = JobQueue.objects.get(job_cmd=status_transitions.SIDE_EFFECTS_JOB_CMD)
+        self.assertEqual(job.status, 0)
+        self.assertEqual(job.parameters_json, {
+            'transitions': [{'approval_id': failing.id, 'transition': status_transitions.TRANSITION_SUSPEND}],
+            'attempt': 2,
+        })
+
+        # Until the last attempt, which fails the job
+        with self.assertRaises(Exception):
+            call_command('process_approval_status_transitions', json.dumps({
+                'transitions': job.parameters_json['transitions'], 'attempt': status_transitions.SIDE_EFFECTS_MAX_ATTEMPTS,
+            }))
+        self.assertEqual(JobQueue.objects.count(), 1)
@@ -0,0 +1,50 @@
+from django.test import TestCase, override_settings
+
+from mooringlicensing.components.emails.emails import TemplateEmailBase, collect_render_stats, get_compiled_template
+from mooringlicensing.components.emails.utils import get_user_as_email_user
+from mooringlicensing.ledger_api_utils import email_user_scope, get_email_user_scope, retrieve_email_userro
+
+HTML_TEMPLATE = 'mooringlicensing/emails_2/application_payment_reminder.html'
+TXT_TEMPLATE = 'mooringlicensing/emails_2/application_payment_reminder.txt'
+
+
+class EmailUser(object):
+
+    def __init__(self, email):
+        self.email = email
+
+
+@override_settings(EMAIL_OUTBOX_ENABLED=True, DISABLE_EMAIL=False)
+class BulkNotificationTests(TestCase):
+
+    @override_settings(DEBUG=False)
+    def test_templates_are_compiled_once(self):
+        self.assertIs(get_compiled_template(HTML_TEMPLATE), get_compiled_template(HTML_TEMPLATE))
+
+    def test_render_time_is_collected_per_template(self):
+        email = TemplateEmailBase(subject='Payment reminder', html_template=HTML_TEMPLATE, txt_template=TXT_TEMPLATE)
+        with collect_render_stats() as render_stats:
+            for to_address in ['first@example.com', 'second@example.com']:
+                self.assertIsNotNone(email.send(to_address, context={'due_date': '01/07/2026'}))
+        # Not collected any more
+        email.send('third@example.com', context={})
+
+        self.assertEqual(list(render_stats.templates), [HTML_TEMPLATE])
+        self.assertEqual(render_stats.count, 2)
+        report = render_stats.report()
+        self.assertTrue(report[0].startswith(f'{HTML_TEMPLATE}: 2 email(s) rendered'))
+        self.assertTrue(report[-1].startswith('Total: 2 email(s)'))
+
+    def test_email_users_are_remembered_within_the_scope(self):
+        holder = EmailUser('holder@example.com')
+        sender = EmailUser('no-reply@example.com')
+        with email_user_scope():
+            users = get_email_user_scope()
+            users['by_id'][123] = holder
+            users['by_email']['no-reply@example.com'] = sender
+            with email_user_scope():
+                # A nested scope shares the outer one
+                self.assertIs(get_email_user_scope(), users)
+                self.assertIs(retrieve_email_userro(123), holder)
+            self.assertIs(get_user_as_email_user('No-Reply@example.com'), sender)
+        self.assertIsNone(get_email_user_scope())
@@ -0,0 +1,70 @@
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from mooringlicensing.cache_backends import TieredCache
+
+LOCAL_OPTIONS = {
+    'LOCAL_TIMEOUT': 1,
+    'GENERATION_CHECK_INTERVAL': 0,
+    'LOCAL_MAX_ENTRIES': 2,
+    'LOCAL_EXCLUDE': ['version_'],
+}
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'mooringlicensing.cache_backends.TieredCache', 'LOCATION': 'shared', 'OPTIONS': LOCAL_OPTIONS},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-cache-tests', 'KEY_PREFIX': 'test'},
+})
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['shared'].clear()
+        # Stand-ins for two processes sharing the same shared cache
+        self.cache = TieredCache('shared', {'OPTIONS': LOCAL_OPTIONS})
+        self.other = TieredCache('shared', {'OPTIONS': LOCAL_OPTIONS})
+
+    def test_read_through_and_copies(self):
+        self.cache.set('key', [1])
+        self.assertEqual(self.other.get('key'), [1])
+        value = self.cache.get('key')
+        value.append(2)
+        self.assertEqual(self.cache.get('key'), [1])
+
+    def test_set_reaches_other_processes_once_local_copy_expires(self):
+        self.cache.set('key', 'old')
+        self.other.get('key')
+        self.cache.set('key', 'new')
+        self.assertEqual(self.other.get('key'), 'old')
+        time.sleep(1.1)
+        self.assertEqual(self.other.get('key'), 'new')
+
+    def test_delete_reaches_other_processes(self):
+        self.cache.set('key', 'value')
+        self.other.get('key')
+        self.cache.delete('key')
+        self.assertIsNone(self.other.get('key'))
+
+    def test_excluded_keys_are_always_read_from_the_shared_cache(self):
+        self.cache.set('version_1', 'a')
+        self.other.get('version_1')
+        self.cache.set('version_1', 'b')
+        self.assertEqual(self.other.get('version_1'), 'b')
+
+    def test_local_tier_is_bounded(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.assertEqual(len(self.cache._local), 2)
+        self.assertEqual(self.cache.get('a'), 'a')
+
+    def test_none_is_cached(self):
+        self.cache.set('key', None)
+        self.assertTrue(self.cache.has_key('key'))
+        self.assertIsNone(self.cache.get('key', 'default'))
+
+    def test_versioning(self):
+        self.cache.set('key', 1)
+        self.cache.incr_version('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', version=2), 1)
@@ -0,0 +1,23 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from mooringlicensing.components.approvals.models import Approval, AnnualAdmissionPermit, AuthorisedUserPermit
+
+
+class ChildTypeTests(TestCase):
+
+    def test_child_type_is_set_on_save(self):
+        approval = AnnualAdmissionPermit.objects.create(issue_date=timezone.now())
+
+        self.assertEqual(approval.child_type, AnnualAdmissionPermit.code)
+        self.assertEqual(list(Approval.objects.filter(child_type=AnnualAdmissionPermit.code).values_list('id', flat=True)), [approval.id])
+
+    def test_select_child_objs(self):
+        ids = [
+            AnnualAdmissionPermit.objects.create(issue_date=timezone.now()).id,
+            AuthorisedUserPermit.objects.create(issue_date=timezone.now()).id,
+        ]
+        approvals = list(Approval.objects.filter(id__in=ids).select_child_objs().order_by('id'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual([type(approval.child_obj) for approval in approvals], [AnnualAdmissionPermit, AuthorisedUserPermit])
@@ -0,0 +1,94 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from mooringlicensing.components.main import cron
+from mooringlicensing.components.main.cron import CronJob, NIGHTLY_JOBS, get_dependencies, run_job, run_jobs
+from mooringlicensing.components.main.models import CronJobRun
+
+
+class CronJobOrderTests(SimpleTestCase):
+
+    def setUp(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def record(self, *event):
+        with self.lock:
+            self.events.append(event)
+
+    def index(self, *event):
+        return self.events.index(event)
+
+    def test_jobs_run_one_after_another_by_default(self):
+        dependencies = get_dependencies(NIGHTLY_JOBS)
+        # e.g. update_approval_status does not run alongside the other jobs touching approvals
+        self.assertEqual(dependencies['update_approval_status'], {'expire_mooring_licence_application_due_to_no_submit'})
+        self.assertEqual(dependencies['expire_dcv_permits_out_of_season'], {'remove_unpaid_dcv_submissions'})
+        self.assertEqual(dependencies['send_compliance_reminder'], {'update_compliance_status'})
+        self.assertEqual(dependencies['update_compliance_status'], set())
+
+    def test_unknown_dependency(self):
+        with self.assertRaises(ValueError):
+            get_dependencies([CronJob('a', depends_on=['b'])])
+
+    def test_circular_dependencies(self):
+        with mock.patch.object(cron, 'run_job'):
+            with self.assertRaises(ValueError):
+                run_jobs([CronJob('a', depends_on=['b'], concurrent=True), CronJob('b', depends_on=['a'], concurrent=True)], 2)
+
+    def test_order_and_concurrency(self):
+        concurrent_job_started = threading.Event()
+
+        def run(run_id, job):
+            self.record('start', job.name)
+            if job.name == 'first':
+                # Only returns early if the concurrent job runs alongside
+                self.assertTrue(concurrent_job_started.wait(5))
+            if job.name == 'concurrent':
+                concurrent_job_started.set()
+            time.sleep(0.01)
+            self.record('end', job.name)
+            return job.name
+
+        jobs = [CronJob('first'), CronJob('concurrent', concurrent=True), CronJob('second'), CronJob('third', depends_on=['concurrent'])]
+        with mock.patch.object(cron, 'run_job', side_effect=run):
+            job_runs = run_jobs(jobs, 4)
+
+        self.assertEqual(sorted(job_runs), ['concurrent', 'first', 'second', 'third'])
+        self.assertLess(self.index('start', 'concurrent'), self.index('end', 'first'))
+        self.assertLess(self.index('end', 'first'), self.index('start', 'second'))
+        self.assertLess(self.index('end', 'second'), self.index('start', 'third'))
+        self.assertLess(self.index('end', 'concurrent'), self.index('start', 'third'))
+
+    def test_jobs_after_a_failed_job_still_run(self):
+        def run(run_id, job):
+            self.record('start', job.name)
+            if job.name == 'failing':
+                raise Exception('Could not be run')
+            return job.name
+
+        with mock.patch.object(cron, 'run_job', side_effect=run):
+            job_runs = run_jobs([CronJob('failing'), CronJob('next'), CronJob('dependent', depends_on=['failing'], concurrent=True)], 2)
+
+        self.assertEqual(sorted(job_runs), ['dependent', 'next'])
+        self.assertLess(self.index('start', 'failing'), self.index('start', 'next'))
+
+
+class CronJobRunTests(TestCase):
+
+    @mock.patch.object(cron, 'call_command')
+    def test_succeeded_job(self, call_command):
+        job_run = run_job('00000000-0000-0000-0000-000000000001', CronJob('update_compliance_status'))
+        call_command.assert_called_once_with('update_compliance_status')
+        self.assertEqual(job_run.status, CronJobRun.STATUS_SUCCEEDED)
+        self.assertIsNotNone(job_run.finished_at)
+
+    @mock.patch.object(cron, 'call_command', side_effect=SystemExit(1))
+    def test_failed_job(self, call_command):
+        job_run = run_job('00000000-0000-0000-0000-000000000001', CronJob('update_compliance_status'))
+        job_run.refresh_from_db()
+        self.assertEqual(job_run.status, CronJobRun.STATUS_FAILED)
+        self.assertIn('SystemExit', job_run.error)
@@ -0,0 +1,37 @@
+import os
+import subprocess
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from mooringlicensing.doctopdf import LibreOfficeConverterPool
+
+
+class LibreOfficeConverterPoolTests(SimpleTestCase):
+
+    def test_failed_batches_are_returned_per_file(self):
+        pool = LibreOfficeConverterPool(max_workers=2, batch_size=2, timeout=1)
+        self.addCleanup(pool.remove_profiles)
+
+        def run(command, **kwargs):
+            if 'b.docx' in command:
+                raise subprocess.TimeoutExpired(command, kwargs['timeout'])
+            if 'c.docx' in command:
+                raise FileNotFoundError('libreoffice')
+            return subprocess.CompletedProcess(command, 0, b'', b'')
+
+        with mock.patch('mooringlicensing.doctopdf.subprocess.run', side_effect=run):
+            errors = pool.convert(['a.docx', 'b.docx', 'c.docx'], '/tmp')
+
+        # a.docx is in the batch which timed out
+        self.assertEqual(set(errors), {'a.docx', 'b.docx', 'c.docx'})
+        self.assertIsInstance(errors['b.docx'], subprocess.TimeoutExpired)
+        self.assertIsInstance(errors['c.docx'], FileNotFoundError)
+        # All the profiles are given back
+        self.assertEqual(pool._profiles.qsize(), 2)
+
+    def test_profiles_are_removed(self):
+        pool = LibreOfficeConverterPool(max_workers=1, batch_size=1, timeout=1)
+        os.makedirs(pool._profile_directories[0], exist_ok=True)
+        pool.remove_profiles()
+        self.assertFalse(os.path.exists(pool._profile_directories[0]))
@@ -0,0 +1,215 @@
+from concurrent.futures import Future
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from mooringlicensing import doctopdf
+from mooringlicensing.components.approvals import document_regeneration
+from mooringlicensing.components.approvals.document_regeneration import DocumentRegenerationProgress, regenerate_approval_documents
+from mooringlicensing.components.approvals.models import (
+    Approval, ApprovalDocumentRegeneration, AnnualAdmissionPermit, AuthorisedUserPermit, MooringLicence,
+)
+from mooringlicensing.management.commands import bulk_regenerate_approval_documents
+
+
+class InlineExecutor(object):
+    """
+    Stands in for the ProcessPoolExecutor, running the batches one after another in the test process and transaction
+    """
+    def __init__(self, max_workers=None, mp_context=None, initializer=None):
+        self.max_workers = max_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class DocumentRegenerationMixin(object):
+
+    def setUp(self):
+        super().setUp()
+        # Closing the connections would end the test transaction
+        patcher = mock.patch.object(document_regeneration, 'connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_approval(self, approval_class=AnnualAdmissionPermit, status=Approval.APPROVAL_STATUS_CURRENT):
+        return approval_class.objects.create(issue_date=timezone.now(), status=status)
+
+    def checkpoints(self, run_name):
+        return dict(ApprovalDocumentRegeneration.objects.filter(run_name=run_name).values_list('approval_id', 'status'))
+
+
+class RegenerateBatchTests(DocumentRegenerationMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.failing_ids = set()
+
+        def _docs(approvals):
+            return [ValueError('template not found') if approval.id in self.failing_ids else b'licence' for approval in approvals]
+
+        for patcher in (
+            mock.patch.object(doctopdf, 'create_approval_doc_bytes_batch', side_effect=_docs),
+            mock.patch.object(doctopdf, 'create_authorised_user_summary_doc_bytes_batch', side_effect=lambda approvals: [b'summary' for approval in approvals]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.generated = {}
+        for name in ('generate_doc', 'generate_au_summary_doc'):
+            patcher = mock.patch.object(Approval, name, autospec=True, side_effect=lambda approval, contents_as_bytes, name=name: self.generated.setdefault(approval.id, []).append((name, contents_as_bytes)))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name in ('write_approval_history', 'log_user_action'):
+            patcher = mock.patch.object(Approval, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def regenerate_batch(self, approvals):
+        for approval in approvals:
+            ApprovalDocumentRegeneration.objects.create(run_name='run', approval=approval)
+        return document_regeneration._regenerate_batch('run', [approval.id for approval in approvals])
+
+    def test_documents_are_regenerated_and_checkpointed(self):
+        permit = self.create_approval()
+        mooring_licence = self.create_approval(MooringLicence)
+
+        self.assertEqual(self.regenerate_batch([permit, mooring_licence]), (2, 0))
+        self.assertEqual(self.generated[permit.id], [('generate_doc', b'licence')])
+        # With the authorised user summary of the mooring licence
+        self.assertEqual(self.generated[mooring_licence.id], [('generate_doc', b'licence'), ('generate_au_summary_doc', b'summary')])
+        self.assertEqual(self.checkpoints('run'), {permit.id: ApprovalDocumentRegeneration.STATUS_COMPLETED, mooring_licence.id: ApprovalDocumentRegeneration.STATUS_COMPLETED})
+        self.assertIsNotNone(ApprovalDocumentRegeneration.objects.get(approval=permit).completed_at)
+        document_regeneration.connections.close_all.assert_called_once_with()
+
+    def test_failed_approval_does_not_stop_the_batch(self):
+        failing = self.create_approval()
+        permit = self.create_approval()
+        self.failing_ids.add(failing.id)
+
+        with self.assertLogs('cron_tasks', 'ERROR'):
+            self.assertEqual(self.regenerate_batch([failing, permit]), (1, 1))
+        self.assertNotIn(failing.id, self.generated)
+        self.assertEqual(self.checkpoints('run'), {failing.id: ApprovalDocumentRegeneration.STATUS_FAILED, permit.id: ApprovalDocumentRegeneration.STATUS_COMPLETED})
+        self.assertEqual(ApprovalDocumentRegeneration.objects.get(approval=failing).error, 'template not found')
+
+
+class RegenerateApprovalDocumentsTests(DocumentRegenerationMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.batches = []
+        self.failing_batches = 0
+
+        def _regenerate_batch(run_name, approval_ids):
+            self.batches.append(approval_ids)
+            if self.failing_batches:
+                self.failing_batches -= 1
+                raise RuntimeError('worker died')
+            ApprovalDocumentRegeneration.objects.filter(run_name=run_name, approval_id__in=approval_ids).update(status=ApprovalDocumentRegeneration.STATUS_COMPLETED)
+            return len(approval_ids), 0
+
+        for patcher in (
+            mock.patch.object(document_regeneration, 'ProcessPoolExecutor', InlineExecutor),
+            mock.patch.object(document_regeneration, '_regenerate_batch', side_effect=_regenerate_batch),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.approvals = [self.create_approval() for i in range(5)]
+        self.approval_ids = [approval.id for approval in self.approvals]
+
+    def regenerate(self, **kwargs):
+        return regenerate_approval_documents('run', Approval.objects.filter(id__in=self.approval_ids), workers=2, batch_size=2, report=lambda msg: None, **kwargs)
+
+    def test_approvals_are_regenerated_in_batches(self):
+        progress = self.regenerate()
+
+        self.assertEqual(self.batches, [self.approval_ids[0:2], self.approval_ids[2:4], self.approval_ids[4:]])
+        self.assertEqual((progress.total, progress.completed, progress.failed), (5, 5, 0))
+        self.assertEqual(set(self.checkpoints('run').values()), {ApprovalDocumentRegeneration.STATUS_COMPLETED})
+
+    def test_run_resumes_from_the_approvals_not_completed(self):
+        self.failing_batches = 1
+        with self.assertLogs('cron_tasks', 'ERROR'):
+            progress = self.regenerate()
+        self.assertEqual(progress.completed, 3)
+        # The checkpoints of the failed batch stay pending
+        self.assertEqual(self.checkpoints('run')[self.approval_ids[0]], ApprovalDocumentRegeneration.STATUS_PENDING)
+
+        self.batches = []
+        progress = self.regenerate()
+        self.assertEqual(self.batches, [self.approval_ids[0:2]])
+        self.assertEqual((progress.total, progress.completed), (2, 2))
+
+        # Nothing left to do
+        self.batches = []
+        self.assertEqual(self.regenerate().total, 0)
+        self.assertEqual(self.batches, [])
+
+    def test_failed_approvals_are_retried_on_request(self):
+        ApprovalDocumentRegeneration.objects.bulk_create([
+            ApprovalDocumentRegeneration(run_name='run', approval_id=approval_id, status=ApprovalDocumentRegeneration.STATUS_COMPLETED)
+            for approval_id in self.approval_ids
+        ])
+        ApprovalDocumentRegeneration.objects.filter(approval_id=self.approval_ids[1]).update(status=ApprovalDocumentRegeneration.STATUS_FAILED)
+
+        self.assertEqual(self.regenerate().total, 0)
+        self.assertEqual(self.regenerate(retry_failed=True).total, 1)
+        self.assertEqual(self.batches, [[self.approval_ids[1]]])
+        # Another run starts from scratch
+        self.assertEqual(regenerate_approval_documents('other run', Approval.objects.filter(id__in=self.approval_ids), report=lambda msg: None).total, 5)
+
+
+class DocumentRegenerationProgressTests(SimpleTestCase):
+
+    def test_progress_report(self):
+        messages = []
+        progress = DocumentRegenerationProgress(10, messages.append)
+        progress.started -= 2
+
+        progress.update(3, 1)
+
+        self.assertEqual((progress.completed, progress.failed), (3, 1))
+        self.assertRegex(messages[-1], r'^4/10 approvals processed \(1 failed\), [12]\.\d\d approvals/s, ETA 3s$')
+
+
+class BulkRegenerateApprovalDocumentsCommandTests(DocumentRegenerationMixin, TestCase):
+
+    def test_current_and_suspended_approvals_of_the_types(self):
+        permit = self.create_approval()
+        suspended_permit = self.create_approval(status=Approval.APPROVAL_STATUS_SUSPENDED)
+        self.create_approval(status=Approval.APPROVAL_STATUS_EXPIRED)
+        mooring_licence = self.create_approval(MooringLicence)
+        self.create_approval(AuthorisedUserPermit)
+
+        with mock.patch.object(bulk_regenerate_approval_documents, 'regenerate_approval_documents', return_value=DocumentRegenerationProgress(0, None)) as regenerate:
+            call_command('bulk_regenerate_approval_documents', '--run', 'run', '--type', 'aap', '--type', 'ml', '--workers', '3', stdout=StringIO())
+
+        run_name, approvals = regenerate.call_args[0]
+        self.assertEqual(run_name, 'run')
+        self.assertEqual(set(approvals.values_list('id', flat=True)), {permit.id, suspended_permit.id, mooring_licence.id})
+        self.assertEqual(regenerate.call_args[1]['workers'], 3)
+
+    def test_status_of_the_run(self):
+        permit = self.create_approval()
+        ApprovalDocumentRegeneration.objects.create(run_name='run', approval=permit, status=ApprovalDocumentRegeneration.STATUS_FAILED)
+        stdout = StringIO()
+
+        with mock.patch.object(bulk_regenerate_approval_documents, 'regenerate_approval_documents') as regenerate:
+            call_command('bulk_regenerate_approval_documents', '--run', 'run', '--status', stdout=stdout)
+
+        regenerate.assert_not_called()
+        self.assertEqual(stdout.getvalue().splitlines(), ['Pending: 0', 'Completed: 0', 'Failed: 1'])
@@ -0,0 +1,52 @@
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from mooringlicensing.components.emails import outbox
+from mooringlicensing.components.emails.models import OutboxEmail
+
+
+class FailingEmailBackend(EmailBackend):
+
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP server unavailable')
+
+
+@override_settings(EMAIL_OUTBOX_RATE_LIMIT=0, EMAIL_OUTBOX_RETRY_DELAY=60, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class EmailOutboxTests(TestCase):
+
+    def queue_email(self, subject='Approval issued'):
+        msg = EmailMultiAlternatives(subject, 'text body', to=['holder@example.com'], cc=['cc@example.com'])
+        msg.attach_alternative('<p>html body</p>', 'text/html')
+        return outbox.enqueue(msg, [('licence.pdf', b'%PDF-1.4', 'application/pdf')])
+
+    def test_queued_emails_are_sent_in_a_batch(self):
+        self.queue_email('First')
+        self.queue_email('Second')
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(outbox.dispatch(), (2, 0))
+
+        self.assertEqual([msg.subject for msg in mail.outbox], ['First', 'Second'])
+        self.assertEqual(mail.outbox[0].attachments, [('licence.pdf', b'%PDF-1.4', 'application/pdf')])
+        self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>html body</p>')
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.STATUS_SENT).exists())
+        # Nothing is sent twice
+        self.assertEqual(outbox.dispatch(), (0, 0))
+
+    def test_failed_emails_are_retried_later(self):
+        outbox_email = self.queue_email()
+
+        self.assertEqual(outbox.dispatch(connection=FailingEmailBackend()), (0, 1))
+        outbox_email.refresh_from_db()
+        self.assertEqual(outbox_email.status, OutboxEmail.STATUS_PENDING)
+        self.assertGreater(outbox_email.next_attempt_at, timezone.now())
+        # Not due yet
+        self.assertEqual(outbox.dispatch(), (0, 0))
+
+        OutboxEmail.objects.filter(id=outbox_email.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.dispatch(connection=FailingEmailBackend()), (0, 1))
+        outbox_email.refresh_from_db()
+        self.assertEqual(outbox_email.status, OutboxEmail.STATUS_FAILED)
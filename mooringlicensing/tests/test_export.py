@@ -0,0 +1,88 @@
+import csv
+import datetime
+import io
+import os
+from unittest import mock
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from mooringlicensing.components.approvals.models import AnnualAdmissionPermit
+from mooringlicensing.components.compliances.models import Compliance
+from mooringlicensing.components.main.utils import csvExportData, excelExportData, formatExportData, streamExportData
+from mooringlicensing.components.proposals.models import AnnualAdmissionApplication
+from mooringlicensing.views import EmailExportsView
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.tmp_directory = str(settings.BASE_DIR) + '/tmp/'
+        os.makedirs(self.tmp_directory, exist_ok=True)
+
+    def rows(self):
+        # A generator, as the export rows are now streamed from the database
+        for i in range(3):
+            yield ['CO{:07d}'.format(i), 'Annual Admission Permit', None]
+
+    def test_csv_is_written_from_a_row_iterator(self):
+        file_name = csvExportData('compliance', ['Lodgement Number', 'Type', 'Holder'], self.rows())
+        self.addCleanup(os.remove, file_name)
+        with open(file_name, newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['Lodgement Number', 'Type', 'Holder'])
+        self.assertEqual(rows[1:], [['CO{:07d}'.format(i), 'Annual Admission Permit', ''] for i in range(3)])
+
+    def test_excel_is_written_from_a_row_iterator(self):
+        file_name = excelExportData('compliance', ['Lodgement Number', 'Type', 'Holder'], self.rows())
+        self.addCleanup(os.remove, file_name)
+        with open(file_name, 'rb') as f:
+            # An xlsx file is a zip archive
+            self.assertEqual(f.read(2), b'PK')
+
+    def test_format_export_data_removes_the_temporary_file(self):
+        before = set(os.listdir(self.tmp_directory))
+        file_name, file_buffer, content_type = formatExportData('compliance', Compliance.objects.none(), 'csv')
+        self.assertEqual(file_name, 'Mooring Licensing - Compliance Report.csv')
+        self.assertEqual(content_type, 'application/csv')
+        self.assertEqual(next(csv.reader(io.StringIO(file_buffer.decode()))), [
+            'Lodgement Number', 'Type', 'Approval Number', 'Holder', 'Holder Email', 'Holder Mobile Number', 'Holder Phone Number', 'Status', 'Due Date',
+        ])
+        self.assertEqual(set(os.listdir(self.tmp_directory)), before)
+
+    def create_compliance(self):
+        proposal = AnnualAdmissionApplication.objects.create()
+        approval = AnnualAdmissionPermit.objects.create(issue_date=timezone.now(), current_proposal=proposal)
+        return Compliance.objects.create(
+            proposal=proposal, approval=approval, due_date=datetime.date.today(), processing_status='due', customer_status='due',
+        )
+
+    def test_stream_csv(self):
+        compliance = self.create_compliance()
+        response = streamExportData('compliance', Compliance.objects.all(), 'csv')
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Mooring Licensing - Compliance Report.csv"')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][0], 'Lodgement Number')
+        self.assertEqual([row[0] for row in rows[1:]], [compliance.lodgement_number])
+
+    def test_stream_excel_removes_the_temporary_file(self):
+        self.create_compliance()
+        before = set(os.listdir(self.tmp_directory))
+        response = streamExportData('compliance', Compliance.objects.all(), 'excel')
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.assertEqual(b''.join(response.streaming_content)[:2], b'PK')
+        self.assertEqual(set(os.listdir(self.tmp_directory)), before)
+
+    @mock.patch('mooringlicensing.views.is_internal', return_value=True)
+    def test_download_from_the_export_view(self, is_internal):
+        compliance = self.create_compliance()
+        request = RequestFactory().post('/email-exports/', {'export_model': 'compliance', 'format': 'csv', 'delivery': 'download', 'filters': '{}'})
+        request.user = mock.Mock(is_authenticated=True, id=1)
+        response = EmailExportsView.as_view()(request)
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row[0] for row in rows[1:]], [compliance.lodgement_number])
@@ -0,0 +1,50 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from mooringlicensing import settings
+from mooringlicensing.components.main.models import ApplicationType, VesselSizeCategory, VesselSizeCategoryGroup
+from mooringlicensing.components.payments_ml import fee_item_lookup
+from mooringlicensing.components.payments_ml.models import FeeConstructor, FeeItem, FeePeriod, FeeSeason
+
+
+@override_settings(FEE_ITEM_LOOKUP_VERSION_CHECK_INTERVAL=60)
+class FeeItemLookupTests(TestCase):
+
+    def setUp(self):
+        application_type, _ = ApplicationType.objects.get_or_create(code=settings.APPLICATION_TYPE_DCV_PERMIT['code'])
+        fee_season = FeeSeason.objects.create(application_type=application_type, name='2025/26')
+        self.fee_period = FeePeriod.objects.create(fee_season=fee_season, name='Period1', start_date=datetime.date(2025, 9, 1))
+        group = VesselSizeCategoryGroup.objects.create(name='Group')
+        VesselSizeCategory.objects.create(vessel_size_category_group=group, name='small', start_size='0.00')
+        self.large = VesselSizeCategory.objects.create(vessel_size_category_group=group, name='large', start_size='10.00', include_start_size=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            # The fee items are created by reconstruct_fees
+            self.fee_constructor = FeeConstructor.objects.create(application_type=application_type, fee_season=fee_season, vessel_size_category_group=group)
+        FeeItem.objects.filter(fee_constructor=self.fee_constructor, vessel_size_category=self.large).update(amount='20.00')
+        fee_item_lookup.invalidate(self.fee_constructor.id)
+
+    def test_lookup_matches_the_database(self):
+        target_date = datetime.date(2025, 10, 1)
+        fee_item = self.fee_constructor.get_fee_item(10.5, target_date=target_date)
+        self.assertEqual(fee_item, FeeItem.objects.get(fee_constructor=self.fee_constructor, vessel_size_category=self.large))
+        self.assertEqual(fee_item.amount, Decimal('20.00'))
+        # The start size of the large category is not included
+        self.assertEqual(self.fee_constructor.get_fee_item(10, target_date=target_date).vessel_size_category.name, 'small')
+
+    def test_lookups_return_new_instances(self):
+        target_date = datetime.date(2025, 10, 1)
+        fee_item = self.fee_constructor.get_fee_item(10.5, target_date=target_date)
+        fee_item.amount = Decimal('0.00')
+        self.assertIsNot(self.fee_constructor.get_fee_item(10.5, target_date=target_date), fee_item)
+        self.assertEqual(self.fee_constructor.get_fee_item(10.5, target_date=target_date).amount, Decimal('20.00'))
+
+    def test_version_is_not_read_for_every_lookup(self):
+        target_date = datetime.date(2025, 10, 1)
+        self.fee_constructor.get_fee_item(10.5, target_date=target_date)
+        with mock.patch.object(fee_item_lookup.cache, 'get_or_set') as get_or_set, self.assertNumQueries(0):
+            for _ in range(10):
+                self.fee_constructor.get_fee_item(10.5, target_date=target_date)
+        get_or_set.assert_not_called()
@@ -0,0 +1,101 @@
+import time
+from unittest import mock
+
+from django.db.models.signals import post_delete, post_save
+from django.test import SimpleTestCase, TestCase, override_settings
+from ledger_api_client.ledger_models import EmailUserRO
+from ledger_api_client.managed_models import SystemGroupPermission
+
+from mooringlicensing import settings
+from mooringlicensing.components.main import group_membership, signals
+from mooringlicensing.components.main.group_membership import GroupMembershipService
+from mooringlicensing.components.proposals.models import MooringLicenceApplication, WaitingListApplication
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class GroupMembershipServiceTests(SimpleTestCase):
+
+    def setUp(self):
+        self.members = {group_name: frozenset() for group_name in set(settings.INTERNAL_GROUPS) | set(settings.CUSTOM_GROUPS)}
+        self.service = GroupMembershipService(ttl=300, version_check_interval=0)
+        for patcher in (
+            mock.patch.object(group_membership, '_load_members', side_effect=lambda: dict(self.members)),
+            mock.patch.object(group_membership, 'group_membership_service', self.service),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def user(self, user_id):
+        return EmailUserRO(id=user_id, is_superuser=False)
+
+    def wait_for_refresh(self, snapshot):
+        # The new snapshot is loaded in a background thread
+        for i in range(100):
+            if self.service._snapshot is not snapshot:
+                return
+            time.sleep(0.02)
+        self.fail('The group membership snapshot has not been refreshed')
+
+    def test_assessor_and_approver_groups(self):
+        self.members[settings.GROUP_ASSESSOR_WAITING_LIST] = frozenset([5])
+        self.members[settings.GROUP_ASSESSOR_MOORING_LICENCE] = frozenset([6])
+        self.members[settings.GROUP_APPROVER_MOORING_LICENCE] = frozenset([7])
+
+        self.assertTrue(WaitingListApplication().is_assessor(self.user(5)))
+        # The assessors of the waiting list applications approve them too
+        self.assertTrue(WaitingListApplication().is_approver(self.user(5)))
+        self.assertFalse(WaitingListApplication().is_assessor(self.user(6)))
+
+        self.assertTrue(MooringLicenceApplication().is_assessor(self.user(6)))
+        self.assertFalse(MooringLicenceApplication().is_approver(self.user(6)))
+        self.assertTrue(MooringLicenceApplication().is_approver(self.user(7)))
+        self.assertFalse(MooringLicenceApplication().is_assessor(self.user(7)))
+        self.assertTrue(self.service.get_snapshot().is_internal(7))
+        self.assertFalse(self.service.get_snapshot().is_internal(8))
+
+    def test_invalidation_reloads_the_snapshot_in_the_background(self):
+        self.members[settings.GROUP_ASSESSOR_WAITING_LIST] = frozenset([5])
+        snapshot = self.service.get_snapshot()
+
+        self.members[settings.GROUP_ASSESSOR_WAITING_LIST] = frozenset()
+        self.service.invalidate()
+        # The previous snapshot keeps answering while the new one is loaded
+        self.assertIs(self.service.get_snapshot(), snapshot)
+        self.wait_for_refresh(snapshot)
+
+        self.assertFalse(WaitingListApplication().is_assessor(self.user(5)))
+        self.assertFalse(self.service.get_snapshot().is_internal(5))
+
+    def test_snapshot_older_than_the_ttl_is_reloaded(self):
+        self.service.ttl = 0
+        snapshot = self.service.get_snapshot()
+        self.members[settings.GROUP_ASSESSOR_WAITING_LIST] = frozenset([5])
+
+        self.service.get_snapshot()
+        self.wait_for_refresh(snapshot)
+        self.assertTrue(self.service._snapshot.is_internal(5))
+
+    def test_failure_to_refresh_keeps_the_previous_snapshot(self):
+        snapshot = self.service.get_snapshot()
+        group_membership._load_members.side_effect = ConnectionError('database is not available')
+        self.service.invalidate()
+
+        with self.assertLogs(group_membership.logger, 'ERROR'):
+            self.service.get_snapshot()
+            for i in range(100):
+                if not self.service._refreshing:
+                    break
+                time.sleep(0.02)
+        self.assertIs(self.service._snapshot, snapshot)
+
+
+class GroupMembershipListenerTests(TestCase):
+
+    def test_membership_changes_invalidate_the_snapshot(self):
+        for signal in (post_save, post_delete):
+            with mock.patch.object(signals.group_membership_service, 'invalidate') as invalidate:
+                with self.captureOnCommitCallbacks(execute=True):
+                    signal.send(sender=SystemGroupPermission, instance=SystemGroupPermission())
+                    # Not before the change has been committed
+                    invalidate.assert_not_called()
+                invalidate.assert_called_once_with()
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from mooringlicensing import ledger_api_utils
+from mooringlicensing.ledger_api_utils import InvoicePropertyService, fill_invoice_property_caches, get_invoice_property_cache_entries
+
+
+class StubLedger(object):
+    """
+    Stands in for ledger_api_client.utils.get_invoice_properties
+    """
+    def __init__(self, payment_statuses, failing=()):
+        self.payment_statuses = payment_statuses
+        self.failing = failing
+        self.calls = []
+
+    def __call__(self, invoice_id):
+        self.calls.append(invoice_id)
+        if invoice_id in self.failing:
+            raise ConnectionError('ledger is not available')
+        return {'data': {'invoice': {
+            'payment_status': self.payment_statuses[invoice_id],
+            'reference': f'0000{invoice_id}',
+            'amount': '10.00',
+            'settlement_date': None,
+        }}}
+
+
+class InvoicePropertyServiceTests(SimpleTestCase):
+
+    def test_failed_invoices_are_returned(self):
+        ledger = StubLedger({1: 'paid', 2: 'unpaid'}, failing=(3,))
+        service = InvoicePropertyService(fetch=ledger, max_workers=2, ttl=60, max_size=10)
+
+        results, errors = service.get_many([1, 2, 3])
+
+        self.assertEqual(set(results), {1, 2})
+        self.assertEqual(list(errors), [3])
+        self.assertIsInstance(errors[3], ConnectionError)
+
+    def test_persisted_entries_are_fetched_from_ledger(self):
+        ledger = StubLedger({1: 'unpaid'}, failing=(2,))
+        service = InvoicePropertyService(fetch=ledger, max_workers=2, ttl=60, max_size=10)
+        invoices = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+
+        with mock.patch.object(ledger_api_utils, 'invoice_property_service', service):
+            get_invoice_property_cache_entries(invoices, use_cache=True)
+            # Paid since it was cached
+            ledger.payment_statuses[1] = 'paid'
+            entries, failed_invoice_ids = get_invoice_property_cache_entries(invoices)
+            self.assertEqual(entries[1]['payment_status'], 'paid')
+            self.assertEqual(failed_invoice_ids, [2])
+            # The shared cache is still used when asked for
+            get_invoice_property_cache_entries(invoices[:1], use_cache=True)
+            self.assertEqual(ledger.calls.count(1), 2)
+
+    def test_page_is_filled_in_memory_through_the_shared_cache(self):
+        ledger = StubLedger({1: 'unpaid', 2: 'paid'})
+        service = InvoicePropertyService(fetch=ledger, max_workers=2, ttl=60, max_size=10)
+
+        def page():
+            return [
+                SimpleNamespace(invoice_property_cache={}, invoice_property_cache_updated_at=None, get_invoices_for_property_cache=lambda: [SimpleNamespace(id=1)]),
+                SimpleNamespace(invoice_property_cache={}, invoice_property_cache_updated_at=None, get_invoices_for_property_cache=lambda: [SimpleNamespace(id=2)]),
+                SimpleNamespace(invoice_property_cache={}, invoice_property_cache_updated_at=None, get_invoices_for_property_cache=lambda: []),
+            ]
+
+        with mock.patch.object(ledger_api_utils, 'invoice_property_service', service):
+            objs = page()
+            # The objects have no _meta, a bulk update would fail
+            self.assertEqual(fill_invoice_property_caches(objs, use_cache=True, save=False), [])
+            self.assertEqual(objs[0].invoice_property_cache[1]['payment_status'], 'unpaid')
+            self.assertEqual(objs[1].invoice_property_cache[2]['payment_status'], 'paid')
+            self.assertTrue(all(obj.invoice_property_cache_loaded for obj in objs))
+            self.assertTrue(all(obj.invoice_property_cache_updated_at is None for obj in objs))
+
+            # The next request for the page is served from the shared cache
+            fill_invoice_property_caches(page(), use_cache=True, save=False)
+            self.assertEqual(sorted(ledger.calls), [1, 2])
@@ -0,0 +1,97 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from mooringlicensing.components.approvals.models import DcvAdmission
+from mooringlicensing.components.payments_ml import invoice_property_sync
+from mooringlicensing.components.payments_ml.models import InvoicePropertySyncRequest
+from mooringlicensing.components.proposals.models import AnnualAdmissionApplication
+
+
+class StubFill(object):
+    """
+    Stands in for fill_invoice_property_caches, recording the objects refreshed
+    """
+    def __init__(self, failing_ids=()):
+        self.failing_ids = failing_ids
+        self.calls = []
+
+    def __call__(self, objs, only_empty=True, use_cache=False):
+        objs = list(objs)
+        self.calls.append([(obj._meta.model_name, obj.id) for obj in objs])
+        return [obj for obj in objs if obj.id in self.failing_ids]
+
+
+class InvoicePropertySyncTests(TestCase):
+
+    def patch_fill(self, fill):
+        patcher = mock.patch.object(invoice_property_sync, 'fill_invoice_property_caches', fill)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return fill
+
+    def requested_ids(self, object_type):
+        return set(InvoicePropertySyncRequest.objects.filter(object_type=object_type).values_list('object_id', flat=True))
+
+    def test_sync_requested_keeps_the_failed_requests(self):
+        dcv_admissions = [DcvAdmission.objects.create() for i in range(3)]
+        for dcv_admission in dcv_admissions:
+            invoice_property_sync.request_sync(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION, [dcv_admission.id])
+        fill = self.patch_fill(StubFill(failing_ids=[dcv_admissions[1].id]))
+
+        # Oldest requests first
+        self.assertEqual(invoice_property_sync.sync_requested(2), 2)
+        self.assertEqual(sorted(id for _, id in fill.calls[0]), [dcv_admissions[0].id, dcv_admissions[1].id])
+        self.assertEqual(self.requested_ids(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION), {dcv_admissions[1].id, dcv_admissions[2].id})
+
+        self.assertEqual(invoice_property_sync.sync_requested(10), 2)
+        self.assertEqual(self.requested_ids(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION), {dcv_admissions[1].id})
+
+    def test_reconcile_shares_the_batch_between_the_object_types(self):
+        proposals = [AnnualAdmissionApplication.objects.create() for i in range(2)]
+        dcv_admissions = [DcvAdmission.objects.create() for i in range(2)]
+        fill = self.patch_fill(StubFill())
+
+        self.assertEqual(invoice_property_sync.reconcile(3, 24), 3)
+        self.assertEqual(fill.calls, [
+            [('proposal', proposals[0].id), ('proposal', proposals[1].id)],
+            [('dcvadmission', dcv_admissions[0].id)],
+        ])
+
+    def test_reconcile_refreshes_the_stale_caches_of_invoices_not_paid(self):
+        stale = timezone.now() - datetime.timedelta(hours=48)
+        recent = timezone.now() - datetime.timedelta(hours=1)
+        DcvAdmission.objects.create(invoice_property_cache={'1': {'payment_status': 'paid'}}, invoice_property_cache_updated_at=stale)
+        unpaid = DcvAdmission.objects.create(
+            invoice_property_cache={'2': {'payment_status': 'paid'}, '3': {'payment_status': 'unpaid'}}, invoice_property_cache_updated_at=stale,
+        )
+        DcvAdmission.objects.create(invoice_property_cache={'4': {'payment_status': 'unpaid'}}, invoice_property_cache_updated_at=recent)
+        DcvAdmission.objects.create(invoice_property_cache={}, invoice_property_cache_updated_at=stale)
+        fill = self.patch_fill(StubFill())
+
+        self.assertEqual(invoice_property_sync.reconcile(10, 24), 1)
+        self.assertEqual(fill.calls, [[('dcvadmission', unpaid.id)]])
+
+    def test_paid_objects_are_refreshed_once_committed(self):
+        dcv_admission = DcvAdmission.objects.create()
+        fill = self.patch_fill(StubFill())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice_property_sync.request_sync(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION, [dcv_admission.id])
+            invoice_property_sync.refresh_on_commit(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION, [dcv_admission.id])
+            self.assertEqual(fill.calls, [])
+
+        self.assertEqual(fill.calls, [[('dcvadmission', dcv_admission.id)]])
+        self.assertEqual(self.requested_ids(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION), set())
+
+    def test_failure_to_refresh_is_left_to_the_sync(self):
+        dcv_admission = DcvAdmission.objects.create()
+        self.patch_fill(StubFill(failing_ids=[dcv_admission.id]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice_property_sync.request_sync(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION, [dcv_admission.id])
+            invoice_property_sync.refresh_on_commit(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION, [dcv_admission.id])
+
+        self.assertEqual(self.requested_ids(InvoicePropertySyncRequest.OBJECT_TYPE_DCV_ADMISSION), {dcv_admission.id})
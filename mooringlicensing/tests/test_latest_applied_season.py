@@ -0,0 +1,56 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from mooringlicensing.components.approvals.models import Approval, AnnualAdmissionPermit
+from mooringlicensing.components.approvals.utils import ApprovalListPageLoader
+from mooringlicensing.components.payments_ml.models import FeeSeason, FeePeriod
+from mooringlicensing.components.proposals.models import Proposal, AnnualAdmissionApplication
+
+
+class LatestAppliedSeasonCacheTests(TestCase):
+
+    def create_season(self, name, start_date):
+        season = FeeSeason.objects.create(name=name)
+        FeePeriod.objects.create(fee_season=season, name='Period1', start_date=start_date)
+        return season
+
+    def test_cache_follows_the_approved_proposals(self):
+        season_1 = self.create_season('2023/24', datetime.date(2023, 9, 1))
+        season_2 = self.create_season('2024/25', datetime.date(2024, 9, 1))
+        approval = AnnualAdmissionPermit.objects.create(issue_date=timezone.now())
+        self.assertIsNotNone(approval.latest_applied_season_cache_updated_at)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AnnualAdmissionApplication.objects.create(approval=approval, fee_season=season_2, processing_status=Proposal.PROCESSING_STATUS_APPROVED)
+            AnnualAdmissionApplication.objects.create(approval=approval, fee_season=season_1, processing_status=Proposal.PROCESSING_STATUS_PRINTING_STICKER)
+            # Not applied yet
+            AnnualAdmissionApplication.objects.create(approval=approval, fee_season=self.create_season('2025/26', datetime.date(2025, 9, 1)), processing_status=Proposal.PROCESSING_STATUS_WITH_ASSESSOR)
+
+        approval.refresh_from_db()
+        self.assertEqual(approval.latest_applied_season, season_2)
+        self.assertEqual(approval.latest_applied_season_cache, season_2)
+
+    def test_page_loader_computes_the_missing_caches_without_saving_them(self):
+        season_1 = self.create_season('2023/24', datetime.date(2023, 9, 1))
+        season_2 = self.create_season('2024/25', datetime.date(2024, 9, 1))
+        approvals = []
+        for season in (season_1, season_2, None):
+            approval = AnnualAdmissionPermit.objects.create(issue_date=timezone.now())
+            if season:
+                with self.captureOnCommitCallbacks(execute=True):
+                    AnnualAdmissionApplication.objects.create(approval=approval, fee_season=season, processing_status=Proposal.PROCESSING_STATUS_APPROVED)
+            approvals.append(approval)
+        # As for the approvals created before the cache columns were added
+        Approval.objects.filter(id__in=[approval.id for approval in approvals]).update(latest_applied_season_cache=None, latest_applied_season_cache_updated_at=None)
+
+        self.assertEqual(Approval.get_latest_applied_season_ids([approval.id for approval in approvals]), {
+            approvals[0].id: season_1.id,
+            approvals[1].id: season_2.id,
+            approvals[2].id: None,
+        })
+        loader = ApprovalListPageLoader(Approval.objects.filter(id__in=[approval.id for approval in approvals]))
+        self.assertEqual([loader.latest_applied_season(approval) for approval in approvals], [season_1, season_2, None])
+        # Left to the update_latest_applied_seasons job
+        self.assertFalse(Approval.objects.filter(id__in=[approval.id for approval in approvals], latest_applied_season_cache_updated_at__isnull=False).exists())
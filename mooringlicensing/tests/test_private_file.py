@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from mooringlicensing.views import get_byte_range, serve_private_file
+
+
+class ByteRangeTests(SimpleTestCase):
+
+    def test_single_range(self):
+        self.assertEqual(get_byte_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(get_byte_range('bytes=900-', 1000), (900, 999))
+        # Clipped to the end of the file
+        self.assertEqual(get_byte_range('bytes=900-2000', 1000), (900, 999))
+
+    def test_suffix_range(self):
+        self.assertEqual(get_byte_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(get_byte_range('bytes=-2000', 1000), (0, 999))
+
+    def test_unsatisfiable_range(self):
+        self.assertIs(get_byte_range('bytes=1000-', 1000), False)
+        self.assertIs(get_byte_range('bytes=10-5', 1000), False)
+        self.assertIs(get_byte_range('bytes=-0', 1000), False)
+        self.assertIs(get_byte_range('bytes=-100', 0), False)
+        self.assertIs(get_byte_range('bytes=0-', 0), False)
+
+    def test_no_usable_range(self):
+        self.assertIsNone(get_byte_range(None, 1000))
+        self.assertIsNone(get_byte_range('bytes=-', 1000))
+        # Multiple ranges are answered with the whole file
+        self.assertIsNone(get_byte_range('bytes=0-1,5-6', 1000))
+
+
+@override_settings(PRIVATE_MEDIA_X_ACCEL_REDIRECT_PREFIX='')
+class ServePrivateFileTests(SimpleTestCase):
+
+    def setUp(self):
+        f = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        f.write(b'0123456789')
+        f.close()
+        self.path = f.name
+        self.addCleanup(os.remove, self.path)
+        self.factory = RequestFactory()
+
+    def test_range_request(self):
+        response = serve_private_file(self.factory.get('/', HTTP_RANGE='bytes=-3'), self.path, 'application/pdf')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+    def test_unsatisfiable_range_request(self):
+        response = serve_private_file(self.factory.get('/', HTTP_RANGE='bytes=20-'), self.path, 'application/pdf')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_none_match(self):
+        etag = serve_private_file(self.factory.get('/'), self.path, 'application/pdf')['ETag']
+        response = serve_private_file(self.factory.get('/', HTTP_IF_NONE_MATCH=etag), self.path, 'application/pdf')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
@@ -0,0 +1,70 @@
+import datetime
+from unittest import mock
+
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, override_settings
+from ledger_api_client.managed_models import SystemUser, SystemUserAddress
+
+from mooringlicensing import helpers
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProfileCompleteTests(TestCase):
+
+    def setUp(self):
+        helpers.cache.clear()
+        self.system_user = SystemUser(
+            ledger_id_id=5, legal_first_name='Jane', legal_last_name='Smith', legal_dob=datetime.date(1980, 1, 1), mobile_number='0400000000',
+        )
+        self.address_types = {address_type for address_type, _ in SystemUserAddress.ADDRESS_TYPE[:2]}
+
+        def _filter_addresses(system_user, address_type):
+            addresses = mock.Mock()
+            addresses.exists.return_value = address_type in self.address_types
+            return addresses
+
+        self.system_users = mock.Mock()
+        self.system_users.filter.return_value.first.side_effect = lambda: self.system_user
+        for patcher in (
+            mock.patch.object(helpers, 'SystemUser', mock.Mock(objects=self.system_users)),
+            mock.patch.object(helpers, 'SystemUserAddress', mock.Mock(ADDRESS_TYPE=SystemUserAddress.ADDRESS_TYPE, **{'objects.filter.side_effect': _filter_addresses})),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_complete_profile_is_cached(self):
+        self.assertTrue(helpers.get_profile_complete(5))
+        self.assertTrue(helpers.get_profile_complete(5))
+        self.assertEqual(self.system_users.filter.call_count, 1)
+
+    def test_incomplete_profile_is_not_cached(self):
+        self.system_user.mobile_number = ''
+        self.assertFalse(helpers.get_profile_complete(5))
+
+        # Completed on the first time page
+        self.system_user.mobile_number = '0400000000'
+        self.assertTrue(helpers.get_profile_complete(5))
+        self.assertEqual(self.system_users.filter.call_count, 2)
+
+    def test_profile_without_the_postal_address_is_incomplete(self):
+        self.address_types.discard(SystemUserAddress.ADDRESS_TYPE[1][0])
+        self.assertFalse(helpers.get_profile_complete(5))
+
+    def test_saving_the_system_user_or_an_address_invalidates_the_cached_profile(self):
+        address = SystemUserAddress(system_user=self.system_user, address_type=SystemUserAddress.ADDRESS_TYPE[0][0])
+        for sender, instance in ((SystemUser, self.system_user), (SystemUserAddress, address)):
+            for signal in (post_save, post_delete):
+                self.assertTrue(helpers.get_profile_complete(5))
+                self.address_types.clear()
+                self.assertTrue(helpers.get_profile_complete(5))
+
+                signal.send(sender=sender, instance=instance)
+                self.assertFalse(helpers.get_profile_complete(5))
+                self.address_types.update(address_type for address_type, _ in SystemUserAddress.ADDRESS_TYPE[:2])
+
+    def test_saving_another_system_user_keeps_the_cached_profile(self):
+        self.assertTrue(helpers.get_profile_complete(5))
+        post_save.send(sender=SystemUser, instance=SystemUser(ledger_id_id=6))
+
+        self.address_types.clear()
+        self.assertTrue(helpers.get_profile_complete(5))
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.sync import async_to_sync
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from mooringlicensing import queue_middleware
+from mooringlicensing.queue_client import QueueBackendClient
+
+
+class StubQueueHandler(BaseHTTPRequestHandler):
+    """
+    Answers /api/check-create-session/ with server.queue_status after server.delay seconds
+    """
+
+    def do_GET(self):
+        self.server.requests.append(parse_qs(urlparse(self.path).query))
+        time.sleep(self.server.delay)
+        body = json.dumps({
+            'status': self.server.queue_status,
+            'session_key': 'stub-session-key',
+            'queue_waiting_room_url': 'http://queue.example/waiting-room',
+        }).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client has given up waiting
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubQueueServerMixin(object):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubQueueHandler)
+        self.server.requests = []
+        self.server.delay = 0
+        self.server.queue_status = 'Active'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = QueueBackendClient(
+            'http://127.0.0.1:{}'.format(self.server.server_port), 'stub group', timeout=0.5, max_failures=2, reset_timeout=60,
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class QueueBackendClientTests(StubQueueServerMixin, SimpleTestCase):
+
+    def test_returns_the_queue_status(self):
+        self.server.queue_status = 'Waiting'
+        queue_json = self.client.check_create_session()
+        self.assertEqual(queue_json['status'], 'Waiting')
+        self.assertEqual(self.server.requests[0]['queue_group'], ['stub group'])
+
+    def test_slow_backend_lets_visitors_through_and_opens_the_circuit(self):
+        self.server.delay = 1
+        self.assertIsNone(self.client.check_create_session())
+        self.assertIsNone(self.client.check_create_session())
+        self.assertTrue(self.client.circuit_breaker.is_open())
+
+        # Once open, the backend is not called any more
+        number_of_requests = len(self.server.requests)
+        started = time.monotonic()
+        self.assertIsNone(self.client.check_create_session())
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(len(self.server.requests), number_of_requests)
+
+    def test_circuit_closes_after_the_reset_timeout(self):
+        self.client.circuit_breaker.reset_timeout = 0
+        self.server.delay = 1
+        self.client.check_create_session()
+        self.client.check_create_session()
+        self.server.delay = 0
+        self.assertEqual(self.client.check_create_session()['status'], 'Active')
+        self.assertFalse(self.client.circuit_breaker.is_open())
+
+
+@override_settings(WAITING_QUEUE_ENABLED=True, QUEUE_ACTIVE_HOSTS='ml.example', QUEUE_WAITING_URL='http://queue.example')
+class AsyncQueueControlTests(StubQueueServerMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.threads = {}
+        self.client_patcher = mock.patch.object(queue_middleware, 'get_queue_backend_client', return_value=self.client)
+        self.client_patcher.start()
+        check_create_session = self.client.check_create_session
+
+        def record_check_create_session(*args, **kwargs):
+            self.threads['check_create_session'] = threading.get_ident()
+            return check_create_session(*args, **kwargs)
+        self.client.check_create_session = record_check_create_session
+
+        async def get_response(request):
+            return HttpResponse('page')
+        self.middleware = queue_middleware.QueueControl(get_response)
+
+    def tearDown(self):
+        self.client_patcher.stop()
+        super().tearDown()
+
+    def is_internal(self, request):
+        self.threads['is_internal'] = threading.get_ident()
+        return False
+
+    def test_only_the_queue_backend_call_leaves_the_orm_thread(self):
+        self.server.queue_status = 'Waiting'
+        request = RequestFactory().get('/', HTTP_HOST='ml.example')
+
+        with mock.patch.object(queue_middleware, 'is_internal', side_effect=self.is_internal):
+            response = async_to_sync(self.middleware)(request)
+
+        self.assertIn(b'http://queue.example/waiting-room', response.content)
+        # Thread sensitive code runs in the thread calling async_to_sync
+        self.assertEqual(self.threads['is_internal'], threading.get_ident())
+        self.assertNotEqual(self.threads['check_create_session'], threading.get_ident())
+
+    def test_visitors_let_in_already_are_not_checked(self):
+        request = RequestFactory().get('/', HTTP_HOST='ml.example')
+        request.COOKIES['sitequeuesession'] = 'stub-session-key'
+
+        with mock.patch.object(queue_middleware, 'is_internal', side_effect=self.is_internal):
+            response = async_to_sync(self.middleware)(request)
+
+        self.assertEqual(response.content, b'page')
+        self.assertEqual(self.threads, {})
+        self.assertEqual(self.server.requests, [])
@@ -0,0 +1,284 @@
+import re
+from copy import deepcopy
+
+from django.test import SimpleTestCase
+from rest_framework import serializers
+
+from mooringlicensing.components.approvals.models import Sticker
+from mooringlicensing.components.main.sanitiser import (
+        remove_html_tags,
+        remove_script_tags,
+        sanitise_dict,
+        sanitise_instance,
+        )
+
+
+# The implementation the sanitiser replaced (main/utils.py), kept as is to compare the results against
+
+def previous_remove_html_tags(text):
+
+    if text is None:
+        return None
+
+    HTML_TAGS_WRAPPED = re.compile(r'<[^>]+>.+</[^>]+>')
+    HTML_TAGS_NO_WRAPPED = re.compile(r'<[^>]+>')
+
+    text = HTML_TAGS_WRAPPED.sub('', text)
+    text = HTML_TAGS_NO_WRAPPED.sub('', text)
+    return text
+
+def previous_remove_script_tags(text):
+
+    if text is None:
+        return None
+
+    SCRIPT_TAGS_WRAPPED = re.compile(r'(?i)<script[^>]+>.+</script[^>]+>')
+    SCRIPT_TAGS_NO_WRAPPED = re.compile(r'(?i)<script[^>]+>')
+
+    text = SCRIPT_TAGS_WRAPPED.sub('', text)
+    text = SCRIPT_TAGS_NO_WRAPPED.sub('', text)
+
+    ATTR_BLACKLIST = ['onresize','onvolumechange','onsuspend','onpopstate','onbeforeunload','oncontextmenu',
+        'ondragstart','oncuechange','onselect','onafterprint','onmouseover','ondragleave','onstorage',
+        'onbeforeprint','onhashchange','onabort','ondragover','onwaiting','onclick','onmousemove','onkeyup',
+        'onmousedown','ononline','onsearch','onprogress','onfocus','onmouseup','onplaying','onstalled','oninvalid',
+        'ontimeupdate','onkeypress','onseeked','onreset','onwheel','onemptied','oninput','onpagehide','onpause',
+        'onloadeddata','onseeking','onunload','onpageshow','onerror','ondrop','oncanplay','oncopy','onended','oncut',
+        'onsubmit','ondrag','onblur','ondragend','onplay','onratechange','onloadedmetadata','oncanplaythrough',
+        'ondurationchange','onchange','ondblclick','onmousewheel','onpaste','onload','onscroll','onkeydown',
+        'ontoggle','onmouseout','onoffline','onloadstart','ondragenter']
+    ATTR_BLACKLIST_STR=('|').join(ATTR_BLACKLIST)
+
+    HTML_TAGS_WITH_ATTR_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>.+</[^>]+>')
+    HTML_TAGS_WITH_ATTR_NO_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>')
+
+    text = HTML_TAGS_WITH_ATTR_WRAPPED.sub('', text)
+    text = HTML_TAGS_WITH_ATTR_NO_WRAPPED.sub('', text)
+
+    return text
+
+def previous_sanitise_fields(instance, exclude=[], error_on_change=[]):
+    if hasattr(instance,"__dict__"):
+        for i in instance.__dict__:
+            #remove html tags for all string fields not in the exclude list
+            if not i in exclude and (isinstance(instance.__dict__[i], dict)):
+                instance.__dict__[i] = previous_sanitise_fields(instance.__dict__[i])
+            
+            elif isinstance(instance.__dict__[i], list) and not i in exclude:
+                for j in range(0, len(instance.__dict__[i])):
+                    check = instance.__dict__[i][j]
+                    if isinstance(instance.__dict__[i][j],str):
+                        instance.__dict__[i][j] = previous_remove_html_tags(instance.__dict__[i][j])
+                    elif isinstance(instance.__dict__[i][j], list) or isinstance(instance.__dict__[i][j], dict):
+                        instance.__dict__[i][j] = previous_sanitise_fields(instance.__dict__[i][j])
+                    if i in error_on_change and check != instance.__dict__[i][j]:
+                        raise serializers.ValidationError("html tags included in field")
+            
+            elif isinstance(instance.__dict__[i], str) and not i in exclude:
+                check = instance.__dict__[i]
+                setattr(instance, i, previous_remove_html_tags(instance.__dict__[i]))
+                if i in error_on_change and check != instance.__dict__[i]:
+                    #only fields that cannot be allowed to change through sanitisation just before saving will throw an error
+                    raise serializers.ValidationError("html tags included in field")
+            elif isinstance(instance.__dict__[i], str) and i in exclude:
+                #even though excluded, we still check to remove script tags
+                setattr(instance, i, previous_remove_script_tags(instance.__dict__[i]))
+                if i in error_on_change and check != instance.__dict__[i]:
+                    #only fields that cannot be allowed to change through sanitisation just before saving will throw an error
+                    raise serializers.ValidationError("script tags included in field")
+            elif (isinstance(instance.__dict__[i], list) or isinstance(instance.__dict__[i], dict)) and i in exclude:
+                #if we have reached this point, it means we have a json object with fields that are allowed to contain tags
+                #we'll use . notation to identify sub fields that should be carried over to the exclude and error on change lists
+                #NOTE: to allow sub fields to be sanitised, the parent field should be included in both lists required for their respective children
+                sub_exclude_list = list(filter(lambda e:e.startswith(i+"."), exclude))
+                exclude_list = list(map(lambda e:e.replace(i+".","",1), sub_exclude_list))
+                #NOTE: a sub error on change list will require the parent field to be in the exclude list, to reach this point (but not necessarily in the error_on_change list)
+                sub_error_on_change_list = list(filter(lambda e:e.startswith(i+"."), error_on_change))
+                error_on_change_list = list(map(lambda e:e.replace(i+".","",1), sub_error_on_change_list))
+
+                if isinstance(instance.__dict__[i], dict):
+                    check = instance.__dict__[i]
+                    instance.__dict__[i] = previous_sanitise_fields(instance.__dict__[i], exclude=exclude_list, error_on_change=error_on_change_list)
+                    if i in error_on_change and check != instance.__dict__[i]:
+                        raise serializers.ValidationError("html tags included in field")
+                elif isinstance(instance.__dict__[i], list):
+                    for j in range(0, len(instance.__dict__[i])):
+                        check = instance.__dict__[i][j]
+                        if isinstance(instance.__dict__[i][j],str):
+                            #strings in an excluded list will be treated as excluded
+                            instance.__dict__[i][j] = previous_remove_script_tags(instance.__dict__[i][j])
+                        elif isinstance(instance.__dict__[i][j], list) or isinstance(instance.__dict__[i][j], dict):
+                            instance.__dict__[i][j] = previous_sanitise_fields(instance.__dict__[i][j], exclude=exclude_list, error_on_change=error_on_change_list)
+                        if i in error_on_change and check != instance.__dict__[i][j]:
+                            raise serializers.ValidationError("html tags included in field")
+    else:
+        remove_keys = []
+        for i in instance:
+            #for dicts we also check the keys - they are removed completely if not sanitary (should not change keys)
+            original_key = i
+            if isinstance(original_key, str):
+                sanitised_key = previous_remove_html_tags(i)
+                if original_key != sanitised_key:
+                    remove_keys.append(original_key)
+                    continue
+
+            #remove html tags for all string fields not in the exclude list
+            if not i in exclude and (isinstance(instance[i], dict)):
+                instance[i] = previous_sanitise_fields(instance[i])
+
+            elif isinstance(instance[i], list) and not i in exclude:
+                for j in range(0, len(instance[i])):
+                    check = instance[i][j]
+                    if isinstance(instance[i][j],str):
+                        instance[i][j] = previous_remove_html_tags(instance[i][j])
+                    elif isinstance(instance[i][j], list) or isinstance(instance[i][j], dict):
+                        instance[i][j] = previous_sanitise_fields(instance[i][j])
+                    if i in error_on_change and check != instance[i][j]:
+                        raise serializers.ValidationError("html tags included in field")
+
+            else:
+                if isinstance(instance[i], str) and not i in exclude:
+                    check = instance[i]
+                    instance[i] = previous_remove_html_tags(instance[i])
+                    if i in error_on_change and check != instance[i]:
+                        #only fields that cannot be allowed to change through sanitisation just before saving will throw an error
+                        raise serializers.ValidationError("html tags included in field")
+                elif isinstance(instance[i], str) and i in exclude:
+                    #even though excluded, we still check to remove script tags
+                    instance[i] = previous_remove_script_tags(instance[i])
+                    if i in error_on_change and check != instance[i]:
+                        #only fields that cannot be allowed to change through sanitisation just before saving will throw an error
+                        raise serializers.ValidationError("script tags included in field")
+                elif (isinstance(instance[i], list) or isinstance(instance[i], dict)) and i in exclude:
+                    #if we have reached this point, it means we have a json object with fields that are allowed to contain tags
+                    #we'll use . notation to identify sub fields that should be carried over to the exclude and error on change lists
+                    #NOTE: to allow sub fields to be sanitised, the parent field should be included in both lists required for their respective children
+                    sub_exclude_list = list(filter(lambda e:e.startswith(i+"."), exclude))
+                    exclude_list = list(map(lambda e:e.replace(i+".","",1), sub_exclude_list))
+                    #NOTE: a sub error on change list will require the parent field to be in the exclude list, to reach this point (but not necessarily in the error_on_change list)
+                    sub_error_on_change_list = list(filter(lambda e:e.startswith(i+"."), error_on_change))
+                    error_on_change_list = list(map(lambda e:e.replace(i+".","",1), sub_error_on_change_list))
+
+                    if isinstance(instance[i], dict):
+                        check = instance[i]
+                        instance[i] = previous_sanitise_fields(instance[i], exclude=exclude_list, error_on_change=error_on_change_list)
+                        if i in error_on_change and check != instance[i]:
+                            raise serializers.ValidationError("script tags included in field")
+                    elif isinstance(instance[i], list):                        
+                        for j in range(0, len(instance[i])):
+                            check = instance[i][j]
+                            if isinstance(instance[i][j],str):
+                                #strings in an excluded list will be treated as excluded
+                                instance[i][j] = previous_remove_script_tags(instance[i][j])
+                            elif isinstance(instance[i][j], list) or isinstance(instance[i][j], dict):
+                                instance[i][j] = previous_sanitise_fields(instance[i][j], exclude=exclude_list, error_on_change=error_on_change_list)
+                            if i in error_on_change and check != instance[i][j]:
+                                raise serializers.ValidationError("script tags included in field")
+                    
+        for i in remove_keys:
+            del instance[i]
+    return instance
+
+
+FIXTURE_STRINGS = [
+    '',
+    'plain text',
+    'a < b and c > d',
+    'unclosed <tag',
+    '<b>bold</b>',
+    'before <i>italic</i> after',
+    '<p>one</p><p>two</p>',
+    '<br/>line<br/>',
+    '<script src="x.js">alert(1)</script>',
+    '<SCRIPT type="text/javascript">',
+    '<img src="x" onerror="alert(1)">',
+    '<a href="#" onclick ="steal()">link</a> tail',
+    '<div OnMouseOver=x>hover</div>',
+]
+
+FIXTURE_DICT = {
+    'name': '<b>Name</b>',
+    'note': 'kept <i>note</i>',
+    'count': 3,
+    'flag': True,
+    'empty': None,
+    'list': ['<p>a</p>', 'b', {'d': '<b>d</b>', 'e': ['<i>e</i>']}, 5],
+    'nested': {'x': '<script src=y>z</script>', 'list': ['<b>e</b>']},
+    '<b>bad</b>': 'removed',
+    'ok<key': 'value <u>u</u>',
+    'html': '<a href="#" onclick="x()">link</a><b>bold</b>',
+    'allowed': {
+        'body': '<p onload="x">p</p><b>keep</b>',
+        'sub': {'inner': '<b>i</b>', 'script': '<script src=1>2</script>'},
+        'items': ['<script src=1>2</script>', '<i>i</i>'],
+    },
+    'allowed_list': ['<b>keep</b>', '<img src=x onerror=y>', {'k': '<b>v</b>', 'l': ['<i>l</i>']}],
+}
+
+EXCLUDE_CASES = [
+    [],
+    ['html', 'allowed', 'allowed_list'],
+    ['allowed', 'allowed.body', 'allowed.sub', 'allowed.sub.inner'],
+    ['note', 'allowed', 'allowed.items', 'allowed_list', 'allowed_list.k'],
+]
+
+
+class SanitiserTests(SimpleTestCase):
+    """
+    The sanitiser must produce exactly the same output as the implementation it replaced
+    """
+
+    def create_sticker(self):
+        return Sticker(
+            number='<b>0000001</b>',
+            postal_address_line1='<i>1</i> Example Street',
+            postal_address_locality='Perth <script src="x">y</script>',
+            invoice_property_cache={
+                'INV<b>1</b>': {'reference': 'INV1'},
+                'INV2': {'reference': '<b>INV2</b>', 'payment_status': 'paid', 'amount': '10.00'},
+            },
+            batch_property_cache={'items': ['<i>a</i>', 'b'], 'note': '<a onclick="x">n</a>'},
+        )
+
+    def field_values(self, instance):
+        return {field.attname: getattr(instance, field.attname) for field in type(instance)._meta.concrete_fields}
+
+    def test_remove_tags_match_previous(self):
+        for text in FIXTURE_STRINGS + [None]:
+            with self.subTest(text=text):
+                self.assertEqual(remove_html_tags(text), previous_remove_html_tags(text))
+                self.assertEqual(remove_script_tags(text), previous_remove_script_tags(text))
+
+    def test_sanitise_dict_matches_previous(self):
+        for exclude in EXCLUDE_CASES:
+            with self.subTest(exclude=exclude):
+                self.assertEqual(
+                    sanitise_dict(deepcopy(FIXTURE_DICT), exclude),
+                    previous_sanitise_fields(deepcopy(FIXTURE_DICT), exclude),
+                )
+
+    def test_sanitise_instance_matches_previous(self):
+        for exclude in [[], ['postal_address_locality', 'batch_property_cache']]:
+            with self.subTest(exclude=exclude):
+                sticker = sanitise_instance(self.create_sticker(), exclude)
+                previous_sticker = previous_sanitise_fields(self.create_sticker(), exclude)
+                self.assertEqual(self.field_values(sticker), self.field_values(previous_sticker))
+
+                # Saved again with markup added to a json field which was clean since the last save
+                for instance in [sticker, previous_sticker]:
+                    instance.invoice_property_cache['INV3'] = {'reference': '<b>INV3</b>'}
+                sanitise_instance(sticker, exclude)
+                previous_sanitise_fields(previous_sticker, exclude)
+                self.assertEqual(self.field_values(sticker), self.field_values(previous_sticker))
+                self.assertEqual(sticker.invoice_property_cache['INV3'], {'reference': 'INV3'})
+
+    def test_error_on_change_matches_previous(self):
+        clean = {'name': 'Name', 'list': ['a', 'b']}
+        self.assertEqual(sanitise_dict(deepcopy(clean), [], ['name', 'list']), previous_sanitise_fields(deepcopy(clean), [], ['name', 'list']))
+
+        for data, error_on_change in [({'name': '<b>Name</b>'}, ['name']), ({'list': ['a', '<b>b</b>']}, ['list'])]:
+            with self.subTest(data=data):
+                with self.assertRaises(serializers.ValidationError):
+                    previous_sanitise_fields(deepcopy(data), [], error_on_change)
+                with self.assertRaises(serializers.ValidationError):
+                    sanitise_dict(deepcopy(data), [], error_on_change)
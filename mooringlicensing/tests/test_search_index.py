@@ -0,0 +1,45 @@
+from django.core.management import call_command
+from django.test import TestCase
+
+from mooringlicensing.components.main import search
+from mooringlicensing.components.main.models import SearchDocument, SearchIndexBuild
+from mooringlicensing.components.main.signals import _SearchIndexBatch
+from mooringlicensing.components.proposals.models import ProposalApplicant, WaitingListApplication
+
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.proposal = WaitingListApplication.objects.create()
+            ProposalApplicant.objects.create(proposal=self.proposal, first_name='Jane', last_name='Citizen', email='jane@example.com')
+
+    def test_search_falls_back_to_the_orm_until_the_index_is_built(self):
+        # The saved proposal has a document, but the ones which have not been saved since the migration have none
+        self.assertTrue(SearchDocument.objects.filter(object_type=SearchDocument.OBJECT_TYPE_PROPOSAL, object_id=self.proposal.id).exists())
+        other_proposal = WaitingListApplication.objects.create()
+        ProposalApplicant.objects.create(proposal=other_proposal, first_name='John', last_name='Citizen', email='john@example.com')
+
+        self.assertEqual(sorted(search.search(SearchDocument.OBJECT_TYPE_PROPOSAL, 'Citizen')), sorted([self.proposal.id, other_proposal.id]))
+
+    def test_search_uses_the_index_once_built(self):
+        call_command('rebuild_search_index')
+        self.assertTrue(SearchIndexBuild.objects.filter(object_type=SearchDocument.OBJECT_TYPE_PROPOSAL).exists())
+        self.assertTrue(SearchDocument.objects.filter(object_type=SearchDocument.OBJECT_TYPE_PROPOSAL, object_id=self.proposal.id).exists())
+        self.assertEqual(list(search.search(SearchDocument.OBJECT_TYPE_PROPOSAL, 'Jane Cit')), [self.proposal.id])
+        self.assertEqual(list(search.search(SearchDocument.OBJECT_TYPE_PROPOSAL, 'nobody')), [])
+
+    def test_saves_of_a_transaction_are_indexed_once(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for i in range(3):
+                self.proposal.save()
+            self.proposal.proposal_applicant.save()
+
+        self.assertEqual(len([callback for callback in callbacks if isinstance(callback, _SearchIndexBatch)]), 1)
+        document = SearchDocument.objects.get(object_type=SearchDocument.OBJECT_TYPE_PROPOSAL, object_id=self.proposal.id)
+        self.assertIn('jane citizen', document.search_text)
+
+        # The next transaction gets a batch of its own
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.proposal.save()
+        self.assertEqual(len([callback for callback in callbacks if isinstance(callback, _SearchIndexBatch)]), 1)
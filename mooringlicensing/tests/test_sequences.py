@@ -0,0 +1,65 @@
+import importlib
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from mooringlicensing.components.approvals.models import AnnualAdmissionPermit, DcvAdmission, Sticker
+from mooringlicensing.components.main.sequences import (
+    SEQUENCE_DCV_ADMISSION_LODGEMENT_NUMBER, SEQUENCE_STICKER_NUMBER, get_max_number, next_value, reserve_values, seed_sequence,
+)
+
+number_sequences_migration = importlib.import_module('mooringlicensing.migrations.0410_number_sequences')
+
+
+class SequenceTests(TestCase):
+    """
+    The sequences are not rolled back with the test transactions, so only the numbers relative to the first one are checked
+    """
+
+    def create_sticker(self, number):
+        approval = AnnualAdmissionPermit.objects.create(issue_date=timezone.now())
+        return Sticker.objects.create(approval=approval, number=number, status=Sticker.STICKER_STATUS_CURRENT)
+
+    def test_reserved_values_are_consecutive_and_unique(self):
+        values = reserve_values(SEQUENCE_STICKER_NUMBER, 5)
+        self.assertEqual(values, list(range(values[0], values[0] + 5)))
+        self.assertEqual(next_value(SEQUENCE_STICKER_NUMBER), values[-1] + 1)
+
+        more_values = reserve_values(SEQUENCE_STICKER_NUMBER, 3)
+        self.assertFalse(set(values) & set(more_values))
+        self.assertEqual(reserve_values(SEQUENCE_STICKER_NUMBER, 0), [])
+
+    def test_sticker_numbers_are_reserved_in_the_sticker_number_format(self):
+        numbers = Sticker.reserve_numbers(3)
+        first = int(numbers[0])
+        self.assertEqual(numbers, ['{0:07d}'.format(first + i) for i in range(3)])
+
+    def test_seeding_goes_past_the_numbers_in_use(self):
+        number = next_value(SEQUENCE_STICKER_NUMBER) + 1000
+        self.create_sticker('{0:07d}'.format(number))
+        # Not a number allocated from the sequence
+        self.create_sticker('ABC')
+
+        self.assertEqual(get_max_number(SEQUENCE_STICKER_NUMBER), number)
+        self.assertEqual(seed_sequence(SEQUENCE_STICKER_NUMBER), number + 1)
+        self.assertEqual(next_value(SEQUENCE_STICKER_NUMBER), number + 1)
+
+        # Never moved backwards
+        self.assertEqual(seed_sequence(SEQUENCE_STICKER_NUMBER), number + 2)
+        self.assertEqual(next_value(SEQUENCE_STICKER_NUMBER), number + 2)
+
+    def test_seeding_ignores_the_prefix_of_the_lodgement_numbers(self):
+        number = next_value(SEQUENCE_DCV_ADMISSION_LODGEMENT_NUMBER) + 1000
+        DcvAdmission.objects.create(lodgement_number='{}{:06d}'.format(DcvAdmission.LODGEMENT_NUMBER_PREFIX, number))
+
+        self.assertEqual(seed_sequence(SEQUENCE_DCV_ADMISSION_LODGEMENT_NUMBER), number + 1)
+
+    def test_migration_seeds_the_sequences_past_the_numbers_in_use(self):
+        number = next_value(SEQUENCE_STICKER_NUMBER) + 1000
+        self.create_sticker('{0:07d}'.format(number))
+
+        number_sequences_migration.create_sequences(None, SimpleNamespace(connection=connection))
+
+        self.assertEqual(next_value(SEQUENCE_STICKER_NUMBER), number + 1)
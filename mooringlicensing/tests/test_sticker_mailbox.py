@@ -0,0 +1,141 @@
+import base64
+from email.message import EmailMessage
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from mooringlicensing.components.approvals.sticker_mailbox import (
+    ImapMailboxClient, LocalMailboxClient, MessagePart, get_checkpoint, import_new_messages, parse_bodystructure,
+    parse_fetch_response,
+)
+from mooringlicensing.components.proposals.models import StickerPrintingResponse, StickerPrintingResponseEmail
+
+
+def make_message(message_id, attachments=()):
+    message = EmailMessage()
+    message['Message-ID'] = message_id
+    message['Subject'] = f'Printing response {message_id}'
+    message['From'] = 'printer@example.com'
+    message['Date'] = 'Mon, 06 Oct 2025 10:00:00 +0800'
+    message.set_content('Please find attached')
+    for filename, content in attachments:
+        message.add_attachment(content, maintype='application', subtype='octet-stream', filename=filename)
+    return message
+
+
+class BodyStructureTests(SimpleTestCase):
+
+    def test_attachment_parts(self):
+        data = [(
+            b'1 (UID 7 BODYSTRUCTURE (("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 12 1 NIL NIL NIL NIL)'
+            b'("APPLICATION" "OCTET-STREAM" ("NAME" "response.csv") NIL NIL "BASE64" 100 NIL ("ATTACHMENT" ("FILENAME" {13}',
+            b'response.xlsx',
+        ), b')) NIL NIL) "MIXED" ("BOUNDARY" "x") NIL NIL NIL))']
+        parts = parse_bodystructure(parse_fetch_response(data)['BODYSTRUCTURE'])
+        self.assertEqual([(part.number, part.content_type, part.filename, part.encoding) for part in parts], [
+            ('1', 'text/plain', None, '7bit'),
+            ('2', 'application/octet-stream', 'response.xlsx', 'base64'),
+        ])
+
+
+class StubImapConnection(object):
+    """
+    Answers like an imaplib.IMAP4_SSL logged in already, from canned responses: {(command, args): (typ, data)}
+    """
+
+    def __init__(self, uid_responses, uid_validity=5):
+        self.uid_responses = uid_responses
+        self.uid_validity = uid_validity
+        self.commands = []
+
+    def select(self, mailbox):
+        self.commands.append(('SELECT', mailbox))
+        return 'OK', [b'2']
+
+    def response(self, code):
+        return code, [str(self.uid_validity).encode()]
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        return self.uid_responses[(command,) + args]
+
+
+class ImapMailboxClientTests(SimpleTestCase):
+
+    def test_select_returns_the_uid_validity(self):
+        connection = StubImapConnection({}, uid_validity=42)
+        self.assertEqual(ImapMailboxClient(connection, 'Stickers').select(), 42)
+        self.assertEqual(connection.commands, [('SELECT', 'Stickers')])
+
+    def test_uids_after(self):
+        connection = StubImapConnection({
+            ('SEARCH', None, 'UID 8:*'): ('OK', [b'8 12 9']),
+            # '8:*' matches the last message even when its UID is lower
+            ('SEARCH', None, 'UID 13:*'): ('OK', [b'12']),
+        })
+        client = ImapMailboxClient(connection)
+        self.assertEqual(client.uids_after(7), [8, 9, 12])
+        self.assertEqual(client.uids_after(12), [])
+
+    def test_fetch_part_downloads_and_decodes_only_the_part(self):
+        content = base64.b64encode(b'Sticker Number\n1\n')
+        connection = StubImapConnection({
+            ('FETCH', '8', '(BODY.PEEK[2])'): ('OK', [(b'1 (UID 8 BODY[2] {%d}' % len(content), content), b')']),
+        })
+        part = MessagePart('2', 'application/octet-stream', 'response.csv', 'base64', None)
+        self.assertEqual(ImapMailboxClient(connection).fetch_part(8, part), b'Sticker Number\n1\n')
+
+    def test_failed_command_raises(self):
+        connection = StubImapConnection({('FETCH', '8', '(BODY.PEEK[1])'): ('NO', [b'Message gone'])})
+        part = MessagePart('1', 'text/plain', None, '7bit', 'utf-8')
+        with self.assertRaises(Exception):
+            ImapMailboxClient(connection).fetch_part(8, part)
+
+
+class ImportNewMessagesTests(TestCase):
+
+    def setUp(self):
+        self.checkpoint = get_checkpoint('imap.example.com', 'stickers', 'INBOX')
+
+    def test_only_new_messages_and_response_files_are_fetched(self):
+        client = LocalMailboxClient([
+            make_message('<1@example.com>', [('response.csv', b'Sticker Number\n1\n'), ('logo.png', b'png')]),
+        ])
+        imported, errors = import_new_messages(client, self.checkpoint)
+        self.assertEqual(len(imported), 1)
+        self.assertEqual(errors, [])
+        self.assertEqual(client.archived, [1])
+        # The body and the csv, never the png
+        self.assertEqual(client.fetched_parts, [(1, '1'), (1, '2')])
+        self.assertEqual(StickerPrintingResponse.objects.filter(sticker_printing_response_email=imported[0]).count(), 1)
+        self.assertEqual(self.checkpoint.last_uid, 1)
+
+        client.add_message(make_message('<2@example.com>'))
+        imported, errors = import_new_messages(client, self.checkpoint)
+        self.assertEqual([email.email_message_id for email in imported], ['<2@example.com>'])
+        self.assertEqual(self.checkpoint.last_uid, 2)
+
+    def test_uid_validity_change_rereads_the_mailbox_without_duplicates(self):
+        client = LocalMailboxClient([make_message('<1@example.com>')])
+        import_new_messages(client, self.checkpoint)
+
+        client = LocalMailboxClient([make_message('<1@example.com>'), make_message('<3@example.com>')], uid_validity=2)
+        imported, errors = import_new_messages(client, self.checkpoint)
+        self.assertEqual([email.email_message_id for email in imported], ['<3@example.com>'])
+        self.assertEqual(StickerPrintingResponseEmail.objects.filter(email_message_id='<1@example.com>').count(), 1)
+        self.assertEqual((self.checkpoint.uid_validity, self.checkpoint.last_uid), (2, 2))
+
+    def test_failed_message_is_tried_again(self):
+        client = LocalMailboxClient([make_message('<1@example.com>'), make_message('<2@example.com>')])
+        fetch_structure = client.fetch_structure
+        with mock.patch.object(client, 'fetch_structure', side_effect=[Exception('database is locked'), fetch_structure(2)]):
+            imported, errors = import_new_messages(client, self.checkpoint)
+        self.assertEqual([email.email_message_id for email in imported], ['<2@example.com>'])
+        self.assertEqual(errors, ['Error importing the message: UID 1'])
+        self.assertEqual(self.checkpoint.last_uid, 0)
+
+        imported, errors = import_new_messages(client, self.checkpoint)
+        self.assertEqual([email.email_message_id for email in imported], ['<1@example.com>'])
+        self.assertEqual(errors, [])
+        self.assertEqual(client.archived, [2, 1])
+        self.assertEqual(self.checkpoint.last_uid, 1)
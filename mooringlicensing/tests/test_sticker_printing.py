@@ -0,0 +1,341 @@
+import csv
+import datetime
+import io
+import logging
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from mooringlicensing.components.approvals.models import AnnualAdmissionPermit, ApprovalHistory, Sticker
+from mooringlicensing.components.approvals.sticker_printing import (
+    add_to_approval_histories, approve_printed_proposals, import_sticker_printing_response, write_sticker_batch,
+)
+from mooringlicensing.components.payments_ml.models import FeeSeason
+from mooringlicensing.components.proposals.models import (
+    AnnualAdmissionApplication, Owner, Proposal, ProposalApplicant, StickerPrintingResponse, Vessel, VesselDetails,
+    VesselOwnership, update_sticker_response_doc_filename,
+)
+
+
+class StickerFixtureMixin(object):
+
+    def create_sticker(self, rego_no='abc123', status=Sticker.STICKER_STATUS_READY, postal_address=True, vessel_details=True, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            vessel = Vessel.objects.create(rego_no=rego_no)
+            if vessel_details:
+                VesselDetails.objects.create(vessel=vessel, vessel_type='catamaran', vessel_draft='1.00', vessel_weight='2.00', vessel_length='8.50')
+            vessel_ownership = VesselOwnership.objects.create(owner=Owner.objects.create(emailuser=123), vessel=vessel)
+            proposal = AnnualAdmissionApplication.objects.create(vessel_ownership=vessel_ownership, processing_status=Proposal.PROCESSING_STATUS_PRINTING_STICKER)
+            ProposalApplicant.objects.create(proposal=proposal, email_user_id=123, first_name='Jane', last_name='Smith')
+            approval = AnnualAdmissionPermit.objects.create(issue_date=timezone.now(), current_proposal=proposal)
+            postal_address = {
+                'postal_address_line1': '1 Main Street',
+                'postal_address_locality': 'Perth',
+                'postal_address_state': 'wa',
+                'postal_address_postcode': '6000',
+            } if postal_address else {}
+            sticker = Sticker.objects.create(
+                approval=approval,
+                vessel_ownership=vessel_ownership,
+                fee_season=FeeSeason.objects.get_or_create(name='2025/26')[0],
+                proposal_initiated=proposal,
+                status=status,
+                **postal_address,
+                **kwargs
+            )
+        return sticker
+
+
+def previous_sticker_export(stickers, today):
+    """
+    The rows, numbers and approval histories of the stickers as written one sticker at a time by sticker_export
+    before write_sticker_batch.  Returns (rows including the header, sticker numbers exported, error messages)
+    """
+    logger = logging.getLogger('cron_tasks')
+    updates = []
+    errors = []
+    stickers_to_export = list(stickers)
+    sticker_numbers = iter(Sticker.reserve_numbers(len(stickers_to_export)))
+    data = [[
+        'Date', 'First Name', 'Last Name', 'Address Line 1', 'Address Line 2', 'Suburb', 'State', 'Postcode',
+        'Sticker Type', 'Sticker Number', 'Vessel Registration Number', 'Moorings', 'Length Colour', 'White info',
+        'Vessel Length', 'Season',
+    ]]
+    for sticker in stickers_to_export:
+        try:
+            sticker.number = next(sticker_numbers)
+            sticker.save()
+
+            mooring_names = ', '.join([mooring.name for mooring in sticker.get_moorings()])
+
+            if not sticker.postal_address_line1 or not sticker.postal_address_locality or not sticker.postal_address_state or not sticker.postal_address_postcode:
+                continue
+
+            sticker_batch_property_values = [
+                today.strftime('%d/%m/%Y'),
+                sticker.first_name,
+                sticker.last_name,
+                sticker.postal_address_line1,
+                sticker.postal_address_line2,
+                sticker.postal_address_locality.upper(),
+                sticker.postal_address_state.upper(),
+                sticker.postal_address_postcode,
+                sticker.approval.description,
+                sticker.number,
+                sticker.vessel_registration_number.upper(),
+                mooring_names,
+                sticker.get_sticker_colour(),
+                sticker.get_white_info(),
+                sticker.vessel_applicable_length,
+                sticker.fee_season.name if sticker.fee_season and sticker.fee_season.name else ''
+            ]
+
+            sticker_batch_properties = {}
+            for i in range(0, len(sticker_batch_property_values) - 1):
+                sticker_batch_properties[data[0][i].lower().replace(" ", "_")] = sticker_batch_property_values[i]
+
+            sticker.batch_property_cache = sticker_batch_properties
+            data.append(sticker_batch_property_values)
+            updates.append(sticker.number)
+            sticker.save()
+            new_approval_history_entry = ApprovalHistory.objects.create(
+                vessel_ownership=sticker.approval.current_proposal.vessel_ownership,
+                approval=sticker.approval,
+                proposal=sticker.approval.current_proposal,
+                start_date=sticker.approval.issue_date,
+                approval_letter=sticker.approval.licence_document,
+            )
+            new_approval_history_entry.stickers.add(sticker)
+            new_approval_history_entry.save()
+        except Exception as e:
+            err_msg = 'Error adding sticker: {} details to spreadsheet.'.format(sticker.number)
+            logger.error('{}\n{}'.format(err_msg, str(e)))
+            errors.append(err_msg)
+    return data, updates, errors
+
+
+class _Rollback(Exception):
+    pass
+
+
+def as_csv(values):
+    # As written by the csv module
+    return ['' if value is None else str(value) for value in values]
+
+
+class StickerExportTests(StickerFixtureMixin, TestCase):
+
+    def export_state(self, stickers, rows, exported_numbers, errors):
+        """
+        What an export did to the stickers, with the sticker numbers replaced by the sticker ids
+        """
+        stickers = list(Sticker.objects.filter(id__in=[sticker.id for sticker in stickers]).order_by('id'))
+        ids_by_number = {sticker.number: sticker.id for sticker in stickers}
+        return {
+            'header': as_csv(rows[0]),
+            'rows': [as_csv(row[:9]) + [ids_by_number[row[9]]] + as_csv(row[10:]) for row in rows[1:]],
+            'exported': sorted(ids_by_number[number] for number in exported_numbers),
+            'errors': len(errors),
+            'stickers': [(
+                sticker.id,
+                sticker.status,
+                len(sticker.number) == 7 and sticker.number.isdigit(),
+                {key: value for key, value in sticker.batch_property_cache.items() if key != 'sticker_number'},
+                list(ApprovalHistory.objects.filter(stickers=sticker).values_list('approval_id', 'proposal_id', 'vessel_ownership_id', 'start_date')),
+            ) for sticker in stickers],
+        }
+
+    def test_stickers_are_numbered_from_the_sequence(self):
+        stickers = [self.create_sticker('abc{}'.format(i)) for i in range(3)]
+        # Numbered even though it is left out of the file
+        stickers.append(self.create_sticker('def123', postal_address=False))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            exported, errors = write_sticker_batch(Sticker.objects.filter(id__in=[sticker.id for sticker in stickers]).order_by('id'), io.StringIO(), timezone.now().date())
+
+        self.assertEqual(len(exported), 3)
+        self.assertEqual(errors, [])
+        numbers = [Sticker.objects.get(id=sticker.id).number for sticker in stickers]
+        first = int(numbers[0])
+        # One reservation for the whole batch
+        self.assertEqual(numbers, ['{0:07d}'.format(first + i) for i in range(4)])
+
+    def test_batch_matches_the_previous_per_sticker_export(self):
+        stickers = [self.create_sticker('abc{}'.format(i)) for i in range(3)]
+        stickers.append(self.create_sticker('def123', postal_address=False))
+        stickers.append(self.create_sticker('ghi123', vessel_details=False))
+        queryset = Sticker.objects.filter(id__in=[sticker.id for sticker in stickers]).order_by('id')
+        today = timezone.now().date()
+
+        try:
+            with transaction.atomic():
+                rows, exported_numbers, errors = previous_sticker_export(queryset, today)
+                previous_state = self.export_state(stickers, rows, exported_numbers, errors)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        csv_file = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            exported, errors = write_sticker_batch(queryset, csv_file, today)
+        rows = list(csv.reader(io.StringIO(csv_file.getvalue())))
+        state = self.export_state(stickers, rows, [sticker.number for sticker in exported], errors)
+
+        self.assertEqual(state, previous_state)
+        self.assertEqual(len(state['rows']), 3)
+        self.assertEqual(state['errors'], 1)
+        # Still waiting for the printing response
+        self.assertEqual({sticker[1] for sticker in state['stickers']}, {Sticker.STICKER_STATUS_READY})
+
+
+class StickerImportTests(StickerFixtureMixin, TestCase):
+
+    def create_response(self, *rows):
+        content = '\n'.join(['Sticker Number,Printing Date,Mailing Date,Status'] + [','.join(row) for row in rows])
+        response = StickerPrintingResponse.objects.create()
+        storage = StickerPrintingResponse._meta.get_field('_file').storage
+        # Saved as is, without the file sanitising of Document.save
+        name = storage.save(update_sticker_response_doc_filename(response, 'response.csv'), ContentFile(content.encode()))
+        self.addCleanup(storage.delete, name)
+        StickerPrintingResponse.objects.filter(id=response.id).update(_file=name)
+        response.refresh_from_db()
+        return response
+
+    def create_approval_history(self, sticker, **kwargs):
+        return ApprovalHistory.objects.create(
+            approval=sticker.approval,
+            proposal=sticker.proposal_initiated,
+            vessel_ownership=sticker.vessel_ownership,
+            start_date=timezone.now(),
+            **kwargs
+        )
+
+    def add_sticker(self, sticker, number, status=Sticker.STICKER_STATUS_AWAITING_PRINTING):
+        # Another sticker of the same approval and proposal
+        return Sticker.objects.create(
+            approval=sticker.approval,
+            vessel_ownership=sticker.vessel_ownership,
+            proposal_initiated=sticker.proposal_initiated,
+            number=number,
+            status=status,
+        )
+
+    def import_response(self, response):
+        with mock.patch.object(Sticker.objects, 'bulk_update', wraps=Sticker.objects.bulk_update) as bulk_update:
+            with self.captureOnCommitCallbacks(execute=True):
+                updated, errors = import_sticker_printing_response(response)
+        bulk_updated = [sticker.id for sticker in bulk_update.call_args[0][0]]
+        return updated, errors, bulk_updated
+
+    def test_printed_stickers_become_current(self):
+        printed = self.create_sticker('abc1', status=Sticker.STICKER_STATUS_AWAITING_PRINTING, number='9100001')
+        approval_history = self.create_approval_history(printed)
+        partly_printed = self.create_sticker('abc2', status=Sticker.STICKER_STATUS_AWAITING_PRINTING, number='9100002')
+        # Left out of the response
+        self.add_sticker(partly_printed, '9100003')
+        response = self.create_response(
+            ('9100001', '06/10/2025', '07/10/2025', ''),
+            ('9100002', '06/10/2025', '07/10/2025', ''),
+        )
+
+        updated, errors, bulk_updated = self.import_response(response)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(sticker.id for sticker in updated), sorted([printed.id, partly_printed.id]))
+        self.assertEqual(sorted(bulk_updated), sorted([printed.id, partly_printed.id]))
+        printed.refresh_from_db()
+        self.assertEqual(printed.status, Sticker.STICKER_STATUS_CURRENT)
+        self.assertEqual((printed.printing_date, printed.mailing_date), (datetime.date(2025, 10, 6), datetime.date(2025, 10, 7)))
+        self.assertEqual(printed.sticker_printing_response, response)
+        self.assertEqual(Proposal.objects.get(id=printed.proposal_initiated_id).processing_status, Proposal.PROCESSING_STATUS_APPROVED)
+        self.assertEqual(list(approval_history.stickers.all()), [printed])
+        # A sticker of the proposal is still being printed
+        self.assertEqual(Sticker.objects.get(id=partly_printed.id).status, Sticker.STICKER_STATUS_CURRENT)
+        self.assertEqual(Proposal.objects.get(id=partly_printed.proposal_initiated_id).processing_status, Proposal.PROCESSING_STATUS_PRINTING_STICKER)
+
+    def test_returned_and_lost_stickers_keep_their_status(self):
+        returned = self.create_sticker('abc1', status=Sticker.STICKER_STATUS_RETURNED, number='9100011')
+        lost = self.create_sticker('abc2', status=Sticker.STICKER_STATUS_LOST, number='9100012')
+        response = self.create_response(
+            ('9100011', '06/10/2025', '07/10/2025', ''),
+            ('9100012', '06/10/2025', '07/10/2025', ''),
+        )
+
+        updated, errors, bulk_updated = self.import_response(response)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(updated), 2)
+        # Saved one by one for their post_save
+        self.assertEqual(bulk_updated, [])
+        for sticker, status in ((returned, Sticker.STICKER_STATUS_RETURNED), (lost, Sticker.STICKER_STATUS_LOST)):
+            sticker.refresh_from_db()
+            self.assertEqual(sticker.status, status)
+            self.assertEqual((sticker.printing_date, sticker.mailing_date), (datetime.date(2025, 10, 6), datetime.date(2025, 10, 7)))
+            self.assertEqual(sticker.sticker_printing_response, response)
+            self.assertEqual(Proposal.objects.get(id=sticker.proposal_initiated_id).processing_status, Proposal.PROCESSING_STATUS_PRINTING_STICKER)
+
+    def test_cancelled_stickers(self):
+        lost = self.create_sticker('abc1', status=Sticker.STICKER_STATUS_LOST, number='9100021')
+        current = self.create_sticker('abc2', status=Sticker.STICKER_STATUS_CURRENT, number='9100022')
+        response = self.create_response(
+            ('9100021', '', '', 'Cancelled'),
+            ('9100022', '', '', 'cancelled'),
+        )
+
+        updated, errors, bulk_updated = self.import_response(response)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(bulk_updated), sorted([lost.id, current.id]))
+        self.assertEqual(Sticker.objects.get(id=lost.id).status, Sticker.STICKER_STATUS_CANCELLED)
+        self.assertEqual(Sticker.objects.get(id=current.id).status, Sticker.STICKER_STATUS_CURRENT)
+        self.assertEqual(Proposal.objects.get(id=lost.proposal_initiated_id).processing_status, Proposal.PROCESSING_STATUS_APPROVED)
+
+    def test_rows_which_cannot_be_applied_are_reported(self):
+        sticker = self.create_sticker('abc1', status=Sticker.STICKER_STATUS_AWAITING_PRINTING, number='9100031')
+        response = self.create_response(
+            ('9100031', '2025-10-06', '07/10/2025', ''),
+            ('9100039', '06/10/2025', '07/10/2025', ''),
+            # Not printed yet
+            ('9100031', '', '', ''),
+        )
+
+        updated, errors, bulk_updated = self.import_response(response)
+
+        self.assertEqual(updated, [])
+        self.assertEqual(errors, ['Error updating the sticker 9100031', 'Error sticker 9100039 not found to update'])
+        self.assertEqual(Sticker.objects.get(id=sticker.id).status, Sticker.STICKER_STATUS_AWAITING_PRINTING)
+
+    def test_proposals_are_approved_once_all_their_stickers_are_printed(self):
+        printed = self.create_sticker('abc1', status=Sticker.STICKER_STATUS_AWAITING_PRINTING)
+        partly_printed = self.create_sticker('abc2', status=Sticker.STICKER_STATUS_AWAITING_PRINTING)
+        self.add_sticker(partly_printed, '', status=Sticker.STICKER_STATUS_NOT_READY_YET)
+        not_printing = self.create_sticker('abc3', status=Sticker.STICKER_STATUS_AWAITING_PRINTING)
+        # Printed, without the post_save approving the proposals
+        Sticker.objects.filter(id__in=[printed.id, partly_printed.id, not_printing.id]).update(status=Sticker.STICKER_STATUS_CURRENT)
+        Proposal.objects.filter(id=not_printing.proposal_initiated_id).update(processing_status=Proposal.PROCESSING_STATUS_WITH_ASSESSOR)
+        proposal_ids = [sticker.proposal_initiated_id for sticker in (printed, partly_printed, not_printing)]
+
+        self.assertEqual([proposal.id for proposal in approve_printed_proposals(proposal_ids)], [printed.proposal_initiated_id])
+        self.assertEqual(
+            list(Proposal.objects.filter(id__in=proposal_ids).order_by('id').values_list('processing_status', flat=True)),
+            [Proposal.PROCESSING_STATUS_APPROVED, Proposal.PROCESSING_STATUS_PRINTING_STICKER, Proposal.PROCESSING_STATUS_WITH_ASSESSOR],
+        )
+        self.assertEqual(approve_printed_proposals(proposal_ids), [])
+
+    def test_current_stickers_are_added_to_the_active_approval_history(self):
+        sticker = self.create_sticker('abc1', status=Sticker.STICKER_STATUS_CURRENT)
+        expired = self.add_sticker(sticker, '', status=Sticker.STICKER_STATUS_EXPIRED)
+        self.create_approval_history(sticker, end_date=timezone.now())
+        approval_history = self.create_approval_history(sticker)
+        without_history = self.create_sticker('abc2', status=Sticker.STICKER_STATUS_CURRENT)
+
+        with self.assertLogs('mooringlicensing.components.approvals.sticker_printing', 'WARNING'):
+            add_to_approval_histories([sticker, expired, without_history])
+        # Never added twice
+        add_to_approval_histories([sticker])
+
+        self.assertEqual(list(approval_history.stickers.all()), [sticker])
+        self.assertFalse(ApprovalHistory.objects.filter(stickers=without_history).exists())
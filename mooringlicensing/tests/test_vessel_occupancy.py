@@ -0,0 +1,123 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import serializers
+
+from mooringlicensing.components.approvals.models import Approval, WaitingListAllocation
+from mooringlicensing.components.proposals import vessel_occupancy
+from mooringlicensing.components.proposals.models import (
+    AnnualAdmissionApplication, Owner, Proposal, ProposalApplicant, Vessel, VesselDetails, VesselOccupancy,
+    VesselOwnership, WaitingListApplication,
+)
+
+
+class VesselOccupancyTests(TestCase):
+
+    def setUp(self):
+        self.vessel = Vessel.objects.create(rego_no='ABC123')
+        self.vessel_ownership = VesselOwnership.objects.create(owner=Owner.objects.create(emailuser=123), vessel=self.vessel)
+        self.other_vessel_ownership = VesselOwnership.objects.create(owner=Owner.objects.create(emailuser=456), vessel=self.vessel)
+        self.vessel_details = VesselDetails.objects.create(vessel=self.vessel, vessel_type='catamaran', vessel_draft='1.00', vessel_weight='2.00')
+
+    def create_proposal(self, proposal_class, vessel_ownership, processing_status=Proposal.PROCESSING_STATUS_WITH_ASSESSOR):
+        with self.captureOnCommitCallbacks(execute=True):
+            proposal = proposal_class.objects.create(
+                vessel_ownership=vessel_ownership, vessel_details=self.vessel_details, rego_no=self.vessel.rego_no, processing_status=processing_status,
+            )
+            ProposalApplicant.objects.create(proposal=proposal, email_user_id=vessel_ownership.owner.emailuser)
+        return proposal
+
+    def create_waiting_list_allocation(self, vessel_ownership):
+        proposal = self.create_proposal(WaitingListApplication, vessel_ownership, Proposal.PROCESSING_STATUS_APPROVED)
+        today = datetime.date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            approval = WaitingListAllocation.objects.create(
+                issue_date=timezone.now(),
+                status=Approval.APPROVAL_STATUS_CURRENT,
+                current_proposal=proposal,
+                start_date=today - datetime.timedelta(days=1),
+                expiry_date=today + datetime.timedelta(days=365),
+            )
+        return approval
+
+    def test_rows_follow_the_active_applications(self):
+        proposal = self.create_proposal(WaitingListApplication, self.vessel_ownership)
+        occupancy = VesselOccupancy.objects.get(proposal=proposal)
+        self.assertEqual(occupancy.source, VesselOccupancy.SOURCE_PROPOSAL)
+        self.assertEqual(occupancy.child_type, WaitingListApplication.code)
+        self.assertEqual(occupancy.vessel, self.vessel)
+        self.assertEqual(occupancy.owner_email_user_id, 123)
+        self.assertEqual(vessel_occupancy.verify(), (set(), set()))
+
+        # The vessel has been sold
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vessel_ownership.end_date = self.vessel_ownership.start_date.date()
+            self.vessel_ownership.save()
+        occupancy.refresh_from_db()
+        self.assertEqual(occupancy.end_date, self.vessel_ownership.end_date)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            proposal.processing_status = Proposal.PROCESSING_STATUS_DISCARDED
+            proposal.save()
+        self.assertFalse(VesselOccupancy.objects.filter(proposal=proposal).exists())
+        self.assertEqual(vessel_occupancy.rebuild(), 0)
+
+    def test_application_of_another_owner_blocks(self):
+        self.create_proposal(WaitingListApplication, self.other_vessel_ownership)
+        proposal = self.create_proposal(AnnualAdmissionApplication, self.vessel_ownership)
+
+        with self.assertRaisesMessage(serializers.ValidationError, 'under another active application with another owner'):
+            self.vessel.check_blocking_ownership(self.vessel_ownership, proposal, None)
+        with self.assertRaisesMessage(serializers.ValidationError, 'already listed in'):
+            proposal.validate_against_existing_proposals_and_approvals()
+
+    def test_application_of_the_same_owner_does_not_block(self):
+        self.create_proposal(WaitingListApplication, self.vessel_ownership)
+        proposal = self.create_proposal(AnnualAdmissionApplication, self.vessel_ownership)
+
+        self.vessel.check_blocking_ownership(self.vessel_ownership, proposal, None)
+        proposal.validate_against_existing_proposals_and_approvals()
+
+    def test_licence_of_another_owner_blocks(self):
+        approval = self.create_waiting_list_allocation(self.other_vessel_ownership)
+        proposal = self.create_proposal(AnnualAdmissionApplication, self.vessel_ownership)
+
+        with self.assertRaisesMessage(serializers.ValidationError, 'under a current Licence/Permit under another owner'):
+            self.vessel.check_blocking_ownership(self.vessel_ownership, proposal, None)
+        with self.assertRaisesMessage(serializers.ValidationError, 'already listed in'):
+            proposal.validate_against_existing_proposals_and_approvals()
+        self.assertEqual(list(self.vessel.get_current_approvals(datetime.date.today())['wla']), [approval])
+
+    def test_licence_of_the_same_owner_does_not_block(self):
+        approval = self.create_waiting_list_allocation(self.vessel_ownership)
+        proposal = self.create_proposal(AnnualAdmissionApplication, self.vessel_ownership)
+
+        self.vessel.check_blocking_ownership(self.vessel_ownership, proposal, None)
+        proposal.validate_against_existing_proposals_and_approvals()
+        self.assertEqual(list(self.vessel.get_current_wlas(datetime.date.today())), [approval])
+
+    def test_changes_not_committed_yet_are_checked(self):
+        proposal = self.create_proposal(AnnualAdmissionApplication, self.vessel_ownership)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            WaitingListApplication.objects.create(
+                vessel_ownership=self.other_vessel_ownership, vessel_details=self.vessel_details, rego_no=self.vessel.rego_no,
+                processing_status=Proposal.PROCESSING_STATUS_WITH_ASSESSOR,
+            )
+            # Synced in the transaction before the check reads the index
+            with self.assertRaisesMessage(serializers.ValidationError, 'under another active application with another owner'):
+                self.vessel.check_blocking_ownership(self.vessel_ownership, proposal, None)
+        self.assertTrue(callbacks)
+        self.assertEqual(vessel_occupancy.verify(), (set(), set()))
+
+    def test_failure_to_sync_before_a_check_is_raised(self):
+        proposal = self.create_proposal(AnnualAdmissionApplication, self.vessel_ownership)
+        vessel_occupancy.sync_on_commit(proposal_ids=[proposal.id])
+
+        with mock.patch.object(vessel_occupancy, 'sync', side_effect=RuntimeError('sync failed')):
+            with self.assertLogs(vessel_occupancy.logger, 'ERROR'), self.assertRaises(RuntimeError):
+                self.vessel.check_blocking_ownership(self.vessel_ownership, proposal, None)
+        # Kept for the next sync
+        self.assertEqual(vessel_occupancy._take_pending()['proposal_ids'], {proposal.id})
@@ -47,6 +47,7 @@ from mooringlicensing.components.approvals.models import (
     DcvPermit,
     DcvVessel,
 )
+from mooringlicensing.components.approvals.pdf import generate_approval_docs, generate_dcv_permit_docs
 
 from tqdm import tqdm
 import logging
@@ -2403,12 +2404,22 @@ class MooringLicenceReader():
             else:
                 approvals = approvals_migrated.filter(migrated=True).filter(Q(current_proposal__processing_status=Proposal.PROCESSING_STATUS_APPROVED)|Q(current_proposal__processing_status=Proposal.PROCESSING_STATUS_PRINTING_STICKER))
 
-            for idx, a in enumerate(approvals):
+            #documents are converted to pdf in batches (a LibreOffice run per batch rather than per document)
+            if isinstance(approvals_migrated[0], DcvPermit):
+                targets = [a for a in approvals if len(a.dcv_permit_documents.all())==0]
+                failed = generate_dcv_permit_docs(targets)
+            else:
+                targets = [a for a in approvals if not hasattr(a, 'licence_document') or a.licence_document is None]
+                failed = generate_approval_docs(targets)
+            for a, e in failed:
+                logger.error(e)
+            failed_ids = [a.id for a, e in failed]
+
+            for idx, a in enumerate(targets):
+                if a.id in failed_ids:
+                    continue
                 try:
-                    if isinstance(a, DcvPermit) and len(a.dcv_permit_documents.all())==0:
-                        a.generate_dcv_permit_doc()
-                    elif not hasattr(a, 'licence_document') or a.licence_document is None: 
-                        a.generate_doc()
+                    if not isinstance(a, DcvPermit):
                         #retroactively update history (update last history record of approval)
                         history = a.approvalhistory_set.last()
                         history.approval_letter = a.licence_document
@@ -1,6 +1,8 @@
 import logging
 from confy import env
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date
 from django.shortcuts import render, redirect
 from django.views.generic import DetailView
 from django.views.generic.base import TemplateView
@@ -13,10 +15,12 @@ from mooringlicensing.components.approvals.models import Approval, DcvAdmission,
 from mooringlicensing.components.proposals.models import Proposal, MooringBay
 from mooringlicensing.components.compliances.models import Compliance
 from mooringlicensing.components.main.models import JobQueue, Notice
+from mooringlicensing.components.main.utils import exportModelData, streamExportData
 from mooringlicensing.components.payments_ml.models import FeeSeason
 from django.core.management import call_command
 from django.db.models import Q
 import os
+import re
 import mimetypes
 import json
 
@@ -184,6 +188,7 @@ class EmailExportsView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
         export_model = request.POST.get('export_model', None)
         filters = request.POST.get('filters', None)
         format = request.POST.get('format', 'csv')
+        delivery = request.POST.get('delivery', 'email')
         num_records = request.POST.get('num_records', settings.MAX_NUM_ROWS_MODEL_EXPORT)
 
         try:
@@ -191,7 +196,13 @@ class EmailExportsView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
         except:
             num_records = settings.MAX_NUM_ROWS_MODEL_EXPORT
 
-        if export_model:
+        if export_model and delivery == 'download':
+            #streamed to the user as the rows are read, rather than emailed by the email_exports queue job
+            response = streamExportData(export_model, exportModelData(export_model, json.loads(filters) if filters else {}, num_records), format)
+            if response:
+                return response
+            context.update({"message": "Export request failed."})
+        elif export_model:
             parameters = {"model":export_model, "filters":filters, "format":format, "num_records": num_records}
             parameters_json = parameters
             #check if job with same params that is not completed/failed already exists - prevent needless duplicates
@@ -254,6 +265,18 @@ def get_file_path_id(check_str,file_path):
     else:
         return False
 
+def is_authorised_to_access_cached(request, document_type, document_id, is_authorised):
+    """
+    Remember the decision of is_authorised for the user and document for a short while,
+    so that paging through a document does not repeat the lookups for every request
+    """
+    cache_key = 'document_access_{}_{}_{}'.format(request.user.id, document_type, document_id)
+    authorised = cache.get(cache_key)
+    if authorised is None:
+        authorised = bool(is_authorised(request, document_id))
+        cache.set(cache_key, authorised, settings.PRIVATE_DOCUMENT_AUTHORISATION_CACHE_TTL)
+    return authorised
+
 def is_authorised_to_access_document(request):
 
     if is_internal(request):
@@ -261,20 +284,86 @@ def is_authorised_to_access_document(request):
     elif is_customer(request):
         p_document_id = get_file_path_id("proposals",request.path) or get_file_path_id("proposal",request.path)
         if p_document_id:
-            return is_authorised_to_access_proposal_document(request,p_document_id)
+            return is_authorised_to_access_cached(request, "proposal", p_document_id, is_authorised_to_access_proposal_document)
         a_document_id = get_file_path_id("approvals",request.path) or get_file_path_id("approval",request.path)
         if a_document_id:
-            return is_authorised_to_access_approval_document(request,a_document_id)
+            return is_authorised_to_access_cached(request, "approval", a_document_id, is_authorised_to_access_approval_document)
         da_document_id = get_file_path_id("dcv_admission",request.path)
         if da_document_id:
-            return is_authorised_to_access_dcv_admission_document(request,da_document_id)
+            return is_authorised_to_access_cached(request, "dcv_admission", da_document_id, is_authorised_to_access_dcv_admission_document)
         dp_document_id = get_file_path_id("dcv_permit",request.path)
         if dp_document_id:
-            return is_authorised_to_access_dcv_permit_document(request,dp_document_id)
+            return is_authorised_to_access_cached(request, "dcv_permit", dp_document_id, is_authorised_to_access_dcv_permit_document)
         return False
     else:
         return False
 
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def get_byte_range(range_header, file_size):
+    """
+    Return (start, end) of a single "bytes=" range, None when there is no usable range,
+    or False when the range cannot be satisfied
+    """
+    match = RANGE_RE.match(range_header.strip()) if range_header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    if match.group(1) == '':
+        # Suffix range: the last n bytes
+        length = int(match.group(2))
+        if length == 0 or file_size == 0:
+            return False
+        return max(file_size - length, 0), file_size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else file_size - 1
+    if start >= file_size or end < start:
+        return False
+    return start, min(end, file_size - 1)
+
+def iterate_file_range(file_path, start, length, chunk_size=64 * 1024):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+def serve_private_file(request, full_file_path, content_type):
+    """
+    Stream the file, answering conditional (ETag/If-None-Match) and single range requests.
+    When PRIVATE_MEDIA_X_ACCEL_REDIRECT_PREFIX is set, the file is handed over to the front proxy instead.
+    """
+    if settings.PRIVATE_MEDIA_X_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.PRIVATE_MEDIA_X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + os.path.relpath(full_file_path, settings.BASE_DIR)
+        return response
+
+    stat = os.stat(full_file_path)
+    etag = '"{:x}-{:x}"'.format(int(stat.st_mtime), stat.st_size)
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        byte_range = None
+        if request.META.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = get_byte_range(request.META.get('HTTP_RANGE'), stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(stat.st_size)
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(iterate_file_range(full_file_path, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, stat.st_size)
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(open(full_file_path, 'rb'), content_type=content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 def getPrivateFile(request):
 
     if is_authorised_to_access_document(request):
@@ -284,14 +373,10 @@ def getPrivateFile(request):
         #we then ensure the normalised path is within the BASE_DIR (and the file exists)
         if full_file_path.startswith(settings.BASE_DIR) and os.path.isfile(full_file_path):
             extension = file_name_path.split(".")[-1].lower()
-            the_file = open(full_file_path, 'rb')
-            the_data = the_file.read()
-            the_file.close()
-            if extension == 'msg':
-                return HttpResponse(the_data, content_type="application/vnd.ms-outlook")
-            if extension == 'eml':
-                return HttpResponse(the_data, content_type="application/vnd.ms-outlook")
-
-            return HttpResponse(the_data, content_type=mimetypes.types_map['.'+str(extension)])
+            if extension in ('msg', 'eml',):
+                content_type = "application/vnd.ms-outlook"
+            else:
+                content_type = mimetypes.types_map['.'+str(extension)]
+            return serve_private_file(request, full_file_path, content_type)
 
-    return HttpResponse()
\ No newline at end of file
+    return HttpResponse()
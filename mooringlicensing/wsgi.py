@@ -11,4 +11,9 @@ confy.read_environment_file(BASE_DIR+"/.env")
 os.environ.setdefault("BASE_DIR", BASE_DIR)
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mooringlicensing.settings")
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+from django.conf import settings
+if settings.CACHE_WARM_ON_STARTUP:
+    from mooringlicensing.components.main.cache_warming import warm_caches
+    warm_caches()